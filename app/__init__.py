@@ -6,18 +6,275 @@ import os
 
 socketio = SocketIO(cors_allowed_origins="*")
 
-def create_app():
+def create_app(broker=None):
     """Application factory pattern for Flask app"""
     load_dotenv()
     
     app = Flask(__name__)
     app.config.from_object('app.config.Config')
     
+    # Services are built on first use (or by the warm-up below), not here:
+    # the process answers /api/health before any broker login or download
+    from app.services.registry import ServiceRegistry
+    
+    services = app.extensions = ServiceRegistry(app.extensions)
+    
     # Enable CORS for API access
     CORS(app)
     
-    # Initialize SocketIO for real-time updates
-    socketio.init_app(app)
+    # Multi-process mode: workers share state and SocketIO events through Redis
+    cluster = None
+    if app.config['REDIS_URL']:
+        from app.services.cluster import ClusterState
+        
+        cluster = ClusterState(app.config['REDIS_URL'], prefix=app.config['CLUSTER_PREFIX'],
+                               max_stream_requests=app.config['TICKER_MAX_INSTRUMENTS'])
+    
+    # Initialize SocketIO for real-time updates (fanned out to every worker's clients)
+    if cluster is not None:
+        socketio.init_app(app, async_mode=app.config['ASYNC_MODE'], message_queue=app.config['REDIS_URL'],
+                          channel=f"{app.config['CLUSTER_PREFIX']}:socketio")
+    else:
+        socketio.init_app(app, async_mode=app.config['ASYNC_MODE'])
+    
+    # One shared broker session per process, injected into all blueprints;
+    # an injected broker (benchmarks, load tests) replaces the live one
+    session = {'broker': broker} if broker is not None else {}
+    simulated = broker is None and app.config['BROKER_BACKEND'] == 'simulator'
+    if broker is not None and cluster is not None:
+        broker.cluster = cluster
+    
+    def connect():
+        """The broker session alone, before the risk gate and journal are attached"""
+        if 'broker' not in session:
+            from app.services.broker import BrokerService
+            
+            client = None
+            # In-process exchange instead of Kite: no credentials, network or market hours
+            if simulated:
+                from app.services.simulator import SimulatedExchange
+                
+                client = SimulatedExchange.from_config().start()
+            session['broker'] = BrokerService(app.config['BROKER_API_KEY'],
+                                              app.config['BROKER_API_SECRET'],
+                                              app.config['BROKER_NAME'],
+                                              kite=client, cluster=cluster)
+            # Kite's limits apply per API key: the workers split each budget between them,
+            # except the order budget, which only the leader spends (see LeaderRouter)
+            if cluster is not None and app.config['WORKERS'] > 1:
+                scheduler = session['broker'].scheduler
+                for name, limiter in list(scheduler.budgets.items()):
+                    if name == 'order':
+                        continue
+                    scheduler.configure(name, limiter.rate / app.config['WORKERS'],
+                                        max(1, limiter.capacity // app.config['WORKERS']))
+        return session['broker']
+    
+    def exchange():
+        client = connect().kite
+        return client if getattr(client, 'simulated', False) else None
+    
+    def build_broker():
+        broker = connect()
+        
+        # Every order is checked in memory before it reaches the broker
+        if app.config['RISK_GATE_ENABLED']:
+            from app.services.risk_gate import PreTradeRiskGate
+            
+            broker.risk_gate = PreTradeRiskGate(services['instruments'], surface=services['options'].surface)
+            broker.risk_gate.loader = lambda: broker.get_positions(raise_errors=True)
+        
+        # Fills of route and exit orders, polled while no streaming feed reports them
+        from app.services.execution import FillTracker
+        
+        broker.fills = FillTracker(broker)
+        if broker.risk_gate is not None:
+            broker.fills.add_listener(broker.risk_gate.on_order_update)
+        
+        # Orders, fills and strategy runs survive restarts; writes are batched off the order path
+        if app.config['JOURNAL_ENABLED']:
+            from app.services.journal import TradeJournal
+            
+            broker.journal = TradeJournal(app.config['JOURNAL_URL'],
+                                          flush_interval=app.config['JOURNAL_FLUSH_INTERVAL']).start()
+            broker.fills.add_listener(broker.journal.on_order_update)
+        
+        # In a cluster only the leader places orders: one gate and journal for the deployment
+        if cluster is not None:
+            from app.services.cluster import LeaderRouter
+            
+            broker.router = LeaderRouter(cluster, lambda: services['cluster'],
+                                         max_workers=app.config['ORDER_MAX_WORKERS'])
+            broker.router.register('place_order', broker.place_order)
+            broker.router.register('cancel_order', broker.cancel_order)
+            broker.router.register('risk_ledger', lambda: broker.risk_gate.snapshot())
+        
+        from app.utils.metrics import metrics
+        from app.utils.rate_limit import LANES
+        
+        for name, limiter in broker.scheduler.budgets.items():
+            metrics.gauge('broker_rate_limit_tokens', limiter.available, 'Tokens left in the request bucket', limiter=name)
+            metrics.gauge('broker_rate_limit_retries_total', lambda limiter=limiter: limiter.retries,
+                          'Calls throttled by the broker (HTTP 429) and retried', 'counter', limiter=name)
+            for priority, lane in enumerate(LANES):
+                metrics.gauge('broker_rate_limit_queue_depth',
+                              lambda limiter=limiter, priority=priority: limiter.queued[priority],
+                              'Requests waiting for a token', limiter=name, lane=lane)
+                metrics.gauge('broker_rate_limit_acquired_total',
+                              lambda limiter=limiter, priority=priority: limiter.lane_acquired[priority],
+                              'Requests admitted by the bucket', 'counter', limiter=name, lane=lane)
+                metrics.gauge('broker_rate_limit_wait_seconds_total',
+                              lambda limiter=limiter, priority=priority: limiter.lane_waited[priority],
+                              'Time spent waiting for tokens', 'counter', limiter=name, lane=lane)
+        return broker
+    
+    def build_instruments():
+        from app.services.instruments import InstrumentStore
+        
+        # Real listed expiries/strikes/symbols, cached on disk once per day
+        # (the simulator's own listing is kept apart from the real master)
+        data_dir = app.config['DATA_DIR']
+        if exchange() is not None:
+            data_dir = os.path.join(data_dir, 'simulator')
+        instruments = InstrumentStore(os.path.join(data_dir, 'instruments'))
+        instruments.load(connect())
+        return instruments
+    
+    def build_options():
+        from app.services.options import OptionsChainService
+        
+        options = OptionsChainService(connect(), services['instruments'])
+        
+        # Persist every chain snapshot off the request path
+        if app.config['RECORDER_ENABLED']:
+            from app.services.recorder import ChainRecorder
+            
+            options.recorder = ChainRecorder(os.path.join(app.config['DATA_DIR'], 'chains')).start()
+        return options
+    
+    def build_strategy():
+        from app.services.strategy import StrategyService
+        
+        strategy = StrategyService(services['broker'], services['options'])
+        if cluster is not None:
+            strategy.router = strategy.broker.router
+            strategy.router.register('execute_strategy', strategy.execute_put_selling_strategy)
+        return strategy
+    
+    def build_exits():
+        from app.services.exits import ExitEngine
+        
+        broker = services['broker']
+        return ExitEngine(broker, services['strategy'].risk).start(broker.get_positions())
+    
+    def build_ticker():
+        from app.services.ticker import MarketDataTicker, QuoteStore
+        
+        broker, options, strategy = services['broker'], services['options'], services['strategy']
+        if exchange() is not None:
+            from app.services.simulator import SimulatedTicker
+            
+            ticker = SimulatedTicker(QuoteStore(), exchange())
+        else:
+            ticker = MarketDataTicker(QuoteStore(), app.config['TICKER_URL'],
+                                      credentials=lambda: (broker.api_key, broker.access_token))
+        ticker.subscribe({'NSE:NIFTY 50': app.config['NIFTY_INDEX_TOKEN']})
+        ticker.add_order_listener(strategy.executor.on_order_update)
+        ticker.add_tick_listener(options.on_ticks)
+        
+        # Position risk follows ticks and fills instead of re-polling positions
+        risk = strategy.risk
+        risk.subscribe = ticker.subscribe
+        ticker.add_tick_listener(risk.on_ticks)
+        ticker.add_order_listener(risk.on_order_update)
+        if broker.risk_gate is not None:
+            ticker.add_tick_listener(broker.risk_gate.on_ticks)
+            ticker.add_order_listener(broker.risk_gate.on_order_update)
+        if broker.journal is not None:
+            ticker.add_order_listener(broker.journal.on_order_update)
+        
+        # Stops, targets and expiry exits fire from ticks, not dashboard polls
+        if 'exits' in services:
+            exits = services['exits']
+            ticker.add_tick_listener(exits.on_ticks)
+            ticker.add_order_listener(exits.on_order_update)
+        broker.attach_ticker(ticker)
+        ticker.start()
+        return ticker
+    
+    services.register('broker', build_broker)
+    if simulated or getattr(getattr(broker, 'kite', None), 'simulated', False):
+        services.register('exchange', exchange)
+    services.register('instruments', build_instruments)
+    services.register('options', build_options)
+    if app.config['JOURNAL_ENABLED']:
+        services.register('journal', lambda: services['broker'].journal)
+    services.register('strategy', build_strategy)
+    # Stream the index and every quoted instrument instead of polling REST
+    # (in a cluster only the leader does, see build_cluster)
+    if app.config['TICKER_ENABLED'] and cluster is None:
+        if app.config['EXIT_ENGINE_ENABLED']:
+            services.register('exits', build_exits)
+        services.register('ticker', build_ticker)
+    
+    # Dashboards subscribe over SocketIO instead of polling REST endpoints
+    from app.services.publisher import DashboardPublisher
+    
+    publisher = DashboardPublisher(socketio, services,
+                                   interval=app.config['PUBLISH_INTERVAL'],
+                                   holdings_interval=app.config['HOLDINGS_PUBLISH_INTERVAL'])
+    publisher.register()
+    services['publisher'] = publisher
+    
+    def build_cluster():
+        from app.services.cluster import LeaderElection, QuoteRelay
+        
+        strategy = services['strategy']
+        publisher.shared = strategy.shared = cluster
+        publisher.leader = False  # Followers serve the leader's snapshots
+        election = LeaderElection(cluster, ttl=app.config['LEADER_TTL'])
+        leading = {}
+        
+        def elected():
+            # The leader owns the market-data feed, the exit engine and dashboard polling
+            if app.config['TICKER_ENABLED']:
+                if 'ticker' in leading:
+                    leading['ticker'].start()
+                else:
+                    if app.config['EXIT_ENGINE_ENABLED']:
+                        services.register('exits', build_exits)
+                    services.register('ticker', build_ticker)
+                    leading['ticker'] = services['ticker']
+                    leading['relay'] = QuoteRelay(cluster, leading['ticker'],
+                                                  interval=app.config['CLUSTER_QUOTE_INTERVAL'])
+                    leading['ticker'].add_tick_listener(leading['relay'].on_ticks)
+                leading['relay'].start()
+            strategy.shared = None
+            publisher.leader = True
+            publisher.start()
+            strategy.broker.router.start()
+        
+        def demoted():
+            strategy.broker.router.stop()
+            strategy.shared = cluster
+            publisher.leader = False
+            publisher.stop()
+            if 'ticker' in leading:
+                leading['relay'].stop()
+                leading['ticker'].stop()
+        
+        election.on_elected(elected)
+        election.on_demoted(demoted)
+        return election.start()
+    
+    # Elected last: the leader starts streaming with every other service in place
+    if cluster is not None:
+        services.register('cluster', build_cluster)
+    
+    # Latency histograms for every route and instrumented service call
+    from app.utils.metrics import instrument_app
+    
+    instrument_app(app, profiling=app.config['PROFILING_ENABLED'])
     
     # Register blueprints
     from app.routes.api import api_bp
@@ -28,4 +285,8 @@ def create_app():
     app.register_blueprint(orders_bp, url_prefix='/api/orders')
     app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     
+    # Build everything in the background so the first trading request doesn't pay for it
+    if app.config['SERVICES_WARMUP']:
+        services.warm()
+    
     return app
\ No newline at end of file
@@ -8,6 +8,48 @@ class Config:
     BROKER_API_KEY = os.getenv('BROKER_API_KEY')
     BROKER_API_SECRET = os.getenv('BROKER_API_SECRET')
     BROKER_NAME = os.getenv('BROKER_NAME', 'zerodha')
+    BROKER_POOL_SIZE = int(os.getenv('BROKER_POOL_SIZE', 10))  # Keep-alive connections
+    BROKER_TIMEOUT = float(os.getenv('BROKER_TIMEOUT', 7))  # Seconds per broker HTTP call
+    # 'kite' (live, needs credentials) or 'simulator': an in-process exchange
+    # serving synthetic or replayed NIFTY prices, for load tests and CI
+    BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'kite')
+    SIMULATOR_SPOT = float(os.getenv('SIMULATOR_SPOT', 22000))
+    SIMULATOR_VOLATILITY = float(os.getenv('SIMULATOR_VOLATILITY', 0.13))  # ATM IV, annualised
+    SIMULATOR_SEED = int(os.getenv('SIMULATOR_SEED', 0))  # Same seed, same prices and fills
+    SIMULATOR_TICK_INTERVAL = float(os.getenv('SIMULATOR_TICK_INTERVAL', 1))  # Seconds between price steps
+    SIMULATOR_LATENCY_MS = float(os.getenv('SIMULATOR_LATENCY_MS', 0))  # Per call, plus exponential jitter
+    SIMULATOR_JITTER_MS = float(os.getenv('SIMULATOR_JITTER_MS', 0))
+    SIMULATOR_ERROR_RATE = float(os.getenv('SIMULATOR_ERROR_RATE', 0))  # Fraction of calls failing (network error)
+    SIMULATOR_REJECT_RATE = float(os.getenv('SIMULATOR_REJECT_RATE', 0))  # Fraction of orders rejected
+    SIMULATOR_RATE_LIMITS = os.getenv('SIMULATOR_RATE_LIMITS', 'false').lower() == 'true'  # Enforce Kite's limits
+    SIMULATOR_REPLAY_DIR = os.getenv('SIMULATOR_REPLAY_DIR')  # Recorded chains (DATA_DIR/chains) to play back
+    SIMULATOR_REPLAY_DATE = os.getenv('SIMULATOR_REPLAY_DATE')  # YYYY-MM-DD, default the latest recorded day
+    
+    # Server concurrency: 'eventlet' (green threads, see run.py) or 'threading'
+    ASYNC_MODE = os.getenv('ASYNC_MODE', 'eventlet')
+    # Services are built on first use; warm-up builds them in the background right after
+    # startup (false: the first request or /api/ready probe does)
+    SERVICES_WARMUP = os.getenv('SERVICES_WARMUP', 'true').lower() == 'true'
+    
+    # Production: run.py starts WORKERS processes on one port. With REDIS_URL they fan
+    # SocketIO out through Redis and elect one leader that owns the market-data feed,
+    # exit engine and dashboard polling, sharing quotes, positions and risk through Redis
+    HOST = os.getenv('HOST', '0.0.0.0')
+    PORT = int(os.getenv('PORT', 5000))
+    WORKERS = int(os.getenv('WORKERS', 1))
+    REDIS_URL = os.getenv('REDIS_URL')
+    CLUSTER_PREFIX = os.getenv('CLUSTER_PREFIX', 'nifty')  # Redis key namespace of one deployment
+    LEADER_TTL = float(os.getenv('LEADER_TTL', 5))  # Seconds before a silent leader is replaced
+    CLUSTER_QUOTE_INTERVAL = float(os.getenv('CLUSTER_QUOTE_INTERVAL', 0.2))  # Seconds between quote relays
+    
+    # Local storage (instrument master, recordings)
+    DATA_DIR = os.getenv('DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data'))
+    RECORDER_ENABLED = os.getenv('RECORDER_ENABLED', 'false').lower() == 'true'
+    
+    # Order/trade journal (SQLAlchemy URL; SQLite or PostgreSQL), written in batches off the order path
+    JOURNAL_ENABLED = os.getenv('JOURNAL_ENABLED', 'true').lower() == 'true'
+    JOURNAL_URL = os.getenv('JOURNAL_URL', f"sqlite:///{os.path.join(DATA_DIR, 'journal.db')}")
+    JOURNAL_FLUSH_INTERVAL = float(os.getenv('JOURNAL_FLUSH_INTERVAL', 0.5))  # Seconds
     
     # Trading parameters for options selling
     MAX_POSITIONS = int(os.getenv('MAX_POSITIONS', 5))
@@ -18,7 +60,80 @@ class Config:
     NIFTY_LOT_SIZE = 50
     EXPIRY_DAYS_MIN = 30  # Minimum days to expiry
     EXPIRY_DAYS_MAX = 45  # Maximum days to expiry
+    RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', 0.065))  # Annualised, for pricing/IV
+    
+    # Volatility surface: listed expiries up to SURFACE_MAX_DAYS, one
+    # polynomial slice (total variance vs log-moneyness) per expiry
+    SURFACE_MAX_DAYS = int(os.getenv('SURFACE_MAX_DAYS', 120))
+    SURFACE_DEGREE = int(os.getenv('SURFACE_DEGREE', 3))
+    
+    # Broker API budgets per endpoint class, shared by every call (RateLimitScheduler);
+    # Kite allows 500 instruments per quote call
+    QUOTE_BATCH_SIZE = int(os.getenv('QUOTE_BATCH_SIZE', 500))
+    QUOTE_MAX_WORKERS = int(os.getenv('QUOTE_MAX_WORKERS', 4))
+    QUOTE_RATE_LIMIT = float(os.getenv('QUOTE_RATE_LIMIT', 1))  # Requests per second
+    QUOTE_RATE_BURST = int(os.getenv('QUOTE_RATE_BURST', 1))
+    # Positions, holdings, order status and the rest share Kite's "other endpoints" budget
+    PORTFOLIO_RATE_LIMIT = float(os.getenv('PORTFOLIO_RATE_LIMIT', 10))
+    PORTFOLIO_RATE_BURST = int(os.getenv('PORTFOLIO_RATE_BURST', 10))
+    # Throttled (HTTP 429) calls: retries, first backoff and cap in seconds (doubling, +-50% jitter)
+    RATE_LIMIT_RETRIES = int(os.getenv('RATE_LIMIT_RETRIES', 3))
+    RATE_LIMIT_BACKOFF = float(os.getenv('RATE_LIMIT_BACKOFF', 0.25))
+    RATE_LIMIT_MAX_BACKOFF = float(os.getenv('RATE_LIMIT_MAX_BACKOFF', 4))
+    
+    # Order execution (Kite allows 10 orders per second)
+    ORDER_RATE_LIMIT = float(os.getenv('ORDER_RATE_LIMIT', 10))
+    ORDER_RATE_BURST = int(os.getenv('ORDER_RATE_BURST', 10))
+    ORDER_MAX_WORKERS = int(os.getenv('ORDER_MAX_WORKERS', 5))
+    ORDER_POLL_INTERVAL = float(os.getenv('ORDER_POLL_INTERVAL', 0.5))  # Seconds
+    ORDER_FILL_TIMEOUT = float(os.getenv('ORDER_FILL_TIMEOUT', 30))  # Seconds
+    STRATEGY_ALL_OR_NOTHING = os.getenv('STRATEGY_ALL_OR_NOTHING', 'false').lower() == 'true'
+    
+    # Broker read cache (TTL seconds, 0 disables); Redis shares it across workers
+    CACHE_TTL_QUOTE = float(os.getenv('CACHE_TTL_QUOTE', 1))
+    CACHE_TTL_POSITIONS = float(os.getenv('CACHE_TTL_POSITIONS', 1))
+    CACHE_TTL_HOLDINGS = float(os.getenv('CACHE_TTL_HOLDINGS', 30))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 2048))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', REDIS_URL)
+    
+    # Streaming market data (quotes are served from ticks while connected)
+    TICKER_ENABLED = os.getenv('TICKER_ENABLED', 'false').lower() == 'true'
+    TICKER_URL = os.getenv('TICKER_URL', 'wss://ws.kite.trade')
+    TICKER_MAX_INSTRUMENTS = int(os.getenv('TICKER_MAX_INSTRUMENTS', 3000))  # Kite's limit per connection
+    NIFTY_INDEX_TOKEN = 256265
+    
+    # Per-request stage timings on demand (X-Profile: 1 or ?profile=1); /api/metrics is always on
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    
+    # Dashboard push cadence (seconds)
+    PUBLISH_INTERVAL = float(os.getenv('PUBLISH_INTERVAL', 3))
+    HOLDINGS_PUBLISH_INTERVAL = float(os.getenv('HOLDINGS_PUBLISH_INTERVAL', 10))
+    
+    # Strike selection: weights of the scaled score components, then hard constraints
+    SELECTION_WEIGHT_POP = float(os.getenv('SELECTION_WEIGHT_POP', 0.35))
+    SELECTION_WEIGHT_YIELD = float(os.getenv('SELECTION_WEIGHT_YIELD', 0.30))
+    SELECTION_WEIGHT_SPREAD = float(os.getenv('SELECTION_WEIGHT_SPREAD', 0.15))
+    SELECTION_WEIGHT_LIQUIDITY = float(os.getenv('SELECTION_WEIGHT_LIQUIDITY', 0.10))
+    SELECTION_WEIGHT_DISTANCE = float(os.getenv('SELECTION_WEIGHT_DISTANCE', 0.10))
+    SELECTION_MIN_POP = float(os.getenv('SELECTION_MIN_POP', 0.6))  # Probability of profit at expiry
+    SELECTION_MAX_SPREAD_PERCENT = float(os.getenv('SELECTION_MAX_SPREAD_PERCENT', 10))  # % of mid
+    SELECTION_MIN_OI = float(os.getenv('SELECTION_MIN_OI', 0))
+    SELECTION_MIN_OTM_PERCENT = float(os.getenv('SELECTION_MIN_OTM_PERCENT', 0))  # % of spot
+    # What the strategy capital pays for: 'margin' (blocked margin, what the risk gate
+    # charges against RISK_CAPITAL) or 'premium' (lots of premium, the old sizing)
+    SELECTION_BUDGET_BASIS = os.getenv('SELECTION_BUDGET_BASIS', 'margin')
     
     # Risk management
-    MAX_LOSS_PER_POSITION = 10000  # Rs
-    STOP_LOSS_PERCENT = 30  # % of premium received
\ No newline at end of file
+    MAX_LOSS_PER_POSITION = float(os.getenv('MAX_LOSS_PER_POSITION', 10000))  # Rs
+    STOP_LOSS_PERCENT = 30  # % of premium received
+    SHORT_MARGIN_PERCENT = float(os.getenv('SHORT_MARGIN_PERCENT', 12))  # % of notional blocked per short leg
+    # Exit engine: closes legs from ticks at the stop, the profit target
+    # (% of entry premium captured) or this many days before expiry
+    EXIT_ENGINE_ENABLED = os.getenv('EXIT_ENGINE_ENABLED', 'false').lower() == 'true'
+    PROFIT_TARGET_PERCENT = float(os.getenv('PROFIT_TARGET_PERCENT', 50))
+    EXIT_DAYS_TO_EXPIRY = float(os.getenv('EXIT_DAYS_TO_EXPIRY', 1))
+    EXIT_RETRY_INTERVAL = float(os.getenv('EXIT_RETRY_INTERVAL', 2))  # Seconds before re-firing a failed exit
+    # Pre-trade gate: every order is checked against the limits above
+    RISK_GATE_ENABLED = os.getenv('RISK_GATE_ENABLED', 'true').lower() == 'true'
+    RISK_CAPITAL = float(os.getenv('RISK_CAPITAL', 500000))  # Rs; RISK_PER_TRADE and margin are sized off it
+    RISK_SYNC_INTERVAL = float(os.getenv('RISK_SYNC_INTERVAL', 30))  # Seconds between broker reconciliations
\ No newline at end of file
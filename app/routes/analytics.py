@@ -1,18 +1,19 @@
-from flask import Blueprint, jsonify
-from app.services.strategy import StrategyService
-from app.services.broker import BrokerService
-from app.services.options import OptionsChainService
+from flask import Blueprint, current_app, jsonify, request
 from app.config import Config
+from app.utils.green import offload
+import logging
+import os
+import time
+from datetime import datetime
 
 analytics_bp = Blueprint('analytics', __name__)
 config = Config()
+logger = logging.getLogger(__name__)
 
 @analytics_bp.route('/positions/monitor', methods=['GET'])
 def monitor_positions():
     """Monitor all positions with risk analysis"""
-    broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
-    options_service = OptionsChainService(broker)
-    strategy_service = StrategyService(broker, options_service)
+    strategy_service = current_app.extensions['strategy']
     
     analysis = strategy_service.monitor_positions()
     
@@ -21,22 +22,193 @@ def monitor_positions():
         'analysis': analysis
     })
 
+@analytics_bp.route('/positions/exits', methods=['GET'])
+def position_exits():
+    """Armed stop/target/expiry levels and exits fired by the exit engine"""
+    exits = current_app.extensions.get('exits')
+    if exits is None:
+        return jsonify({
+            'success': False,
+            'error': 'Exit engine disabled'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': exits.status()
+    })
+
 @analytics_bp.route('/pnl/summary', methods=['GET'])
 def pnl_summary():
-    """Get P&L summary"""
-    broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
-    positions = broker.get_positions()
+    """Get P&L summary, plus journaled history for ?from=YYYY-MM-DD&to=YYYY-MM-DD&strategy="""
+    strategy_service = current_app.extensions['strategy']
+    
+    try:
+        start, end = (datetime.strptime(request.args[name], '%Y-%m-%d').date() if name in request.args else None
+                      for name in ('from', 'to'))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'from/to must be YYYY-MM-DD'
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': strategy_service.pnl_summary(start=start, end=end, strategy=request.args.get('strategy'))
+    })
+
+@analytics_bp.route('/scenarios', methods=['GET'])
+def scenarios():
+    """P&L surface of open positions under spot and IV shocks"""
+    import numpy as np
     
-    total_pnl = sum(pos.get('pnl', 0) for pos in positions)
-    realized_pnl = sum(pos.get('realised', 0) for pos in positions)
-    unrealized_pnl = sum(pos.get('unrealised', 0) for pos in positions)
+    strategy_service = current_app.extensions['strategy']
+    
+    # Spot range in %, IV range in vol points, days as a comma-separated list
+    spot_range = request.args.get('spot_range', 5, type=float)
+    spot_steps = request.args.get('spot_steps', 21, type=int)
+    iv_range = request.args.get('iv_range', 10, type=float)
+    iv_steps = request.args.get('iv_steps', 21, type=int)
+    try:
+        days = [float(day) for day in request.args.get('days', '0').split(',') if day.strip()]
+    except ValueError:
+        days = None
+    if days is None or not all(np.isfinite(day) and day >= 0 for day in days):
+        return jsonify({
+            'success': False,
+            'error': 'days must be comma-separated non-negative numbers'
+        }), 400
+    
+    if not 1 <= spot_steps <= 501 or not 1 <= iv_steps <= 501 or not 1 <= len(days) <= 30:
+        return jsonify({
+            'success': False,
+            'error': 'Grid too large'
+        }), 400
+    
+    result = strategy_service.stress_test(
+        spot_shocks=np.linspace(-spot_range, spot_range, spot_steps) / 100,
+        iv_shocks=np.linspace(-iv_range, iv_range, iv_steps) / 100,
+        days=days
+    )
     
     return jsonify({
         'success': True,
         'data': {
-            'total_pnl': total_pnl,
-            'realized_pnl': realized_pnl,
-            'unrealized_pnl': unrealized_pnl,
-            'positions_count': len(positions)
+            'spot_shocks': result['spot_shocks'].round(6).tolist(),
+            'iv_shocks': result['iv_shocks'].round(6).tolist(),
+            'days': result['days'].tolist(),
+            'pnl': result['pnl'].round(2).tolist(),
+            'legs': result['legs'],
+            'estimated_iv': result['estimated_iv'],
+            'unpriced': result['unpriced'],
+            'worst': result['worst']
         }
-    })
\ No newline at end of file
+    })
+
+@analytics_bp.route('/surface', methods=['GET'])
+def volatility_surface():
+    """Smoothed implied volatility by expiry over a strike/spot grid"""
+    import numpy as np
+    
+    options = current_app.extensions['options']
+    
+    # refresh=incremental re-fits only ticked expiries; full refetches every chain
+    refresh = request.args.get('refresh', 'incremental')
+    width = request.args.get('range', 15, type=float)
+    points = request.args.get('points', 31, type=int)
+    
+    if not 2 <= points <= 501:
+        return jsonify({
+            'success': False,
+            'error': 'Grid too large'
+        }), 400
+    
+    start = time.perf_counter()
+    surface = options.surface if refresh == 'none' else options.refresh_surface(full=refresh == 'full')
+    elapsed = time.perf_counter() - start
+    
+    data = surface.to_dict(np.linspace(1 - width / 100, 1 + width / 100, points))
+    data['refresh_ms'] = round(elapsed * 1000, 3)
+    
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+@analytics_bp.route('/candidates', methods=['GET'])
+def strike_candidates():
+    """Scored short strikes across the DTE window, and the legs a capital budget buys"""
+    options = current_app.extensions['options']
+    
+    option_type = request.args.get('option_type', 'PE').upper()
+    min_premium = request.args.get('min_premium', 100, type=float)
+    min_days = request.args.get('min_days', config.EXPIRY_DAYS_MIN, type=int)
+    max_days = request.args.get('max_days', config.EXPIRY_DAYS_MAX, type=int)
+    limit = request.args.get('limit', 20, type=int)
+    capital = request.args.get('capital', type=float)
+    legs = request.args.get('legs', 3, type=int)
+    
+    if option_type not in ('PE', 'CE'):
+        return jsonify({
+            'success': False,
+            'error': 'option_type must be PE or CE'
+        }), 400
+    
+    # Cached chains are kept current by ticks; refresh=full refetches them
+    start = time.perf_counter()
+    candidates = options.rank_strikes(option_type, min_premium, min_days, max_days,
+                                      refresh=request.args.get('refresh') == 'full')
+    data = {
+        'count': len(candidates),
+        'candidates': _records(candidates.head(limit)),
+        'rank_ms': round((time.perf_counter() - start) * 1000, 3)
+    }
+    if capital:
+        data['allocation'] = _records(options.selector.allocate(candidates, capital, legs))
+    
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+def _records(frame):
+    """DataFrame rows as JSON-safe dicts (NaN as None)"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+@analytics_bp.route('/backtest', methods=['POST'])
+def backtest():
+    """Replay recorded chains through the put-selling strategy"""
+    # pandas and the backtest engine load on first use, not at startup
+    from app.services.backtest import PutSellingBacktest
+    from app.services.recorder import ChainReader
+    
+    data = request.get_json() or {}
+    
+    reader = ChainReader(os.path.join(current_app.config['DATA_DIR'], 'chains'))
+    
+    def replay():
+        engine = PutSellingBacktest.from_recorder(reader, capital=data.get('capital', 500000))
+        return engine.run(
+            min_premium=data.get('min_premium', 100),
+            target_strikes=data.get('target_strikes', 3),
+            min_days=data.get('min_days'),
+            max_days=data.get('max_days'),
+            stop_loss_percent=data.get('stop_loss_percent')
+        )
+    
+    try:
+        # Reading and replaying recordings is CPU-bound; run it off the hub
+        result = offload(replay)
+    except Exception as e:
+        logger.error(f"Backtest failed: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    trades = result.pop('trades_log')
+    trades = trades.astype({'entry_date': str, 'exit_date': str, 'expiry': str})
+    return jsonify({
+        'success': True,
+        'data': result,
+        'trades': trades.to_dict('records')
+    })
@@ -1,33 +1,65 @@
-from flask import Blueprint, jsonify, request
-from app.services.broker import BrokerService
-from app.services.options import OptionsChainService
-from app.services.strategy import StrategyService
+from flask import Blueprint, Response, current_app, jsonify, request
 from app.config import Config
+from app.utils.metrics import metrics
 import logging
 
 api_bp = Blueprint('api', __name__)
 config = Config()
 logger = logging.getLogger(__name__)
 
-# Initialize services (in production, use dependency injection)
-broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
-options = OptionsChainService(broker)
-strategy = StrategyService(broker, options)
-
 @api_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Liveness: the process serves requests (never touches the broker)"""
     return jsonify({
         'status': 'healthy',
         'service': 'NIFTY Options Trader API'
     })
 
+@api_bp.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 503 until every service is built; starts the build if nothing has"""
+    services = current_app.extensions
+    services.warm()
+    ready = services.ready()
+
+    body = {
+        'success': ready,
+        'status': 'ready' if ready else 'starting',
+        'services': services.status()
+    }
+    # Multi-process mode: this worker's role and the current leader
+    if services.built('cluster'):
+        election = services['cluster']
+        body['cluster'] = {
+            'worker': election.state.identity,
+            'role': 'leader' if election.leader else 'follower',
+            'leader': election.leader_id()
+        }
+
+    return jsonify(body), 200 if ready else 503
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Broker read cache hit/miss/coalesced counters"""
+    broker = current_app.extensions['broker']
+    
+    return jsonify({
+        'success': True,
+        'data': broker.cache.get_stats()
+    })
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms, call/error counts and rate-limit usage (Prometheus text format)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @api_bp.route('/login', methods=['POST'])
 def login():
     """Broker login endpoint"""
     data = request.get_json()
     request_token = data.get('request_token')
     
+    broker = current_app.extensions['broker']
     success = broker.login(request_token)
     
     return jsonify({
@@ -37,13 +69,18 @@ def login():
 
 @api_bp.route('/options-chain/<expiry>', methods=['GET'])
 def get_options_chain(expiry):
-    """Get complete options chain"""
+    """Get complete options chain (?format=records|columns|binary)"""
+    layout = request.args.get('format', 'records')
     try:
+        options = current_app.extensions['options']
         chain = options.get_options_chain(expiry)
         
+        if layout == 'binary':
+            return Response(chain.to_bytes(), mimetype='application/octet-stream')
+        
         return jsonify({
             'success': True,
-            'data': chain.to_dict('records')
+            'data': chain.to_columns() if layout == 'columns' else chain.to_records()
         })
     except Exception as e:
         logger.error(f"Options chain fetch failed: {e}")
@@ -58,6 +95,7 @@ def get_expiries():
     min_days = request.args.get('min_days', 30, type=int)
     max_days = request.args.get('max_days', 45, type=int)
     
+    options = current_app.extensions['options']
     expiries = options.get_nifty_expiries(min_days, max_days)
     
     return jsonify({
@@ -69,6 +107,7 @@ def get_expiries():
 def get_quote(symbol):
     """Get real-time quote"""
     exchange = request.args.get('exchange', 'NFO')
+    broker = current_app.extensions['broker']
     quote = broker.get_quote(symbol, exchange)
     
     if quote:
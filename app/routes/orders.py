@@ -1,7 +1,4 @@
-from flask import Blueprint, jsonify, request
-from app.services.broker import BrokerService
-from app.services.strategy import StrategyService
-from app.services.options import OptionsChainService
+from flask import Blueprint, current_app, jsonify, request
 from app.config import Config
 import logging
 
@@ -12,6 +9,10 @@ logger = logging.getLogger(__name__)
 @orders_bp.route('/place', methods=['POST'])
 def place_order():
     """Place a single order"""
+    # Deferred with the risk gate's NumPy/SciPy imports, off the startup path
+    from app.services.cluster import UNKNOWN
+    from app.services.risk_gate import OrderRejected
+    
     data = request.get_json()
     
     # Validate request data
@@ -22,17 +23,33 @@ def place_order():
             'error': 'Missing required fields'
         }), 400
     
-    # Initialize broker (in production, get from session/context)
-    broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
+    broker = current_app.extensions['broker']
     
-    order_id = broker.place_order(
-        symbol=data['symbol'],
-        transaction_type=data['transaction_type'],
-        quantity=data['quantity'],
-        price=data.get('price'),
-        order_type=data.get('order_type', 'LIMIT'),
-        product=data.get('product', 'NRML')
-    )
+    try:
+        order_id = broker.place_order(
+            symbol=data['symbol'],
+            transaction_type=data['transaction_type'],
+            quantity=data['quantity'],
+            price=data.get('price'),
+            order_type=data.get('order_type', 'LIMIT'),
+            product=data.get('product', 'NRML'),
+            reference_price=data.get('reference_price'),
+            tag=data.get('tag')
+        )
+    except OrderRejected as e:
+        return jsonify({
+            'success': False,
+            'error': 'Order rejected by risk checks',
+            'reasons': e.reasons
+        }), 422
+    
+    if order_id is UNKNOWN:
+        # Relayed in a cluster and the leader's reply was lost: it may be live, so don't retry blindly
+        return jsonify({
+            'success': None,
+            'status': 'unknown',
+            'error': 'The cluster leader took the order but did not reply; check the order book before retrying'
+        }), 202
     
     if order_id:
         return jsonify({
@@ -49,7 +66,7 @@ def place_order():
 @orders_bp.route('/positions', methods=['GET'])
 def get_positions():
     """Get all open positions"""
-    broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
+    broker = current_app.extensions['broker']
     positions = broker.get_positions()
     
     return jsonify({
@@ -57,11 +74,37 @@ def get_positions():
         'data': positions
     })
 
+@orders_bp.route('/risk', methods=['GET'])
+def get_risk_ledger():
+    """Pre-trade limits and the in-memory exposure ledger"""
+    broker = current_app.extensions['broker']
+    if broker.risk_gate is None:
+        return jsonify({
+            'success': False,
+            'error': 'Risk gate disabled'
+        }), 404
+    
+    # In a cluster the leader's gate checks every order; followers' stay empty
+    if broker.router is not None and not broker.router.local:
+        ledger = broker.router.call('risk_ledger', timeout=5)
+        if ledger is None:
+            return jsonify({
+                'success': False,
+                'error': 'No reply from the cluster leader'
+            }), 503
+    else:
+        ledger = broker.risk_gate.snapshot()
+    
+    return jsonify({
+        'success': True,
+        'data': ledger
+    })
+
 @orders_bp.route('/holdings', methods=['GET'])
 def get_holdings():
     """Get all holdings"""
     try:
-        broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
+        broker = current_app.extensions['broker']
         holdings = broker.get_holdings()
         
         return jsonify({
@@ -79,16 +122,16 @@ def get_holdings():
 def execute_strategy():
     """Execute the put selling strategy"""
     data = request.get_json()
-    capital = data.get('capital', 100000)  # Default 1L
+    capital = data.get('capital', config.RISK_CAPITAL)  # Default: all the risk gate allows
     target_strikes = data.get('target_strikes', 3)
+    all_or_nothing = data.get('all_or_nothing')
     
-    broker = BrokerService(config.BROKER_API_KEY, config.BROKER_API_SECRET)
-    options_service = OptionsChainService(broker)
-    strategy_service = StrategyService(broker, options_service)
+    strategy_service = current_app.extensions['strategy']
     
     result = strategy_service.execute_put_selling_strategy(
         capital=capital,
-        target_strikes=target_strikes
+        target_strikes=target_strikes,
+        all_or_nothing=all_or_nothing
     )
     
     return jsonify(result)
\ No newline at end of file
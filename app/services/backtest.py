@@ -0,0 +1,275 @@
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import Config
+from app.services.strategy import position_quantity
+
+logger = logging.getLogger(__name__)
+
+_WORKER_BACKTEST = None
+
+
+def _init_worker(backtest):
+    global _WORKER_BACKTEST
+    _WORKER_BACKTEST = backtest
+
+
+def _run_in_worker(params: Dict) -> Dict:
+    return _WORKER_BACKTEST.run(trades=False, **params)
+
+
+def _parse_expiry(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, '%d%b%y').date()
+    return pd.Timestamp(value).date()
+
+
+class PutSellingBacktest:
+    """
+    Replay daily chain closes through the put-selling strategy
+
+    The history (one row per date/expiry/strike with pe_ltp and
+    spot_price) is pivoted once into per-expiry price blocks.
+    Each run then mirrors execute_put_selling_strategy for every day at
+    once: first expiry inside the DTE window (get_nifty_expiries), puts
+    with premium >= min_premium sorted by premium, and whole-lot sizing
+    (position_quantity). Recorded closes carry no depth or IV, so this is
+    the premium rule the live strategy used before StrikeSelector scoring.
+    Short legs are closed when the daily close reaches STOP_LOSS_PERCENT
+    above the premium received, otherwise settled at intrinsic value on
+    expiry. A new set of legs is opened only once the previous set is flat.
+    """
+
+    def __init__(self, history: pd.DataFrame, capital: float = 500000,
+                 lot_size: int = None):
+        self.capital = capital
+        self.lot_size = lot_size or Config.NIFTY_LOT_SIZE
+
+        history = history.dropna(subset=['pe_ltp'])
+        date_idx, self.dates = self._factorize(history['date'], lambda d: pd.Timestamp(d).date())
+        expiry_idx, self.expiries = self._factorize(history['expiry'], _parse_expiry)
+
+        # Each expiry only trades for a few weeks, so prices live in one
+        # (listed day x strike) block per expiry rather than a sparse
+        # dates x contracts matrix
+        strike_values, strike_code = np.unique(history['strike'].to_numpy(dtype=np.float64), return_inverse=True)
+        contracts, contract_idx = np.unique(expiry_idx * len(strike_values) + strike_code, return_inverse=True)
+        contract_expiry = contracts // len(strike_values)
+        block_start = np.searchsorted(contract_expiry, np.arange(len(self.expiries)))
+        strike_col = contract_idx - block_start[expiry_idx]
+
+        self.first_row = np.full(len(self.expiries), len(self.dates), dtype=np.int64)
+        np.minimum.at(self.first_row, expiry_idx, date_idx)
+        life_row = date_idx - self.first_row[expiry_idx]
+
+        width = int(strike_col.max()) + 1
+        self.prices = np.full((len(self.expiries), int(life_row.max()) + 1, width), np.nan)
+        self.prices[expiry_idx, life_row, strike_col] = history['pe_ltp'].to_numpy(dtype=np.float64)
+        self.strikes = np.full((len(self.expiries), width), np.nan)
+        self.strikes[contract_expiry, np.arange(len(contracts)) - block_start[contract_expiry]] = \
+            strike_values[contracts % len(strike_values)]
+
+        self.spot = np.full(len(self.dates), np.nan)
+        self.spot[date_idx] = history['spot_price'].to_numpy(dtype=np.float64)
+
+        # Expiries quoted on each date, and the last row on or before each expiry
+        self.listed = np.zeros((len(self.dates), len(self.expiries)), dtype=bool)
+        self.listed[date_idx, expiry_idx] = True
+        self.settled = self.expiries <= self.dates[-1]
+        self.last_row = np.where(self.settled, np.searchsorted(self.dates, self.expiries, side='right') - 1,
+                                 len(self.dates) - 1)
+        self.days_to_expiry = (self.expiries[None, :] - self.dates[:, None]).astype(np.int64)
+
+    @staticmethod
+    def _factorize(column: pd.Series, to_date):
+        """Sorted unique dates and each row's index into them"""
+        codes, uniques = pd.factorize(column)
+        values = np.array([to_date(value) for value in uniques], dtype='datetime64[D]')
+        order = np.argsort(values)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return rank[codes], values[order]
+
+    def _price(self, expiry: np.ndarray, row: np.ndarray, strike_col: np.ndarray) -> np.ndarray:
+        """Close of (expiry, strike) on a date row; NaN when not quoted"""
+        life_row = row - self.first_row[expiry]
+        inside = (life_row >= 0) & (life_row < self.prices.shape[1])
+        values = self.prices[expiry, np.clip(life_row, 0, self.prices.shape[1] - 1), strike_col]
+        return np.where(inside, values, np.nan)
+
+    @classmethod
+    def from_recorder(cls, reader, **kwargs) -> 'PutSellingBacktest':
+        """Build from a ChainReader using the last snapshot of each day"""
+        frames = []
+        for expiry, day in reader.partitions():
+            arrays = reader.read_arrays(expiry, day, ['timestamp', 'strike', 'spot_price', 'pe_ltp'])
+            timestamps = arrays['timestamp']
+            if len(timestamps) == 0:
+                continue
+            lo = np.searchsorted(timestamps, timestamps[-1])
+            frames.append(pd.DataFrame({
+                'date': day,
+                'expiry': expiry,
+                'strike': arrays['strike'][lo:],
+                'spot_price': arrays['spot_price'][lo:],
+                'pe_ltp': arrays['pe_ltp'][lo:],
+            }))
+        if not frames:
+            raise ValueError('No recorded chain snapshots found')
+        return cls(pd.concat(frames, ignore_index=True), **kwargs)
+
+    def _select(self, min_premium: float, target_strikes: int, min_days: int, max_days: int):
+        """Per-day expiry and top-premium strike columns, shape (days, target_strikes)"""
+        eligible = self.listed & (self.days_to_expiry >= min_days) & (self.days_to_expiry <= max_days)
+        has_expiry = eligible.any(axis=1)
+        expiry = eligible.argmax(axis=1)
+
+        rows = np.arange(len(self.dates))
+        chain = self.prices[expiry, np.clip(rows - self.first_row[expiry], 0, self.prices.shape[1] - 1)]
+        key = np.where(has_expiry[:, None] & (chain >= min_premium), chain, -np.inf)
+
+        picks = min(target_strikes, key.shape[1])
+        top = np.argpartition(-key, picks - 1, axis=1)[:, :picks]
+        order = np.argsort(-np.take_along_axis(key, top, axis=1), axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        return np.repeat(expiry[:, None], picks, axis=1), top, np.take_along_axis(key, top, axis=1)
+
+    def _simulate(self, expiry: np.ndarray, strike_col: np.ndarray, entry: np.ndarray,
+                  valid: np.ndarray, stop_loss_percent: float):
+        """Exit row, exit price and reason for every leg"""
+        last_row = self.last_row[expiry]
+        start = np.arange(len(self.dates))[:, None]
+
+        # Only the rows between entry and expiry matter, so gather that window
+        window = max(int((last_row - start)[valid].max()), 1) if valid.any() else 1
+        rows = start[:, :, None] + 1 + np.arange(window)[None, None, :]
+        path = self._price(expiry[:, :, None], rows, strike_col[:, :, None])
+
+        stop_level = entry * (1 + stop_loss_percent / 100)
+        hit = (rows <= last_row[:, :, None]) & (path >= stop_level[:, :, None])
+        stopped = hit.any(axis=2)
+        first = hit.argmax(axis=2)
+        stop_price = np.take_along_axis(path, first[:, :, None], axis=2)[:, :, 0]
+
+        settled = self.settled[expiry]
+        intrinsic = np.maximum(self.strikes[expiry, strike_col] - self.spot[last_row], 0)
+        mark = self._price(expiry, last_row, strike_col)
+        final_price = np.where(settled, intrinsic, np.where(np.isnan(mark), entry, mark))
+
+        exit_row = np.where(stopped, start + 1 + first, last_row)
+        exit_price = np.where(stopped, stop_price, final_price)
+        reason = np.where(stopped, 'STOP_LOSS', np.where(settled, 'EXPIRY', 'OPEN'))
+        return exit_row, exit_price, reason
+
+    def _cycles(self, valid: np.ndarray, exit_row: np.ndarray) -> np.ndarray:
+        """Entry days when the book is flat: each new set waits for the last exit"""
+        entry_days = np.flatnonzero(valid.any(axis=1))
+        flat_after = np.where(valid, exit_row, -1).max(axis=1)
+        taken = []
+        i = 0
+        while i < len(entry_days):
+            day = entry_days[i]
+            taken.append(day)
+            i = np.searchsorted(entry_days, flat_after[day], side='right')
+        return np.array(taken, dtype=np.int64)
+
+    def run(self, min_premium: float = 100, target_strikes: int = 3,
+            min_days: int = None, max_days: int = None,
+            stop_loss_percent: float = None, capital: float = None,
+            trades: bool = True) -> Dict:
+        """Backtest one parameter set; summary plus per-leg trades"""
+        min_days = Config.EXPIRY_DAYS_MIN if min_days is None else min_days
+        max_days = Config.EXPIRY_DAYS_MAX if max_days is None else max_days
+        stop_loss_percent = stop_loss_percent or Config.STOP_LOSS_PERCENT
+        capital = capital or self.capital
+
+        expiry, strike_col, entry = self._select(min_premium, target_strikes, min_days, max_days)
+        quantity = position_quantity(capital / target_strikes, entry, self.lot_size)
+        valid = np.isfinite(entry) & (quantity >= self.lot_size)
+        entry = np.where(valid, entry, 0)
+        quantity = np.where(valid, quantity, 0)
+
+        exit_row, exit_price, reason = self._simulate(expiry, strike_col, entry, valid, stop_loss_percent)
+        pnl = (entry - exit_price) * quantity
+
+        days = self._cycles(valid, exit_row)
+        taken = valid[days]
+        leg_pnl = pnl[days][taken]
+        leg_exit = exit_row[days][taken]
+        leg_reason = reason[days][taken]
+
+        # Realised equity by exit date
+        equity = np.cumsum(np.bincount(leg_exit, weights=leg_pnl, minlength=len(self.dates)))
+        drawdown = np.maximum.accumulate(np.r_[0, equity])[1:] - equity
+
+        summary = {
+            'params': {
+                'min_premium': min_premium,
+                'target_strikes': target_strikes,
+                'min_days': min_days,
+                'max_days': max_days,
+                'stop_loss_percent': stop_loss_percent,
+                'capital': capital,
+            },
+            'cycles': len(days),
+            'trades': int(taken.sum()),
+            'stop_losses': int((leg_reason == 'STOP_LOSS').sum()),
+            'expired': int((leg_reason == 'EXPIRY').sum()),
+            'open': int((leg_reason == 'OPEN').sum()),
+            'total_pnl': round(float(leg_pnl.sum()), 2),
+            'win_rate': round(float((leg_pnl > 0).mean()) * 100, 2) if len(leg_pnl) else 0.0,
+            'max_drawdown': round(float(drawdown.max()), 2) if len(drawdown) else 0.0,
+        }
+
+        if trades:
+            leg_expiry = expiry[days][taken]
+            summary['trades_log'] = pd.DataFrame({
+                'entry_date': self.dates[np.repeat(days, taken.sum(axis=1))],
+                'exit_date': self.dates[leg_exit],
+                'expiry': self.expiries[leg_expiry],
+                'strike': self.strikes[leg_expiry, strike_col[days][taken]],
+                'quantity': quantity[days][taken].astype(np.int64),
+                'entry_price': entry[days][taken],
+                'exit_price': exit_price[days][taken],
+                'exit_reason': leg_reason,
+                'pnl': leg_pnl,
+            })
+        return summary
+
+    def run_grid(self, grid: Dict[str, List], processes: Optional[int] = None) -> pd.DataFrame:
+        """
+        Run every combination of the grid on a process pool
+
+        Keys are run() arguments; 'dte_window' takes (min_days, max_days)
+        pairs. Results come back sorted by total P&L.
+        """
+        grid = dict(grid)
+        windows = grid.pop('dte_window', [None])
+        keys = list(grid)
+        combos = []
+        for window in windows:
+            for values in itertools.product(*(grid[key] for key in keys)):
+                params = dict(zip(keys, values))
+                if window is not None:
+                    params['min_days'], params['max_days'] = window
+                combos.append(params)
+
+        processes = processes or os.cpu_count() or 1
+        if processes == 1 or len(combos) == 1:
+            results = [self.run(trades=False, **params) for params in combos]
+        else:
+            # Ship the price matrix to each worker once, not once per combination
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                     initargs=(self,)) as pool:
+                results = list(pool.map(_run_in_worker, combos,
+                                        chunksize=max(1, len(combos) // (processes * 4))))
+
+        rows = [dict(result.pop('params'), **result) for result in results]
+        return pd.DataFrame(rows).sort_values('total_pnl', ascending=False).reset_index(drop=True)
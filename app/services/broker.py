@@ -5,36 +5,112 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from auto_login import auto_login, load_access_token
 from kiteconnect import KiteConnect
+from kiteconnect.exceptions import TokenException
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from requests.adapters import HTTPAdapter
+from typing import Dict, List
+from app.config import Config
+from app.services.cache import BrokerCache
+from app.utils.metrics import metrics
+from app.utils.rate_limit import PRIORITY_ORDER, RateLimitScheduler
 import logging
+import requests
+import threading
 
 logger = logging.getLogger(__name__)
 
 class BrokerService:
-    """Unified broker interface with auto-authentication"""
+    """
+    Unified broker interface with auto-authentication
 
-    def __init__(self, api_key: str = None, api_secret: str = None, broker: str = 'zerodha'):
+    One instance is shared per process (see create_app). All calls go
+    through a single keep-alive HTTP session and the access token is
+    refreshed lazily once it expires.
+
+    kite is the backend: by default an auto-logged-in KiteConnect, or any
+    injected client with the same methods (quote, positions, holdings,
+    place_order, order_history, cancel_order, instruments), such as
+    SimulatedExchange for BROKER_BACKEND=simulator.
+
+    With a ClusterState (multi-process mode) the day's access token is
+    shared so only one worker logs in, and quotes the leader streams are
+    read from Redis before falling back to REST. Followers hand order
+    placement and cancels to the leader (router), which alone runs them.
+    """
+
+    base_url = 'https://api.kite.trade'
+
+    def __init__(self, api_key: str = None, api_secret: str = None, broker: str = 'zerodha',
+                 kite=None, cluster=None):
         self.broker = broker
         self.api_key = api_key or os.getenv('API_KEY')
         self.api_secret = api_secret or os.getenv('API_SECRET')
-        self.kite = None
+        self.kite = kite
         self.access_token = None
-        self._authenticate()
+        self.ticker = None
+        # Redis state shared with the other workers (ClusterState), if any
+        self.cluster = cluster
+        # Pre-trade checks (PreTradeRiskGate), attached by create_app
+        self.risk_gate = None
+        # Order/trade journal (TradeJournal), attached by create_app
+        self.journal = None
+        # Order-history polling (FillTracker) for fills no feed or executor reports, attached by create_app
+        self.fills = None
+        # Runs orders on the cluster leader (LeaderRouter), attached by create_app in a cluster
+        self.router = None
+        # Every call waits its turn in a per-endpoint budget, most urgent lane first
+        self.scheduler = RateLimitScheduler.from_config()
+        self.cache = BrokerCache(
+            ttls={
+                'quote': Config.CACHE_TTL_QUOTE,
+                'positions': Config.CACHE_TTL_POSITIONS,
+                'holdings': Config.CACHE_TTL_HOLDINGS
+            },
+            max_entries=Config.CACHE_MAX_ENTRIES,
+            redis_url=Config.CACHE_REDIS_URL
+        )
 
-    def _authenticate(self):
+        # Pooled keep-alive connections shared by Kite calls and raw REST calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=Config.BROKER_POOL_SIZE,
+                              pool_maxsize=Config.BROKER_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._auth_lock = threading.Lock()
+        self._token_date = None
+
+        # An injected client (tests, benchmarks) is used as-is
+        self._owns_client = kite is None
+        if self._owns_client:
+            self._authenticate()
+
+    def _authenticate(self, stale_token: str = None):
         """Authenticate using auto-login"""
         try:
-            # Try to load today's saved token first
-            self.access_token = load_access_token()
+            # Try today's token: shared by another worker, else saved on disk
+            shared = self.cluster.access_token() if self.cluster is not None else None
+            token = shared if shared and shared != stale_token else load_access_token()
+            self.access_token = token if token != stale_token else None
 
-            # If no valid token, do auto-login
+            # If no valid token, do auto-login (one worker per deployment; the rest wait for its token)
             if not self.access_token:
-                logger.info("No valid token found, attempting auto-login...")
-                self.access_token = auto_login()
+                if self.cluster is not None and not self.cluster.claim('login', ttl=120):
+                    logger.info("Another worker is logging in, waiting for its token...")
+                    self.access_token = self.cluster.wait_access_token(timeout=120, exclude=stale_token)
+                else:
+                    logger.info("No valid token found, attempting auto-login...")
+                    self.access_token = auto_login()
+            if self.access_token and self.cluster is not None and self.access_token != shared:
+                self.cluster.share_access_token(self.access_token)
 
             if self.access_token:
                 # Create authenticated Kite instance
-                self.kite = KiteConnect(api_key=self.api_key)
+                self.kite = KiteConnect(api_key=self.api_key, timeout=Config.BROKER_TIMEOUT)
+                self.kite.reqsession = self.session
                 self.kite.set_access_token(self.access_token)
+                self._token_date = date.today()
                 logger.info("✅ Kite authenticated successfully")
             else:
                 logger.error("❌ Authentication failed")
@@ -42,67 +118,269 @@ class BrokerService:
         except Exception as e:
             logger.error(f"Authentication error: {e}")
 
+    def _refresh_token(self, stale_token: str = None):
+        """Re-authenticate once, even if several threads hit an expired token"""
+        with self._auth_lock:
+            if self.access_token == stale_token or self._token_date != date.today():
+                logger.info("Access token expired, re-authenticating...")
+                self._authenticate(stale_token)
+
+    def _call(self, method: str, *args, priority: int = None, **kwargs):
+        """
+        Call a Kite client method in its rate-limit budget and lane
+        (priority overrides the method's default lane), refreshing an
+        expired token on the way
+        """
+        if self._owns_client and self._token_date != date.today():
+            self._refresh_token()
+
+        if not self.kite:
+            raise Exception("Not authenticated")
+
+        token = self.access_token
+
+        def request():
+            # One span per broker round trip, token refresh included
+            with metrics.span(f'kite.{method}'):
+                try:
+                    return getattr(self.kite, method)(*args, **kwargs)
+                except TokenException:
+                    if not self._owns_client:
+                        raise
+                    self._refresh_token(token)
+                    return getattr(self.kite, method)(*args, **kwargs)
+
+        return self.scheduler.call(method, request, priority)
+
+    def attach_ticker(self, ticker):
+        """Serve quotes from a live streaming feed, falling back to REST"""
+        self.ticker = ticker
+
+    def _streaming(self) -> bool:
+        return bool(self.ticker and self.ticker.connected)
+
+    def _streamed_quote(self, key: str):
+        if self._streaming():
+            return self.ticker.store.get(key)
+        return None
+
+    def _subscribe(self, quotes: Dict[str, Dict]):
+        """Stream every instrument fetched over REST from now on (on the leader's feed in a cluster)"""
+        if self.ticker or self.cluster is not None:
+            tokens = {key: quote['instrument_token'] for key, quote in quotes.items()
+                      if quote and 'instrument_token' in quote}
+            if tokens and self.ticker:
+                self.ticker.subscribe(tokens)
+            if tokens and self.cluster is not None and not self._streaming():
+                self.cluster.request_stream(tokens)
+
+    @metrics.timed('broker.get_quote')
     def get_quote(self, symbol: str, exchange: str = 'NFO'):
         """Get real-time quote"""
-        try:
-            if not self.kite:
-                raise Exception("Not authenticated")
+        key = f'{exchange}:{symbol}'
+        streamed = self._streamed_quote(key)
+        if not streamed and self.cluster is not None and not self._streaming():
+            streamed = self.cluster.get_quotes([key]).get(key)
+        if streamed:
+            return streamed
 
-            instruments = self.kite.quote([f'{exchange}:{symbol}'])
-            return instruments.get(f'{exchange}:{symbol}')
+        def load():
+            instruments = self._call('quote', [key])
+            self._subscribe(instruments)
+            return instruments.get(key)
+
+        try:
+            return self.cache.get_or_load('quote', key, load)
 
         except Exception as e:
             logger.error(f"Quote fetch failed: {e}")
             return None
 
+    @metrics.timed('broker.get_quotes')
+    def get_quotes(self, symbols: List[str], exchange: str = 'NFO') -> Dict[str, Dict]:
+        """Get quotes for many symbols in batched, rate-limited calls"""
+        quotes = {}
+        keys = []
+        for symbol in symbols:
+            key = f'{exchange}:{symbol}'
+            streamed = self._streamed_quote(key)
+            if streamed:
+                quotes[symbol] = streamed
+            else:
+                keys.append(key)
+
+        # Followers read what the leader streams, in one Redis round trip
+        prefix = len(exchange) + 1
+        if keys and self.cluster is not None and not self._streaming():
+            shared = self.cluster.get_quotes(keys)
+            for key, quote in shared.items():
+                quotes[key[prefix:]] = quote
+            keys = [key for key in keys if key not in shared]
+
+        size = Config.QUOTE_BATCH_SIZE
+        chunks = [keys[i:i + size] for i in range(0, len(keys), size)]
+
+        def fetch(chunk):
+            try:
+                return self._call('quote', chunk)
+            except Exception as e:
+                logger.error(f"Batch quote fetch failed ({len(chunk)} instruments): {e}")
+                return {}
+
+        if len(chunks) <= 1:
+            responses = [fetch(chunk) for chunk in chunks]
+        else:
+            workers = min(Config.QUOTE_MAX_WORKERS, len(chunks))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                responses = list(pool.map(fetch, chunks))
+
+        for response in responses:
+            for key, quote in (response or {}).items():
+                quotes[key[prefix:]] = quote
+            self._subscribe(response or {})
+
+        return quotes
+
+    @metrics.timed('broker.place_order')
     def place_order(self, symbol: str, transaction_type: str, quantity: int,
-                   price: float = None, order_type: str = 'LIMIT', product: str = 'NRML'):
-        """Place order"""
-        try:
-            if not self.kite:
-                raise Exception("Not authenticated")
+                   price: float = None, order_type: str = 'LIMIT', product: str = 'NRML',
+                   reference_price: float = None, tag: str = None, priority: int = PRIORITY_ORDER,
+                   reduce_only: bool = False, track_fills: bool = True):
+        """
+        Place order
+
+        With a risk gate attached the order is checked first and
+        OrderRejected (carrying the failed limits) is raised instead of
+        submitting; reference_price sizes the risk of market orders.
+        tag (alphanumeric, up to 20 characters) is sent to Kite and links
+        the order to a strategy run in the journal. priority is the
+        rate-limit lane: exits pass PRIORITY_EXIT to go ahead of new orders.
+        reduce_only (exits, unwinds) skips the gate's limits. Fills are
+        polled by FillTracker unless the caller waits for them itself
+        (track_fills=False) or the streaming feed reports them. In a
+        cluster, followers relay the order to the leader and return its result,
+        or cluster.UNKNOWN if the leader took it but its reply never came.
+        """
+        if self.router is not None and not self.router.local:
+            from app.services.cluster import UNKNOWN
+
+            order_id = self.router.call('place_order', unknown=UNKNOWN,
+                                        symbol=symbol, transaction_type=transaction_type, quantity=quantity,
+                                        price=price, order_type=order_type, product=product, reference_price=reference_price, tag=tag,
+                                        priority=priority, reduce_only=reduce_only, track_fills=track_fills)
+            self.cache.invalidate('positions', 'net')
+            return order_id
+
+        ticket = None
+        if self.risk_gate is not None:
+            with metrics.span('risk_gate.check'):
+                ticket = self.risk_gate.check(symbol, transaction_type, quantity, price or reference_price,
+                                              reduce_only=reduce_only)
 
-            order_id = self.kite.place_order(
-                variety=self.kite.VARIETY_REGULAR,
-                exchange=self.kite.EXCHANGE_NFO,
+        try:
+            order_id = self._call(
+                'place_order',
+                variety=KiteConnect.VARIETY_REGULAR,
+                exchange=KiteConnect.EXCHANGE_NFO,
                 tradingsymbol=symbol,
                 transaction_type=transaction_type,
                 quantity=quantity,
                 product=product,
                 order_type=order_type,
-                price=price
+                price=price,
+                priority=priority,
+                **({'tag': tag} if tag else {})
             )
+            # A new order changes positions; don't serve them stale
+            self.cache.invalidate('positions', 'net')
+            if ticket is not None:
+                self.risk_gate.bind(ticket, order_id)
+            if self.fills is not None and order_id and track_fills and not self._streaming():
+                self.fills.track(order_id)
+            if self.journal is not None and order_id:
+                self.journal.order_placed(order_id, symbol, transaction_type, quantity, price,
+                                          order_type, product, tag=tag)
             return order_id
 
         except Exception as e:
             logger.error(f"Order placement failed: {e}")
+            if ticket is not None:
+                self.risk_gate.release(ticket)
             return None
 
-    def get_positions(self):
-        """Get current positions"""
+    @metrics.timed('broker.get_order_history')
+    def get_order_history(self, order_id: str) -> List[Dict]:
+        """Status transitions for one order, oldest first"""
+        try:
+            return self._call('order_history', order_id)
+
+        except Exception as e:
+            logger.error(f"Order history fetch failed: {e}")
+            return []
+
+    @metrics.timed('broker.cancel_order')
+    def cancel_order(self, order_id: str):
+        """Cancel an open order"""
+        if self.router is not None and not self.router.local:
+            return self.router.call('cancel_order', order_id=order_id)
+
         try:
-            if not self.kite:
-                raise Exception("Not authenticated")
+            return self._call('cancel_order', variety=KiteConnect.VARIETY_REGULAR, order_id=order_id)
+
+        except Exception as e:
+            logger.error(f"Order cancel failed: {e}")
+            return None
 
-            positions = self.kite.positions()
-            return positions['net']
+    @metrics.timed('broker.get_positions')
+    def get_positions(self, raise_errors: bool = False):
+        """Get current positions (raise_errors: fail loudly instead of returning an empty book)"""
+        try:
+            return self.cache.get_or_load(
+                'positions', 'net', lambda: self._call('positions')['net']
+            )
 
         except Exception as e:
             logger.error(f"Position fetch failed: {e}")
+            if raise_errors:
+                raise
             return []
+
+    @metrics.timed('broker.get_instruments')
+    def get_instruments(self, exchange: str = 'NFO') -> List[Dict]:
+        """Download the full instrument master for an exchange"""
+        try:
+            return self._call('instruments', exchange)
+
+        except Exception as e:
+            logger.error(f"Instruments fetch failed: {e}")
+            return []
+
+    @metrics.timed('broker.get_holdings')
     def get_holdings(self) -> List[Dict]:
         """Get all holdings"""
         try:
-            headers = {
-                'Authorization': f'token {self.api_key}:{self.access_token}'
-            }
+            return self.cache.get_or_load('holdings', 'all', self._fetch_holdings)
+
+        except Exception as e:
+            logger.error(f"Holdings fetch failed: {e}")
+            return []
 
+    def _fetch_holdings(self) -> List[Dict]:
+        if not self._owns_client:
+            return self._call('holdings')
+
+        if self._owns_client and self._token_date != date.today():
+            self._refresh_token()
+
+        headers = {
+            'X-Kite-Version': '3',
+            'Authorization': f'token {self.api_key}:{self.access_token}'
+        }
+
+        def request():
             url = f"{self.base_url}/portfolio/holdings"
-            response = requests.get(url, headers=headers)
+            response = self.session.get(url, headers=headers, timeout=Config.BROKER_TIMEOUT)
             response.raise_for_status()
-
             return response.json()['data']
 
-        except Exception as e:
-            logger.error(f"Holdings fetch failed: {e}")
-            return []
+        return self.scheduler.call('holdings', request)
@@ -0,0 +1,159 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-progress broker call that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class BrokerCache:
+    """
+    TTL + LRU cache with single-flight coalescing for broker reads
+
+    Each method has its own TTL; methods without one pass straight
+    through. Concurrent misses on the same key share a single broker call.
+    With a Redis URL, values are also shared between worker processes
+    (JSON-encoded, so datetimes come back as strings). A load that was
+    already running when its entry is invalidated still answers its own
+    callers but is not cached.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 2048, redis_url: str = None):
+        self.ttls = {method: ttl for method, ttl in ttls.items() if ttl > 0}
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._generations: Dict[str, int] = {}  # Per cache key, bumped by invalidate()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'redis_hits': 0}
+
+        self.redis = None
+        if redis_url:
+            try:
+                import redis
+                self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.2)
+            except Exception as e:
+                logger.error(f"Redis cache unavailable: {e}")
+
+    def get_or_load(self, method: str, key: str, loader: Callable):
+        """Return a fresh cached value or call loader exactly once for all waiters"""
+        ttl = self.ttls.get(method)
+        if ttl is None:
+            return loader()
+
+        cache_key = f'{method}:{key}'
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self.stats['hits'] += 1
+                return entry[1]
+
+            flight = self._inflight.get(cache_key)
+            leader = flight is None
+            generation = self._generations.get(cache_key, 0)
+            if leader:
+                flight = self._inflight[cache_key] = _Flight()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._redis_get(cache_key)
+            if value is None:
+                value = loader()
+                if self._current(cache_key, generation):
+                    self._redis_set(cache_key, value, ttl)
+            flight.value = value
+            self._store(cache_key, value, ttl, generation)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(cache_key) is flight:
+                    del self._inflight[cache_key]
+            flight.done.set()
+
+    def _current(self, cache_key: str, generation: int) -> bool:
+        with self._lock:
+            return self._generations.get(cache_key, 0) == generation
+
+    def _store(self, cache_key: str, value, ttl: float, generation: int):
+        with self._lock:
+            if self._generations.get(cache_key, 0) != generation:
+                return  # Invalidated while loading: the value may predate the change
+            self._entries[cache_key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _redis_get(self, cache_key: str):
+        if not self.redis:
+            return None
+        try:
+            raw = self.redis.get(f'broker:{cache_key}')
+        except Exception as e:
+            logger.error(f"Redis cache read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        with self._lock:
+            self.stats['redis_hits'] += 1
+        return json.loads(raw)
+
+    def _redis_set(self, cache_key: str, value, ttl: float):
+        if not self.redis:
+            return
+        try:
+            self.redis.set(f'broker:{cache_key}', json.dumps(value, default=str), px=int(ttl * 1000))
+        except Exception as e:
+            logger.error(f"Redis cache write failed: {e}")
+
+    def invalidate(self, method: Optional[str] = None, key: Optional[str] = None):
+        """Drop the entry for one method and key, every entry of a method, or everything"""
+        prefix = f'{method}:' if method else ''
+        with self._lock:
+            if key is not None:
+                cache_keys = [f'{method}:{key}']
+            else:
+                cache_keys = [k for k in set(self._entries) | set(self._inflight) if k.startswith(prefix)]
+            for cache_key in cache_keys:
+                self._entries.pop(cache_key, None)
+                # Loads already running are not cached, and later callers don't wait on them
+                self._inflight.pop(cache_key, None)
+                self._generations[cache_key] = self._generations.get(cache_key, 0) + 1
+
+        if self.redis:
+            try:
+                if key is not None:
+                    self.redis.delete(f'broker:{method}:{key}')
+                else:
+                    keys = list(self.redis.scan_iter(f'broker:{prefix}*'))
+                    if keys:
+                        self.redis.delete(*keys)
+            except Exception as e:
+                logger.error(f"Redis cache invalidation failed: {e}")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), inflight=len(self._inflight))
@@ -0,0 +1,273 @@
+import json
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('ltp', 'bid', 'ask', 'volume', 'oi', 'iv')
+LTP, BID, ASK, VOLUME, OI, IV = range(len(FIELDS))
+SIDES = ('ce', 'pe')
+CE, PE = 0, 1
+
+# Column order of the old DataFrame chain, kept for records/to_frame()
+COLUMNS = ('strike', 'ce_symbol', 'pe_symbol',
+           'ce_ltp', 'ce_volume', 'ce_oi', 'ce_bid', 'ce_ask',
+           'pe_ltp', 'pe_volume', 'pe_oi', 'pe_bid', 'pe_ask',
+           'spot_price', 'expiry', 'ce_iv', 'pe_iv')
+INTEGER_FIELDS = (VOLUME, OI)
+
+MAGIC = b'OCH1'
+
+
+def _best(depth: Optional[Dict], side: str) -> float:
+    levels = depth.get(side) if depth else None
+    return levels[0].get('price', 0) if levels else 0
+
+
+def _json_floats(values: np.ndarray) -> list:
+    """tolist() with NaN as None, since NaN is not valid JSON"""
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    return np.where(finite, values, None).tolist()
+
+
+class OptionsChain:
+    """
+    One expiry's options chain in a single contiguous NumPy block
+
+    values[field, side, row] holds LTP/bid/ask/volume/OI/IV for CE (side 0)
+    and PE (side 1) with rows in ascending strike order, so each column is
+    a contiguous view: chain['pe_ltp'] and friends never copy, and
+    apply_ticks() writes streamed prices in place. Strikes are fixed at
+    construction; rows() maps strikes to row numbers. Column access mirrors
+    the old DataFrame chain ('strike', 'ce_symbol', ..., 'spot_price',
+    'expiry'), and to_records()/to_columns()/to_bytes() serialize for the API.
+    """
+
+    def __init__(self, expiry: str, spot_price: float, strikes: Sequence[int],
+                 symbols: Sequence[Sequence[str]], tokens: Optional[np.ndarray] = None,
+                 values: Optional[np.ndarray] = None, timestamp: Optional[float] = None):
+        rows = len(strikes)
+        self.expiry = expiry
+        self.spot_price = float(spot_price)
+        self.strikes = np.asarray(strikes, dtype=np.int64)
+        self.symbols = np.empty((2, rows), dtype=object)
+        self.symbols[:] = symbols
+        self.tokens = np.zeros((2, rows), dtype=np.int64) if tokens is None else np.asarray(tokens, dtype=np.int64)
+        if values is None:
+            values = np.zeros((len(FIELDS), 2, rows))
+            values[IV] = np.nan
+        self.values = values
+        self.timestamp = timestamp or time.time()
+        # Instrument token of the underlying; its ticks move spot_price
+        self.spot_token = None
+        self._slots = None
+
+    @classmethod
+    def from_quotes(cls, expiry: str, spot_price: float, strikes: Sequence[int],
+                    symbols: Sequence[Sequence[str]], quotes: Dict[str, Dict]) -> 'OptionsChain':
+        """Build from Kite-shaped quotes, dropping strikes missing either side"""
+        rows = len(strikes)
+        values = np.zeros((len(FIELDS), 2, rows))
+        values[IV] = np.nan
+        tokens = np.zeros((2, rows), dtype=np.int64)
+        quoted = np.ones(rows, dtype=bool)
+
+        for side in (CE, PE):
+            ltp, bid, ask, volume, oi, token = [], [], [], [], [], []
+            for row, symbol in enumerate(symbols[side]):
+                quote = quotes.get(symbol)
+                if not quote:
+                    quoted[row] = False
+                    quote = {}
+                depth = quote.get('depth')
+                ltp.append(quote.get('last_price', 0))
+                bid.append(_best(depth, 'buy'))
+                ask.append(_best(depth, 'sell'))
+                volume.append(quote.get('volume', 0))
+                oi.append(quote.get('oi', 0))
+                token.append(quote.get('instrument_token', 0))
+            values[:OI + 1, side] = (ltp, bid, ask, volume, oi)
+            tokens[side] = token
+
+        symbols = np.asarray(symbols, dtype=object).reshape(2, rows)
+        if not quoted.all():
+            values = np.ascontiguousarray(values[:, :, quoted])
+            tokens, symbols = tokens[:, quoted], symbols[:, quoted]
+            strikes = np.asarray(strikes)[quoted]
+        return cls(expiry, spot_price, strikes, symbols, tokens, values)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'OptionsChain':
+        """Rebuild from a DataFrame chain (e.g. recorded snapshots)"""
+        frame = frame.sort_values('strike')
+        rows = len(frame)
+        values = np.zeros((len(FIELDS), 2, rows))
+        for side, prefix in enumerate(SIDES):
+            for field, name in enumerate(FIELDS):
+                column = f'{prefix}_{name}'
+                values[field, side] = frame[column].to_numpy(dtype=np.float64) if column in frame else (
+                    np.nan if field == IV else 0)
+        symbols = [frame[f'{prefix}_symbol'].tolist() if f'{prefix}_symbol' in frame else [''] * rows
+                   for prefix in SIDES]
+        spot = frame['spot_price'].iloc[0] if rows else np.nan
+        expiry = str(frame['expiry'].iloc[0]) if rows and 'expiry' in frame else ''
+        return cls(expiry, spot, frame['strike'].to_numpy(), symbols, values=values)
+
+    def __len__(self) -> int:
+        return len(self.strikes)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.strikes) == 0
+
+    @property
+    def columns(self) -> List[str]:
+        return list(COLUMNS)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the chain, symbol strings included"""
+        strings = sum(sys.getsizeof(symbol) for symbol in self.symbols.flat)
+        return self.values.nbytes + self.strikes.nbytes + self.tokens.nbytes + self.symbols.nbytes + strings
+
+    def __contains__(self, name: str) -> bool:
+        return name in COLUMNS or name in ('ce_token', 'pe_token')
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Column by its DataFrame name; option columns are views into values"""
+        if name == 'strike':
+            return self.strikes
+        if name == 'spot_price':
+            return np.broadcast_to(self.spot_price, self.strikes.shape)
+        if name == 'expiry':
+            return np.broadcast_to(np.array(self.expiry, dtype=object), self.strikes.shape)
+
+        prefix, _, field = name.partition('_')
+        if prefix not in SIDES:
+            raise KeyError(name)
+        side = SIDES.index(prefix)
+        if field == 'symbol':
+            return self.symbols[side]
+        if field == 'token':
+            return self.tokens[side]
+        if field not in FIELDS:
+            raise KeyError(name)
+        return self.values[FIELDS.index(field), side]
+
+    def rows(self, strikes) -> np.ndarray:
+        """Row number of each strike, -1 where the strike is not in the chain"""
+        strikes = np.asarray(strikes)
+        if self.empty:
+            return np.full(strikes.shape, -1)
+        found = np.searchsorted(self.strikes, strikes)
+        found[found == len(self.strikes)] = 0
+        return np.where(self.strikes[found] == strikes, found, -1)
+
+    def copy(self) -> 'OptionsChain':
+        chain = OptionsChain(self.expiry, self.spot_price, self.strikes, self.symbols,
+                             self.tokens, self.values.copy(), self.timestamp)
+        chain.spot_token = self.spot_token
+        return chain
+
+    def apply_ticks(self, ticks: Iterable[Dict]) -> int:
+        """Write streamed ticks into the matching rows, return how many applied"""
+        if self._slots is None:
+            self._slots = {int(token): divmod(slot, len(self.strikes))
+                           for slot, token in enumerate(self.tokens.flat) if token}
+
+        values = self.values
+        applied = 0
+        for tick in ticks:
+            token = tick['instrument_token']
+            slot = self._slots.get(token)
+            if slot is None:
+                if token == self.spot_token:
+                    self.spot_price = float(tick['last_price'])
+                    applied += 1
+                continue
+
+            side, row = slot
+            values[LTP, side, row] = tick['last_price']
+            if 'volume' in tick:
+                values[VOLUME, side, row] = tick['volume']
+            if 'oi' in tick:
+                values[OI, side, row] = tick['oi']
+            depth = tick.get('depth')
+            if depth:
+                values[BID, side, row] = _best(depth, 'buy')
+                values[ASK, side, row] = _best(depth, 'sell')
+            applied += 1
+
+        if applied:
+            self.timestamp = time.time()
+        return applied
+
+    def _column_values(self, name: str) -> list:
+        if name in ('strike', 'ce_symbol', 'pe_symbol'):
+            return self[name].tolist()
+        if name == 'spot_price':
+            return [self.spot_price] * len(self)
+        if name == 'expiry':
+            return [self.expiry] * len(self)
+        field = FIELDS.index(name[3:])
+        if field in INTEGER_FIELDS:
+            return self[name].astype(np.int64).tolist()
+        return _json_floats(self[name])
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame in the old chain layout"""
+        return pd.DataFrame({name: self[name] if name not in ('spot_price', 'expiry') else np.asarray(self[name])
+                             for name in COLUMNS})
+
+    def to_records(self) -> List[Dict]:
+        """One dict per strike, as the old DataFrame to_dict('records')"""
+        columns = [self._column_values(name) for name in COLUMNS]
+        return [dict(zip(COLUMNS, row)) for row in zip(*columns)]
+
+    def to_columns(self) -> Dict:
+        """Columnar JSON: scalars once, one list per field and side"""
+        return {
+            'expiry': self.expiry,
+            'spot_price': self.spot_price,
+            'timestamp': self.timestamp,
+            'strike': self.strikes.tolist(),
+            **{prefix: {'symbol': self.symbols[side].tolist(),
+                        **{name: self._column_values(f'{prefix}_{name}') for name in FIELDS}}
+               for side, prefix in enumerate(SIDES)},
+        }
+
+    def to_bytes(self) -> bytes:
+        """
+        Binary frame: MAGIC, uint32 header length, JSON header, then
+        little-endian int64 strikes and float64 values[field, side, row]
+        """
+        header = json.dumps({
+            'expiry': self.expiry,
+            'spot_price': self.spot_price,
+            'timestamp': self.timestamp,
+            'rows': len(self),
+            'fields': FIELDS,
+            'sides': SIDES,
+            'symbols': self.symbols.tolist(),
+        }, separators=(',', ':')).encode()
+        return b''.join((MAGIC, struct.pack('<I', len(header)), header,
+                         self.strikes.astype('<i8', copy=False).tobytes(),
+                         self.values.astype('<f8', copy=False).tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'OptionsChain':
+        if data[:4] != MAGIC:
+            raise ValueError('Not an options chain frame')
+        size, = struct.unpack_from('<I', data, 4)
+        header = json.loads(data[8:8 + size])
+        rows = header['rows']
+        offset = 8 + size
+        strikes = np.frombuffer(data, dtype='<i8', count=rows, offset=offset)
+        values = np.frombuffer(data, dtype='<f8', count=len(FIELDS) * 2 * rows, offset=offset + 8 * rows)
+        return cls(header['expiry'], header['spot_price'], strikes, header['symbols'],
+                   values=values.reshape(len(FIELDS), 2, rows).copy(), timestamp=header['timestamp'])
@@ -0,0 +1,500 @@
+"""
+Multi-process coordination through Redis
+
+With REDIS_URL set, every worker process runs the same app and one of them
+holds a short Redis lease as the leader. Only the leader streams market
+data, runs the exit engine and polls the broker for the dashboards. It
+relays streamed quotes, the dashboard snapshots (positions, P&L, risk)
+and the day's access token into Redis, and the followers read them there
+instead of each calling the broker. Orders reach the broker through the
+leader alone (LeaderRouter), so its one pre-trade gate and journal see all
+of them. SocketIO events fan out between the workers through the same
+Redis (message_queue).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Unknown:
+    def __repr__(self):
+        return 'UNKNOWN'
+
+
+# A relayed call the leader took but never answered: it may have run
+UNKNOWN = _Unknown()
+
+
+class ClusterState:
+    """Redis keys shared by every worker of one deployment"""
+
+    def __init__(self, redis_url: str, prefix: str = 'nifty', quote_max_age: float = 2.0,
+                 max_stream_requests: int = 3000):
+        import redis
+
+        self.redis = redis.Redis.from_url(redis_url, socket_timeout=1)
+        # No socket timeout: blocking pops wait on the server for their own timeout
+        self.blocking = redis.Redis.from_url(redis_url)
+        self.prefix = prefix
+        # Streamed quotes count as live only while the leader's relay keeps refreshing this
+        self.quote_max_age = quote_max_age
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        # The feed's instrument limit per connection; requests beyond it stay on REST
+        self.max_stream_requests = max_stream_requests
+        self._capped_on = None
+
+    def key(self, name: str) -> str:
+        return f'{self.prefix}:{name}'
+
+    # Streamed quotes, written by the leader's QuoteRelay
+
+    def put_quotes(self, quotes: Dict[str, Dict], live: bool, reset: bool = False):
+        pipe = self.redis.pipeline(transaction=False)
+        if reset:
+            pipe.delete(self.key('quotes'))
+        if quotes:
+            pipe.hset(self.key('quotes'), mapping={key: json.dumps(quote) for key, quote in quotes.items()})
+        if live:
+            pipe.set(self.key('quotes:live'), self.identity, px=int(self.quote_max_age * 1000))
+        else:
+            pipe.delete(self.key('quotes:live'))
+        pipe.execute()
+
+    def get_quotes(self, keys: List[str]) -> Dict[str, Dict]:
+        """Streamed quotes for 'EXCHANGE:SYMBOL' keys while the leader's feed is live, else {}"""
+        if not keys:
+            return {}
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.exists(self.key('quotes:live'))
+            pipe.hmget(self.key('quotes'), keys)
+            live, values = pipe.execute()
+        except Exception as e:
+            logger.error(f"Shared quote read failed: {e}")
+            return {}
+        if not live:
+            return {}
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    def request_stream(self, tokens: Dict[str, int]):
+        """
+        Ask the leader to stream instruments this worker had to fetch over REST
+
+        Requests are kept per trading day (yesterday's contracts are not
+        streamed again) and capped at max_stream_requests.
+        """
+        day = date.today().isoformat()
+        key = self.key(f'subscriptions:{day}')
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hlen(key)
+            pipe.hmget(key, list(tokens))
+            count, present = pipe.execute()
+            new = {name: token for (name, token), value in zip(tokens.items(), present) if value is None}
+            room = max(self.max_stream_requests - count, 0)
+            if len(new) > room:
+                if self._capped_on != day:
+                    self._capped_on = day
+                    logger.warning(f"Stream requests at the feed limit ({self.max_stream_requests}), "
+                                   f"further instruments stay on REST today")
+                new = dict(list(new.items())[:room])
+            if new:
+                pipe.hset(key, mapping=new)
+                pipe.expire(key, 24 * 3600)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Stream request failed: {e}")
+
+    def stream_requests(self) -> Dict[str, int]:
+        values = self.redis.hgetall(self.key(f'subscriptions:{date.today().isoformat()}'))
+        return {key.decode(): int(token) for key, token in values.items()}
+
+    # Snapshots written by the leader (dashboard channels, risk analysis)
+
+    def put(self, name: str, value, ttl: float):
+        try:
+            self.redis.set(self.key(f'state:{name}'), json.dumps(value, default=str), px=int(ttl * 1000))
+        except Exception as e:
+            logger.error(f"Shared state write failed ({name}): {e}")
+
+    def get(self, name: str):
+        """Latest snapshot, or None if missing, expired or Redis is unreachable"""
+        try:
+            value = self.redis.get(self.key(f'state:{name}'))
+        except Exception as e:
+            logger.error(f"Shared state read failed ({name}): {e}")
+            return None
+        return None if value is None else json.loads(value)
+
+    # One broker login per day for the whole deployment
+
+    def access_token(self) -> Optional[str]:
+        try:
+            token = self.redis.get(self.key(f'access_token:{date.today().isoformat()}'))
+        except Exception as e:
+            logger.error(f"Shared access token read failed: {e}")
+            return None
+        return token.decode() if token else None
+
+    def share_access_token(self, token: str):
+        try:
+            self.redis.set(self.key(f'access_token:{date.today().isoformat()}'), token, ex=24 * 3600)
+        except Exception as e:
+            logger.error(f"Shared access token write failed: {e}")
+
+    def claim(self, name: str, ttl: float) -> bool:
+        """True for the one worker that sets the key first; it expires after ttl seconds"""
+        try:
+            return bool(self.redis.set(self.key(name), self.identity, nx=True, px=int(ttl * 1000)))
+        except Exception as e:
+            logger.error(f"Cluster claim failed ({name}): {e}")
+            return True  # Without Redis every worker fends for itself
+
+    def wait_access_token(self, timeout: float, exclude: str = None, interval: float = 0.5) -> Optional[str]:
+        """The token another worker is logging in for, once it is shared (exclude: a known-expired one)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            token = self.access_token()
+            if token and token != exclude:
+                return token
+            time.sleep(interval)
+        return None
+
+
+class LeaderElection:
+    """
+    Redis lease naming one leader among the workers
+
+    Every ttl/3 the leader extends its lease and the others try to take
+    it. A leader that cannot confirm its lease for a whole ttl steps down,
+    and a crashed leader's lease expires, so a new one is elected within
+    about one ttl. Callbacks run on the election thread.
+    """
+
+    def __init__(self, state: ClusterState, ttl: float = 5.0):
+        self.state = state
+        self.ttl = ttl
+        self.key = state.key('leader')
+        self.leader = False
+        self.elections = 0
+
+        self._on_elected: List[Callable] = []
+        self._on_demoted: List[Callable] = []
+        self._renewed = 0.0
+        self._running = False
+        self._thread = None
+
+    def on_elected(self, callback: Callable):
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: Callable):
+        self._on_demoted.append(callback)
+
+    def start(self) -> 'LeaderElection':
+        if not self._running:
+            self._running = True
+            self.poll()
+            self._thread = threading.Thread(target=self._run, name='leader-election', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop campaigning and hand the lease over at once if held"""
+        self._running = False
+        if self.leader:
+            try:
+                self._compare_and(lambda pipe: pipe.delete(self.key))
+            except Exception as e:
+                logger.error(f"Leader lease release failed: {e}")
+            self._set(False)
+
+    def leader_id(self) -> Optional[str]:
+        try:
+            value = self.state.redis.get(self.key)
+        except Exception:
+            return None
+        return value.decode() if value else None
+
+    def poll(self) -> bool:
+        """One renew/acquire round; True while this worker leads"""
+        try:
+            if self.leader:
+                held = self._compare_and(lambda pipe: pipe.pexpire(self.key, int(self.ttl * 1000)))
+            else:
+                held = bool(self.state.redis.set(self.key, self.state.identity, nx=True,
+                                                 px=int(self.ttl * 1000)))
+            if held:
+                self._renewed = time.monotonic()
+        except Exception as e:
+            logger.error(f"Leader lease check failed: {e}")
+            # Unsure: keep leading only while the last confirmed lease cannot have expired
+            held = self.leader and time.monotonic() - self._renewed < self.ttl
+
+        if held != self.leader:
+            self._set(held)
+        return held
+
+    def _compare_and(self, action: Callable) -> bool:
+        """Apply action to the lease only if this worker still holds it (WATCH/MULTI)"""
+        from redis.exceptions import WatchError
+
+        with self.state.redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                holder = pipe.get(self.key)
+                if holder is None or holder.decode() != self.state.identity:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                action(pipe)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def _set(self, leader: bool):
+        self.leader = leader
+        if leader:
+            self.elections += 1
+            logger.info(f"Elected cluster leader ({self.state.identity})")
+        else:
+            logger.warning(f"No longer cluster leader ({self.state.identity})")
+        for callback in self._on_elected if leader else self._on_demoted:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Leader {'election' if leader else 'demotion'} handler failed: {e}")
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.ttl / 3)
+            if self._running:
+                self.poll()
+
+
+class QuoteRelay:
+    """
+    Leader side: copy streamed quotes into Redis for the followers
+
+    Ticks only mark instruments dirty; every interval their latest quotes
+    are written in one pipeline, together with the live flag followers
+    check. Instruments the followers fetched over REST are subscribed on
+    the leader's feed.
+    """
+
+    def __init__(self, state: ClusterState, ticker, interval: float = 0.2):
+        self.state = state
+        self.ticker = ticker
+        self.interval = interval
+        self.relayed = 0
+
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def on_ticks(self, ticks: List[Dict]):
+        """Ticker listener"""
+        with self._lock:
+            self._dirty.update(tick['instrument_token'] for tick in ticks)
+
+    def start(self) -> 'QuoteRelay':
+        if not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='quote-relay', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        try:
+            self.state.put_quotes({}, live=False)
+        except Exception as e:
+            logger.error(f"Quote relay shutdown failed: {e}")
+
+    def flush(self, reset: bool = False):
+        with self._lock:
+            tokens, self._dirty = self._dirty, set()
+        store = self.ticker.store
+        quotes = {}
+        for token in tokens:
+            key = store.key_for(token)
+            quote = store.get(key) if key else None
+            if quote:
+                quotes[key] = quote
+        self.state.put_quotes(quotes, live=self.ticker.connected, reset=reset)
+        self.relayed += len(quotes)
+
+    def _run(self):
+        reset = True  # A previous leader's quotes may be stale
+        since_requests = 0.0
+        while self._running:
+            try:
+                since_requests += self.interval
+                if since_requests >= 1.0:
+                    since_requests = 0.0
+                    self.ticker.subscribe(self.state.stream_requests())
+                self.flush(reset=reset)
+                reset = False
+            except Exception as e:
+                logger.error(f"Quote relay failed: {e}")
+            time.sleep(self.interval)
+
+
+class LeaderRouter:
+    """
+    Run order calls on the cluster leader
+
+    Every worker accepts order requests, but only the leader runs them, so
+    its pre-trade risk gate, fill tracking and journal see every order of
+    the deployment. A follower pushes the call onto a Redis list and waits
+    for the reply; the leader serves the list from a thread pool while it
+    holds the lease. A call not picked up within start_timeout (no leader,
+    or a busy one) is dropped unplaced, and the caller gets its default.
+    One taken but not answered in time may still have run: the caller
+    gets its unknown value instead, so a live order isn't reported failed.
+    """
+
+    def __init__(self, state: ClusterState, election: Callable[[], LeaderElection],
+                 max_workers: int = 5, start_timeout: float = 10.0):
+        self.state = state
+        self.election = election  # Resolved on first use: the election is built after the broker
+        self.max_workers = max_workers
+        self.start_timeout = start_timeout
+        self.queue = state.key('leader:calls')
+        self.handlers: Dict[str, Callable] = {}
+        self.served = 0
+
+        self._pool = None
+        self._running = False
+        self._thread = None
+
+    def register(self, name: str, handler: Callable):
+        self.handlers[name] = handler
+
+    @property
+    def local(self) -> bool:
+        """True while this worker leads and runs calls itself"""
+        try:
+            return self.election().leader
+        except Exception as e:
+            logger.error(f"Cluster role unknown: {e}")
+            return False
+
+    def call(self, name: str, default=None, timeout: float = 60.0, unknown=None, **kwargs):
+        """
+        handler(**kwargs) on the leader
+
+        OrderRejected raised there is raised here too. With no reply within
+        start_timeout + timeout, default is returned if the call was never
+        taken, and unknown (default if None) if the leader took it and may
+        still have run it.
+        """
+        if self.local:
+            return self.handlers[name](**kwargs)
+
+        call_id = uuid.uuid4().hex
+        reply_key = self.state.key(f'leader:reply:{call_id}')
+        request = json.dumps({
+            'id': call_id,
+            'name': name,
+            'kwargs': kwargs,
+            'expires': time.time() + self.start_timeout
+        }, default=str)
+        try:
+            self.state.redis.lpush(self.queue, request)
+        except Exception as e:
+            logger.error(f"Leader call failed ({name}): {e}")
+            return default
+        unknown = default if unknown is None else unknown
+        try:
+            popped = self.state.blocking.blpop([reply_key], timeout=int(self.start_timeout + timeout))
+            if popped is None:
+                # Still queued: withdrawn, so it can't run after we give up
+                taken = not self.state.redis.lrem(self.queue, 1, request)
+        except Exception as e:
+            logger.error(f"Leader call outcome unknown ({name}): {e}")
+            return unknown
+        if popped is None:
+            if not taken:
+                logger.error(f"Leader call timed out unplaced ({name})")
+                return default
+            logger.error(f"Leader call timed out, outcome unknown ({name})")
+            return unknown
+
+        reply = json.loads(popped[1])
+        if 'rejected' in reply:
+            from app.services.risk_gate import OrderRejected
+
+            raise OrderRejected(reply['rejected'])
+        if 'error' in reply:
+            logger.error(f"Leader call failed ({name}): {reply['error']}")
+            return default
+        return reply['result']
+
+    def start(self) -> 'LeaderRouter':
+        if not self._running:
+            self._running = True
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='leader-call')
+            self._thread = threading.Thread(target=self._run, args=(self._pool,), name='leader-router',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop taking calls; those already taken still finish and reply"""
+        self._running = False
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _serve(self, request: Dict):
+        from app.services.risk_gate import OrderRejected
+
+        if time.time() > request['expires']:
+            logger.warning(f"Dropped expired leader call ({request['name']})")
+            # Answered, so the caller knows it never ran
+            reply = {'error': 'expired before a leader took it'}
+        else:
+            try:
+                reply = {'result': self.handlers[request['name']](**request['kwargs'])}
+            except OrderRejected as e:
+                reply = {'rejected': e.reasons}
+            except Exception as e:
+                logger.error(f"Leader call {request['name']} failed: {e}")
+                reply = {'error': str(e)}
+        reply_key = self.state.key(f"leader:reply:{request['id']}")
+        try:
+            pipe = self.state.redis.pipeline(transaction=False)
+            pipe.rpush(reply_key, json.dumps(reply, default=str))
+            pipe.expire(reply_key, 60)  # Unread if the caller gave up
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Leader reply failed ({request['name']}): {e}")
+        self.served += 1
+
+    def _run(self, pool: ThreadPoolExecutor):
+        while self._pool is pool:
+            try:
+                popped = self.state.blocking.brpop([self.queue], timeout=1)
+            except Exception as e:
+                logger.error(f"Leader call queue read failed: {e}")
+                time.sleep(1)
+                continue
+            if popped is None:
+                continue
+            request = json.loads(popped[1])
+            if self._pool is not pool:
+                # Demoted between the pop and here: hand the call to the next leader
+                self.state.redis.rpush(self.queue, popped[1])
+                break
+            pool.submit(self._serve, request)
@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.config import Config
+from app.services.risk_gate import OrderRejected
+from app.utils.rate_limit import PRIORITY_EXIT, PRIORITY_ORDER
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('COMPLETE', 'REJECTED', 'CANCELLED')
+
+
+class _OrderState:
+    def __init__(self):
+        self.update = threading.Event()
+        self.order: Dict = {}
+
+
+class FillTracker:
+    """
+    Poll order history for orders placed outside OrderExecutor
+
+    Route orders and exit-engine closes have no one waiting on them, so
+    without a streaming order feed their fills would never reach the
+    consumers that book them (listeners get each polled order update).
+    One thread polls every tracked order each interval until it is
+    terminal or the fill timeout passes.
+    """
+
+    def __init__(self, broker, poll_interval: float = None, timeout: float = None):
+        self.broker = broker
+        self.poll_interval = poll_interval or Config.ORDER_POLL_INTERVAL
+        self.timeout = timeout or Config.ORDER_FILL_TIMEOUT
+        self.polls = 0
+
+        self._listeners: List[Callable] = []
+        self._orders: Dict[str, float] = {}  # order_id -> deadline
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_listener(self, callback: Callable):
+        """callback(order) runs on the tracker thread for every polled update"""
+        self._listeners.append(callback)
+
+    def track(self, order_id: str):
+        if not self._listeners:
+            return
+        with self._lock:
+            self._orders[str(order_id)] = time.monotonic() + self.timeout
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='fill-tracker', daemon=True)
+                self._thread.start()
+
+    def _dispatch(self, order: Dict):
+        for listener in self._listeners:
+            try:
+                listener(order)
+            except Exception as e:
+                logger.error(f"Fill listener failed: {e}")
+
+    def poll(self):
+        """One pass over every tracked order"""
+        now = time.monotonic()
+        with self._lock:
+            orders = list(self._orders.items())
+        for order_id, deadline in orders:
+            history = self.broker.get_order_history(order_id)
+            self.polls += 1
+            order = history[-1] if history else None
+            if order:
+                self._dispatch(order)
+            if (order and order.get('status') in TERMINAL_STATUSES) or now > deadline:
+                with self._lock:
+                    self._orders.pop(order_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.poll()
+            with self._lock:
+                if not self._orders:
+                    self._thread = None
+                    return
+
+
+class OrderExecutor:
+    """
+    Submit multi-leg orders concurrently and track them to fill/reject
+
+    Legs go out in parallel behind the order rate budget. Status comes
+    from broker order updates (on_order_update, wired to the ticker feed)
+    with order-history polling as a fallback. In all-or-nothing mode a
+    failed leg cancels open siblings and unwinds filled ones.
+    """
+
+    def __init__(self, broker, max_workers: int = None, poll_interval: float = None, timeout: float = None):
+        self.broker = broker
+        self.max_workers = max_workers or Config.ORDER_MAX_WORKERS
+        self.poll_interval = poll_interval or Config.ORDER_POLL_INTERVAL
+        self.timeout = timeout or Config.ORDER_FILL_TIMEOUT
+
+        # Updates can arrive before place_order returns, so keep a bounded backlog
+        self._orders: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _state(self, order_id: str) -> _OrderState:
+        with self._lock:
+            state = self._orders.get(order_id)
+            if state is None:
+                state = self._orders[order_id] = _OrderState()
+                while len(self._orders) > 1024:
+                    self._orders.popitem(last=False)
+            return state
+
+    def _forget(self, order_id: str):
+        with self._lock:
+            self._orders.pop(order_id, None)
+
+    def on_order_update(self, order: Dict):
+        """Order postback from the broker feed"""
+        order_id = order.get('order_id')
+        if not order_id:
+            return
+        state = self._state(str(order_id))
+        state.order = order
+        state.update.set()
+
+    def _poll(self, order_id: str) -> Optional[Dict]:
+        history = self.broker.get_order_history(order_id)
+        return history[-1] if history else None
+
+    def _wait_for_fill(self, order_id: str, deadline: float) -> Dict:
+        """Block until the order is terminal or the deadline passes"""
+        state = self._state(order_id)
+        while True:
+            if state.order.get('status') in TERMINAL_STATUSES:
+                return state.order
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return state.order
+
+            # Pushed updates wake us immediately; otherwise poll on each interval
+            state.update.wait(min(self.poll_interval, remaining))
+            if state.update.is_set():
+                state.update.clear()
+                continue
+
+            polled = self._poll(order_id)
+            if polled:
+                state.order = polled
+
+    def _execute_leg(self, leg: Dict, deadline: float) -> Dict:
+        result = {
+            'symbol': leg['symbol'],
+            'transaction_type': leg['transaction_type'],
+            'quantity': leg['quantity'],
+            'order_id': None,
+            'status': 'FAILED',
+            'filled_quantity': 0,
+            'average_price': None,
+            'timings': {}
+        }
+        result.update({key: leg[key] for key in ('strike', 'premium', 'expiry', 'tag') if key in leg})
+
+        submitted = time.perf_counter()
+        try:
+            order_id = self.broker.place_order(
+                symbol=leg['symbol'],
+                transaction_type=leg['transaction_type'],
+                quantity=leg['quantity'],
+                price=leg.get('price'),
+                order_type=leg.get('order_type', 'MARKET'),
+                product=leg.get('product', 'NRML'),
+                reference_price=leg.get('premium'),
+                tag=leg.get('tag'),
+                priority=leg.get('priority', PRIORITY_ORDER),
+                reduce_only=leg.get('reduce_only', False),
+                track_fills=False
+            )
+        except OrderRejected as e:
+            result['status'] = 'REJECTED'
+            result['rejection'] = e.reasons
+            return result
+        acked = time.perf_counter()
+        result['timings']['submit_to_ack_ms'] = round((acked - submitted) * 1000, 3)
+
+        if not order_id:
+            return result
+
+        result['order_id'] = order_id
+        order = self._wait_for_fill(str(order_id), deadline)
+        done = time.perf_counter()
+        self._forget(str(order_id))
+        # Polled fills reach the risk ledger and journal too (both ignore ones already booked)
+        for listener in (getattr(self.broker, 'risk_gate', None), getattr(self.broker, 'journal', None)):
+            if listener is not None and order:
+                listener.on_order_update(order)
+
+        status = order.get('status', 'TIMEOUT')
+        result['status'] = status if status in TERMINAL_STATUSES else 'TIMEOUT'
+        result['filled_quantity'] = order.get('filled_quantity', 0) or 0
+        result['average_price'] = order.get('average_price')
+        if status == 'COMPLETE':
+            result['timings']['ack_to_fill_ms'] = round((done - acked) * 1000, 3)
+            result['timings']['submit_to_fill_ms'] = round((done - submitted) * 1000, 3)
+
+        return result
+
+    def _unwind(self, results: List[Dict]) -> List[Dict]:
+        """Cancel open legs and close filled quantity with market orders"""
+        unwinds = []
+        for leg in results:
+            if leg['status'] == 'TIMEOUT' and leg['order_id']:
+                self.broker.cancel_order(leg['order_id'])
+                leg['status'] = 'CANCELLED'
+                # Anything that filled before the cancel still needs closing
+                order = self._poll(str(leg['order_id'])) or {}
+                leg['filled_quantity'] = order.get('filled_quantity', leg['filled_quantity']) or 0
+
+            if leg['filled_quantity']:
+                side = 'BUY' if leg['transaction_type'] == 'SELL' else 'SELL'
+                unwinds.append({
+                    'symbol': leg['symbol'],
+                    'transaction_type': side,
+                    'quantity': leg['filled_quantity'],
+                    'order_type': 'MARKET',
+                    'tag': leg.get('tag'),
+                    'priority': PRIORITY_EXIT,
+                    'reduce_only': True,
+                })
+
+        if not unwinds:
+            return []
+        return self.execute(unwinds)['legs']
+
+    def execute(self, legs: List[Dict], all_or_nothing: bool = False) -> Dict:
+        """Place all legs in parallel and wait for each to reach a final state"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+
+        if not legs:
+            return {'status': 'completed', 'legs': [], 'unwound': [], 'elapsed_ms': 0.0}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(legs))) as pool:
+            results = list(pool.map(lambda leg: self._execute_leg(leg, deadline), legs))
+
+        failed = [leg for leg in results if leg['status'] != 'COMPLETE']
+        unwound = []
+        if failed and all_or_nothing:
+            logger.warning(f"{len(failed)} leg(s) failed, unwinding {len(results) - len(failed)} sibling(s)")
+            unwound = self._unwind(results)
+        elif getattr(self.broker, 'fills', None) is not None:
+            # Legs still working at the broker: their later fills reach the risk ledger and journal
+            for leg in failed:
+                if leg['status'] == 'TIMEOUT' and leg['order_id']:
+                    self.broker.fills.track(str(leg['order_id']))
+
+        if not failed:
+            status = 'completed'
+        elif all_or_nothing:
+            status = 'unwound'
+        else:
+            status = 'partial' if len(failed) < len(results) else 'failed'
+
+        return {
+            'status': status,
+            'legs': results,
+            'unwound': unwound,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
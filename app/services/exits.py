@@ -0,0 +1,305 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from app.config import Config
+from app.services.risk_gate import OrderRejected
+from app.utils.rate_limit import PRIORITY_EXIT
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('COMPLETE', 'REJECTED', 'CANCELLED')
+DAY_SECONDS = 24 * 3600
+
+
+class _Triggers:
+    """One instrument's exit levels, sorted so a tick finds breaches by bisection"""
+    __slots__ = ('above', 'above_prices', 'below', 'below_prices')
+
+    def __init__(self, above: List[tuple], below: List[tuple]):
+        # Fire when last_price >= price (above) or <= price (below)
+        self.above = sorted(above, key=lambda level: level[0])
+        self.above_prices = [level[0] for level in self.above]
+        self.below = sorted(below, key=lambda level: level[0])
+        self.below_prices = [level[0] for level in self.below]
+
+
+class ExitEngine:
+    """
+    Close positions from the tick stream: stop-loss, profit target and expiry
+
+    Each open leg in PortfolioRisk gets a stop and a target price, both
+    measured from its average price in the direction of the trade (a short
+    stops out STOP_LOSS_PERCENT above where it was sold and takes profit
+    PROFIT_TARGET_PERCENT below). Levels are kept per instrument in sorted
+    lists, so a tick costs one dict lookup and two bisections; legs within
+    EXIT_DAYS_TO_EXPIRY of expiry sit on a heap checked on every tick batch.
+
+    A breach submits one MARKET order through BrokerService.place_order on
+    a small worker pool, so the ticker thread never waits on the broker. It
+    closes the leg's quantity less what its exits still working at the
+    broker will close, so a breach (or a partial fill) never sends a second
+    close for the same quantity. An exit that fails, is rejected or is
+    cancelled is retried after EXIT_RETRY_INTERVAL.
+    """
+
+    def __init__(self, broker, risk, stop_loss_percent: float = None, profit_target_percent: float = None,
+                 exit_days: float = None, retry_interval: float = None, max_workers: int = 2):
+        self.broker = broker
+        self.risk = risk
+        self.stop_loss_percent = stop_loss_percent or Config.STOP_LOSS_PERCENT
+        self.profit_target_percent = Config.PROFIT_TARGET_PERCENT if profit_target_percent is None else profit_target_percent
+        self.exit_days = Config.EXIT_DAYS_TO_EXPIRY if exit_days is None else exit_days
+        self.retry_interval = Config.EXIT_RETRY_INTERVAL if retry_interval is None else retry_interval
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='exit')
+
+        self._lock = threading.Lock()
+        self._legs: Dict[tuple, Dict] = {}  # (token, product) -> leg as armed
+        self._triggers: Dict[int, _Triggers] = {}
+        self._expiries: List[tuple] = []  # heap of (exit_at, key, quantity)
+        self._exits: Dict[tuple, List[Dict]] = {}  # key -> exits not yet done (working or backing off)
+        self._by_order: Dict[str, Dict] = {}  # order_id -> working exit
+        self.history = deque(maxlen=256)  # Fired exits, most recent last
+
+    def start(self, positions: Optional[List[Dict]] = None):
+        """Arm from the current book and follow its changes"""
+        self.risk.add_position_listener(self.rearm)
+        if positions is not None:
+            self.risk.sync(positions)
+        self.rearm()
+        return self
+
+    def _levels(self, leg: Dict):
+        average = leg['average_price']
+        if not average:
+            return None, None
+        stop = self.stop_loss_percent / 100
+        target = self.profit_target_percent / 100 if self.profit_target_percent else None
+        if leg['quantity'] < 0:
+            return average * (1 + stop), average * (1 - target) if target else None
+        return average * (1 - stop), average * (1 + target) if target else None
+
+    def rearm(self, tokens: Optional[Iterable[int]] = None):
+        """Rebuild levels for legs on the given tokens (all legs when None)"""
+        legs = self.risk.legs(tokens)
+        now = time.time()
+        with self._lock:
+            if tokens is None:
+                stale = set(self._legs)
+                touched = set(self._triggers) | {leg['token'] for leg in legs}
+            else:
+                touched = set(tokens)
+                stale = {key for key in self._legs if key[0] in touched}
+
+            current = {}
+            for leg in legs:
+                key = (leg['token'], leg['product'])
+                current[key] = leg
+                armed = self._legs.get(key)
+                if self.exit_days and leg['expiry_at'] and (armed is None or armed['quantity'] != leg['quantity']):
+                    heapq.heappush(self._expiries, (leg['expiry_at'] - self.exit_days * DAY_SECONDS, key,
+                                                    leg['quantity']))
+
+            for key in stale - set(current):
+                self._legs.pop(key, None)
+                self._drop_exit(key)
+            self._legs.update(current)
+
+            for token in touched:
+                above, below = [], []
+                for key, leg in self._legs.items():
+                    if key[0] != token:
+                        continue
+                    stop, target = self._levels(leg)
+                    if stop is None:
+                        continue
+                    short = leg['quantity'] < 0
+                    (above if short else below).append((stop, key, 'STOP_LOSS'))
+                    if target is not None:
+                        (below if short else above).append((target, key, 'PROFIT_TARGET'))
+                if above or below:
+                    self._triggers[token] = _Triggers(above, below)
+                else:
+                    self._triggers.pop(token, None)
+        self._check_expiries(now)
+
+    def _drop_exit(self, key: tuple):
+        for fired in self._exits.pop(key, ()):
+            if fired['order_id']:
+                self._by_order.pop(fired['order_id'], None)
+
+    def _backing_off(self, key: tuple) -> float:
+        """When the leg's last failed, rejected or cancelled exit may be retried; 0 if none is pending"""
+        return max((fired['retry_at'] for fired in self._exits.get(key, ())), default=0.0)
+
+    def on_ticks(self, ticks: List[Dict]):
+        """Ticker listener: fire exits for legs whose level the tick crossed"""
+        fired = []
+        with self._lock:
+            for tick in ticks:
+                triggers = self._triggers.get(tick['instrument_token'])
+                if triggers is None:
+                    continue
+                price = tick['last_price']
+                for level in triggers.above[:bisect_right(triggers.above_prices, price)]:
+                    fired.append((level, price))
+                for level in triggers.below[bisect_left(triggers.below_prices, price):]:
+                    fired.append((level, price))
+            fired = [self._claim(key, reason, threshold, price) for (threshold, key, reason), price in fired]
+        for exit_order in fired:
+            if exit_order is not None:
+                self.pool.submit(self._submit, exit_order)
+        self._check_expiries(time.time())
+
+    def _check_expiries(self, now: float):
+        if not self._expiries or self._expiries[0][0] > now:
+            return
+        due = []
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                _, key, quantity = heapq.heappop(self._expiries)
+                leg = self._legs.get(key)
+                # Entries for legs since closed or resized are skipped; the resize pushed its own
+                if leg is None or leg['quantity'] != quantity:
+                    continue
+                exit_order = self._claim(key, 'EXPIRY', None, leg['last_price'])
+                retry_at = self._backing_off(key)
+                if exit_order is None and retry_at > time.monotonic():
+                    # Still backing off from a failed exit; try again after it
+                    heapq.heappush(self._expiries, (now + retry_at - time.monotonic(), key, quantity))
+                due.append(exit_order)
+        for exit_order in due:
+            if exit_order is not None:
+                self.pool.submit(self._submit, exit_order)
+
+    def _requeue_expiry(self, exit_order: Dict, at: float):
+        """An expiry exit that did not go through is due again at `at` (caller holds the lock)"""
+        leg = self._legs.get(exit_order['key'])
+        if exit_order['reason'] == 'EXPIRY' and leg is not None:
+            heapq.heappush(self._expiries, (at, exit_order['key'], leg['quantity']))
+
+    def _claim(self, key: tuple, reason: str, threshold: Optional[float], price: float) -> Optional[Dict]:
+        """
+        Exit for the leg's quantity not yet covered by working exits (caller holds the lock)
+
+        None while a failed exit backs off or the working exits already
+        close the whole leg.
+        """
+        now = time.monotonic()
+        if now < self._backing_off(key):
+            return None
+        # Failed exits past their back-off are done with; working ones still count
+        exits = [fired for fired in self._exits.get(key, ()) if not fired['retry_at']]
+        leg = self._legs[key]
+        # Fills of a working exit are already in the leg (PortfolioRisk books them first)
+        pending = sum(fired['quantity'] - fired['filled'] for fired in exits)
+        quantity = abs(leg['quantity']) - pending
+        if quantity <= 0:
+            self._exits[key] = exits
+            return None
+        exit_order = {
+            'key': key,
+            'symbol': leg['symbol'],
+            'exchange': leg['exchange'],
+            'product': leg['product'],
+            'transaction_type': 'BUY' if leg['quantity'] < 0 else 'SELL',
+            'quantity': quantity,
+            'filled': 0,
+            'reason': reason,
+            'threshold': round(threshold, 2) if threshold is not None else None,
+            'trigger_price': price,
+            'triggered_at': time.time(),
+            'order_id': None,
+            'status': 'PENDING',
+            'retry_at': 0.0,
+        }
+        self._exits[key] = exits + [exit_order]
+        self.history.append(exit_order)
+        return exit_order
+
+    def _submit(self, exit_order: Dict):
+        started = time.perf_counter()
+        try:
+            order_id = self.broker.place_order(
+                symbol=exit_order['symbol'],
+                transaction_type=exit_order['transaction_type'],
+                quantity=exit_order['quantity'],
+                order_type='MARKET',
+                product=exit_order['product'],
+                reference_price=exit_order['trigger_price'],
+                tag='exit',
+                priority=PRIORITY_EXIT,
+                reduce_only=True
+            )
+        except OrderRejected as e:
+            logger.error(f"Exit for {exit_order['symbol']} rejected: {e}")
+            order_id = None
+        exit_order['submit_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+        with self._lock:
+            if order_id:
+                exit_order['order_id'] = str(order_id)
+                exit_order['status'] = 'OPEN'
+                self._by_order[str(order_id)] = exit_order
+                logger.info(f"{exit_order['reason']} exit {exit_order['symbol']} x{exit_order['quantity']} "
+                            f"at {exit_order['trigger_price']}: order {order_id}")
+            else:
+                # Leave the claim in place until the retry interval passes
+                exit_order['order_id'] = False
+                exit_order['status'] = 'FAILED'
+                exit_order['retry_at'] = time.monotonic() + self.retry_interval
+                self._requeue_expiry(exit_order, time.time() + self.retry_interval)
+
+    def on_order_update(self, order: Dict):
+        """Order listener: track an exit's fills; a rejected or cancelled one is retried after the back-off"""
+        order_id = str(order.get('order_id') or '')
+        status = order.get('status')
+        with self._lock:
+            exit_order = self._by_order.get(order_id)
+            if exit_order is None:
+                return
+            exit_order['status'] = status
+            exit_order['filled'] = max(exit_order['filled'], int(order.get('filled_quantity') or 0))
+            if status not in TERMINAL_STATUSES:
+                return
+            self._by_order.pop(order_id, None)
+            exits = self._exits.get(exit_order['key'], [])
+            if status == 'COMPLETE':
+                if exit_order in exits:
+                    exits.remove(exit_order)
+            else:
+                # Its unfilled quantity is free again, but not before the back-off
+                # (a broker that keeps rejecting must not get an order per tick)
+                exit_order['retry_at'] = time.monotonic() + self.retry_interval
+                self._requeue_expiry(exit_order, time.time() + self.retry_interval)
+
+    def status(self) -> Dict:
+        """Armed levels per leg and recent exits"""
+        with self._lock:
+            armed = []
+            for key, leg in self._legs.items():
+                stop, target = self._levels(leg)
+                armed.append({
+                    'symbol': leg['symbol'],
+                    'product': leg['product'],
+                    'quantity': leg['quantity'],
+                    'average_price': round(leg['average_price'], 2),
+                    'stop_price': round(stop, 2) if stop is not None else None,
+                    'target_price': round(target, 2) if target is not None else None,
+                    'exit_at': (leg['expiry_at'] - self.exit_days * DAY_SECONDS
+                                if self.exit_days and leg['expiry_at'] else None),
+                    'exiting': any(not fired['retry_at'] for fired in self._exits.get(key, ())),
+                })
+            return {
+                'stop_loss_percent': self.stop_loss_percent,
+                'profit_target_percent': self.profit_target_percent,
+                'exit_days_to_expiry': self.exit_days,
+                'armed': armed,
+                'exits': [{name: value for name, value in exit_order.items() if name not in ('key', 'retry_at')}
+                          for exit_order in reversed(self.history)],
+            }
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INSTRUMENT_TYPES = ('FUT', 'CE', 'PE')
+COLUMNS = ('token', 'tradingsymbol', 'name', 'expiry', 'strike', 'type', 'lot_size', 'tick_size')
+
+
+def _to_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+class InstrumentStore:
+    """
+    Daily instrument master cached as memory-mapped NumPy columns
+
+    The broker's NFO dump is downloaded at most once per day into
+    <directory>/<YYYY-MM-DD>/*.npy; later starts memory-map those files
+    instead of downloading and parsing again. Lookups by
+    (underlying, expiry, strike, type) and expiry/strike listings are
+    served from in-memory indexes. If a day's download fails, the last
+    master keeps serving and the download is retried every retry_interval
+    seconds rather than on every lookup.
+    """
+
+    def __init__(self, directory: str, exchange: str = 'NFO', retry_interval: float = 60.0):
+        self.directory = directory
+        self.exchange = exchange
+        self.retry_interval = retry_interval
+        self.loaded_for: Optional[date] = None
+        self.columns: Dict[str, np.ndarray] = {}
+        self.names: List[str] = []
+
+        self._lock = threading.Lock()
+        self._broker = None
+        self._retry_at = 0.0  # monotonic time of the next download attempt after a failure
+        self._contracts: Dict[tuple, int] = {}
+        self._expiries: Dict[str, List[date]] = {}
+        self._strikes: Dict[tuple, np.ndarray] = {}
+        self._name_codes: Dict[str, int] = {}
+        self._tokens: Dict[int, int] = {}
+        self._symbols: Dict[bytes, int] = {}
+
+    def load(self, broker=None, today: Optional[date] = None) -> bool:
+        """Load today's master from disk, downloading it first if needed"""
+        today = today or date.today()
+        if broker is not None:
+            self._broker = broker
+
+        with self._lock:
+            path = os.path.join(self.directory, today.isoformat())
+            if not os.path.exists(os.path.join(path, 'names.json')):
+                if self._broker is None:
+                    return False
+                instruments = self._broker.get_instruments(self.exchange)
+                if not instruments:
+                    logger.error("Instrument master download failed")
+                    return False
+                self._write(path, instruments)
+                self._prune(keep=today.isoformat())
+
+            self._read(path)
+            self._build_indexes()
+            self.loaded_for = today
+            logger.info(f"Loaded {len(self.columns['token'])} {self.exchange} instruments for {today}")
+            return True
+
+    def _ensure_current(self):
+        if self.loaded_for == date.today() or self._broker is None or time.monotonic() < self._retry_at:
+            return
+        # Set before the attempt, so lookups racing a failing download don't each retry it
+        self._retry_at = time.monotonic() + self.retry_interval
+        try:
+            loaded = self.load()
+        except Exception as e:
+            logger.error(f"Instrument master reload failed: {e}")
+            loaded = False
+        if loaded:
+            self._retry_at = 0.0
+        else:
+            logger.warning(f"Serving the {self.loaded_for} instrument master until a reload succeeds")
+
+    def _write(self, path: str, instruments: List[Dict]):
+        rows = [i for i in instruments if i.get('instrument_type') in INSTRUMENT_TYPES]
+        names = sorted({i['name'] for i in rows})
+        name_codes = {name: code for code, name in enumerate(names)}
+        width = max([len(i['tradingsymbol']) for i in rows] + [1])
+
+        columns = {
+            'token': np.array([i['instrument_token'] for i in rows], dtype=np.int64),
+            'tradingsymbol': np.array([i['tradingsymbol'] for i in rows], dtype=f'S{width}'),
+            'name': np.array([name_codes[i['name']] for i in rows], dtype=np.int32),
+            'expiry': np.array([_to_date(i.get('expiry')) or date.max for i in rows], dtype='datetime64[D]'),
+            'strike': np.array([i.get('strike') or 0 for i in rows], dtype=np.float64),
+            'type': np.array([INSTRUMENT_TYPES.index(i['instrument_type']) for i in rows], dtype=np.int8),
+            'lot_size': np.array([i.get('lot_size') or 0 for i in rows], dtype=np.int32),
+            'tick_size': np.array([i.get('tick_size') or 0 for i in rows], dtype=np.float64),
+        }
+
+        # Write into a temp dir and rename so readers never see a partial master
+        tmp = f'{path}.tmp'
+        os.makedirs(tmp, exist_ok=True)
+        for column, values in columns.items():
+            np.save(os.path.join(tmp, f'{column}.npy'), values)
+        with open(os.path.join(tmp, 'names.json'), 'w') as f:
+            json.dump(names, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    def _read(self, path: str):
+        self.columns = {column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+                        for column in COLUMNS}
+        with open(os.path.join(path, 'names.json')) as f:
+            self.names = json.load(f)
+
+    def _prune(self, keep: str):
+        for entry in os.listdir(self.directory):
+            if entry != keep:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def _build_indexes(self):
+        name = np.asarray(self.columns['name'])
+        expiry = np.asarray(self.columns['expiry'])
+        strike = np.asarray(self.columns['strike'])
+        kind = np.asarray(self.columns['type'])
+
+        contracts = {}
+        for row, key in enumerate(zip(name.tolist(), expiry.tolist(), strike.tolist(), kind.tolist())):
+            contracts[key] = row
+        tokens = {token: row for row, token in enumerate(np.asarray(self.columns['token']).tolist())}
+        symbols = {symbol: row for row, symbol in enumerate(np.asarray(self.columns['tradingsymbol']).tolist())}
+
+        # Sort option rows by (underlying, expiry, strike) once, then slice groups
+        options = np.flatnonzero(kind > 0)
+        order = options[np.lexsort((strike[options], expiry[options], name[options]))]
+        group_name, group_expiry = name[order], expiry[order]
+        starts = np.flatnonzero(np.r_[True, (group_name[1:] != group_name[:-1]) |
+                                      (group_expiry[1:] != group_expiry[:-1])])
+        ends = np.r_[starts[1:], len(order)]
+
+        expiries: Dict[str, List[date]] = {}
+        strikes: Dict[tuple, np.ndarray] = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            underlying = self.names[group_name[start]]
+            listed = group_expiry[start].item()
+            expiries.setdefault(underlying, []).append(listed)
+            strikes[(underlying, listed)] = np.unique(strike[order[start:end]])
+
+        self._contracts = contracts
+        self._tokens = tokens
+        self._symbols = symbols
+        self._expiries = expiries
+        self._strikes = strikes
+        self._name_codes = {n: code for code, n in enumerate(self.names)}
+
+    @property
+    def available(self) -> bool:
+        return self.loaded_for is not None
+
+    def expiries(self, underlying: str) -> List[date]:
+        """Listed option expiries, ascending"""
+        self._ensure_current()
+        return self._expiries.get(underlying, [])
+
+    def strikes(self, underlying: str, expiry: date) -> np.ndarray:
+        """Listed strikes for one expiry, ascending"""
+        self._ensure_current()
+        return self._strikes.get((underlying, expiry), np.empty(0))
+
+    def find(self, underlying: str, expiry: date, strike: float, option_type: str) -> Optional[Dict]:
+        """token/tradingsymbol/lot_size for one contract"""
+        self._ensure_current()
+        code = self._name_codes.get(underlying)
+        if code is None or option_type not in INSTRUMENT_TYPES:
+            return None
+
+        row = self._contracts.get((code, expiry, float(strike), INSTRUMENT_TYPES.index(option_type)))
+        if row is None:
+            return None
+
+        return {
+            'instrument_token': int(self.columns['token'][row]),
+            'tradingsymbol': self.columns['tradingsymbol'][row].decode(),
+            'lot_size': int(self.columns['lot_size'][row]),
+            'tick_size': float(self.columns['tick_size'][row]),
+        }
+
+    def by_token(self, token: int) -> Optional[Dict]:
+        """Underlying, expiry, strike and type of an instrument token"""
+        self._ensure_current()
+        return self._describe(self._tokens.get(int(token)))
+
+    def by_symbol(self, tradingsymbol: str) -> Optional[Dict]:
+        """Same as by_token, looked up by tradingsymbol"""
+        self._ensure_current()
+        return self._describe(self._symbols.get(tradingsymbol.encode()))
+
+    def _describe(self, row: Optional[int]) -> Optional[Dict]:
+        if row is None:
+            return None
+
+        expiry = self.columns['expiry'][row].item()
+        return {
+            'name': self.names[self.columns['name'][row]],
+            'tradingsymbol': self.columns['tradingsymbol'][row].decode(),
+            'expiry': None if expiry == date.max else expiry,
+            'strike': float(self.columns['strike'][row]),
+            'instrument_type': INSTRUMENT_TYPES[self.columns['type'][row]],
+            'lot_size': int(self.columns['lot_size'][row]),
+            'instrument_token': int(self.columns['token'][row]),
+        }
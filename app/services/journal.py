@@ -0,0 +1,457 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import (JSON, Column, Date, Float, Index, Integer, MetaData, String, Table, bindparam, case,
+                        create_engine, event, func, select)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+strategy_runs = Table(
+    'strategy_runs', metadata,
+    Column('run_id', String(32), primary_key=True),
+    Column('strategy', String(64), nullable=False),
+    Column('status', String(16)),
+    Column('params', JSON),
+    Column('result', JSON),
+    Column('started_at', Float, nullable=False),
+    Column('finished_at', Float),
+    Index('ix_strategy_runs_strategy_started', 'strategy', 'started_at'),
+)
+
+orders = Table(
+    'orders', metadata,
+    Column('order_id', String(32), primary_key=True),
+    Column('run_id', String(32), index=True),
+    Column('strategy', String(64)),
+    Column('tag', String(32)),
+    Column('symbol', String(64)),
+    Column('exchange', String(8)),
+    Column('product', String(8)),
+    Column('transaction_type', String(4)),
+    Column('order_type', String(8)),
+    Column('quantity', Integer),
+    Column('price', Float),
+    Column('status', String(16)),
+    Column('filled_quantity', Integer, default=0),
+    Column('average_price', Float),
+    Column('placed_at', Float),
+    Column('updated_at', Float, index=True),
+)
+
+order_events = Table(
+    'order_events', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('order_id', String(32), nullable=False, index=True),
+    Column('status', String(16)),
+    Column('filled_quantity', Integer),
+    Column('average_price', Float),
+    Column('message', String(255)),
+    Column('timestamp', Float, nullable=False),
+)
+
+# One row per fill increment; realized_pnl is booked on fills that reduce a position
+fills = Table(
+    'fills', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('order_id', String(32), nullable=False, index=True),
+    Column('run_id', String(32)),
+    Column('strategy', String(64), nullable=False),
+    Column('symbol', String(64), nullable=False),
+    Column('transaction_type', String(4), nullable=False),
+    Column('quantity', Integer, nullable=False),
+    Column('price', Float, nullable=False),
+    Column('realized_pnl', Float, nullable=False, default=0.0),
+    Column('timestamp', Float, nullable=False),
+    Column('trading_day', Date, nullable=False),
+    Index('ix_fills_day_strategy', 'trading_day', 'strategy'),
+    Index('ix_fills_strategy_day', 'strategy', 'trading_day'),
+    Index('ix_fills_symbol', 'symbol', 'id'),
+)
+
+# Running totals per trading day and strategy, kept by the writer so P&L ranges read a few rows
+daily_pnl = Table(
+    'daily_pnl', metadata,
+    Column('trading_day', Date, primary_key=True),
+    Column('strategy', String(64), primary_key=True),
+    Column('realized_pnl', Float, nullable=False),
+    Column('fills', Integer, nullable=False),
+    Column('turnover', Float, nullable=False),
+    Index('ix_daily_pnl_strategy_day', 'strategy', 'trading_day'),
+)
+
+# Orders without a strategy run (manual, exits) book P&L to the position's strategy, else this
+MANUAL = 'manual'
+
+
+def _upsert(engine):
+    """Dialect insert with ON CONFLICT support (SQLite and PostgreSQL)"""
+    return postgresql.insert if engine.dialect.name == 'postgresql' else sqlite.insert
+
+
+class TradeJournal:
+    """
+    Durable record of strategy runs, orders, status transitions and fills
+
+    Callers on the order path (run_started, order_placed, on_order_update,
+    run_finished) only enqueue; a background thread applies events in
+    order, keeps the in-memory state (orders seen, fills booked per order,
+    net position and average price per symbol) and writes each batch in
+    one transaction. Fills carry realized P&L and the strategy the position
+    was opened by; the same transaction adds them to daily_pnl, one row per
+    trading day and strategy, which is what pnl() ranges read.
+    Events are dropped (and counted) if the queue is full. A batch whose
+    transaction fails (a locked SQLite file, a lost connection) is retried
+    with backoff until it commits: its fills are already booked in memory,
+    so dropping it would lose them for good.
+    """
+
+    def __init__(self, url: str, batch_size: int = 500, flush_interval: float = 0.5,
+                 queue_size: int = 100000, max_retry_delay: float = 5.0):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.written = 0
+        self.dropped = 0
+        self.write_retries = 0
+
+        if url.startswith('sqlite:///'):
+            os.makedirs(os.path.dirname(os.path.abspath(url[len('sqlite:///'):])), exist_ok=True)
+        self.engine = create_engine(url, connect_args={'check_same_thread': False} if url.startswith('sqlite') else {})
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', self._sqlite_pragmas)
+        try:
+            metadata.create_all(self.engine)
+        except OperationalError:
+            # Another worker created the tables between the check and the CREATE
+            metadata.create_all(self.engine)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._stopping = False
+        self._runs: Dict[str, str] = {}  # run_id -> strategy
+        # order_id -> row as last written; its filled_quantity/average_price are the fills booked
+        self._orders: OrderedDict = OrderedDict()
+        self._positions: Dict[str, List] = {}  # symbol -> [net quantity, average price, strategy]
+        self._idle = threading.Event()
+        self._idle.set()
+
+    @staticmethod
+    def _sqlite_pragmas(connection, _):
+        # WAL lets API reads run while the writer commits
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    def start(self):
+        if self._thread is None:
+            self._load()
+            self._thread = threading.Thread(target=self._run, name='trade-journal', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Write everything queued, then stop the writer"""
+        if self._thread is not None:
+            self._stopping = True
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            self._stopping = False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until events queued so far are written"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._queue.empty() and self._idle.is_set():
+                return True
+            time.sleep(0.005)
+        return False
+
+    def _load(self):
+        """Rebuild open positions and recent orders so fills stay idempotent across restarts"""
+        since = time.time() - 3 * 24 * 3600
+        with self.engine.connect() as connection:
+            for row in connection.execute(select(orders).where(orders.c.updated_at >= since)).mappings():
+                order = dict(row)
+                self._orders[order['order_id']] = order
+                if order['run_id'] and order['strategy']:
+                    self._runs[order['run_id']] = order['strategy']
+
+            signed = func.sum(case((fills.c.transaction_type == 'BUY', fills.c.quantity), else_=-fills.c.quantity))
+            open_symbols = [symbol for symbol, net in connection.execute(
+                select(fills.c.symbol, signed).group_by(fills.c.symbol)) if net]
+            if open_symbols:
+                replay = select(fills.c.symbol, fills.c.transaction_type, fills.c.quantity, fills.c.price,
+                                fills.c.strategy).where(fills.c.symbol.in_(open_symbols)).order_by(fills.c.id)
+                for symbol, side, quantity, price, strategy in connection.execute(replay):
+                    self._book_position(symbol, quantity if side == 'BUY' else -quantity, price, strategy)
+
+    def _put(self, event_type: str, payload: Dict):
+        try:
+            self._queue.put_nowait((event_type, time.time(), payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def run_started(self, run_id: str, strategy: str, params: Optional[Dict] = None):
+        self._put('run_started', {'run_id': run_id, 'strategy': strategy, 'params': params or {}})
+
+    def run_finished(self, run_id: str, status: str, result: Optional[Dict] = None):
+        self._put('run_finished', {'run_id': run_id, 'status': status, 'result': result or {}})
+
+    def order_placed(self, order_id: str, symbol: str, transaction_type: str, quantity: int,
+                     price: Optional[float] = None, order_type: str = None, product: str = None,
+                     exchange: str = 'NFO', tag: Optional[str] = None):
+        self._put('order_placed', {
+            'order_id': str(order_id), 'symbol': symbol, 'transaction_type': transaction_type,
+            'quantity': quantity, 'price': price, 'order_type': order_type, 'product': product,
+            'exchange': exchange, 'tag': tag,
+        })
+
+    def on_order_update(self, order: Dict):
+        """Order listener (ticker feed or polled history); repeats are ignored when applied"""
+        if order.get('order_id'):
+            self._put('order_update', dict(order))
+
+    def _book_position(self, symbol: str, signed: int, price: float, strategy: str) -> tuple:
+        """Apply a fill to the symbol's net position; (realized P&L, strategy to book it to)"""
+        position = self._positions.setdefault(symbol, [0, 0.0, strategy])
+        held, average, opened_by = position
+        realized = 0.0
+        after = held + signed
+        if held == 0 or held * signed > 0:
+            position[1] = (abs(held) * average + abs(signed) * price) / abs(after)
+            if held == 0:
+                position[2] = opened_by = strategy
+        else:
+            closed = min(abs(signed), abs(held))
+            # Long closed by a sale gains price - average; a short closed by a purchase the reverse
+            realized = closed * (price - average) * (1 if held > 0 else -1)
+            if held * after < 0:
+                position[1], position[2] = price, strategy
+            elif after == 0:
+                position[1] = 0.0
+        position[0] = after
+        if after == 0:
+            del self._positions[symbol]
+        # Closing fills without a strategy of their own (exits, manual) belong to the opener
+        return realized, (strategy if strategy != MANUAL or not realized else opened_by)
+
+    def _apply(self, event_type: str, timestamp: float, payload: Dict, batch: Dict):
+        if event_type == 'run_started':
+            self._runs[payload['run_id']] = payload['strategy']
+            batch['runs'][payload['run_id']] = {**payload, 'status': 'RUNNING', 'result': None,
+                                                'started_at': timestamp, 'finished_at': None}
+            return
+        if event_type == 'run_finished':
+            run = batch['runs'].get(payload['run_id'])
+            if run is not None:
+                run.update(status=payload['status'], result=payload['result'], finished_at=timestamp)
+            else:
+                batch['run_updates'].append({'b_run_id': payload['run_id'], 'status': payload['status'],
+                                             'result': payload['result'], 'finished_at': timestamp})
+            return
+
+        order_id = str(payload['order_id'])
+        order = self._orders.get(order_id)
+        if order is not None:
+            self._orders.move_to_end(order_id)
+        else:
+            order = self._orders[order_id] = {
+                'order_id': order_id, 'run_id': None, 'strategy': None, 'tag': None, 'symbol': None,
+                'exchange': None, 'product': None, 'transaction_type': None, 'order_type': None,
+                'quantity': None, 'price': None, 'status': None, 'filled_quantity': 0, 'average_price': None,
+                'placed_at': None, 'updated_at': timestamp,
+            }
+        order['updated_at'] = timestamp
+
+        if event_type == 'order_placed':
+            tag = payload['tag']
+            order.update({key: value for key, value in payload.items() if value is not None and key != 'order_id'})
+            order['placed_at'] = timestamp
+            order['status'] = order['status'] or 'PLACED'
+            if tag in self._runs:
+                order['run_id'], order['strategy'] = tag, self._runs[tag]
+            batch['orders'][order_id] = order
+            return
+
+        # Order update: fields from the broker fill any gaps left by placement
+        for key, source in (('symbol', 'tradingsymbol'), ('exchange', 'exchange'), ('product', 'product'),
+                            ('transaction_type', 'transaction_type'), ('order_type', 'order_type'),
+                            ('quantity', 'quantity'), ('price', 'price')):
+            if order[key] is None and payload.get(source) is not None:
+                order[key] = payload[source]
+        if order['tag'] is None and payload.get('tag'):
+            order['tag'] = payload['tag']
+            if order['tag'] in self._runs:
+                order['run_id'], order['strategy'] = order['tag'], self._runs[order['tag']]
+
+        status = payload.get('status')
+        filled = int(payload.get('filled_quantity') or 0)
+        average = float(payload.get('average_price') or 0)
+        changed = (status, filled) != (order['status'], order['filled_quantity'])
+        if changed:
+            batch['events'].append({'order_id': order_id, 'status': status, 'filled_quantity': filled,
+                                    'average_price': average or None,
+                                    'message': (payload.get('status_message') or '')[:255] or None,
+                                    'timestamp': timestamp})
+        order['status'] = status or order['status']
+
+        booked, booked_price = order['filled_quantity'] or 0, order['average_price'] or 0.0
+        if filled > booked and average and order['symbol'] and order['transaction_type']:
+            # average_price covers every fill so far; back out this increment's price
+            price = (average * filled - booked_price * booked) / (filled - booked)
+            increment = filled - booked
+            signed = increment if order['transaction_type'] == 'BUY' else -increment
+            realized, strategy = self._book_position(order['symbol'], signed, price, order['strategy'] or MANUAL)
+            batch['fills'].append({
+                'order_id': order_id, 'run_id': order['run_id'], 'strategy': strategy,
+                'symbol': order['symbol'], 'transaction_type': order['transaction_type'],
+                'quantity': increment, 'price': price, 'realized_pnl': realized,
+                'timestamp': timestamp, 'trading_day': datetime.fromtimestamp(timestamp).date(),
+            })
+            order['filled_quantity'], order['average_price'] = filled, average
+        if changed:
+            batch['orders'][order_id] = order
+
+        while len(self._orders) > 10000:
+            self._orders.popitem(last=False)
+
+    def _write(self, batch: Dict):
+        upsert = _upsert(self.engine)
+        with self.engine.begin() as connection:
+            if batch['runs']:
+                statement = upsert(strategy_runs)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=['run_id'],
+                    set_={name: statement.excluded[name] for name in ('status', 'result', 'finished_at')}),
+                    list(batch['runs'].values()))
+            if batch['run_updates']:
+                connection.execute(strategy_runs.update().where(strategy_runs.c.run_id == bindparam('b_run_id')),
+                                   batch['run_updates'])
+            if batch['orders']:
+                statement = upsert(orders)
+                # Metadata only fills gaps, so an update row never erases what placement wrote
+                keep = ('run_id', 'strategy', 'tag', 'symbol', 'exchange', 'product', 'transaction_type',
+                        'order_type', 'quantity', 'price', 'placed_at')
+                set_ = {name: func.coalesce(statement.excluded[name], orders.c[name]) for name in keep}
+                set_.update({name: statement.excluded[name]
+                             for name in ('status', 'filled_quantity', 'average_price', 'updated_at')})
+                connection.execute(statement.on_conflict_do_update(index_elements=['order_id'], set_=set_),
+                                   [dict(order) for order in batch['orders'].values()])
+            if batch['events']:
+                connection.execute(order_events.insert(), batch['events'])
+            if batch['fills']:
+                connection.execute(fills.insert(), batch['fills'])
+                totals = {}
+                for fill in batch['fills']:
+                    total = totals.setdefault((fill['trading_day'], fill['strategy']), {
+                        'trading_day': fill['trading_day'], 'strategy': fill['strategy'],
+                        'realized_pnl': 0.0, 'fills': 0, 'turnover': 0.0})
+                    total['realized_pnl'] += fill['realized_pnl']
+                    total['fills'] += 1
+                    total['turnover'] += fill['quantity'] * fill['price']
+                statement = upsert(daily_pnl)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=['trading_day', 'strategy'],
+                    set_={name: daily_pnl.c[name] + statement.excluded[name]
+                          for name in ('realized_pnl', 'fills', 'turnover')}),
+                    list(totals.values()))
+        self.written += sum(len(batch[key]) for key in ('runs', 'orders', 'events', 'fills'))
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._idle.clear()
+
+            # Take whatever else is queued, up to a batch, without waiting
+            items = [item]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = {'runs': {}, 'run_updates': [], 'orders': {}, 'events': [], 'fills': []}
+            for item in items:
+                if item is None:
+                    stopping = True
+                    continue
+                try:
+                    self._apply(*item, batch)
+                except Exception as e:
+                    logger.error(f"Journal event {item[0]} failed: {e}")
+            self._commit(batch)
+            self._idle.set()
+
+    def _commit(self, batch: Dict):
+        """_write until it commits; each attempt is one transaction, so a retry never doubles rows"""
+        delay = 0.1
+        attempts = 0
+        while True:
+            try:
+                self._write(batch)
+                return
+            except Exception as e:
+                attempts += 1
+                if self._stopping and attempts >= 3:
+                    rows = sum(len(batch[key]) for key in ('runs', 'run_updates', 'orders', 'events', 'fills'))
+                    logger.error(f"Journal write failed at shutdown, {rows} rows lost: {e}")
+                    return
+                self.write_retries += 1
+                logger.error(f"Journal write failed (attempt {attempts}), retrying in {delay:g}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def pnl(self, start: Optional[date] = None, end: Optional[date] = None,
+            strategy: Optional[str] = None) -> Dict:
+        """Realized P&L between two trading days (inclusive, default the last 30), by day and by strategy"""
+        end = end or date.today()
+        start = start or end - timedelta(days=30)
+        conditions = [daily_pnl.c.trading_day >= start, daily_pnl.c.trading_day <= end]
+        if strategy:
+            conditions.append(daily_pnl.c.strategy == strategy)
+        totals = (func.sum(daily_pnl.c.realized_pnl), func.sum(daily_pnl.c.fills), func.sum(daily_pnl.c.turnover))
+
+        with self.engine.connect() as connection:
+            by_day = connection.execute(
+                select(daily_pnl.c.trading_day, *totals).where(*conditions)
+                .group_by(daily_pnl.c.trading_day).order_by(daily_pnl.c.trading_day)).all()
+            by_strategy = connection.execute(
+                select(daily_pnl.c.strategy, *totals).where(*conditions)
+                .group_by(daily_pnl.c.strategy).order_by(daily_pnl.c.strategy)).all()
+            runs = connection.execute(
+                select(func.count()).select_from(strategy_runs).where(
+                    strategy_runs.c.started_at >= datetime.combine(start, datetime.min.time()).timestamp(),
+                    strategy_runs.c.started_at < datetime.combine(end + timedelta(days=1),
+                                                                  datetime.min.time()).timestamp(),
+                    *([strategy_runs.c.strategy == strategy] if strategy else []))).scalar()
+
+        def rows(grouped, key):
+            return [{key: value.isoformat() if isinstance(value, date) else value,
+                     'realized_pnl': round(pnl or 0.0, 2), 'fills': count, 'turnover': round(traded or 0.0, 2)}
+                    for value, pnl, count, traded in grouped]
+
+        return {
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'realized_pnl': round(sum(pnl or 0.0 for _, pnl, _, _ in by_day), 2),
+            'strategy_runs': runs,
+            'by_day': rows(by_day, 'day'),
+            'by_strategy': rows(by_strategy, 'strategy'),
+        }
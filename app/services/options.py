@@ -1,18 +1,43 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
+from app.config import Config
+from app.services.chain import IV, LTP, OptionsChain
+from app.services.selection import StrikeSelector
+from app.services.surface import VolatilitySurface
+from app.utils.greeks import GreeksCalculator
+from app.utils.metrics import metrics
 import pandas as pd
 import numpy as np
 
 class OptionsChainService:
     """Handle NIFTY options chain data and analysis"""
     
-    def __init__(self, broker_service):
+    def __init__(self, broker_service, instruments=None):
         self.broker = broker_service
+        # Daily instrument master; without it expiries/strikes are guessed
+        self.instruments = instruments
+        # Optional ChainRecorder that persists every chain built
+        self.recorder = None
+        # Latest chain per expiry: streamed ticks land in it, and its IVs
+        # warm-start the next refresh
+        self.chains: Dict[str, OptionsChain] = {}
+        # Smoothed IV over moneyness x expiry, refitted per expiry as chains change
+        self.surface = VolatilitySurface()
+        # Scores strikes across expiries and sizes legs under a budget
+        self.selector = StrikeSelector(self.surface)
         
     def get_nifty_expiries(self, 
                           min_days: int = 30, 
                           max_days: int = 45) -> List[str]:
         """Get NIFTY expiry dates within target range"""
+        if self.instruments is not None and self.instruments.available:
+            today = datetime.now().date()
+            return [
+                expiry.strftime('%d%b%y').upper()
+                for expiry in self.instruments.expiries('NIFTY')
+                if min_days <= (expiry - today).days <= max_days
+            ]
+        
         # NIFTY weekly expiries are on Thursdays
         today = datetime.now()
         expiries = []
@@ -33,79 +58,222 @@ class OptionsChainService:
         
         return expiries
     
-    def get_options_chain(self, expiry: str) -> pd.DataFrame:
+    @metrics.timed('options.get_options_chain')
+    def get_options_chain(self, expiry: str) -> OptionsChain:
         """Fetch complete options chain for given expiry"""
+        return self.get_options_chains([expiry]).get(expiry) or OptionsChain(expiry, np.nan, [], ([], []))
+    
+    @metrics.timed('options.get_options_chains')
+    def get_options_chains(self, expiries: Optional[List[str]] = None) -> Dict[str, OptionsChain]:
+        """
+        Fetch chains for several expiries (default: every listed expiry up
+        to SURFACE_MAX_DAYS) in one pipelined pass
+        
+        One spot quote, then every contract of every expiry goes through a
+        single get_quotes call, which batches and fetches the chunks
+        concurrently; each chain's IVs are solved and its surface slice
+        refitted.
+        """
+        if expiries is None:
+            expiries = self.get_nifty_expiries(min_days=0, max_days=Config.SURFACE_MAX_DAYS)
+        
         # Get NIFTY spot price
         spot_data = self.broker.get_quote('NIFTY 50', 'NSE')
-        if not spot_data:
-            return pd.DataFrame()
+        if not spot_data or not expiries:
+            return {}
         
         spot_price = spot_data['last_price']
         
-        # Generate strike range (±10% from spot)
-        strikes = self._generate_strikes(spot_price)
+        # Strike range (±10% from spot) and tradingsymbols per expiry
+        symbols = {}
+        for expiry in expiries:
+            pairs = {
+                strike: (self.option_symbol(expiry, strike, 'CE'),
+                         self.option_symbol(expiry, strike, 'PE'))
+                for strike in self._generate_strikes(spot_price, expiry=expiry)
+            }
+            symbols[expiry] = {strike: pair for strike, pair in pairs.items() if all(pair)}
         
-        chain_data = []
+        # Quote everything in a few bulk calls instead of two per strike
+        quotes = self.broker.get_quotes(
+            [symbol for pairs in symbols.values() for pair in pairs.values() for symbol in pair]
+        )
         
-        for strike in strikes:
-            # Fetch CE (Call) data
-            ce_symbol = f"NIFTY{expiry}{strike}CE"
-            ce_data = self.broker.get_quote(ce_symbol)
+        chains = {}
+        for expiry, pairs in symbols.items():
+            with metrics.span('options.build_chain'):
+                chain = OptionsChain.from_quotes(
+                    expiry, spot_price, list(pairs),
+                    ([pair[0] for pair in pairs.values()], [pair[1] for pair in pairs.values()]),
+                    quotes
+                )
+            chain.spot_token = Config.NIFTY_INDEX_TOKEN
             
-            # Fetch PE (Put) data
-            pe_symbol = f"NIFTY{expiry}{strike}PE"
-            pe_data = self.broker.get_quote(pe_symbol)
-            
-            if ce_data and pe_data:
-                chain_data.append({
-                    'strike': strike,
-                    'ce_ltp': ce_data.get('last_price', 0),
-                    'ce_volume': ce_data.get('volume', 0),
-                    'ce_oi': ce_data.get('oi', 0),
-                    'ce_bid': ce_data.get('depth', {}).get('buy', [{}])[0].get('price', 0),
-                    'ce_ask': ce_data.get('depth', {}).get('sell', [{}])[0].get('price', 0),
-                    'pe_ltp': pe_data.get('last_price', 0),
-                    'pe_volume': pe_data.get('volume', 0),
-                    'pe_oi': pe_data.get('oi', 0),
-                    'pe_bid': pe_data.get('depth', {}).get('buy', [{}])[0].get('price', 0),
-                    'pe_ask': pe_data.get('depth', {}).get('sell', [{}])[0].get('price', 0)
-                })
-        
-        df = pd.DataFrame(chain_data)
-        df['spot_price'] = spot_price
-        df['expiry'] = expiry
-        
-        return df
+            chain = self.add_implied_volatility(chain, expiry)
+            self.chains[expiry] = chain
+            with metrics.span('options.surface_fit'):
+                self.surface.update(chain, self.time_to_expiry(expiry))
+            if self.recorder is not None:
+                self.recorder.record(chain)
+            chains[expiry] = chain
+        
+        return chains
+    
+    @metrics.timed('options.refresh_surface')
+    def refresh_surface(self, full: bool = False) -> VolatilitySurface:
+        """
+        Bring the volatility surface up to date
+        
+        Incremental by default: only expiries whose chains changed since
+        their slice was fitted (streamed ticks, a newer fetch) are re-solved
+        and refitted, with no broker calls. full=True, or an empty cache,
+        refetches every expiry. A refetch that fails keeps the last surface.
+        """
+        if full or not self.chains:
+            chains = self.get_options_chains()
+            # {} means the spot quote or the broker failed, not that nothing is listed
+            if chains:
+                self.surface.retain(chains)
+            return self.surface
+        
+        for expiry, chain in list(self.chains.items()):
+            if chain.timestamp > self.surface.updated(expiry):
+                self.add_implied_volatility(chain, expiry)
+                self.surface.update(chain, self.time_to_expiry(expiry))
+        return self.surface
+    
+    def on_ticks(self, ticks: List[Dict]):
+        """Ticker listener: update the latest chains in place"""
+        for chain in list(self.chains.values()):
+            chain.apply_ticks(ticks)
+    
+    @staticmethod
+    def _expiry_date(expiry: str):
+        return datetime.strptime(expiry, '%d%b%y').date()
+    
+    def _contract(self, expiry: str, strike: int, option_type: str) -> Optional[Dict]:
+        if self.instruments is None or not self.instruments.available:
+            return None
+        return self.instruments.find('NIFTY', self._expiry_date(expiry), strike, option_type)
+    
+    def option_symbol(self, expiry: str, strike: int, option_type: str) -> Optional[str]:
+        """Broker tradingsymbol for a NIFTY option (None if not listed)"""
+        if self.instruments is None or not self.instruments.available:
+            return f"NIFTY{expiry}{strike}{option_type}"
+        
+        contract = self._contract(expiry, strike, option_type)
+        return contract['tradingsymbol'] if contract else None
+    
+    def lot_size(self, expiry: str) -> int:
+        """Contract lot size for an expiry, from the instrument master"""
+        if self.instruments is not None and self.instruments.available:
+            listed = self.instruments.strikes('NIFTY', self._expiry_date(expiry))
+            if len(listed):
+                contract = self._contract(expiry, listed[0], 'PE') or self._contract(expiry, listed[0], 'CE')
+                if contract:
+                    return contract['lot_size']
+        return Config.NIFTY_LOT_SIZE
+    
+    @staticmethod
+    def time_to_expiry(expiry: str, now: Optional[datetime] = None) -> float:
+        """Years until 15:30 on the expiry day"""
+        now = now or datetime.now()
+        expiry_at = datetime.strptime(expiry, '%d%b%y').replace(hour=15, minute=30)
+        seconds = (expiry_at - now).total_seconds()
+        
+        return max(seconds, 60) / (365 * 24 * 3600)
+    
+    @metrics.timed('options.add_implied_volatility')
+    def add_implied_volatility(self, chain: OptionsChain, expiry: str) -> OptionsChain:
+        """Solve ce_iv/pe_iv for the whole chain from LTPs, in place"""
+        if chain.empty:
+            return chain
+        
+        rows = len(chain)
+        strikes = chain.strikes.astype(np.float64)
+        
+        previous = self.chains.get(expiry)
+        initial = None
+        if previous is not None:
+            # CE and PE sit side by side, so both sides reindex in one take
+            found = previous.rows(chain.strikes)
+            initial = np.where(found >= 0, previous.values[IV][:, found], np.nan).ravel()
+        
+        iv = GreeksCalculator.calculate_implied_volatility(
+            price=chain.values[LTP].ravel(),
+            S=chain.spot_price,
+            K=np.tile(strikes, 2),
+            T=self.time_to_expiry(expiry),
+            r=Config.RISK_FREE_RATE,
+            is_call=np.repeat([True, False], rows),
+            initial=initial
+        )
+        
+        chain.values[IV] = iv.reshape(2, rows)
+        
+        return chain
     
     def _generate_strikes(self, spot_price: float, 
-                         range_percent: float = 10) -> List[int]:
+                         range_percent: float = 10,
+                         expiry: Optional[str] = None) -> List[int]:
         """Generate option strikes around spot price"""
+        if expiry and self.instruments is not None and self.instruments.available:
+            listed = self.instruments.strikes('NIFTY', self._expiry_date(expiry))
+            lo = np.searchsorted(listed, spot_price * (1 - range_percent/100))
+            hi = np.searchsorted(listed, spot_price * (1 + range_percent/100), side='right')
+            return [int(strike) for strike in listed[lo:hi]]
+        
         # NIFTY strikes are in multiples of 50
         lower = int((spot_price * (1 - range_percent/100)) / 50) * 50
         upper = int((spot_price * (1 + range_percent/100)) / 50) * 50
         
         return list(range(lower, upper + 50, 50))
     
+    @metrics.timed('options.find_selling_candidates')
     def find_selling_candidates(self, 
-                               chain: pd.DataFrame,
+                               chain,
                                option_type: str = 'PE',
                                min_premium: float = 100) -> pd.DataFrame:
-        """Find best options to sell based on your strategy"""
-        
-        if option_type == 'PE':
-            # For Put selling - look for OTM puts with good premium
-            candidates = chain[chain['pe_ltp'] >= min_premium].copy()
-            candidates['premium'] = candidates['pe_ltp']
-            candidates['oi'] = candidates['pe_oi']
-            candidates['distance'] = chain['spot_price'] - candidates['strike']
-        else:
-            # For Call selling
-            candidates = chain[chain['ce_ltp'] >= min_premium].copy()
-            candidates['premium'] = candidates['ce_ltp']
-            candidates['oi'] = candidates['ce_oi']
-            candidates['distance'] = candidates['strike'] - chain['spot_price']
-        
-        # Sort by premium/risk ratio
-        candidates = candidates.sort_values('premium', ascending=False)
-        
-        return candidates[['strike', 'premium', 'oi', 'distance']]
\ No newline at end of file
+        """
+        Find best options to sell based on your strategy
+        
+        chain is an OptionsChain or a DataFrame with the same columns, or a
+        list of them to rank several expiries together. Every strike is
+        scored in one pass by StrikeSelector (probability of profit, premium
+        per margin, spread, liquidity, distance from spot) and the rows that
+        meet the SELECTION_* constraints come back best first.
+        """
+        chains = chain if isinstance(chain, (list, tuple)) else [chain]
+        times, lot_sizes = [], []
+        for item in chains:
+            expiry = item.expiry if isinstance(item, OptionsChain) else (
+                item['expiry'].iloc[0] if 'expiry' in item and len(item) else None)
+            times.append(self.time_to_expiry(expiry) if expiry else np.nan)
+            lot_sizes.append(self.lot_size(expiry) if expiry else Config.NIFTY_LOT_SIZE)
+        
+        return self.selector.score(chains, times, lot_sizes, option_type, min_premium)
+    
+    @metrics.timed('options.rank_strikes')
+    def rank_strikes(self, 
+                     option_type: str = 'PE',
+                     min_premium: float = 100,
+                     min_days: int = None,
+                     max_days: int = None,
+                     refresh: bool = False) -> pd.DataFrame:
+        """
+        Candidates across every expiry in the DTE window
+        
+        Scores the latest chains, which streamed ticks keep current, so it
+        is cheap enough to re-run per tick; expiries not cached yet (or all
+        of them with refresh=True) are fetched in one pipelined pass.
+        """
+        expiries = self.get_nifty_expiries(
+            min_days=Config.EXPIRY_DAYS_MIN if min_days is None else min_days,
+            max_days=Config.EXPIRY_DAYS_MAX if max_days is None else max_days
+        )
+        missing = expiries if refresh else [expiry for expiry in expiries if expiry not in self.chains]
+        if missing:
+            self.get_options_chains(missing)
+        
+        chains = [self.chains[expiry] for expiry in expiries if expiry in self.chains]
+        return self.find_selling_candidates(chains, option_type, min_premium)
\ No newline at end of file
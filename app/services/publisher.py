@@ -0,0 +1,174 @@
+import logging
+from typing import Dict, List, Optional
+
+from flask import request
+from flask_socketio import join_room, leave_room
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('positions', 'pnl', 'risk', 'holdings')
+ROW_CHANNELS = ('positions', 'holdings')
+
+
+def _position_key(position: Dict) -> str:
+    return f"{position.get('tradingsymbol')}:{position.get('product')}"
+
+
+def _holding_key(holding: Dict) -> str:
+    return f"{holding.get('exchange')}:{holding.get('tradingsymbol')}"
+
+
+def diff_fields(old: Optional[Dict], new: Dict) -> Dict:
+    """Top-level fields of new that differ from old"""
+    if old is None:
+        return dict(new)
+    return {key: value for key, value in new.items() if old.get(key) != value}
+
+
+def diff_rows(old: Optional[Dict[str, Dict]], new: Dict[str, Dict]):
+    """Per-row changed fields plus keys of rows that disappeared"""
+    old = old or {}
+    changed = {}
+    for key, row in new.items():
+        fields = diff_fields(old.get(key), row)
+        if fields:
+            changed[key] = fields
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class DashboardPublisher:
+    """
+    Push positions, P&L, risk and holdings to SocketIO rooms
+
+    One background task polls the broker once per interval regardless of
+    how many dashboards are open, and only changed fields are broadcast.
+    Clients emit 'subscribe' with a list of channels, receive a full
+    snapshot, then 'update' events with
+    {channel, full, data, removed}; row channels (positions, holdings)
+    carry {row_key: changed_fields} in data. The broker and strategy
+    services are looked up on the first publish, so the socket handlers
+    can be registered before they are built. Subscriptions are counted
+    per connection and channel (two widgets of one page may share a
+    socket), and the room is left only when the last one unsubscribes.
+
+    In a cluster (shared set to a ClusterState) only the leader polls. It
+    publishes every channel, since dashboards are spread over all workers
+    and the events reach them through the SocketIO message queue, and
+    stores each snapshot in Redis for any worker's new subscribers.
+    """
+
+    def __init__(self, socketio, services: Dict, interval: float = 3.0,
+                 holdings_interval: float = 10.0):
+        self.socketio = socketio
+        self.services = services
+        self.interval = interval
+        self.holdings_interval = holdings_interval
+
+        self.state: Dict[str, Dict] = {}
+        # channel -> {sid: subscription count}
+        self.subscribers: Dict[str, Dict[str, int]] = {channel: {} for channel in CHANNELS}
+        self.shared = None
+        self.leader = True  # Cluster followers never poll
+        self._task = None
+        self._generation = 0
+        self._since_holdings = holdings_interval
+
+    @property
+    def broker(self):
+        return self.services['broker']
+
+    @property
+    def strategy(self):
+        return self.services['strategy']
+
+    def register(self):
+        self.socketio.on_event('subscribe', self._on_subscribe)
+        self.socketio.on_event('unsubscribe', self._on_unsubscribe)
+        self.socketio.on_event('disconnect', self._on_disconnect)
+
+    def start(self):
+        if self._task is None and self.leader:
+            self._task = self.socketio.start_background_task(self._run, self._generation)
+
+    def stop(self):
+        """End the polling task after its current round"""
+        self._generation += 1
+        self._task = None
+
+    def _snapshot(self, channel: str) -> Optional[Dict]:
+        if self.shared is not None and not self.leader:
+            return self.shared.get(channel)
+        return self.state.get(channel)
+
+    def _channels(self, payload) -> List[str]:
+        requested = (payload or {}).get('channels', CHANNELS)
+        return [channel for channel in requested if channel in CHANNELS]
+
+    def _on_subscribe(self, payload=None):
+        for channel in self._channels(payload):
+            join_room(channel)
+            sids = self.subscribers[channel]
+            sids[request.sid] = sids.get(request.sid, 0) + 1
+            snapshot = self._snapshot(channel)
+            if snapshot is not None:
+                self.socketio.emit('update', self._message(channel, snapshot), to=request.sid)
+        self.start()
+
+    def _on_unsubscribe(self, payload=None):
+        for channel in self._channels(payload):
+            sids = self.subscribers[channel]
+            if request.sid not in sids:
+                continue
+            sids[request.sid] -= 1
+            if sids[request.sid] <= 0:
+                del sids[request.sid]
+                leave_room(channel)
+
+    def _on_disconnect(self, *args):
+        for sids in self.subscribers.values():
+            sids.pop(request.sid, None)
+
+    def _message(self, channel: str, data: Dict, removed: List[str] = None, full: bool = True) -> Dict:
+        return {'channel': channel, 'full': full, 'data': data, 'removed': removed or []}
+
+    def _publish(self, channel: str, new: Dict):
+        old = self.state.get(channel)
+        self.state[channel] = new
+        if self.shared is not None:
+            self.shared.put(channel, new, ttl=3 * max(self.interval, self.holdings_interval))
+
+        if channel in ROW_CHANNELS:
+            changed, removed = diff_rows(old, new)
+        else:
+            changed, removed = diff_fields(old, new), []
+
+        if changed or removed:
+            self.socketio.emit('update', self._message(channel, changed, removed, full=old is None),
+                               to=channel)
+
+    def publish_once(self):
+        """Poll the broker once and broadcast what changed"""
+        watching = {channel for channel, sids in self.subscribers.items() if sids}
+        if self.shared is not None:
+            watching = set(CHANNELS)
+
+        if watching & {'positions', 'pnl', 'risk'}:
+            positions = self.broker.get_positions()
+            self._publish('positions', {_position_key(p): p for p in positions})
+            self._publish('pnl', self.strategy.pnl_summary(positions))
+            self._publish('risk', self.strategy.monitor_positions(positions))
+
+        self._since_holdings += self.interval
+        if 'holdings' in watching and self._since_holdings >= self.holdings_interval:
+            self._since_holdings = 0
+            holdings = self.broker.get_holdings()
+            self._publish('holdings', {_holding_key(h): h for h in holdings})
+
+    def _run(self, generation: int):
+        while generation == self._generation:
+            try:
+                self.publish_once()
+            except Exception as e:
+                logger.error(f"Dashboard publish failed: {e}")
+            self.socketio.sleep(self.interval)
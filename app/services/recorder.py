@@ -0,0 +1,239 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.chain import OptionsChain
+
+logger = logging.getLogger(__name__)
+
+# Column -> on-disk dtype; prices are float32, symbols dictionary-encoded
+SCHEMA = {
+    'timestamp': np.int64,  # Epoch milliseconds
+    'strike': np.int32,
+    'spot_price': np.float32,
+    'ce_symbol': np.int32,
+    'ce_ltp': np.float32,
+    'ce_bid': np.float32,
+    'ce_ask': np.float32,
+    'ce_oi': np.int32,
+    'ce_volume': np.int64,
+    'pe_symbol': np.int32,
+    'pe_ltp': np.float32,
+    'pe_bid': np.float32,
+    'pe_ask': np.float32,
+    'pe_oi': np.int32,
+    'pe_volume': np.int64,
+}
+SYMBOL_COLUMNS = ('ce_symbol', 'pe_symbol')
+
+
+def partition_path(directory: str, expiry: str, day: str) -> str:
+    return os.path.join(directory, f'expiry={expiry}', f'date={day}')
+
+
+class _Partition:
+    """Open append handles and symbol dictionary for one expiry/date"""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.files = {column: open(os.path.join(path, f'{column}.bin'), 'ab') for column in SCHEMA}
+        self.symbols_file = open(os.path.join(path, 'symbols.txt'), 'a+')
+        self.symbols_file.seek(0)
+        self.codes = {line.rstrip('\n'): code for code, line in enumerate(self.symbols_file)}
+
+    def encode(self, symbols) -> np.ndarray:
+        codes = np.empty(len(symbols), dtype=np.int32)
+        for i, symbol in enumerate(symbols):
+            code = self.codes.get(symbol)
+            if code is None:
+                code = self.codes[symbol] = len(self.codes)
+                self.symbols_file.write(f'{symbol}\n')
+            codes[i] = code
+        return codes
+
+    def flush(self):
+        # Symbols first, so readers never see a code without its dictionary entry
+        self.symbols_file.flush()
+        for handle in self.files.values():
+            handle.flush()
+
+    def close(self):
+        self.flush()
+        self.symbols_file.close()
+        for handle in self.files.values():
+            handle.close()
+
+
+class ChainRecorder:
+    """
+    Append-only columnar recorder for options chain snapshots
+
+    record() only enqueues, so the request path never waits on disk; a
+    background thread appends each column to
+    <directory>/expiry=<EXPIRY>/date=<YYYY-MM-DD>/<column>.bin. Snapshots
+    are dropped (and counted) if the queue is full.
+    """
+
+    def __init__(self, directory: str, queue_size: int = 10000, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._partitions: Dict[tuple, _Partition] = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='chain-recorder', daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, chain, timestamp: Optional[float] = None):
+        """Queue a chain snapshot (OptionsChain or DataFrame) for writing; never blocks"""
+        if chain.empty:
+            return
+        if isinstance(chain, OptionsChain):
+            # Ticks update the live chain in place; keep the snapshot as it is now
+            chain = chain.copy()
+        try:
+            self._queue.put_nowait((timestamp or time.time(), chain))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Drain the queue and close every partition"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _partition(self, expiry: str, timestamp: float) -> _Partition:
+        day = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+        key = (expiry, day)
+        partition = self._partitions.get(key)
+        if partition is None:
+            # Snapshots arrive in time order, so earlier days are finished
+            for old_key in [k for k in self._partitions if k[0] == expiry]:
+                self._partitions.pop(old_key).close()
+            partition = self._partitions[key] = _Partition(partition_path(self.directory, expiry, day))
+        return partition
+
+    def _write(self, timestamp: float, chain):
+        expiry = chain.expiry if isinstance(chain, OptionsChain) else str(chain['expiry'].iloc[0])
+        partition = self._partition(expiry, timestamp)
+        rows = len(chain)
+
+        for column, dtype in SCHEMA.items():
+            if column == 'timestamp':
+                values = np.full(rows, int(timestamp * 1000), dtype=dtype)
+            elif column in SYMBOL_COLUMNS:
+                symbols = chain[column] if column in chain else [''] * rows
+                values = partition.encode(symbols)
+            else:
+                values = np.asarray(chain[column], dtype=dtype)
+            values.tofile(partition.files[column])
+
+        self.recorded += 1
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+
+            if item is None:
+                break
+            if item:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    logger.error(f"Chain snapshot write failed: {e}")
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                for partition in self._partitions.values():
+                    partition.flush()
+                last_flush = time.monotonic()
+
+        for partition in self._partitions.values():
+            partition.close()
+        self._partitions.clear()
+
+
+class ChainReader:
+    """Memory-mapped access to recorded chain snapshots"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def partitions(self, expiry: Optional[str] = None) -> List[tuple]:
+        """(expiry, date) pairs on disk, sorted"""
+        found = []
+        if not os.path.isdir(self.directory):
+            return found
+        for expiry_dir in sorted(os.listdir(self.directory)):
+            name = expiry_dir.split('=', 1)[-1]
+            if expiry and name != expiry:
+                continue
+            for date_dir in sorted(os.listdir(os.path.join(self.directory, expiry_dir))):
+                found.append((name, date_dir.split('=', 1)[-1]))
+        return found
+
+    def read_arrays(self, expiry: str, day: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Zero-copy memmaps of each column, trimmed to fully written rows"""
+        path = partition_path(self.directory, expiry, day)
+        columns = columns or list(SCHEMA)
+        sizes = {column: os.path.getsize(os.path.join(path, f'{column}.bin')) // np.dtype(dtype).itemsize
+                 for column, dtype in SCHEMA.items()}
+        rows = min(sizes.values())
+
+        arrays = {}
+        for column in columns:
+            if rows == 0:
+                arrays[column] = np.empty(0, dtype=SCHEMA[column])
+                continue
+            arrays[column] = np.memmap(os.path.join(path, f'{column}.bin'), dtype=SCHEMA[column],
+                                       mode='r', shape=(rows,))
+        return arrays
+
+    def symbols(self, expiry: str, day: str) -> np.ndarray:
+        with open(os.path.join(partition_path(self.directory, expiry, day), 'symbols.txt')) as f:
+            return np.array([line.rstrip('\n') for line in f], dtype=object)
+
+    def read_frame(self, expiry: str, day: str, start: Optional[float] = None,
+                   end: Optional[float] = None, decode_symbols: bool = False) -> pd.DataFrame:
+        """Rows between start/end (epoch seconds) as a DataFrame"""
+        arrays = self.read_arrays(expiry, day)
+        timestamps = arrays['timestamp']
+        lo = 0 if start is None else np.searchsorted(timestamps, int(start * 1000))
+        hi = len(timestamps) if end is None else np.searchsorted(timestamps, int(end * 1000), side='right')
+
+        frame = pd.DataFrame({column: values[lo:hi] for column, values in arrays.items()})
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'], unit='ms')
+        if decode_symbols:
+            dictionary = self.symbols(expiry, day)
+            for column in SYMBOL_COLUMNS:
+                frame[column] = dictionary[frame[column].to_numpy()]
+        frame['expiry'] = expiry
+        return frame
+
+    def snapshots(self, expiry: str, day: str) -> Iterator[pd.DataFrame]:
+        """Yield one chain DataFrame per recorded timestamp"""
+        frame = self.read_frame(expiry, day)
+        timestamps = frame['timestamp'].to_numpy()
+        if len(timestamps) == 0:
+            return
+        bounds = np.flatnonzero(np.r_[True, timestamps[1:] != timestamps[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            yield frame.iloc[lo:hi].reset_index(drop=True)
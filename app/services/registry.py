@@ -0,0 +1,123 @@
+"""
+Lazily built services
+
+create_app() registers one factory per service instead of logging in to
+the broker, downloading the instrument master and opening the journal and
+ticker before the first request. The registry replaces app.extensions, so
+routes keep reading current_app.extensions['options']: the first read
+builds the service (and whatever its factory reads in turn) once, under a
+lock, and later reads are plain dict lookups.
+
+warm() builds everything on a background thread. The heavy third-party
+imports run first on a native thread (offload), so under eventlet the hub
+keeps answering /api/health while pandas and SciPy load. A factory that
+raises is recorded and retried on the next read or warm().
+"""
+import importlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+from app.utils.green import offload
+
+logger = logging.getLogger(__name__)
+
+# Imported ahead of the factories that need them, off the green hub
+HEAVY_MODULES = ('numpy', 'pandas', 'scipy.special', 'scipy.stats', 'kiteconnect', 'sqlalchemy')
+
+
+class ServiceRegistry(dict):
+    """app.extensions with factories for entries that are built on first read"""
+
+    def __init__(self, *args, preload: Sequence[str] = HEAVY_MODULES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preload = tuple(preload)
+        self.factories: Dict[str, Callable] = {}
+        self.errors: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+        self._building = set()
+        self._lock = threading.RLock()
+        self._warm_lock = threading.Lock()  # Not _lock: a readiness probe must not wait on a build
+        self._warming: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory: Callable):
+        """factory() builds the service on first read; registration order is warm-up order"""
+        self.factories[name] = factory
+
+    def __missing__(self, name: str):
+        if name not in self.factories:
+            raise KeyError(name)
+        with self._lock:
+            if dict.__contains__(self, name):  # Built while this caller waited
+                return dict.__getitem__(self, name)
+            self._building.add(name)
+            started = time.perf_counter()
+            try:
+                service = self.factories[name]()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.error(f"Service {name} failed to start: {e}")
+                raise
+            finally:
+                self._building.discard(name)
+            self.timings[name] = time.perf_counter() - started
+            self.errors.pop(name, None)
+            dict.__setitem__(self, name, service)
+            return service
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __contains__(self, name) -> bool:
+        return dict.__contains__(self, name) or name in self.factories
+
+    def built(self, name: str) -> bool:
+        return dict.__contains__(self, name)
+
+    def ready(self) -> bool:
+        return all(self.built(name) for name in self.factories)
+
+    def status(self) -> Dict[str, Dict]:
+        """Per registered service: pending, building, ready or failed (with the error)"""
+        services = {}
+        for name in self.factories:
+            if self.built(name):
+                services[name] = {'status': 'ready', 'ms': round(self.timings.get(name, 0.0) * 1000, 1)}
+            elif name in self._building:
+                services[name] = {'status': 'building'}
+            elif name in self.errors:
+                services[name] = {'status': 'failed', 'error': self.errors[name]}
+            else:
+                services[name] = {'status': 'pending'}
+        return services
+
+    def warm(self) -> 'ServiceRegistry':
+        """Build every registered service in the background; no-op while a warm-up runs or once ready"""
+        with self._warm_lock:
+            if self.ready() or (self._warming is not None and self._warming.is_alive()):
+                return self
+            self._warming = threading.Thread(target=self._warm, name='service-warmup', daemon=True)
+            self._warming.start()
+        return self
+
+    def _preload(self):
+        for module in self.preload:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+    def _warm(self):
+        started = time.perf_counter()
+        offload(self._preload)
+        for name in list(self.factories):
+            try:
+                self[name]
+            except Exception:
+                pass  # Logged and recorded in errors; the next read or warm() retries
+        if self.ready():
+            logger.info(f"Services ready in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,435 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import Config
+from app.utils.greeks import GreeksCalculator
+
+logger = logging.getLogger(__name__)
+
+YEAR_SECONDS = 365 * 24 * 3600
+# Fallback format produced by OptionsChainService.option_symbol without an instrument master
+OPTION_SYMBOL = re.compile(r'^(?P<name>[A-Z]+)(?P<expiry>\d{2}[A-Z]{3}\d{2})(?P<strike>\d+(?:\.\d+)?)(?P<type>CE|PE)$')
+
+
+def describe_contract(instruments, token: int = 0, symbol: str = None) -> Dict:
+    """Underlying/expiry/strike/type of an instrument, from the master or its symbol"""
+    contract = None
+    if instruments is not None:
+        contract = instruments.by_token(token) if token else None
+        if contract is None and symbol:
+            contract = instruments.by_symbol(symbol)
+    if contract:
+        return contract
+
+    match = OPTION_SYMBOL.match(symbol or '')
+    if not match:
+        return {'name': symbol, 'expiry': None, 'strike': 0.0, 'instrument_type': 'EQ'}
+    return {
+        'name': match['name'],
+        'expiry': datetime.strptime(match['expiry'], '%d%b%y').date(),
+        'strike': float(match['strike']),
+        'instrument_type': match['type'],
+    }
+
+
+class PortfolioRisk:
+    """
+    Incrementally maintained Greeks, margin and stop distance per position
+
+    Positions live in preallocated NumPy columns, one slot per
+    (instrument token, product). Ticks reprice only the slots on that
+    instrument (or, for an index tick, the options on that underlying),
+    fills adjust only the traded slot, and a periodic sync() reconciles
+    against broker positions. analysis() is served from the maintained
+    state and only rebuilds rows that changed since the last call.
+
+    Loss and stop distance are measured against the entry premium, in the
+    direction of the trade: a short leg is at its stop once the option
+    trades STOP_LOSS_PERCENT above the price it was sold at.
+    """
+
+    def __init__(self, instruments=None, stop_loss_percent: float = None,
+                 risk_free_rate: float = None, short_margin_percent: float = None,
+                 capacity: int = 256):
+        self.instruments = instruments
+        self.stop_loss_percent = stop_loss_percent or Config.STOP_LOSS_PERCENT
+        self.risk_free_rate = Config.RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+        self.short_margin_percent = short_margin_percent or Config.SHORT_MARGIN_PERCENT
+        # Optional ticker subscribe({'EXCHANGE:SYMBOL': token}) for newly seen legs
+        self.subscribe: Optional[Callable] = None
+
+        self.spot: Dict[str, float] = {}
+        self.index_tokens = {Config.NIFTY_INDEX_TOKEN: 'NIFTY'}
+        self.last_sync = 0.0
+
+        self._lock = threading.Lock()
+        self._slots: Dict[tuple, int] = {}  # (token, product) -> slot
+        self._by_token: Dict[int, List[int]] = {}
+        self._free: List[int] = []
+        self._meta: List[Optional[Dict]] = []
+        self._rows: List[Optional[Dict]] = []
+        self._dirty = set()
+        self._analysis: Optional[Dict] = None
+        self._applied: OrderedDict = OrderedDict()  # order_id -> filled quantity already booked
+        self._position_listeners: List[Callable] = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        def grow(old, dtype, fill=0):
+            new = np.full(capacity, fill, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        get = lambda name: getattr(self, name, None)
+        self.capacity = capacity
+        self.active = grow(get('active'), np.bool_)
+        self.is_option = grow(get('is_option'), np.bool_)
+        self.is_call = grow(get('is_call'), np.bool_)
+        self.strike = grow(get('strike'), np.float64)
+        self.expiry_at = grow(get('expiry_at'), np.float64)  # Epoch seconds, 15:30 on expiry
+        self.quantity = grow(get('quantity'), np.int64)  # Net, negative when short
+        self.multiplier = grow(get('multiplier'), np.float64, 1)
+        self.average_price = grow(get('average_price'), np.float64)
+        self.buy_value = grow(get('buy_value'), np.float64)
+        self.sell_value = grow(get('sell_value'), np.float64)
+        self.ltp = grow(get('ltp'), np.float64)
+        self.ticked = grow(get('ticked'), np.bool_)
+        self.iv = grow(get('iv'), np.float64, np.nan)
+        self.delta = grow(get('delta'), np.float64)
+        self.gamma = grow(get('gamma'), np.float64)
+        self.theta = grow(get('theta'), np.float64)
+        self.vega = grow(get('vega'), np.float64)
+        self.margin = grow(get('margin'), np.float64)
+        self.pnl = grow(get('pnl'), np.float64)
+        self.loss_percent = grow(get('loss_percent'), np.float64)
+        self.stop_price = grow(get('stop_price'), np.float64)
+        self.distance_to_stop = grow(get('distance_to_stop'), np.float64)
+        self._meta.extend([None] * (capacity - len(self._meta)))
+        self._rows.extend([None] * (capacity - len(self._rows)))
+
+    def _slot(self, token: int, product: str, symbol: str, exchange: str = 'NFO') -> int:
+        key = (token, product)
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slots)
+            if slot >= self.capacity:
+                self._allocate(self.capacity * 2)
+        self._slots[key] = slot
+        self._by_token.setdefault(token, []).append(slot)
+
+        contract = describe_contract(self.instruments, token, symbol)
+        option = contract['instrument_type'] in ('CE', 'PE')
+        expiry = contract['expiry']
+        self.active[slot] = True
+        self.is_option[slot] = option
+        self.is_call[slot] = contract['instrument_type'] == 'CE'
+        self.strike[slot] = contract['strike']
+        self.expiry_at[slot] = (datetime.combine(expiry, datetime.min.time()).replace(hour=15, minute=30).timestamp()
+                                if expiry else 0.0)
+        self.iv[slot] = np.nan
+        self.ticked[slot] = False
+        self._meta[slot] = {
+            'symbol': symbol,
+            'exchange': exchange,
+            'product': product,
+            'token': token,
+            'underlying': contract['name'],
+            'expiry': expiry.isoformat() if expiry else None,
+        }
+
+        if self.subscribe is not None and token:
+            try:
+                self.subscribe({f'{exchange}:{symbol}': token})
+            except Exception as e:
+                logger.error(f"Risk subscription failed: {e}")
+        return slot
+
+    def add_position_listener(self, callback: Callable):
+        """callback(tokens) runs after a sync or fill changes the legs on those tokens"""
+        self._position_listeners.append(callback)
+
+    def _notify(self, tokens):
+        for callback in self._position_listeners:
+            try:
+                callback(tokens)
+            except Exception as e:
+                logger.error(f"Position listener failed: {e}")
+
+    def legs(self, tokens=None) -> List[Dict]:
+        """Quantity, entry and expiry of the open legs (optionally only on some tokens)"""
+        with self._lock:
+            if tokens is None:
+                slots = self._slots.values()
+            else:
+                slots = [slot for token in tokens for slot in self._by_token.get(token, ())]
+            return [dict(self._meta[slot],
+                         quantity=int(self.quantity[slot]),
+                         average_price=float(self.average_price[slot]),
+                         last_price=float(self.ltp[slot]),
+                         expiry_at=float(self.expiry_at[slot]))
+                    for slot in slots if self.quantity[slot] != 0]
+
+    def _release(self, slot: int):
+        meta = self._meta[slot]
+        self._slots.pop((meta['token'], meta['product']), None)
+        self._by_token[meta['token']].remove(slot)
+        self.active[slot] = False
+        self._meta[slot] = None
+        self._rows[slot] = None
+        self._free.append(slot)
+        self._dirty.discard(slot)
+        self._analysis = None
+
+    def _reprice(self, slots: np.ndarray):
+        """Recompute P&L, Greeks, margin and stop distance for some slots"""
+        if len(slots) == 0:
+            return
+
+        qty = self.quantity[slots]
+        ltp = self.ltp[slots]
+        multiplier = self.multiplier[slots]
+        self.pnl[slots] = self.sell_value[slots] - self.buy_value[slots] + qty * ltp * multiplier
+
+        # Loss and stop are relative to entry, in the direction of the trade
+        short = qty < 0
+        average = self.average_price[slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loss = np.where(short, ltp - average, average - ltp) / average * 100
+        stop = average * np.where(short, 1 + self.stop_loss_percent / 100, 1 - self.stop_loss_percent / 100)
+        self.loss_percent[slots] = np.where((qty != 0) & (average > 0), loss, 0.0)
+        self.stop_price[slots] = stop
+        self.distance_to_stop[slots] = np.where(qty != 0, np.where(short, stop - ltp, ltp - stop), 0.0)
+
+        spot = np.array([self.spot.get(self._meta[slot]['underlying'], np.nan) for slot in slots])
+        notional = np.abs(qty) * multiplier * np.where(self.is_option[slots], spot, ltp)
+        self.margin[slots] = np.where(short, notional * self.short_margin_percent / 100,
+                                      np.abs(qty) * multiplier * average)
+
+        # Futures/equity carry delta only; options are repriced off the current spot
+        self.delta[slots] = np.where(self.is_option[slots], 0.0, qty * multiplier)
+        self.gamma[slots] = self.theta[slots] = self.vega[slots] = 0.0
+        option = self.is_option[slots] & np.isfinite(spot)
+        if option.any():
+            picked = slots[option]
+            S = spot[option]
+            T = np.maximum(self.expiry_at[picked] - time.time(), 60) / YEAR_SECONDS
+            K = self.strike[picked]
+            calls = self.is_call[picked]
+            iv = GreeksCalculator.calculate_implied_volatility(self.ltp[picked], S, K, T, self.risk_free_rate,
+                                                               calls, initial=self.iv[picked])
+            # Keep the last good IV when a price is outside no-arbitrage bounds
+            iv = np.where(np.isfinite(iv), iv, self.iv[picked])
+            self.iv[picked] = iv
+
+            priced = np.isfinite(iv)
+            if priced.any():
+                picked = picked[priced]
+                greeks = GreeksCalculator.calculate_batch_greeks(S[priced], K[priced], T[priced], self.risk_free_rate,
+                                                                 iv[priced], calls[priced])
+                units = self.quantity[picked] * self.multiplier[picked]
+                for name in ('delta', 'gamma', 'theta', 'vega'):
+                    getattr(self, name)[picked] = greeks[name] * units
+
+        self._dirty.update(slots.tolist())
+        self._analysis = None
+
+    def sync(self, positions: List[Dict], spot: Optional[float] = None):
+        """Reconcile with broker positions; only changed legs are repriced"""
+        with self._lock:
+            if spot:
+                self.spot['NIFTY'] = spot
+
+            seen = set()
+            changed = []
+            for position in positions:
+                token = int(position.get('instrument_token') or 0)
+                product = position.get('product', 'NRML')
+                slot = self._slot(token, product, position.get('tradingsymbol'), position.get('exchange', 'NFO'))
+                seen.add(slot)
+
+                fields = (int(position.get('quantity', 0)), float(position.get('average_price') or 0),
+                          float(position.get('buy_value') or 0), float(position.get('sell_value') or 0),
+                          float(position.get('multiplier') or 1))
+                current = (int(self.quantity[slot]), self.average_price[slot], self.buy_value[slot],
+                           self.sell_value[slot], self.multiplier[slot])
+                ltp = float(position.get('last_price') or 0)
+                if fields != current or (not self.ticked[slot] and ltp != self.ltp[slot]):
+                    (self.quantity[slot], self.average_price[slot], self.buy_value[slot],
+                     self.sell_value[slot], self.multiplier[slot]) = fields
+                    if not self.ticked[slot]:
+                        self.ltp[slot] = ltp
+                    changed.append(slot)
+
+            released = [s for s in self._slots.values() if s not in seen]
+            tokens = {self._meta[slot]['token'] for slot in released + changed}
+            for slot in released:
+                self._release(slot)
+
+            # Time decay and a fresh spot move every option, so reprice all on sync
+            if spot:
+                changed = [s for s in self._slots.values()]
+            self._reprice(np.array(sorted(set(changed)), dtype=np.int64))
+            self.last_sync = time.time()
+        if tokens:
+            self._notify(tokens)
+
+    def on_ticks(self, ticks: List[Dict]):
+        """Ticker listener: reprice only the slots the ticks touch"""
+        with self._lock:
+            affected = set()
+            for tick in ticks:
+                token = tick['instrument_token']
+                underlying = self.index_tokens.get(token)
+                if underlying is not None:
+                    self.spot[underlying] = tick['last_price']
+                    affected.update(slot for slot, meta in enumerate(self._meta)
+                                    if meta and meta['underlying'] == underlying)
+                    continue
+
+                for slot in self._by_token.get(token, ()):
+                    self.ltp[slot] = tick['last_price']
+                    self.ticked[slot] = True
+                    affected.add(slot)
+
+            if affected:
+                self._reprice(np.array(sorted(affected), dtype=np.int64))
+
+    def on_order_update(self, order: Dict):
+        """Order listener: book newly filled quantity into its slot"""
+        order_id = order.get('order_id')
+        filled = int(order.get('filled_quantity') or 0)
+        if not order_id or not filled or not order.get('instrument_token'):
+            return
+
+        with self._lock:
+            booked = self._applied.get(order_id, 0)
+            if filled <= booked:
+                return
+            self._applied[order_id] = filled
+            while len(self._applied) > 4096:
+                self._applied.popitem(last=False)
+
+            increment = filled - booked
+            price = float(order.get('average_price') or 0)
+            slot = self._slot(int(order['instrument_token']), order.get('product', 'NRML'),
+                              order.get('tradingsymbol'), order.get('exchange', 'NFO'))
+
+            quantity = int(self.quantity[slot])
+            signed = increment if order.get('transaction_type') == 'BUY' else -increment
+            if signed > 0:
+                self.buy_value[slot] += increment * price
+            else:
+                self.sell_value[slot] += increment * price
+
+            # Average price follows the open side, as in the broker's net positions
+            new_quantity = quantity + signed
+            if quantity == 0 or np.sign(new_quantity) != np.sign(quantity):
+                self.average_price[slot] = price if new_quantity else 0.0
+            elif abs(new_quantity) > abs(quantity):
+                self.average_price[slot] = (abs(quantity) * self.average_price[slot] + increment * price) / abs(new_quantity)
+            self.quantity[slot] = new_quantity
+            if not self.ticked[slot]:
+                self.ltp[slot] = price
+
+            self._reprice(np.array([slot], dtype=np.int64))
+        self._notify({int(order['instrument_token'])})
+
+    # Row field -> (column, decimals); rounded as arrays so rows rebuild in bulk
+    ROW_FIELDS = {
+        'average_price': ('average_price', 2),
+        'last_price': ('ltp', 2),
+        'pnl': ('pnl', 2),
+        'iv': ('iv', 4),
+        'delta': ('delta', 4),
+        'gamma': ('gamma', 6),
+        'theta': ('theta', 2),
+        'vega': ('vega', 2),
+        'margin': ('margin', 2),
+        'loss_percent': ('loss_percent', 2),
+        'stop_price': ('stop_price', 2),
+        'distance_to_stop': ('distance_to_stop', 2),
+    }
+
+    def _rebuild_rows(self, slots: np.ndarray):
+        columns = {field: np.round(getattr(self, column)[slots], decimals).tolist()
+                   for field, (column, decimals) in self.ROW_FIELDS.items()}
+        columns['quantity'] = self.quantity[slots].tolist()
+        iv_missing = np.isnan(self.iv[slots])
+        fields = list(columns)
+        for i, values in enumerate(zip(*columns.values())):
+            slot = int(slots[i])
+            row = dict(self._meta[slot], **dict(zip(fields, values)))
+            if iv_missing[i]:
+                row['iv'] = None
+            self._rows[slot] = row
+
+    def analysis(self) -> Dict:
+        """Portfolio totals, per-position rows and positions at their stop"""
+        with self._lock:
+            if self._analysis is not None:
+                return self._analysis
+
+            if self._dirty:
+                self._rebuild_rows(np.array(sorted(self._dirty), dtype=np.int64))
+                self._dirty.clear()
+
+            active = self.active
+            at_risk = np.flatnonzero(active & (self.quantity != 0) & (self.loss_percent >= self.stop_loss_percent))
+            self._analysis = {
+                'total_positions': len(self._slots),
+                'total_pnl': round(float(self.pnl[active].sum()), 2),
+                'greeks': {
+                    'delta': round(float(self.delta[active].sum()), 4),
+                    'gamma': round(float(self.gamma[active].sum()), 6),
+                    'theta': round(float(self.theta[active].sum()), 2),
+                    'vega': round(float(self.vega[active].sum()), 2),
+                },
+                'margin_used': round(float(self.margin[active].sum()), 2),
+                'spot': dict(self.spot),
+                'positions': [self._rows[slot] for slot in np.flatnonzero(active).tolist()],
+                'positions_at_risk': [{
+                    'symbol': self._meta[slot]['symbol'],
+                    'loss_percent': loss,
+                    'distance_to_stop': distance,
+                    'action': 'CLOSE_IMMEDIATELY'
+                } for slot, loss, distance in zip(at_risk.tolist(),
+                                                  np.round(self.loss_percent[at_risk], 2).tolist(),
+                                                  np.round(self.distance_to_stop[at_risk], 2).tolist())],
+                'recommendations': [],
+                'last_sync': self.last_sync,
+            }
+            return self._analysis
+
+    def book(self) -> Dict[str, np.ndarray]:
+        """Copy of the open legs' pricing inputs, for scenario repricing"""
+        with self._lock:
+            slots = np.flatnonzero(self.active & (self.quantity != 0))
+            now = time.time()
+            return {
+                'symbol': np.array([self._meta[slot]['symbol'] for slot in slots.tolist()], dtype=object),
+                'spot': np.array([self.spot.get(self._meta[slot]['underlying'], np.nan) for slot in slots.tolist()]),
+                'is_option': self.is_option[slots],
+                'is_call': self.is_call[slots],
+                'strike': self.strike[slots],
+                'T': np.maximum(self.expiry_at[slots] - now, 60) / YEAR_SECONDS,
+                'iv': self.iv[slots],
+                'ltp': self.ltp[slots],
+                'units': self.quantity[slots] * self.multiplier[slots],
+            }
+
+    def stale(self, max_age: float = None) -> bool:
+        max_age = Config.RISK_SYNC_INTERVAL if max_age is None else max_age
+        return time.time() - self.last_sync > max_age
@@ -0,0 +1,484 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import Config
+from app.services.risk import YEAR_SECONDS, describe_contract
+from app.utils.greeks import GreeksCalculator
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('COMPLETE', 'REJECTED', 'CANCELLED')
+
+
+class OrderRejected(Exception):
+    """Raised by BrokerService.place_order when the pre-trade risk gate blocks an order"""
+
+    def __init__(self, reasons: List[Dict]):
+        super().__init__('; '.join(reason['message'] for reason in reasons))
+        self.reasons = reasons
+
+
+class _Position:
+    __slots__ = ('symbol', 'token', 'bucket', 'is_option', 'is_call', 'strike', 'expiry_at',
+                 'quantity', 'reserved', 'average_price', 'mark', 'unit_delta', 'unit_vega', 'underlying_price',
+                 'margin')
+
+    def __init__(self, symbol: str, contract: Dict):
+        expiry = contract['expiry']
+        self.symbol = symbol
+        self.token = contract.get('instrument_token', 0)
+        self.bucket = (contract['name'], expiry.isoformat() if expiry else None)
+        self.is_option = contract['instrument_type'] in ('CE', 'PE')
+        self.is_call = contract['instrument_type'] == 'CE'
+        self.strike = contract['strike']
+        self.expiry_at = (datetime.combine(expiry, datetime.min.time()).replace(hour=15, minute=30).timestamp()
+                          if expiry else 0.0)
+        self.quantity = 0  # Filled, negative when short
+        self.reserved = 0  # Accepted orders not yet filled
+        self.average_price = 0.0
+        self.mark = 0.0
+        self.unit_delta = 0.0 if self.is_option else 1.0
+        self.unit_vega = 0.0
+        self.underlying_price = 0.0
+        self.margin = 0.0  # As booked into the bucket, so the same amount comes out again
+
+
+class PreTradeRiskGate:
+    """
+    Constant-time pre-trade checks on every order
+
+    Keeps net quantity and average price per instrument, plus open
+    quantity, notional, margin, delta and vega per (underlying, expiry),
+    all updated from fills (order updates) rather than positions calls.
+    Accepted orders reserve their quantity and margin until they fill,
+    cancel or expire, so concurrent legs cannot jointly overshoot a limit.
+
+    check() enforces MAX_POSITIONS, RISK_PER_TRADE (% of RISK_CAPITAL lost
+    if the trade hits its stop; the whole premium for a long option),
+    MAX_LOSS_PER_POSITION (the resulting position at its stop) and total
+    margin within RISK_CAPITAL. Orders that only reduce a position, as
+    booked or as the broker holds it, are always allowed, and exit-engine
+    and unwind orders (reduce_only) skip the limits, so exits are never
+    blocked. Greeks are taken at fill time; PortfolioRisk keeps the live
+    ones. Fills arrive as order updates from the streaming feed, the
+    strategy executor or FillTracker's order-history polling.
+
+    Broker positions are loaded before the first check (retried every
+    retry_interval seconds until a load succeeds). A rejected order
+    re-reads one instrument's broker position, at most once per
+    retry_interval per instrument, in case it closes a position the
+    ledger missed.
+    """
+
+    def __init__(self, instruments=None, capital: float = None, max_positions: int = None,
+                 max_loss_per_position: float = None, risk_per_trade: float = None,
+                 stop_loss_percent: float = None, short_margin_percent: float = None,
+                 surface=None, reservation_ttl: float = None, retry_interval: float = 5.0):
+        self.instruments = instruments
+        self.capital = capital or Config.RISK_CAPITAL
+        self.max_positions = max_positions or Config.MAX_POSITIONS
+        self.max_loss_per_position = max_loss_per_position or Config.MAX_LOSS_PER_POSITION
+        self.risk_per_trade = risk_per_trade or Config.RISK_PER_TRADE
+        self.stop_loss_percent = stop_loss_percent or Config.STOP_LOSS_PERCENT
+        self.short_margin_percent = short_margin_percent or Config.SHORT_MARGIN_PERCENT
+        self.surface = surface
+        self.reservation_ttl = reservation_ttl or 2 * Config.ORDER_FILL_TIMEOUT
+        self.retry_interval = retry_interval
+        # Broker positions (raising on failure), loaded once before the first check
+        self.loader: Optional[Callable[[], List[Dict]]] = None
+
+        self.spot: Dict[str, float] = {}
+        self.index_tokens = {Config.NIFTY_INDEX_TOKEN: 'NIFTY'}
+        self.open_positions = 0
+        self.margin_used = 0.0
+        self.reserved_margin = 0.0
+        self.checked = 0
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._load_at = 0.0  # monotonic time of the next load attempt
+        self._reconciled: Dict[str, float] = {}  # symbol -> monotonic time of its last reconcile
+        self._positions: Dict[str, _Position] = {}
+        self._by_token: Dict[int, _Position] = {}
+        self._buckets: Dict[tuple, Dict] = {}
+        self._tickets = 0
+        self._reservations: Dict[int, Dict] = {}
+        self._pending = deque()
+        self._by_order: Dict[str, Dict] = {}
+        self._applied: OrderedDict = OrderedDict()  # order_id -> (filled quantity, average price) booked
+        self._terminal: OrderedDict = OrderedDict()
+
+    def _position(self, symbol: str, token: int = 0) -> _Position:
+        position = self._positions.get(symbol)
+        if position is None:
+            position = self._positions[symbol] = _Position(symbol, describe_contract(self.instruments, token, symbol))
+        if token and not position.token:
+            position.token = token
+        if position.token:
+            self._by_token[position.token] = position
+        return position
+
+    def _underlying_price(self, position: _Position) -> float:
+        spot = self.spot.get(position.bucket[0])
+        if not spot and self.surface is not None and np.isfinite(self.surface.spot):
+            spot = self.surface.spot
+        return spot or position.strike or position.mark
+
+    def _margin(self, position: _Position, quantity: int, price: float) -> float:
+        """Blocked margin: % of underlying notional when short, premium paid when long"""
+        if quantity < 0 and position.is_option:
+            return -quantity * self._underlying_price(position) * self.short_margin_percent / 100
+        return abs(quantity) * price
+
+    def _contribution(self, position: _Position, sign: int):
+        bucket = self._buckets.setdefault(position.bucket, {
+            'quantity': 0, 'notional': 0.0, 'margin': 0.0, 'delta': 0.0, 'vega': 0.0, 'positions': 0})
+        quantity = position.quantity
+        if sign > 0:
+            position.margin = self._margin(position, quantity, position.average_price)
+        margin = position.margin
+        bucket['quantity'] += sign * quantity
+        bucket['notional'] += sign * abs(quantity) * (position.underlying_price or position.average_price)
+        bucket['margin'] += sign * margin
+        bucket['delta'] += sign * quantity * position.unit_delta
+        bucket['vega'] += sign * quantity * position.unit_vega
+        bucket['positions'] += sign * (quantity != 0)
+        self.margin_used += sign * margin
+
+    def _set_open(self, position: _Position, before: int):
+        after = position.quantity + position.reserved
+        self.open_positions += (after != 0) - (before != 0)
+
+    def _unit_greeks(self, position: _Position, price: float):
+        """Per-unit delta/vega at fill, with surface vol (or the fill's implied vol)"""
+        spot = self._underlying_price(position)
+        position.underlying_price = spot
+        if not position.is_option or not spot or not price:
+            return
+        T = max(position.expiry_at - time.time(), 60) / YEAR_SECONDS
+        sigma = np.nan
+        if self.surface is not None and self.surface.slices:
+            sigma = float(self.surface.sigma(position.strike, T, spot))
+        if not np.isfinite(sigma):
+            sigma = float(GreeksCalculator.calculate_implied_volatility(price, spot, position.strike, T,
+                                                                        Config.RISK_FREE_RATE, position.is_call))
+        if np.isfinite(sigma):
+            greeks = GreeksCalculator.calculate_batch_greeks(spot, position.strike, T, Config.RISK_FREE_RATE,
+                                                             sigma, position.is_call)
+            position.unit_delta, position.unit_vega = float(greeks['delta']), float(greeks['vega'])
+
+    def _fill(self, position: _Position, quantity: int, price: float):
+        """Book a fill into the instrument and its bucket"""
+        self._contribution(position, -1)
+        before = position.quantity + position.reserved
+        held = position.quantity
+        after = held + quantity
+        if held == 0 or held * quantity > 0:
+            position.average_price = (abs(held) * position.average_price + abs(quantity) * price) / abs(after)
+        elif after == 0:
+            position.average_price = 0.0
+        elif held * after < 0:
+            position.average_price = price
+        position.quantity = after
+        position.mark = price
+        self._unit_greeks(position, price)
+        self._contribution(position, 1)
+        self._set_open(position, before)
+
+    def _release(self, reservation: Dict):
+        """Return a reservation's unfilled quantity and margin"""
+        if reservation['quantity']:
+            position = reservation['position']
+            before = position.quantity + position.reserved
+            position.reserved -= reservation['quantity']
+            self.reserved_margin -= reservation['margin']
+            reservation['quantity'], reservation['margin'] = 0, 0.0
+            self._set_open(position, before)
+        self._reservations.pop(reservation['ticket'], None)
+        if reservation['order_id']:
+            self._by_order.pop(reservation['order_id'], None)
+
+    def _consume(self, reservation: Dict, filled: int):
+        """Move filled quantity out of a reservation (the fill itself is booked by _fill)"""
+        remaining = abs(reservation['quantity'])
+        used = min(filled, remaining)
+        if not used:
+            return
+        position = reservation['position']
+        sign = 1 if reservation['quantity'] > 0 else -1
+        share = reservation['margin'] * used / remaining
+        before = position.quantity + position.reserved
+        position.reserved -= sign * used
+        reservation['quantity'] -= sign * used
+        reservation['margin'] -= share
+        self.reserved_margin -= share
+        self._set_open(position, before)
+        if reservation['quantity'] == 0:
+            self._release(reservation)
+
+    def _expire(self, now: float):
+        while self._pending and now - self._pending[0]['created'] > self.reservation_ttl:
+            self._release(self._pending.popleft())
+
+    def _ensure_loaded(self):
+        if self._loaded or self.loader is None or time.monotonic() < self._load_at:
+            return
+        # Set first so concurrent checks don't all retry a failing load; sync() marks it loaded
+        self._load_at = time.monotonic() + self.retry_interval
+        try:
+            self.sync(self.loader())
+        except Exception as e:
+            logger.error(f"Risk gate position load failed, retrying in {self.retry_interval:g}s: {e}")
+
+    def _reject(self, code: str, message: str, limit=None, value=None) -> Dict:
+        reason = {'code': code, 'message': message}
+        if limit is not None:
+            reason.update({'limit': round(float(limit), 2), 'value': round(float(value), 2)})
+        return reason
+
+    def check(self, symbol: str, transaction_type: str, quantity: int, price: float = None,
+              reduce_only: bool = False) -> int:
+        """
+        Check an order against every limit and reserve its exposure
+
+        Returns a ticket for bind()/release(); raises OrderRejected with
+        one {'code', 'message', 'limit', 'value'} entry per failed limit.
+        reduce_only orders (exit engine, unwinds) skip the limits.
+        """
+        self._ensure_loaded()
+        if transaction_type not in ('BUY', 'SELL') or not isinstance(quantity, int) or quantity <= 0:
+            self.rejected += 1
+            raise OrderRejected([self._reject('INVALID_ORDER', 'transaction_type must be BUY or SELL '
+                                                                'and quantity a positive integer')])
+
+        signed = quantity if transaction_type == 'BUY' else -quantity
+        with self._lock:
+            self.checked += 1
+        ticket, reasons = self._reserve(symbol, signed, price, reduce_only)
+        # Before blocking, make sure the ledger hasn't missed a position the broker holds
+        # (an order placed elsewhere); the order may be closing it
+        if reasons and self._reconcile(symbol):
+            ticket, reasons = self._reserve(symbol, signed, price, reduce_only)
+        if reasons:
+            with self._lock:
+                self.rejected += 1
+            raise OrderRejected(reasons)
+        return ticket
+
+    def _reserve(self, symbol: str, signed: int, price: Optional[float], reduce_only: bool):
+        """(ticket, []) with the exposure reserved, or (None, failed limits)"""
+        quantity = abs(signed)
+        with self._lock:
+            self._expire(time.monotonic())
+            position = self._position(symbol)
+            current = position.quantity + position.reserved
+            after = current + signed
+
+            def reduces(held: int) -> bool:
+                return held != 0 and (held + signed) * held >= 0 and abs(held + signed) < abs(held)
+
+            # Against the book with pending orders, or the filled book alone
+            reducing = reduce_only or reduces(current) or reduces(position.quantity)
+
+            reasons = []
+            margin = 0.0
+            reference = price or position.mark
+            if not reducing and not reference:
+                reasons.append(self._reject('NO_REFERENCE_PRICE', f'No price to size the risk of {symbol}; '
+                                                                  'send a limit price or reference_price'))
+            elif not reducing:
+                if current == 0 and self.open_positions >= self.max_positions:
+                    reasons.append(self._reject('MAX_POSITIONS', f'{self.open_positions} positions already open',
+                                                self.max_positions, self.open_positions + 1))
+
+                stop = self.stop_loss_percent / 100
+                trade_risk = quantity * reference * (stop if signed < 0 else 1)
+                budget = self.capital * self.risk_per_trade / 100
+                if trade_risk > budget:
+                    reasons.append(self._reject('RISK_PER_TRADE', f'Loss at stop {trade_risk:,.0f} exceeds '
+                                                                  f'{self.risk_per_trade}% of capital', budget, trade_risk))
+
+                adds = current * signed > 0
+                average = ((abs(current) * position.average_price + quantity * reference) / abs(after)
+                           if adds and position.average_price else reference)
+                position_loss = abs(after) * average * (stop if after < 0 else 1)
+                if position_loss > self.max_loss_per_position:
+                    reasons.append(self._reject('MAX_LOSS_PER_POSITION', f'{symbol} loss at stop '
+                                                                         f'{position_loss:,.0f} exceeds the limit',
+                                                self.max_loss_per_position, position_loss))
+
+                margin = self._margin(position, signed, reference)
+                committed = self.margin_used + self.reserved_margin + margin
+                if committed > self.capital:
+                    reasons.append(self._reject('CAPITAL', 'Margin would exceed risk capital',
+                                                self.capital, committed))
+
+            if reasons:
+                return None, reasons
+
+            self._tickets += 1
+            reservation = {'ticket': self._tickets, 'position': position, 'quantity': signed,
+                           'margin': margin, 'order_id': None, 'created': time.monotonic()}
+            before = current
+            position.reserved += signed
+            self.reserved_margin += margin
+            self._set_open(position, before)
+            self._reservations[self._tickets] = reservation
+            self._pending.append(reservation)
+            return self._tickets, []
+
+    def _reconcile(self, symbol: str) -> bool:
+        """Take one instrument's filled quantity from broker positions; True if the ledger changed"""
+        if self.loader is None:
+            return False
+        with self._lock:
+            position = self._positions.get(symbol)
+            if position is not None and position.reserved:
+                return False  # Our own orders are in flight: their fills are on the way
+            # Repeated rejections must not turn into a positions call each
+            now = time.monotonic()
+            if now - self._reconciled.get(symbol, -self.retry_interval) < self.retry_interval:
+                return False
+            self._reconciled[symbol] = now
+            if len(self._reconciled) > 4096:
+                self._reconciled.pop(next(iter(self._reconciled)))
+        try:
+            rows = [row for row in self.loader() if row.get('tradingsymbol') == symbol]
+        except Exception as e:
+            logger.error(f"Risk gate reconcile failed ({symbol}): {e}")
+            return False
+
+        quantity = sum(int(row.get('quantity', 0)) for row in rows)
+        with self._lock:
+            position = self._position(symbol, int(rows[0].get('instrument_token') or 0) if rows else 0)
+            if position.reserved or position.quantity == quantity:
+                return False
+            logger.warning(f"Risk gate missed fills on {symbol}: booked {position.quantity}, broker {quantity}")
+            self._contribution(position, -1)
+            before = position.quantity + position.reserved
+            position.quantity = quantity
+            if rows:
+                position.average_price = float(rows[0].get('average_price') or 0)
+                position.mark = float(rows[0].get('last_price') or position.average_price)
+            self._unit_greeks(position, position.mark)
+            self._contribution(position, 1)
+            self._set_open(position, before)
+            return True
+
+    def bind(self, ticket: int, order_id: Optional[str]):
+        """Attach the broker order id to a reservation (None releases it)"""
+        with self._lock:
+            reservation = self._reservations.get(ticket)
+            if reservation is None:
+                return
+            if not order_id:
+                self._release(reservation)
+                return
+            order_id = str(order_id)
+            reservation['order_id'] = order_id
+            self._by_order[order_id] = reservation
+            # Updates may have arrived before place_order returned
+            if order_id in self._applied:
+                self._consume(reservation, self._applied[order_id][0])
+            if order_id in self._terminal:
+                self._release(reservation)
+
+    def release(self, ticket: int):
+        with self._lock:
+            reservation = self._reservations.get(ticket)
+            if reservation is not None:
+                self._release(reservation)
+
+    def on_order_update(self, order: Dict):
+        """Book new fills from an order update; idempotent per order_id"""
+        order_id = str(order.get('order_id') or '')
+        symbol = order.get('tradingsymbol')
+        if not order_id or not symbol:
+            return
+
+        filled = int(order.get('filled_quantity') or 0)
+        with self._lock:
+            booked, booked_price = self._applied.get(order_id, (0, 0.0))
+            if filled > booked:
+                average = float(order.get('average_price') or 0)
+                # average_price covers every fill so far; back out this fill's price
+                price = (average * filled - booked_price * booked) / (filled - booked) if average else 0.0
+                self._applied[order_id] = (filled, average)
+                self._applied.move_to_end(order_id)
+                while len(self._applied) > 4096:
+                    self._applied.popitem(last=False)
+
+                position = self._position(symbol, int(order.get('instrument_token') or 0))
+                sign = 1 if order.get('transaction_type') == 'BUY' else -1
+                self._fill(position, sign * (filled - booked), price or position.mark)
+                reservation = self._by_order.get(order_id)
+                if reservation is not None:
+                    self._consume(reservation, filled - booked)
+
+            if order.get('status') in TERMINAL_STATUSES:
+                self._terminal[order_id] = True
+                while len(self._terminal) > 4096:
+                    self._terminal.popitem(last=False)
+                reservation = self._by_order.get(order_id)
+                if reservation is not None:
+                    self._release(reservation)
+
+    def on_ticks(self, ticks: List[Dict]):
+        """Marks and index levels for sizing market orders; buckets stay at fill values"""
+        for tick in ticks:
+            token = tick['instrument_token']
+            underlying = self.index_tokens.get(token)
+            if underlying:
+                self.spot[underlying] = tick['last_price']
+                continue
+            position = self._by_token.get(token)
+            if position is not None:
+                position.mark = tick['last_price']
+
+    def sync(self, positions: List[Dict]):
+        """Reset filled quantities from broker positions (reservations are kept)"""
+        with self._lock:
+            self._loaded = True
+            self._buckets.clear()
+            self.margin_used = 0.0
+            for position in self._positions.values():
+                position.quantity = 0
+                position.margin = 0.0
+            for row in positions:
+                position = self._position(row['tradingsymbol'], int(row.get('instrument_token') or 0))
+                position.quantity = int(row.get('quantity', 0))
+                position.average_price = float(row.get('average_price') or 0)
+                position.mark = float(row.get('last_price') or position.average_price)
+                self._unit_greeks(position, position.mark)
+                self._contribution(position, 1)
+            self.open_positions = sum((p.quantity + p.reserved) != 0 for p in self._positions.values())
+
+    def snapshot(self) -> Dict:
+        """Limits, utilisation and the per-underlying/expiry ledger"""
+        with self._lock:
+            return {
+                'limits': {
+                    'capital': self.capital,
+                    'max_positions': self.max_positions,
+                    'max_loss_per_position': self.max_loss_per_position,
+                    'risk_per_trade_percent': self.risk_per_trade,
+                },
+                'open_positions': self.open_positions,
+                'margin_used': round(self.margin_used, 2),
+                'reserved_margin': round(self.reserved_margin, 2),
+                'pending_orders': len(self._reservations),
+                'checked': self.checked,
+                'rejected': self.rejected,
+                'buckets': [{
+                    'underlying': underlying,
+                    'expiry': expiry,
+                    **{key: round(value, 4) if isinstance(value, float) else value for key, value in bucket.items()},
+                } for (underlying, expiry), bucket in self._buckets.items() if bucket['positions']],
+            }
@@ -0,0 +1,102 @@
+import logging
+from typing import Dict, Sequence
+
+import numpy as np
+
+from app.config import Config
+from app.utils.greeks import GreeksCalculator
+
+logger = logging.getLogger(__name__)
+
+DAY = 1 / 365
+MIN_T = 60 / (365 * 24 * 3600)
+
+
+class ScenarioEngine:
+    """
+    Reprice the open book over a grid of spot and IV shocks
+
+    Every option leg is repriced with black_scholes_call/black_scholes_put
+    in one broadcast over (spot shock x IV shock x leg), per time step, and
+    summed against signed quantities into a P&L surface relative to the
+    current marks. Spot shocks are fractions of spot (-0.05 = 5% gap
+    down), IV shocks are absolute vol points (0.05 = +5 vols), days step
+    time forward. Large grids are evaluated in spot-axis chunks to bound
+    memory. Legs whose mark gives no IV take it from the volatility
+    surface when one is attached, else the book's median IV.
+    """
+
+    def __init__(self, risk_free_rate: float = None, max_chunk: int = 1 << 20, surface=None):
+        self.risk_free_rate = Config.RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+        self.max_chunk = max_chunk
+        self.surface = surface
+
+    def _reprice(self, pricer, spot, strike, T, iv, units, ltp,
+                 spot_shocks: np.ndarray, iv_shocks: np.ndarray) -> np.ndarray:
+        """P&L over (spot shock, IV shock) for one option type"""
+        legs = len(strike)
+        surface = np.empty((len(spot_shocks), len(iv_shocks)))
+        sigma = np.maximum(iv[None, :] + iv_shocks[:, None], 1e-4)[None, :, :]
+        base = ltp @ units
+        rows = max(1, self.max_chunk // (len(iv_shocks) * legs))
+
+        for lo in range(0, len(spot_shocks), rows):
+            shocks = spot_shocks[lo:lo + rows]
+            S = spot[None, None, :] * (1 + shocks[:, None, None])
+            price = pricer(S, strike, T, self.risk_free_rate, sigma)
+            surface[lo:lo + rows] = (price.reshape(-1, legs) @ units).reshape(len(shocks), -1) - base
+        return surface
+
+    def pnl_surface(self, book: Dict[str, np.ndarray], spot_shocks: Sequence[float],
+                    iv_shocks: Sequence[float], days: Sequence[float] = (0,)) -> Dict:
+        """P&L change for every (day, spot shock, IV shock) plus the worst cell"""
+        spot_shocks = np.asarray(spot_shocks, dtype=np.float64)
+        iv_shocks = np.asarray(iv_shocks, dtype=np.float64)
+        days = np.asarray(days, dtype=np.float64)
+        surface = np.zeros((len(days), len(spot_shocks), len(iv_shocks)))
+
+        spot = book['spot']
+        has_spot = np.isfinite(spot)
+        options = book['is_option'] & has_spot
+        delta_one = ~book['is_option'] & has_spot
+
+        # Legs whose mark gave no IV (e.g. below intrinsic) use the surface, else the book's median IV
+        iv = book['iv']
+        estimated = options & ~np.isfinite(iv)
+        if estimated.any():
+            if self.surface is not None:
+                iv = np.where(estimated, self.surface.sigma(book['strike'], book['T'], spot), iv)
+            solved = book['iv'][options & np.isfinite(book['iv'])]
+            iv = np.where(options & ~np.isfinite(iv), np.median(solved) if len(solved) else 0.2, iv)
+
+        for step, day in enumerate(days):
+            T = np.maximum(book['T'] - day * DAY, MIN_T)
+            for calls, pricer in ((True, GreeksCalculator.black_scholes_call),
+                                  (False, GreeksCalculator.black_scholes_put)):
+                legs = options & (book['is_call'] == calls)
+                if legs.any():
+                    surface[step] += self._reprice(pricer, spot[legs], book['strike'][legs], T[legs],
+                                                   iv[legs], book['units'][legs], book['ltp'][legs],
+                                                   spot_shocks, iv_shocks)
+
+        # Futures and other delta-one legs move one for one with spot
+        if delta_one.any():
+            exposure = book['ltp'][delta_one] @ book['units'][delta_one]
+            surface += (exposure * spot_shocks)[None, :, None]
+
+        worst = np.unravel_index(np.argmin(surface), surface.shape) if surface.size else None
+        return {
+            'spot_shocks': spot_shocks,
+            'iv_shocks': iv_shocks,
+            'days': days,
+            'pnl': surface,
+            'legs': int(options.sum() + delta_one.sum()),
+            'estimated_iv': book['symbol'][estimated].tolist(),
+            'unpriced': book['symbol'][~(options | delta_one)].tolist(),
+            'worst': None if worst is None else {
+                'pnl': float(surface[worst]),
+                'day': float(days[worst[0]]),
+                'spot_shock': float(spot_shocks[worst[1]]),
+                'iv_shock': float(iv_shocks[worst[2]]),
+            },
+        }
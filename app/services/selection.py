@@ -0,0 +1,232 @@
+import logging
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+from app.config import Config
+from app.services.chain import ASK, BID, IV, LTP, OI, SIDES, VOLUME, OptionsChain
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ('pop', 'yield', 'spread', 'liquidity', 'distance')
+COLUMNS = ('expiry', 'strike', 'symbol', 'premium', 'bid', 'ask', 'oi', 'volume', 'distance',
+           'iv', 'delta', 'pop', 'spread', 'margin', 'yield', 'lot_size', 'score')
+
+
+class StrikeSelector:
+    """
+    Rank short option strikes across expiries and size them under a budget
+
+    score() flattens every strike of every chain into one set of arrays and
+    scores them in a single vectorized pass on five components, each
+    min-max scaled over the contracts that pass the constraints:
+
+        pop        probability the underlying ends beyond breakeven (strike
+                   minus/plus premium) at expiry, lognormal at the surface
+                   IV (chain IV where the surface has no fit yet)
+        yield      premium per unit of blocked margin, annualized so that
+                   expiries compare
+        spread     bid-ask cost as a fraction of mid (tighter is better)
+        liquidity  log open interest plus log volume
+        distance   OTM distance as a fraction of spot
+
+    The score is their weighted mean (SELECTION_WEIGHT_*). allocate() then
+    picks whole lots for at most `legs` strikes under a budget.
+    """
+
+    def __init__(self, surface=None, weights: Optional[Dict[str, float]] = None,
+                 min_pop: float = None, max_spread_percent: float = None, min_oi: float = None,
+                 min_otm_percent: float = None, short_margin_percent: float = None,
+                 risk_free_rate: float = None, basis: str = None):
+        self.surface = surface
+        self.weights = weights or {
+            'pop': Config.SELECTION_WEIGHT_POP,
+            'yield': Config.SELECTION_WEIGHT_YIELD,
+            'spread': Config.SELECTION_WEIGHT_SPREAD,
+            'liquidity': Config.SELECTION_WEIGHT_LIQUIDITY,
+            'distance': Config.SELECTION_WEIGHT_DISTANCE
+        }
+        self.min_pop = Config.SELECTION_MIN_POP if min_pop is None else min_pop
+        self.max_spread_percent = Config.SELECTION_MAX_SPREAD_PERCENT if max_spread_percent is None else max_spread_percent
+        self.min_oi = Config.SELECTION_MIN_OI if min_oi is None else min_oi
+        self.min_otm_percent = Config.SELECTION_MIN_OTM_PERCENT if min_otm_percent is None else min_otm_percent
+        self.short_margin_percent = short_margin_percent or Config.SHORT_MARGIN_PERCENT
+        self.risk_free_rate = Config.RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+        self.basis = basis or Config.SELECTION_BUDGET_BASIS
+
+    @staticmethod
+    def _column(chains, name: str, default=0.0, dtype=np.float64) -> np.ndarray:
+        return np.concatenate([
+            np.asarray(chain[name], dtype=dtype) if name in chain else np.full(len(chain), default, dtype=dtype)
+            for chain in chains
+        ])
+
+    @staticmethod
+    def _scale(values: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+        """Min-max over the eligible rows, 0 where unknown or where all rows tie"""
+        known = eligible & np.isfinite(values)
+        if not known.any():
+            return np.zeros(len(values))
+        lo, hi = values[known].min(), values[known].max()
+        if hi <= lo:
+            return np.zeros(len(values))
+        return np.where(known, (values - lo) / (hi - lo), 0.0)
+
+    def score(self, chains: Sequence, times: Sequence[float], lot_sizes: Sequence[int],
+              option_type: str = 'PE', min_premium: float = 0.0) -> pd.DataFrame:
+        """
+        Score every strike of `chains` (OptionsChain or DataFrame, aligned
+        with `times` in years and `lot_sizes`); eligible rows, best first
+        """
+        pairs = [(chain, T, lot) for chain, T, lot in zip(chains, times, lot_sizes) if len(chain)]
+        if not pairs:
+            return pd.DataFrame(columns=list(COLUMNS))
+        chains = [chain for chain, _, _ in pairs]
+        sizes = [len(chain) for chain in chains]
+        side = 'pe' if option_type == 'PE' else 'ce'
+
+        strike = self._column(chains, 'strike')
+        spot = self._column(chains, 'spot_price')
+        if all(isinstance(chain, OptionsChain) for chain in chains):
+            # One copy of each chain's side block instead of a copy per field
+            block = np.concatenate([chain.values[:, SIDES.index(side)] for chain in chains], axis=1)
+            ltp, bid, ask, oi, volume, iv = (block[field] for field in (LTP, BID, ASK, OI, VOLUME, IV))
+        else:
+            ltp = self._column(chains, f'{side}_ltp')
+            bid = self._column(chains, f'{side}_bid')
+            ask = self._column(chains, f'{side}_ask')
+            oi = self._column(chains, f'{side}_oi')
+            volume = self._column(chains, f'{side}_volume')
+            iv = self._column(chains, f'{side}_iv', np.nan)
+        T = np.maximum(np.repeat(np.asarray([T for _, T, _ in pairs], dtype=np.float64), sizes), 1e-6)
+        lot = np.repeat(np.asarray([lot for _, _, lot in pairs], dtype=np.float64), sizes)
+
+        # Sellers realise nearer the mid than the last trade when both sides are quoted
+        quoted = (bid > 0) & (ask >= bid)
+        premium = np.where(quoted, (bid + ask) / 2, ltp)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spread = np.where(quoted & (premium > 0), (ask - bid) / premium, np.nan)
+
+        if self.surface is not None and self.surface.slices:
+            fitted = self.surface.sigma(strike, T, spot)
+            iv = np.where(np.isfinite(fitted), fitted, iv)
+
+        # Breakeven probability and delta share the lognormal terms
+        is_put = option_type == 'PE'
+        breakeven = strike - premium if is_put else strike + premium
+        sigma_sqrt_t = iv * np.sqrt(T)
+        drift = (self.risk_free_rate - 0.5 * iv ** 2) * T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d2 = (np.log(spot / breakeven) + drift) / sigma_sqrt_t
+            d1 = (np.log(spot / strike) + drift) / sigma_sqrt_t + sigma_sqrt_t
+        pop = ndtr(d2) if is_put else ndtr(-d2)
+        pop = np.where(np.isfinite(d2) & (breakeven > 0), pop, np.nan)
+        delta = ndtr(d1) - 1 if is_put else ndtr(d1)
+
+        margin = spot * lot * self.short_margin_percent / 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yield_ = premium * lot / margin
+        otm = (spot - strike) / spot if is_put else (strike - spot) / spot
+        liquidity = np.log1p(np.maximum(oi, 0)) + np.log1p(np.maximum(volume, 0))
+
+        eligible = ((premium >= min_premium) & (premium > 0) & np.isfinite(pop) &
+                    (pop >= self.min_pop) & (otm * 100 >= self.min_otm_percent) & (oi >= self.min_oi) &
+                    ~(spread * 100 > self.max_spread_percent))
+
+        components = {
+            'pop': self._scale(pop, eligible),
+            'yield': self._scale(yield_ / T, eligible),
+            'spread': np.where(np.isfinite(spread), 1 - self._scale(spread, eligible), 0.0),
+            'liquidity': self._scale(liquidity, eligible),
+            'distance': self._scale(otm, eligible)
+        }
+        total = sum(self.weights.get(name, 0.0) for name in COMPONENTS) or 1.0
+        score = sum(self.weights.get(name, 0.0) * components[name] for name in COMPONENTS) / total
+
+        rows = np.flatnonzero(eligible)
+        rows = rows[np.argsort(-score[rows], kind='stable')]
+        symbols = self._column(chains, f'{side}_symbol', None, object)
+        expiries = self._column(chains, 'expiry', None, object)
+        return pd.DataFrame({
+            'expiry': expiries[rows],
+            'strike': strike[rows].astype(np.int64),
+            'symbol': symbols[rows],
+            'premium': premium[rows],
+            'bid': bid[rows],
+            'ask': ask[rows],
+            'oi': oi[rows].astype(np.int64),
+            'volume': volume[rows].astype(np.int64),
+            'distance': (spot - strike)[rows] if is_put else (strike - spot)[rows],
+            'iv': iv[rows],
+            'delta': delta[rows],
+            'pop': pop[rows],
+            'spread': spread[rows],
+            'margin': margin[rows],
+            'yield': yield_[rows],
+            'lot_size': lot[rows].astype(np.int64),
+            'score': score[rows]
+        })
+
+    def allocate(self, candidates: pd.DataFrame, budget: float, legs: int, basis: str = None,
+                 max_leg_fraction: float = None, pool: int = None, resolution: int = 400) -> pd.DataFrame:
+        """
+        Whole lots for at most `legs` of the ranked candidates within `budget`
+
+        A lot costs its premium (basis='premium', the way position_quantity
+        sizes) or its blocked margin (basis='margin'), and no leg takes more
+        than max_leg_fraction of the budget (default an equal 1/legs split).
+        Maximizes score-weighted premium collected: a bounded knapsack
+        solved by DP over the budget in `resolution` steps, each cost
+        rounded up so the result never exceeds the budget. Only the best
+        `pool` candidates (default 4 per leg, at least 12) are considered. Returns the picked rows with
+        lots, quantity and cost, best score first.
+        """
+        basis = basis or self.basis
+        if candidates.empty or budget <= 0 or legs <= 0:
+            return candidates.head(0).assign(lots=0, quantity=0, cost=0.0)
+
+        top = candidates.head(pool or max(12, 4 * legs))
+        lot = top['lot_size'].to_numpy(dtype=np.float64)
+        premium = top['premium'].to_numpy(dtype=np.float64) * lot
+        cost = top['margin'].to_numpy(dtype=np.float64) if basis == 'margin' else premium
+        value = top['score'].to_numpy(dtype=np.float64) * premium
+        cap = budget * (max_leg_fraction or 1 / legs)
+        unit = budget / resolution
+        with np.errstate(divide='ignore', invalid='ignore'):
+            max_lots = np.where(cost > 0, np.floor(np.minimum(cap, budget) / cost), 0).astype(np.int64)
+            steps = np.ceil(cost / unit - 1e-9).astype(np.int64)
+
+        # best[k, b]: highest value using k legs and at most b budget steps
+        best = np.full((legs + 1, resolution + 1), -np.inf)
+        best[0] = 0.0
+        chosen = np.zeros((len(top), legs + 1, resolution + 1), dtype=np.int32)
+        for item in range(len(top)):
+            count = min(int(max_lots[item]), resolution // max(int(steps[item]), 1))
+            if count < 1 or value[item] <= 0:
+                continue
+            # Each lot count shifts the k-1 leg row right by its cost; all
+            # read the table as it was before this strike
+            previous = best.copy()
+            for lots in range(1, count + 1):
+                shift = lots * int(steps[item])
+                gain = previous[:-1, :resolution + 1 - shift] + lots * value[item]
+                better = gain > best[1:, shift:]
+                np.copyto(best[1:, shift:], gain, where=better)
+                np.copyto(chosen[item, 1:, shift:], lots, where=better)
+
+        k = int(best[:, resolution].argmax())
+        if not np.isfinite(best[k, resolution]) or k == 0:
+            return top.head(0).assign(lots=0, quantity=0, cost=0.0)
+        b = resolution
+        picked = {}
+        for item in range(len(top) - 1, -1, -1):
+            lots = int(chosen[item, k, b])
+            if lots:
+                picked[item] = lots
+                k -= 1
+                b -= lots * int(steps[item])
+        rows = sorted(picked)
+        lots = np.array([picked[item] for item in rows])
+        return top.iloc[rows].assign(lots=lots, quantity=lots * lot[rows].astype(np.int64), cost=cost[rows] * lots)
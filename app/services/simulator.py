@@ -0,0 +1,687 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from kiteconnect.exceptions import InputException, NetworkException
+
+from app.config import Config
+from app.services.options import OptionsChainService
+from app.services.recorder import ChainReader
+from app.services.ticker import (DEPTH_LEVELS, MODE_FULL, MarketDataTicker, QuoteStore, pack_full_packet,
+                                 pack_index_packet, pack_message)
+from app.utils.greeks import GreeksCalculator
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = 'NSE:NIFTY 50'
+NFO_SEGMENT = 2  # token & 0xFF of NFO contracts (prices in paise)
+TICK_SIZE = 0.05
+TRADING_YEAR_SECONDS = 252 * 6.25 * 3600
+
+# Kite's published limits, requests per second per endpoint group
+KITE_RATE_LIMITS = {'quote': 1, 'order': 10, 'default': 10}
+ENDPOINT_GROUPS = {'quote': 'quote', 'place_order': 'order', 'cancel_order': 'order'}
+
+
+def _round_tick(values, how=np.round) -> np.ndarray:
+    # Rounding to 6 places first keeps 100.05 / 0.05 from flooring to 2000
+    return np.round(how(np.round(np.asarray(values) / TICK_SIZE, 6)) * TICK_SIZE, 2)
+
+
+class _ReplayPartition:
+    """One recorded expiry/day, with each row mapped to its CE and PE contract"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], ce: np.ndarray, pe: np.ndarray):
+        self.arrays = {column: np.asarray(values) for column, values in arrays.items()}
+        self.ce = ce
+        self.pe = pe
+        timestamps = self.arrays['timestamp']
+        self.bounds = np.flatnonzero(np.r_[True, timestamps[1:] != timestamps[:-1], True])
+        self.snapshots = timestamps[self.bounds[:-1]]
+        self.applied = -1
+
+
+class SimulatedExchange:
+    """
+    In-process NIFTY options exchange behind the Kite client interface
+
+    BrokerService drives whatever client it is given through the
+    KiteConnect methods it uses (quote, positions, holdings, place_order,
+    order_history, cancel_order, orders, instruments); this class answers
+    all of them from memory, so the chain, strategy and order paths run
+    with no credentials, network or market hours (BROKER_BACKEND=simulator,
+    or BrokerService(kite=SimulatedExchange(...)) in benchmarks).
+
+    Prices: weekly expiries and 50-point strikes around `spot`, priced by
+    Black-Scholes on a skewed smile while the spot follows a seeded
+    geometric Brownian motion, one step per step() call (or per
+    `interval` once start()ed). With `replay`, a directory written by
+    ChainRecorder, the recorded spot and quotes of one day are played back
+    instead; recorded expiries keep their days to expiry relative to today
+    and the last snapshot holds once the day runs out.
+
+    Depth: five levels a side around the mark, spreads widening and size
+    thinning away from the money. Orders walk it level by level (marketable
+    LIMIT and MARKET), take liquidity for the rest of the step, and rest
+    any remainder until later steps cross it; fills update positions and
+    are pushed to order listeners from a delivery thread, as postbacks are.
+
+    Faults: every call sleeps `latency` plus exponential `jitter` seconds,
+    fails with NetworkException at `error_rate`, and past the per-second
+    `rate_limits` ({'quote': 1, 'order': 10, 'default': 10}, KITE_RATE_LIMITS)
+    fails with a 429 NetworkException; `reject_rate` of valid orders are
+    rejected by "RMS". The path, depth and faults come from `seed` alone,
+    so two runs with the same calls see the same prices and fills.
+    """
+
+    simulated = True
+
+    def __init__(self, spot: float = 22000.0, volatility: float = 0.13, seed: int = 0,
+                 expiries: int = 18, strike_range: float = 0.2, strike_step: int = 50,
+                 lot_size: int = None, depth_lots: int = 20, skew: float = 0.25, curvature: float = 0.8,
+                 spread: float = 0.002, tick_interval: float = 1.0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, reject_rate: float = 0.0, rate_limits: Optional[Dict[str, float]] = None,
+                 holdings: Optional[List[Dict]] = None, replay: Optional[str] = None, replay_date: str = None):
+        self.spot = float(spot)
+        self.volatility = volatility
+        self.skew = skew
+        self.curvature = curvature
+        self.spread = spread
+        self.lot_size = lot_size or Config.NIFTY_LOT_SIZE
+        self.depth_lots = depth_lots
+        self.tick_interval = tick_interval
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.rate_limits = rate_limits or {}
+        self.holdings_book = list(holdings or [])
+        self.steps = 0
+
+        # Separate streams so faults never perturb the price path
+        self._path_rng = np.random.default_rng(seed)
+        self._depth_seed = seed
+        self._fault_rng = np.random.default_rng(seed + 1)
+        self._lock = threading.RLock()
+        self._fault_lock = threading.Lock()
+        self._windows: Dict[str, deque] = {}
+        self.calls = Counter()
+        self.faults = Counter()
+
+        self._replay: List[_ReplayPartition] = []
+        self._timeline = np.empty(0, dtype=np.int64)
+        if replay:
+            self._list_recorded(replay, replay_date)
+        else:
+            self._list_synthetic(expiries, strike_range, strike_step)
+        # Session open, high, low and the previous close the index quote reports
+        self.ohlc = [self.spot] * 4
+
+        rows = len(self.strike)
+        self.mark = np.zeros(rows)
+        self.bid = np.zeros(rows)
+        self.ask = np.zeros(rows)
+        self.oi = np.round(2e6 * np.exp(-(np.log(self.strike / self.spot) / 0.04) ** 2) *
+                           self._path_rng.uniform(0.2, 1.0, rows))
+        self.volume = np.round(self.oi * self._path_rng.uniform(0.05, 0.3, rows))
+        self._recorded = np.full((5, rows), np.nan)  # ltp, bid, ask, oi, volume
+        self._quantities = None
+        self._taken = np.zeros((2, rows, DEPTH_LEVELS), dtype=np.int64)
+
+        self._orders: Dict[str, Dict] = {}
+        self._history: Dict[str, List[Dict]] = {}
+        self._resting: Dict[str, Dict] = {}
+        self._positions: Dict[int, List] = {}
+        self._order_ids = itertools.count(1)
+        self._step_listeners: List[Callable] = []
+        self._order_listeners: List[Callable] = []
+        self._updates = queue.Queue()
+        self._delivery = None
+        self._clock = None
+        self._running = False
+
+        if self._replay:
+            self._advance()
+        self._reprice()
+
+    @classmethod
+    def from_config(cls) -> 'SimulatedExchange':
+        return cls(spot=Config.SIMULATOR_SPOT, volatility=Config.SIMULATOR_VOLATILITY, seed=Config.SIMULATOR_SEED,
+                   tick_interval=Config.SIMULATOR_TICK_INTERVAL, latency=Config.SIMULATOR_LATENCY_MS / 1000,
+                   jitter=Config.SIMULATOR_JITTER_MS / 1000, error_rate=Config.SIMULATOR_ERROR_RATE,
+                   reject_rate=Config.SIMULATOR_REJECT_RATE,
+                   rate_limits=KITE_RATE_LIMITS if Config.SIMULATOR_RATE_LIMITS else None,
+                   replay=Config.SIMULATOR_REPLAY_DIR, replay_date=Config.SIMULATOR_REPLAY_DATE)
+
+    # Listed contracts
+
+    def _list(self, expiries: List[date], strikes: List[np.ndarray]):
+        """Contract arrays: per expiry, every CE strike then every PE strike"""
+        self.expiries = [expiry.strftime('%d%b%y').upper() for expiry in expiries]
+        self.expiry_dates = list(expiries)
+        sizes = [len(listed) for listed in strikes]
+        self.offsets = np.r_[0, np.cumsum([2 * size for size in sizes])]
+        self.expiry_index = np.repeat(np.arange(len(expiries)), [2 * size for size in sizes])
+        self.strike = np.concatenate([np.r_[listed, listed] for listed in strikes]).astype(np.float64)
+        self.is_call = np.concatenate([np.r_[np.ones(size, bool), np.zeros(size, bool)] for size in sizes])
+        self.strikes = strikes
+
+        rows = len(self.strike)
+        self.tokens = (np.arange(rows, dtype=np.int64) + 40000) << 8 | NFO_SEGMENT
+        self.symbols = np.array([
+            f"NIFTY{self.expiries[e]}{int(strike)}{'CE' if call else 'PE'}"
+            for e, strike, call in zip(self.expiry_index.tolist(), self.strike.tolist(), self.is_call.tolist())
+        ], dtype=object)
+        self._by_symbol = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self._by_token = {token: row for row, token in enumerate(self.tokens.tolist())}
+
+    def _list_synthetic(self, expiries: int, strike_range: float, strike_step: int):
+        today = date.today()
+        first = today + timedelta(days=(3 - today.weekday()) % 7 or 7)  # Next Thursday
+        lower = int(self.spot * (1 - strike_range) / strike_step) * strike_step
+        upper = int(self.spot * (1 + strike_range) / strike_step) * strike_step
+        strikes = np.arange(lower, upper + strike_step, strike_step)
+        self._list([first + timedelta(weeks=week) for week in range(expiries)], [strikes] * expiries)
+
+    def _list_recorded(self, directory: str, day: Optional[str]):
+        """List the recorded day's expiries (shifted to keep their DTE) and load its snapshots"""
+        reader = ChainReader(directory)
+        partitions = reader.partitions()
+        day = day or max((recorded for _, recorded in partitions), default=None)
+        partitions = sorted(((expiry, recorded) for expiry, recorded in partitions if recorded == day),
+                            key=lambda partition: datetime.strptime(partition[0], '%d%b%y'))
+        if not partitions:
+            raise ValueError(f"No recorded chains in {directory} for {day}")
+
+        recorded_day = datetime.strptime(day, '%Y-%m-%d').date()
+        frames = [reader.read_arrays(expiry, day) for expiry, _ in partitions]
+        expiries = [date.today() + (datetime.strptime(expiry, '%d%b%y').date() - recorded_day)
+                    for expiry, _ in partitions]
+        strikes = [np.unique(np.asarray(arrays['strike'])).astype(np.int64) for arrays in frames]
+        self._list(expiries, strikes)
+
+        for e, arrays in enumerate(frames):
+            position = np.searchsorted(strikes[e], np.asarray(arrays['strike']))
+            ce = self.offsets[e] + position
+            self._replay.append(_ReplayPartition(arrays, ce, ce + len(strikes[e])))
+        self._timeline = np.unique(np.concatenate([partition.snapshots for partition in self._replay]))
+        self._cursor = -1
+        first = self._replay[0]
+        self.spot = float(first.arrays['spot_price'][0])
+
+    def instruments(self, exchange: str = None) -> List[Dict]:
+        """Instrument master rows, shaped like Kite's"""
+        self._request('instruments')
+        if exchange not in (None, 'NFO'):
+            return []
+        return [{
+            'instrument_token': int(self.tokens[row]),
+            'exchange_token': int(self.tokens[row]) >> 8,
+            'tradingsymbol': self.symbols[row],
+            'name': 'NIFTY',
+            'last_price': 0.0,
+            'expiry': self.expiry_dates[self.expiry_index[row]],
+            'strike': float(self.strike[row]),
+            'tick_size': TICK_SIZE,
+            'lot_size': self.lot_size,
+            'instrument_type': 'CE' if self.is_call[row] else 'PE',
+            'segment': 'NFO-OPT',
+            'exchange': 'NFO'
+        } for row in range(len(self.strike))]
+
+    def set_access_token(self, access_token: str):
+        pass
+
+    # Market
+
+    def _advance(self):
+        """Move the underlying (or the replay) one tick"""
+        self.steps += 1
+        self._quantities = None
+        self._taken[:] = 0
+        if not self._replay:
+            dt = self.tick_interval / TRADING_YEAR_SECONDS
+            shock = self._path_rng.standard_normal()
+            self.spot *= np.exp(-0.5 * self.volatility ** 2 * dt + self.volatility * np.sqrt(dt) * shock)
+        else:
+            self._replay_next()
+        self.ohlc[1] = max(self.ohlc[1], self.spot)
+        self.ohlc[2] = min(self.ohlc[2], self.spot)
+
+    def _replay_next(self):
+        """Apply every partition's latest snapshot at the next recorded timestamp"""
+        self._cursor = min(self._cursor + 1, len(self._timeline) - 1)
+        now = self._timeline[self._cursor]
+        for partition in self._replay:
+            snapshot = np.searchsorted(partition.snapshots, now, side='right') - 1
+            if snapshot < 0 or snapshot == partition.applied:
+                continue
+            partition.applied = snapshot
+            rows = slice(partition.bounds[snapshot], partition.bounds[snapshot + 1])
+            arrays = partition.arrays
+            for side, contracts in (('ce', partition.ce), ('pe', partition.pe)):
+                for field, column in enumerate(('ltp', 'bid', 'ask', 'oi', 'volume')):
+                    self._recorded[field, contracts[rows]] = arrays[f'{side}_{column}'][rows]
+            self.spot = float(arrays['spot_price'][rows.start])
+
+    def _reprice(self):
+        """Marks and top of book for every contract at the current spot"""
+        T = np.array([OptionsChainService.time_to_expiry(expiry) for expiry in self.expiries])[self.expiry_index]
+        k = np.log(self.strike / self.spot)
+        sigma = np.maximum(self.volatility - self.skew * k + self.curvature * k ** 2, 0.01)
+        price = GreeksCalculator.calculate_batch_greeks(self.spot, self.strike, T, Config.RISK_FREE_RATE,
+                                                        sigma, self.is_call)['price']
+        mark = np.maximum(_round_tick(price), TICK_SIZE)
+        half = np.maximum(TICK_SIZE, mark * (self.spread + 0.4 * np.abs(k)))
+        bid = np.maximum(_round_tick(mark - half, np.floor), TICK_SIZE)
+        ask = np.maximum(_round_tick(mark + half, np.ceil), bid + TICK_SIZE)
+
+        if self._replay:
+            ltp, rec_bid, rec_ask, oi, volume = self._recorded
+            quoted = np.isfinite(ltp) & (ltp > 0)
+            mark = np.where(quoted, ltp, mark)
+            two_sided = quoted & (rec_bid > 0) & (rec_ask >= rec_bid)
+            bid = np.where(two_sided, rec_bid, np.where(quoted, np.maximum(mark - half, TICK_SIZE), bid))
+            ask = np.where(two_sided, rec_ask, np.where(quoted, mark + half, ask))
+            self.oi = np.where(quoted, oi, self.oi)
+            self.volume = np.where(quoted, volume, self.volume)
+
+        self.mark, self.bid, self.ask = mark, bid, ask
+        self._level_step = np.maximum(TICK_SIZE, _round_tick(mark * 0.002))
+
+    def _depth(self, rows: np.ndarray):
+        """Prices (2, n, levels) and quantities left this step; side 0 bids, 1 asks"""
+        if self._quantities is None:
+            rng = np.random.default_rng((self._depth_seed, self.steps))
+            k = np.log(self.strike / self.spot)
+            liquidity = np.exp(-(k / 0.08) ** 2)
+            shape = (2, len(self.strike), DEPTH_LEVELS)
+            lots = self.depth_lots * liquidity[None, :, None] * (1 + 0.5 * np.arange(DEPTH_LEVELS)) * \
+                rng.uniform(0.5, 1.5, shape)
+            self._quantities = np.maximum(np.round(lots), 1).astype(np.int64) * self.lot_size
+
+        levels = np.arange(DEPTH_LEVELS)
+        step = self._level_step[rows][:, None]
+        prices = np.stack([np.maximum(self.bid[rows][:, None] - levels * step, TICK_SIZE),
+                           self.ask[rows][:, None] + levels * step])
+        quantities = self._quantities[:, rows] - self._taken[:, rows]
+        return prices, quantities
+
+    def step(self, count: int = 1) -> float:
+        """Advance the market `count` ticks and match resting orders; returns the spot"""
+        updates = []
+        with self._lock:
+            for _ in range(count):
+                self._advance()
+            self._reprice()
+            for order in list(self._resting.values()):
+                updates.extend(self._match(order))
+        self._publish(updates)
+
+        for callback in self._step_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Simulator step listener failed: {e}")
+        return self.spot
+
+    def start(self, interval: float = None) -> 'SimulatedExchange':
+        """Step every `interval` seconds (default tick_interval) on a background thread"""
+        if self._running:
+            return self
+        self._running = True
+        interval = interval or self.tick_interval
+
+        def run():
+            while self._running:
+                time.sleep(interval)
+                self.step()
+
+        self._clock = threading.Thread(target=run, name='simulated-exchange', daemon=True)
+        self._clock.start()
+        return self
+
+    def stop(self):
+        self._running = False
+
+    def add_step_listener(self, callback: Callable):
+        """callback() runs after every step, on the stepping thread"""
+        self._step_listeners.append(callback)
+
+    def add_order_listener(self, callback: Callable):
+        """callback(order) runs for every order update, on the delivery thread"""
+        self._order_listeners.append(callback)
+        if self._delivery is None:
+            self._delivery = threading.Thread(target=self._deliver, name='simulated-postbacks', daemon=True)
+            self._delivery.start()
+
+    def _deliver(self):
+        while True:
+            order = self._updates.get()
+            for callback in self._order_listeners:
+                try:
+                    callback(order)
+                except Exception as e:
+                    logger.error(f"Simulator order listener failed: {e}")
+
+    def _publish(self, updates: List[Dict]):
+        if self._order_listeners:
+            for order in updates:
+                self._updates.put(order)
+
+    # Faults
+
+    def _request(self, method: str):
+        """Apply latency, rate limits and injected errors to one call"""
+        group = ENDPOINT_GROUPS.get(method, 'default')
+        self.calls[method] += 1
+        with self._fault_lock:
+            delay = self.latency + (self._fault_rng.exponential(self.jitter) if self.jitter else 0.0)
+            failed = self.error_rate > 0 and self._fault_rng.random() < self.error_rate
+            limited = False
+            limit = self.rate_limits.get(group)
+            if limit:
+                now = time.monotonic()
+                window = self._windows.setdefault(group, deque())
+                while window and now - window[0] >= 1.0:
+                    window.popleft()
+                limited = len(window) >= limit
+                if not limited:
+                    window.append(now)
+
+        if delay > 0:
+            time.sleep(delay)
+        if limited:
+            self.faults['rate_limited'] += 1
+            raise NetworkException("Too many requests", code=429)
+        if failed:
+            self.faults['injected'] += 1
+            raise NetworkException("Simulated gateway timeout", code=504)
+
+    # Quotes and portfolio
+
+    def quote(self, *instruments) -> Dict[str, Dict]:
+        """Full quotes for 'EXCHANGE:SYMBOL' keys; unknown keys are left out, as Kite does"""
+        self._request('quote')
+        keys = [key for item in instruments for key in ([item] if isinstance(item, str) else item)]
+        timestamp = datetime.now().replace(microsecond=0)
+        quotes = {}
+        with self._lock:
+            if INDEX_KEY in keys:
+                quotes[INDEX_KEY] = {
+                    'instrument_token': Config.NIFTY_INDEX_TOKEN,
+                    'last_price': round(self.spot, 2),
+                    'ohlc': dict(zip(('open', 'high', 'low', 'close'), self.ohlc)),
+                    'timestamp': timestamp
+                }
+            found = [(key, self._by_symbol.get(key[4:])) for key in keys if key.startswith('NFO:')]
+            found = [(key, row) for key, row in found if row is not None]
+            if not found:
+                return quotes
+            rows = np.array([row for _, row in found])
+            prices, quantities = self._depth(rows)
+            for i, (key, row) in enumerate(found):
+                quotes[key] = {
+                    'instrument_token': int(self.tokens[row]),
+                    'last_price': float(self.mark[row]),
+                    'volume': int(self.volume[row]),
+                    'oi': int(self.oi[row]),
+                    'timestamp': timestamp,
+                    'depth': {side: [{'price': round(float(prices[s, i, level]), 2),
+                                      'quantity': int(quantities[s, i, level]),
+                                      'orders': max(1, int(quantities[s, i, level]) // self.lot_size // 2)}
+                                     for level in range(DEPTH_LEVELS)]
+                              for s, side in enumerate(('buy', 'sell'))}
+                }
+        return quotes
+
+    def tick_message(self, tokens: List[int]) -> bytes:
+        """Binary ticker frame (full mode) for the subscribed tokens"""
+        timestamp = int(time.time())
+        packets = []
+        with self._lock:
+            if Config.NIFTY_INDEX_TOKEN in tokens:
+                packets.append(pack_index_packet(Config.NIFTY_INDEX_TOKEN, self.spot, self.ohlc, timestamp))
+            rows = np.array([row for row in map(self._by_token.get, tokens) if row is not None], dtype=np.int64)
+            if len(rows):
+                prices, quantities = self._depth(rows)
+                prices, quantities = prices.tolist(), quantities.tolist()
+                marks, volumes, ois = self.mark[rows].tolist(), self.volume[rows].tolist(), self.oi[rows].tolist()
+                for i, row in enumerate(rows.tolist()):
+                    bids = [(p, q, max(1, q // self.lot_size // 2)) for p, q in zip(prices[0][i], quantities[0][i])]
+                    asks = [(p, q, max(1, q // self.lot_size // 2)) for p, q in zip(prices[1][i], quantities[1][i])]
+                    packets.append(pack_full_packet(int(self.tokens[row]), marks[i], int(volumes[i]), int(ois[i]),
+                                                    bids, asks, timestamp))
+        return pack_message(packets)
+
+    def positions(self) -> Dict[str, List[Dict]]:
+        """Net and day positions marked at the current LTP (every position is opened today)"""
+        self._request('positions')
+        net = []
+        with self._lock:
+            for row, (buy_quantity, buy_value, sell_quantity, sell_value, product) in self._positions.items():
+                quantity = buy_quantity - sell_quantity
+                last_price = float(self.mark[row])
+                buy_price = buy_value / buy_quantity if buy_quantity else 0.0
+                sell_price = sell_value / sell_quantity if sell_quantity else 0.0
+                pnl = sell_value - buy_value + quantity * last_price
+                realised = min(buy_quantity, sell_quantity) * (sell_price - buy_price)
+                net.append({
+                    'tradingsymbol': self.symbols[row],
+                    'exchange': 'NFO',
+                    'instrument_token': int(self.tokens[row]),
+                    'product': product,
+                    'quantity': quantity,
+                    'overnight_quantity': 0,
+                    'multiplier': 1,
+                    'average_price': buy_price if quantity > 0 else sell_price if quantity < 0 else 0.0,
+                    'last_price': last_price,
+                    'close_price': last_price,
+                    'buy_quantity': buy_quantity,
+                    'buy_price': buy_price,
+                    'buy_value': buy_value,
+                    'sell_quantity': sell_quantity,
+                    'sell_price': sell_price,
+                    'sell_value': sell_value,
+                    'pnl': pnl,
+                    'm2m': pnl,
+                    'realised': realised,
+                    'unrealised': pnl - realised
+                })
+        return {'net': net, 'day': [dict(position) for position in net]}
+
+    def holdings(self) -> List[Dict]:
+        self._request('holdings')
+        return [dict(holding) for holding in self.holdings_book]
+
+    # Orders
+
+    def place_order(self, variety: str, exchange: str, tradingsymbol: str, transaction_type: str,
+                    quantity: int, product: str, order_type: str, price: float = None, tag: str = None,
+                    **kwargs) -> str:
+        """Accept an order, match its marketable part now and rest the remainder"""
+        self._request('place_order')
+        row = self._by_symbol.get(tradingsymbol) if exchange == 'NFO' else None
+        if row is None:
+            raise InputException(f"Invalid tradingsymbol {exchange}:{tradingsymbol}")
+        if order_type not in ('MARKET', 'LIMIT'):
+            raise InputException(f"Order type {order_type} is not supported by the simulator")
+        if order_type == 'LIMIT' and not price:
+            raise InputException("Limit orders need a price")
+        if transaction_type not in ('BUY', 'SELL'):
+            raise InputException(f"Invalid transaction type {transaction_type}")
+
+        with self._fault_lock:
+            rejected = self.reject_rate > 0 and self._fault_rng.random() < self.reject_rate
+        with self._lock:
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            order_id = f"{date.today():%y%m%d}{next(self._order_ids):09d}"
+            order = {
+                'order_id': order_id,
+                'exchange_order_id': f"1{order_id}",
+                'variety': variety,
+                'status': 'OPEN',
+                'status_message': None,
+                'tradingsymbol': tradingsymbol,
+                'exchange': exchange,
+                'instrument_token': int(self.tokens[row]),
+                'transaction_type': transaction_type,
+                'order_type': order_type,
+                'product': product,
+                'quantity': int(quantity),
+                'price': float(price or 0),
+                'filled_quantity': 0,
+                'pending_quantity': int(quantity),
+                'cancelled_quantity': 0,
+                'average_price': 0.0,
+                'tag': tag,
+                'order_timestamp': now,
+                'exchange_timestamp': now
+            }
+            self._orders[order_id] = order
+            self._history[order_id] = []
+
+            if quantity <= 0 or quantity % self.lot_size:
+                updates = [self._update(order, status='REJECTED',
+                                        status_message=f"Quantity should be a multiple of lot size {self.lot_size}")]
+            elif rejected:
+                updates = [self._update(order, status='REJECTED', status_message="RMS: simulated rejection")]
+            else:
+                updates = [self._update(order)]
+                self._resting[order_id] = order
+                updates.extend(self._match(order))
+        self._publish(updates)
+        return order_id
+
+    def _update(self, order: Dict, **changes) -> Dict:
+        """Apply changes and record a snapshot in the order's history"""
+        order.update(changes)
+        order['exchange_timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        snapshot = dict(order)
+        self._history[order['order_id']].append(snapshot)
+        return snapshot
+
+    def _match(self, order: Dict) -> List[Dict]:
+        """Fill what the current depth offers at or better than the order's price"""
+        row = self._by_symbol[order['tradingsymbol']]
+        buying = order['transaction_type'] == 'BUY'
+        side = 1 if buying else 0  # Buys take asks, sells hit bids
+        prices, quantities = self._depth(np.array([row]))
+        limit = order['price'] if order['order_type'] == 'LIMIT' else None
+
+        filled, value = 0, 0.0
+        remaining = order['pending_quantity']
+        for level in range(DEPTH_LEVELS):
+            if remaining <= 0:
+                break
+            level_price = float(prices[side, 0, level])
+            if limit is not None and (level_price > limit + 1e-9 if buying else level_price < limit - 1e-9):
+                break
+            take = min(remaining, int(quantities[side, 0, level]))
+            if take <= 0:
+                continue
+            self._taken[side, row, level] += take
+            filled += take
+            value += take * level_price
+            remaining -= take
+        if not filled:
+            return []
+
+        self.volume[row] += filled
+        position = self._positions.setdefault(row, [0, 0.0, 0, 0.0, order['product']])
+        if buying:
+            position[0] += filled
+            position[1] += value
+        else:
+            position[2] += filled
+            position[3] += value
+
+        total = order['filled_quantity'] + filled
+        average = (order['average_price'] * order['filled_quantity'] + value) / total
+        done = remaining == 0
+        if done:
+            self._resting.pop(order['order_id'], None)
+        return [self._update(order, filled_quantity=total, pending_quantity=remaining,
+                             average_price=round(average, 4), status='COMPLETE' if done else 'OPEN')]
+
+    def cancel_order(self, variety: str, order_id: str, **kwargs) -> str:
+        self._request('cancel_order')
+        with self._lock:
+            order = self._orders.get(str(order_id))
+            if order is None:
+                raise InputException(f"Invalid order_id {order_id}")
+            if order['status'] != 'OPEN':
+                raise InputException(f"Order cannot be cancelled as it is {order['status']}")
+            self._resting.pop(order['order_id'], None)
+            update = self._update(order, status='CANCELLED', cancelled_quantity=order['pending_quantity'],
+                                  pending_quantity=0)
+        self._publish([update])
+        return order['order_id']
+
+    def order_history(self, order_id: str) -> List[Dict]:
+        self._request('order_history')
+        with self._lock:
+            if str(order_id) not in self._history:
+                raise InputException(f"Invalid order_id {order_id}")
+            return [dict(snapshot) for snapshot in self._history[str(order_id)]]
+
+    def orders(self) -> List[Dict]:
+        self._request('orders')
+        with self._lock:
+            return [dict(order) for order in self._orders.values()]
+
+    def stats(self) -> Dict:
+        """Calls per method and faults served so far"""
+        with self._lock:
+            fills = sum(order['filled_quantity'] for order in self._orders.values())
+            return {'steps': self.steps, 'spot': round(self.spot, 2), 'calls': dict(self.calls),
+                    'faults': dict(self.faults), 'orders': len(self._orders), 'resting': len(self._resting),
+                    'filled_quantity': fills}
+
+
+class SimulatedTicker(MarketDataTicker):
+    """
+    MarketDataTicker fed by a SimulatedExchange instead of a websocket
+
+    After every exchange step the subscribed tokens are encoded as a binary
+    full-mode frame and order updates as text frames, and both go through
+    the normal parse and dispatch path, so the QuoteStore and listeners see
+    what the live feed would deliver.
+    """
+
+    def __init__(self, store: QuoteStore, exchange: SimulatedExchange, mode: str = MODE_FULL):
+        super().__init__(store, url='simulator://', mode=mode)
+        self.exchange = exchange
+        exchange.add_step_listener(self._on_step)
+        exchange.add_order_listener(self._on_order)
+
+    def start(self):
+        self._running = True
+        self.connected = True
+
+    def stop(self):
+        self._running = False
+        self._on_close(None)
+
+    def _send_subscription(self, tokens: List[int]):
+        # Streamed from the next step on
+        pass
+
+    def _on_step(self):
+        if not self._running:
+            return
+        with self._lock:
+            tokens = list(self._subscribed)
+        if tokens:
+            self._on_message(None, self.exchange.tick_message(tokens))
+
+    def _on_order(self, order: Dict):
+        if self._running:
+            self._on_text(json.dumps({'type': 'order', 'data': order}, default=str))
@@ -1,9 +1,20 @@
-from typing import Dict, Optional
+from datetime import date
+from typing import Dict, List, Optional
 from app.config import Config
+from app.services.execution import OrderExecutor
+from app.services.risk import PortfolioRisk
+from app.services.scenario import ScenarioEngine
+from app.utils.green import offload
+from app.utils.metrics import metrics
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
+def position_quantity(capital_per_trade, premium, lot_size):
+    """Whole lots affordable per leg; works on scalars and NumPy arrays"""
+    return (capital_per_trade // (premium * lot_size)) * lot_size
+
 class StrategyService:
     """Execute options selling strategies"""
     
@@ -11,19 +22,52 @@ class StrategyService:
         self.broker = broker_service
         self.options = options_service
         self.config = Config()
+        self.executor = OrderExecutor(broker_service)
+        # Greeks/margin/stop state kept current by ticks, fills and periodic syncs
+        self.risk = PortfolioRisk(getattr(options_service, 'instruments', None))
+        self.scenarios = ScenarioEngine(surface=getattr(options_service, 'surface', None))
+        # Cluster state (ClusterState): followers serve the leader's risk snapshot
+        self.shared = None
+        # Cluster followers run strategies on the leader (LeaderRouter), next to its risk gate
+        self.router = None
         
+    @metrics.timed('strategy.execute_put_selling_strategy')
     def execute_put_selling_strategy(self, 
                                      capital: float,
-                                     target_strikes: int = 3) -> Dict:
+                                     target_strikes: int = 3,
+                                     all_or_nothing: Optional[bool] = None) -> Dict:
         """
         Execute 30-45 day put selling strategy
         Sells OTM puts on NIFTY based on your trading style
+        
+        Strikes of every expiry in the window are scored together and
+        capital is split into whole lots across the best target_strikes
+        (see StrikeSelector). With all_or_nothing, filled legs are unwound if any sibling fails.
+        In a cluster, followers run the whole strategy on the leader.
         """
+        if self.router is not None and not self.router.local:
+            failed = {'status': 'failed', 'orders': [], 'errors': ['No reply from the cluster leader']}
+            unknown = {'status': 'unknown', 'orders': [],
+                       'errors': ['The cluster leader took the run but did not reply; check the order book']}
+            return self.router.call('execute_strategy', default=failed, unknown=unknown,
+                                    timeout=self.config.ORDER_FILL_TIMEOUT + 60,
+                                    capital=capital, target_strikes=target_strikes, all_or_nothing=all_or_nothing)
+        
+        # Tags every order of this run at the broker and in the journal
+        run_id = uuid.uuid4().hex[:16]
         results = {
+            'run_id': run_id,
             'status': 'initiated',
             'orders': [],
             'errors': []
         }
+        journal = getattr(self.broker, 'journal', None)
+        if journal is not None:
+            journal.run_started(run_id, 'put_selling', {
+                'capital': capital,
+                'target_strikes': target_strikes,
+                'all_or_nothing': all_or_nothing
+            })
         
         try:
             # Step 1: Get target expiries (30-45 days)
@@ -37,91 +81,133 @@ class StrategyService:
                 results['errors'].append('No suitable expiry found')
                 return results
             
-            target_expiry = expiries[0]  # First available expiry
+            # Step 2: Get options chains for every eligible expiry in one pipelined pass
+            chains = [chain for chain in self.options.get_options_chains(expiries).values() if not chain.empty]
             
-            # Step 2: Get options chain
-            chain = self.options.get_options_chain(target_expiry)
-            
-            if chain.empty:
+            if not chains:
                 results['status'] = 'failed'
                 results['errors'].append('Options chain not available')
                 return results
             
-            # Step 3: Find selling candidates
+            # Step 3: Score every strike of every expiry
             candidates = self.options.find_selling_candidates(
-                chain, 
+                chains, 
                 option_type='PE',
                 min_premium=100
             )
             
-            # Step 4: Calculate position sizing
-            capital_per_trade = capital / target_strikes
+            # Step 4: Whole lots for the best legs within the capital
+            picks = self.options.selector.allocate(candidates, capital, target_strikes)
+            
+            if picks.empty:
+                results['status'] = 'failed'
+                results['errors'].append('No candidate strike fits the capital')
+                return results
+            
+            # Step 5: Build one leg per pick
+            legs = []
+            for row in picks.itertuples(index=False):
+                strike = int(row.strike)
+                legs.append({
+                    'symbol': row.symbol or self.options.option_symbol(row.expiry, strike, 'PE'),
+                    'transaction_type': 'SELL',
+                    'quantity': int(row.quantity),
+                    'order_type': 'MARKET',
+                    'product': 'NRML',  # Normal for positional trading
+                    'strike': strike,
+                    'premium': row.premium,
+                    'expiry': row.expiry,
+                    'tag': run_id
+                })
+            
+            # Step 6: Submit all legs concurrently so later legs don't fill stale
+            if all_or_nothing is None:
+                all_or_nothing = self.config.STRATEGY_ALL_OR_NOTHING
+            with metrics.span('strategy.execute_legs'):
+                execution = self.executor.execute(legs, all_or_nothing=all_or_nothing)
             
-            # Step 5: Place orders for top candidates
-            for idx, row in candidates.head(target_strikes).iterrows():
-                strike = int(row['strike'])
-                premium = row['premium']
-                
-                # Calculate quantity based on capital
-                margin_required = premium * self.config.NIFTY_LOT_SIZE
-                quantity = int(capital_per_trade / margin_required) * self.config.NIFTY_LOT_SIZE
-                
-                if quantity >= self.config.NIFTY_LOT_SIZE:
-                    symbol = f"NIFTY{target_expiry}{strike}PE"
-                    
-                    order_id = self.broker.place_order(
-                        symbol=symbol,
-                        transaction_type='SELL',
-                        quantity=quantity,
-                        order_type='MARKET',
-                        product='NRML'  # Normal for positional trading
-                    )
-                    
-                    if order_id:
-                        results['orders'].append({
-                            'order_id': order_id,
-                            'symbol': symbol,
-                            'strike': strike,
-                            'quantity': quantity,
-                            'premium': premium,
-                            'expiry': target_expiry
-                        })
-                    else:
-                        results['errors'].append(f'Failed to place order for {strike}PE')
+            for leg in execution['legs']:
+                if leg['status'] == 'COMPLETE' and not execution['unwound']:
+                    results['orders'].append(leg)
+                elif leg['status'] == 'TIMEOUT' and leg['order_id']:
+                    # Still working at the broker (not cancelled): returned so the caller sees the live order
+                    results['orders'].append(leg)
+                    results['errors'].append(f"Order {leg['order_id']} for {leg['strike']}PE still open after "
+                                             f"{self.executor.timeout:g}s ({leg['filled_quantity']} filled)")
+                elif leg.get('rejection'):
+                    reasons = '; '.join(reason['message'] for reason in leg['rejection'])
+                    results['errors'].append(f"Order for {leg['strike']}PE rejected: {reasons}")
+                else:
+                    results['errors'].append(f"Order for {leg['strike']}PE {leg['status'].lower()}")
             
-            results['status'] = 'completed' if results['orders'] else 'failed'
+            results['unwound'] = execution['unwound']
+            results['execution_ms'] = execution['elapsed_ms']
+            if any(order['status'] == 'COMPLETE' for order in results['orders']):
+                results['status'] = 'completed'
+            else:
+                results['status'] = 'pending' if results['orders'] else 'failed'
             
         except Exception as e:
             logger.error(f"Strategy execution failed: {e}")
             results['status'] = 'error'
             results['errors'].append(str(e))
         
+        if journal is not None:
+            journal.run_finished(run_id, results['status'], {
+                'orders': len(results['orders']),
+                'errors': results['errors'],
+                'execution_ms': results.get('execution_ms')
+            })
         return results
     
-    def monitor_positions(self) -> Dict:
+    @metrics.timed('strategy.monitor_positions')
+    def monitor_positions(self, positions: Optional[List[Dict]] = None) -> Dict:
         """Monitor and manage open positions"""
-        positions = self.broker.get_positions()
+        if positions is None and self.shared is not None:
+            # The cluster leader's analysis, kept current by its ticks, fills and dashboard polls
+            snapshot = self.shared.get('risk')
+            if snapshot is not None:
+                return snapshot
         
-        analysis = {
-            'total_positions': len(positions),
-            'total_pnl': 0,
-            'positions_at_risk': [],
-            'recommendations': []
-        }
+        if positions is not None:
+            self.risk.sync(positions, self._spot())
+        elif self.risk.stale():
+            # Ticks and fills keep the state live; reconcile with the broker now and then
+            self.risk.sync(self.broker.get_positions(), self._spot())
         
-        for position in positions:
-            pnl = position.get('pnl', 0)
-            analysis['total_pnl'] += pnl
-            
-            # Check if stop loss hit (30% of premium)
-            if pnl < 0:
-                loss_percent = abs(pnl / position['buy_value']) * 100
-                
-                if loss_percent >= self.config.STOP_LOSS_PERCENT:
-                    analysis['positions_at_risk'].append({
-                        'symbol': position['tradingsymbol'],
-                        'loss_percent': loss_percent,
-                        'action': 'CLOSE_IMMEDIATELY'
-                    })
+        return self.risk.analysis()
+    
+    @metrics.timed('strategy.stress_test')
+    def stress_test(self, spot_shocks: List[float], iv_shocks: List[float],
+                    days: Optional[List[float]] = None) -> Dict:
+        """P&L surface of open positions over spot x IV shocks"""
+        self.monitor_positions()
+        # Large grids are pure NumPy; keep them off the green-thread hub
+        return offload(self.scenarios.pnl_surface, self.risk.book(), spot_shocks, iv_shocks, days or [0])
+    
+    def _spot(self) -> Optional[float]:
+        quote = self.broker.get_quote('NIFTY 50', 'NSE')
+        return quote.get('last_price') if quote else None
+    
+    @metrics.timed('strategy.pnl_summary')
+    def pnl_summary(self, positions: Optional[List[Dict]] = None, start: Optional[date] = None,
+                    end: Optional[date] = None, strategy: Optional[str] = None) -> Dict:
+        """
+        Aggregate realised/unrealised P&L across positions
+        
+        With a date range (and a journal attached), 'history' adds realized
+        P&L from journaled fills by trading day and by strategy.
+        """
+        if positions is None:
+            positions = self.broker.get_positions()
         
-        return analysis
\ No newline at end of file
+        summary = {
+            'total_pnl': sum(pos.get('pnl', 0) for pos in positions),
+            'realized_pnl': sum(pos.get('realised', 0) for pos in positions),
+            'unrealized_pnl': sum(pos.get('unrealised', 0) for pos in positions),
+            'positions_count': len(positions)
+        }
+        journal = getattr(self.broker, 'journal', None)
+        if journal is not None and (start or end or strategy):
+            summary['history'] = journal.pnl(start, end, strategy)
+        return summary
@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+MIN_IV = 0.01
+MAX_IV = 3.0
+
+
+class VolatilitySurface:
+    """
+    Smoothed implied volatility over log-moneyness x time to expiry
+
+    Each expiry is one slice: a vega-weighted polynomial fit of total
+    variance w = iv^2 * T against k = ln(K / F), using out-of-the-money
+    quotes (puts below the forward, calls above). Between slices total
+    variance is interpolated linearly in T at fixed k, beyond the last
+    slice implied vol is held flat, and outside a slice's quoted strikes
+    its edge value is used. update() refits a single expiry, so a tick on
+    one expiry never touches the others.
+    """
+
+    def __init__(self, degree: int = None, risk_free_rate: float = None, min_points: int = 5):
+        self.degree = Config.SURFACE_DEGREE if degree is None else degree
+        self.risk_free_rate = Config.RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+        self.min_points = max(min_points, self.degree + 1)
+        self.spot = np.nan
+        self.slices: Dict[str, Dict] = {}
+
+        self._lock = threading.Lock()
+        self._stacked = None
+
+    def updated(self, expiry: str) -> float:
+        """Timestamp of the chain the expiry's slice was last fitted from"""
+        fitted = self.slices.get(expiry)
+        return fitted['updated'] if fitted else 0.0
+
+    def retain(self, expiries):
+        """Drop slices for expiries no longer listed"""
+        with self._lock:
+            for expiry in set(self.slices) - set(expiries):
+                del self.slices[expiry]
+            self._stacked = None
+
+    def update(self, chain, T: float) -> bool:
+        """Refit one expiry's slice from an OptionsChain with solved IVs"""
+        if chain.empty or not T > 0:
+            return False
+
+        strikes = chain.strikes.astype(np.float64)
+        spot = chain.spot_price
+        k = np.log(strikes / (spot * np.exp(self.risk_free_rate * T)))
+        iv = np.where(k < 0, chain['pe_iv'], chain['ce_iv'])
+        usable = np.isfinite(iv) & (iv > MIN_IV) & (iv < MAX_IV)
+        if usable.sum() < self.min_points:
+            logger.warning(f"Volatility slice {chain.expiry} skipped: {usable.sum()} usable quotes")
+            return False
+
+        k, iv = k[usable], iv[usable]
+        total = iv * iv * T
+        # Weight by Black-Scholes vega (up to a constant): wings carry little information
+        d1 = (-k + 0.5 * total) / np.sqrt(total)
+        weight = np.exp(-0.5 * d1 * d1)
+        coefficients = np.polyfit(k, total, self.degree, w=weight)
+        fitted = np.sqrt(np.maximum(np.polyval(coefficients, k), MIN_IV ** 2 * T) / T)
+
+        with self._lock:
+            self.spot = spot
+            self.slices[chain.expiry] = {
+                'T': T,
+                'coefficients': coefficients,
+                'k_min': float(k.min()),
+                'k_max': float(k.max()),
+                'points': int(usable.sum()),
+                'rmse': float(np.sqrt(np.average((fitted - iv) ** 2, weights=weight))),
+                'updated': chain.timestamp,
+            }
+            self._stacked = None
+        return True
+
+    def _stack(self):
+        """Slices sorted by T as arrays, rebuilt only after a refit"""
+        with self._lock:
+            if self._stacked is None and self.slices:
+                ordered = sorted(self.slices.values(), key=lambda fitted: fitted['T'])
+                self._stacked = (
+                    np.array([fitted['T'] for fitted in ordered]),
+                    np.array([fitted['coefficients'] for fitted in ordered]),
+                    np.array([fitted['k_min'] for fitted in ordered]),
+                    np.array([fitted['k_max'] for fitted in ordered]),
+                )
+            return self._stacked
+
+    def sigma(self, strike, T, spot: Optional[float] = None) -> np.ndarray:
+        """Surface vol for any strikes/times (arrays broadcast); NaN before the first fit"""
+        strike, T, spot = np.broadcast_arrays(np.asarray(strike, dtype=np.float64),
+                                              np.maximum(np.asarray(T, dtype=np.float64), 1e-6),
+                                              np.asarray(self.spot if spot is None else spot, dtype=np.float64))
+        stacked = self._stack()
+        if stacked is None:
+            return np.full(strike.shape, np.nan)
+        times, coefficients, k_min, k_max = stacked
+
+        shape = strike.shape
+        strike, T, spot = strike.ravel(), T.ravel(), spot.ravel()
+        k = np.log(strike / (spot * np.exp(self.risk_free_rate * T)))
+        kk = np.clip(k[None, :], k_min[:, None], k_max[:, None])
+        total = np.broadcast_to(coefficients[:, :1], kk.shape)
+        for column in coefficients.T[1:]:
+            total = total * kk + column[:, None]
+        total = np.maximum(total, MIN_IV ** 2 * times[:, None])
+
+        # Flat vol before the first and after the last slice
+        w = np.where(T < times[0], total[0] / times[0] * T, total[-1] / times[-1] * T)
+        if len(times) > 1:
+            # Linear in total variance between the bracketing slices
+            columns = np.arange(len(T))
+            upper = np.clip(np.searchsorted(times, T), 1, len(times) - 1)
+            lower = upper - 1
+            fraction = (T - times[lower]) / (times[upper] - times[lower])
+            inside = (T >= times[0]) & (T <= times[-1])
+            w = np.where(inside, total[lower, columns] + (total[upper, columns] - total[lower, columns]) * fraction, w)
+        return np.sqrt(w / T).reshape(shape)
+
+    def to_dict(self, moneyness: np.ndarray) -> Dict:
+        """Fitted slices and the smoothed vol on a strike/spot grid, for the API"""
+        stacked = self._stack()
+        ordered = sorted(self.slices.items(), key=lambda item: item[1]['T'])
+        grid = np.asarray(moneyness, dtype=np.float64)
+        return {
+            'spot': self.spot if np.isfinite(self.spot) else None,  # NaN before the first fit
+            'moneyness': grid.tolist(),
+            'expiries': [{
+                'expiry': expiry,
+                'days': round(fitted['T'] * 365, 2),
+                'points': fitted['points'],
+                'rmse': fitted['rmse'],
+                'age': round(time.time() - fitted['updated'], 3),
+                'iv': self.sigma(grid * self.spot, fitted['T']).tolist(),
+            } for expiry, fitted in ordered] if stacked is not None else [],
+        }
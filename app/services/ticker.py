@@ -0,0 +1,369 @@
+import json
+import logging
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import websocket
+
+logger = logging.getLogger(__name__)
+
+# Kite ticker segments (token & 0xFF) and their price divisors
+SEGMENT_CDS = 3
+SEGMENT_BCD = 6
+SEGMENT_INDICES = 9
+
+MODE_LTP = 'ltp'
+MODE_QUOTE = 'quote'
+MODE_FULL = 'full'
+
+DEPTH_LEVELS = 5
+
+
+def _divisor(token: int) -> float:
+    segment = token & 0xFF
+    if segment == SEGMENT_CDS:
+        return 10000000.0
+    if segment == SEGMENT_BCD:
+        return 10000.0
+    return 100.0
+
+
+def parse_packet(packet: bytes) -> Optional[Dict]:
+    """Decode one Kite binary tick packet into a flat dict"""
+    size = len(packet)
+    if size < 8:
+        return None
+
+    token, ltp = struct.unpack('>II', packet[:8])
+    divisor = _divisor(token)
+    tick = {'instrument_token': token, 'last_price': ltp / divisor}
+
+    if token & 0xFF == SEGMENT_INDICES:
+        if size >= 28:
+            _, _, high, low, open_, close, _ = struct.unpack('>7i', packet[:28])
+            tick['ohlc'] = {'open': open_ / divisor, 'high': high / divisor,
+                            'low': low / divisor, 'close': close / divisor}
+        if size >= 32:
+            tick['timestamp'] = struct.unpack('>I', packet[28:32])[0]
+        return tick
+
+    if size >= 44:
+        fields = struct.unpack('>11I', packet[:44])
+        tick.update({
+            'last_quantity': fields[2],
+            'average_price': fields[3] / divisor,
+            'volume': fields[4],
+            'buy_quantity': fields[5],
+            'sell_quantity': fields[6],
+            'ohlc': {'open': fields[7] / divisor, 'high': fields[8] / divisor,
+                     'low': fields[9] / divisor, 'close': fields[10] / divisor},
+        })
+
+    if size >= 184:
+        last_trade_time, oi, _, _, timestamp = struct.unpack('>5I', packet[44:64])
+        tick.update({'last_trade_time': last_trade_time, 'oi': oi, 'timestamp': timestamp})
+
+        levels = []
+        for offset in range(64, 184, 12):
+            quantity, price, orders = struct.unpack('>IIH', packet[offset:offset + 10])
+            levels.append({'quantity': quantity, 'price': price / divisor, 'orders': orders})
+        tick['depth'] = {'buy': levels[:DEPTH_LEVELS], 'sell': levels[DEPTH_LEVELS:]}
+
+    return tick
+
+
+def parse_message(message: bytes) -> List[Dict]:
+    """Split a binary ticker frame into ticks (1-byte frames are heartbeats)"""
+    if len(message) < 2:
+        return []
+
+    count = struct.unpack('>H', message[:2])[0]
+    ticks = []
+    offset = 2
+    for _ in range(count):
+        length = struct.unpack('>H', message[offset:offset + 2])[0]
+        tick = parse_packet(message[offset + 2:offset + 2 + length])
+        if tick:
+            ticks.append(tick)
+        offset += 2 + length
+    return ticks
+
+
+def pack_full_packet(token: int, last_price: float, volume: int = 0, oi: int = 0,
+                     bids=(), asks=(), timestamp: int = 0) -> bytes:
+    """Encode a full-mode packet; used by local replay servers"""
+    divisor = _divisor(token)
+    price = lambda value: int(round(value * divisor))
+    packet = struct.pack('>11I', token, price(last_price), 0, price(last_price), volume,
+                         0, 0, 0, 0, 0, 0)
+    packet += struct.pack('>5I', timestamp, oi, oi, oi, timestamp)
+
+    for side in (bids, asks):
+        levels = list(side)[:DEPTH_LEVELS]
+        levels += [(0.0, 0, 0)] * (DEPTH_LEVELS - len(levels))
+        for level_price, quantity, orders in levels:
+            packet += struct.pack('>IIHxx', quantity, price(level_price), orders)
+    return packet
+
+
+def pack_index_packet(token: int, last_price: float, ohlc=None, timestamp: int = 0) -> bytes:
+    """Encode a full-mode index packet (no depth); used by local replay servers"""
+    divisor = _divisor(token)
+    price = lambda value: int(round(value * divisor))
+    open_, high, low, close = ohlc or (last_price,) * 4
+    return struct.pack('>7iI', token, price(last_price), price(high), price(low), price(open_), price(close),
+                       price(last_price - close), timestamp)
+
+
+def pack_message(packets: Iterable[bytes]) -> bytes:
+    packets = list(packets)
+    body = b''.join(struct.pack('>H', len(packet)) + packet for packet in packets)
+    return struct.pack('>H', len(packets)) + body
+
+
+class QuoteStore:
+    """
+    Latest tick per instrument token in preallocated NumPy columns
+
+    Writes come from the ticker thread, reads from request threads; a
+    single lock keeps each row consistent.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._slots: Dict[int, int] = {}
+        self._tokens: Dict[str, int] = {}  # 'NFO:SYMBOL' -> instrument token
+        self._keys: Dict[int, str] = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        def grow(old, shape, dtype):
+            new = np.zeros(shape, dtype=dtype)
+            if old is not None:
+                new[:len(old)] = old
+            return new
+
+        get = lambda name: getattr(self, name, None)
+        self.capacity = capacity
+        self.token = grow(get('token'), capacity, np.int64)
+        self.ltp = grow(get('ltp'), capacity, np.float64)
+        self.volume = grow(get('volume'), capacity, np.int64)
+        self.oi = grow(get('oi'), capacity, np.int64)
+        self.bid_price = grow(get('bid_price'), (capacity, DEPTH_LEVELS), np.float64)
+        self.bid_qty = grow(get('bid_qty'), (capacity, DEPTH_LEVELS), np.int64)
+        self.bid_orders = grow(get('bid_orders'), (capacity, DEPTH_LEVELS), np.int32)
+        self.ask_price = grow(get('ask_price'), (capacity, DEPTH_LEVELS), np.float64)
+        self.ask_qty = grow(get('ask_qty'), (capacity, DEPTH_LEVELS), np.int64)
+        self.ask_orders = grow(get('ask_orders'), (capacity, DEPTH_LEVELS), np.int32)
+        self.updated = grow(get('updated'), capacity, np.float64)
+        self.seen = grow(get('seen'), capacity, np.bool_)
+
+    def _slot(self, token: int) -> int:
+        slot = self._slots.get(token)
+        if slot is None:
+            slot = len(self._slots)
+            if slot >= self.capacity:
+                self._allocate(self.capacity * 2)
+            self._slots[token] = slot
+            self.token[slot] = token
+        return slot
+
+    def register(self, key: str, token: int):
+        """Map an 'EXCHANGE:SYMBOL' key to its instrument token"""
+        with self._lock:
+            self._tokens[key] = token
+            self._keys[token] = key
+            self._slot(token)
+
+    def token_for(self, key: str) -> Optional[int]:
+        return self._tokens.get(key)
+
+    def key_for(self, token: int) -> Optional[str]:
+        return self._keys.get(token)
+
+    def update(self, tick: Dict):
+        with self._lock:
+            slot = self._slot(tick['instrument_token'])
+            self.ltp[slot] = tick['last_price']
+            if 'volume' in tick:
+                self.volume[slot] = tick['volume']
+            if 'oi' in tick:
+                self.oi[slot] = tick['oi']
+
+            depth = tick.get('depth')
+            if depth:
+                for level, entry in enumerate(depth['buy'][:DEPTH_LEVELS]):
+                    self.bid_price[slot, level] = entry['price']
+                    self.bid_qty[slot, level] = entry['quantity']
+                    self.bid_orders[slot, level] = entry['orders']
+                for level, entry in enumerate(depth['sell'][:DEPTH_LEVELS]):
+                    self.ask_price[slot, level] = entry['price']
+                    self.ask_qty[slot, level] = entry['quantity']
+                    self.ask_orders[slot, level] = entry['orders']
+
+            self.updated[slot] = time.time()
+            self.seen[slot] = True
+
+    def invalidate(self):
+        """Mark every row stale, e.g. after the feed disconnects"""
+        with self._lock:
+            self.seen[:] = False
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Kite-shaped quote for a key, or None if no live tick is stored"""
+        token = self._tokens.get(key)
+        if token is None:
+            return None
+
+        with self._lock:
+            slot = self._slots[token]
+            if not self.seen[slot]:
+                return None
+
+            def levels(price, qty, orders):
+                return [{'price': float(price[slot, i]), 'quantity': int(qty[slot, i]),
+                         'orders': int(orders[slot, i])} for i in range(DEPTH_LEVELS)]
+
+            return {
+                'instrument_token': token,
+                'last_price': float(self.ltp[slot]),
+                'volume': int(self.volume[slot]),
+                'oi': int(self.oi[slot]),
+                'depth': {
+                    'buy': levels(self.bid_price, self.bid_qty, self.bid_orders),
+                    'sell': levels(self.ask_price, self.ask_qty, self.ask_orders),
+                },
+                'timestamp': float(self.updated[slot]),
+            }
+
+
+class MarketDataTicker:
+    """Broker streaming feed client writing ticks into a QuoteStore"""
+
+    def __init__(self, store: QuoteStore, url: str, credentials: Callable = None,
+                 mode: str = MODE_FULL, reconnect_delay: float = 2.0):
+        self.store = store
+        self.url = url
+        self.credentials = credentials
+        self.mode = mode
+        self.reconnect_delay = reconnect_delay
+        self.connected = False
+
+        self._subscribed = set()
+        self._lock = threading.Lock()
+        self._ws = None
+        self._thread = None
+        self._running = False
+        self._tick_listeners: List[Callable] = []
+        self._order_listeners: List[Callable] = []
+
+    def add_tick_listener(self, callback: Callable):
+        """callback(ticks) runs on the ticker thread after the store update"""
+        self._tick_listeners.append(callback)
+
+    def add_order_listener(self, callback: Callable):
+        """callback(order) runs for every order update pushed on the feed"""
+        self._order_listeners.append(callback)
+
+    def _connect_url(self) -> str:
+        if not self.credentials:
+            return self.url
+        api_key, access_token = self.credentials()
+        separator = '&' if '?' in self.url else '?'
+        return f"{self.url}{separator}api_key={api_key}&access_token={access_token}"
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='market-data-ticker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._ws:
+            self._ws.close()
+
+    def _run(self):
+        while self._running:
+            self._ws = websocket.WebSocketApp(
+                self._connect_url(),
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            self._ws.run_forever(ping_interval=30, ping_timeout=10)
+            if self._running:
+                time.sleep(self.reconnect_delay)
+
+    def subscribe(self, tokens: Dict[str, int]):
+        """Subscribe {'EXCHANGE:SYMBOL': instrument_token} in full mode"""
+        new = []
+        with self._lock:
+            for key, token in tokens.items():
+                self.store.register(key, token)
+                if token not in self._subscribed:
+                    self._subscribed.add(token)
+                    new.append(token)
+
+        if new and self.connected:
+            self._send_subscription(new)
+
+    def _send_subscription(self, tokens: List[int]):
+        try:
+            self._ws.send(json.dumps({'a': 'subscribe', 'v': tokens}))
+            self._ws.send(json.dumps({'a': 'mode', 'v': [self.mode, tokens]}))
+        except Exception as e:
+            logger.error(f"Ticker subscription failed: {e}")
+
+    def _on_open(self, ws):
+        self.connected = True
+        logger.info("Ticker connected")
+        with self._lock:
+            tokens = list(self._subscribed)
+        if tokens:
+            self._send_subscription(tokens)
+
+    def _on_message(self, ws, message):
+        if isinstance(message, str):
+            self._on_text(message)
+            return
+
+        ticks = parse_message(message)
+        for tick in ticks:
+            self.store.update(tick)
+
+        if ticks:
+            for callback in self._tick_listeners:
+                try:
+                    callback(ticks)
+                except Exception as e:
+                    logger.error(f"Tick listener failed: {e}")
+
+    def _on_text(self, message: str):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            return
+
+        if payload.get('type') == 'order':
+            for callback in self._order_listeners:
+                try:
+                    callback(payload.get('data', {}))
+                except Exception as e:
+                    logger.error(f"Order listener failed: {e}")
+        elif payload.get('type') == 'error':
+            logger.error(f"Ticker error: {payload.get('data')}")
+
+    def _on_error(self, ws, error):
+        logger.error(f"Ticker error: {error}")
+
+    def _on_close(self, ws, status_code=None, message=None):
+        if self.connected:
+            logger.warning("Ticker disconnected")
+        self.connected = False
+        self.store.invalidate()
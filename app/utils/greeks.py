@@ -1,6 +1,10 @@
 import numpy as np
+from scipy.special import ndtr
 from scipy.stats import norm
 from datetime import datetime
+from typing import Dict
+
+SQRT_2PI = np.sqrt(2 * np.pi)
 
 class GreeksCalculator:
     """Calculate option Greeks for risk management"""
@@ -8,19 +12,22 @@ class GreeksCalculator:
     @staticmethod
     def black_scholes_call(S, K, T, r, sigma):
         """Calculate Call option price using Black-Scholes"""
-        d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T) / (sigma*np.sqrt(T))
-        d2 = d1 - sigma*np.sqrt(T)
+        sigma_sqrt_t = sigma*np.sqrt(T)
+        d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T) / sigma_sqrt_t
+        d2 = d1 - sigma_sqrt_t
         
-        call_price = S*norm.cdf(d1) - K*np.exp(-r*T)*norm.cdf(d2)
+        # ndtr is norm.cdf without the argument handling, which dominates on large grids
+        call_price = S*ndtr(d1) - K*np.exp(-r*T)*ndtr(d2)
         return call_price
     
     @staticmethod
     def black_scholes_put(S, K, T, r, sigma):
         """Calculate Put option price using Black-Scholes"""
-        d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T) / (sigma*np.sqrt(T))
-        d2 = d1 - sigma*np.sqrt(T)
+        sigma_sqrt_t = sigma*np.sqrt(T)
+        d1 = (np.log(S/K) + (r + 0.5*sigma**2)*T) / sigma_sqrt_t
+        d2 = d1 - sigma_sqrt_t
         
-        put_price = K*np.exp(-r*T)*norm.cdf(-d2) - S*norm.cdf(-d1)
+        put_price = K*np.exp(-r*T)*ndtr(-d2) - S*ndtr(-d1)
         return put_price
     
     @staticmethod
@@ -57,4 +64,163 @@ class GreeksCalculator:
             'delta': calc.calculate_delta(S, K, T, r, sigma, option_type),
             'theta': calc.calculate_theta(S, K, T, r, sigma, option_type),
             'days_to_expiry': int(T * 365)
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def calculate_batch_greeks(S, K, T, r, sigma, is_call) -> Dict[str, np.ndarray]:
+        """
+        Price and Greeks for many options in one vectorized pass
+        
+        All inputs broadcast against each other; is_call is a boolean
+        array (or 'CE'/'PE' labels). d1, d2, pdf and cdf are computed once
+        and shared. Theta is per day, vega and rho per 1% move.
+        """
+        S = np.asarray(S, dtype=np.float64)
+        K = np.asarray(K, dtype=np.float64)
+        T = np.asarray(T, dtype=np.float64)
+        r = np.asarray(r, dtype=np.float64)
+        sigma = np.asarray(sigma, dtype=np.float64)
+        is_call = np.asarray(is_call)
+        if is_call.dtype.kind in 'UO':
+            is_call = np.char.upper(is_call.astype(str)) == 'CE'
+        is_call = is_call.astype(bool)
+        
+        sqrt_t = np.sqrt(T)
+        sigma_sqrt_t = sigma * sqrt_t
+        d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / sigma_sqrt_t
+        d2 = d1 - sigma_sqrt_t
+        
+        pdf_d1 = np.exp(-0.5 * d1**2) / SQRT_2PI
+        cdf_d1 = ndtr(d1)
+        cdf_d2 = ndtr(d2)
+        discounted_k = K * np.exp(-r * T)
+        
+        # Put values follow from put-call parity on the shared terms
+        call_price = S * cdf_d1 - discounted_k * cdf_d2
+        price = np.where(is_call, call_price, call_price - S + discounted_k)
+        delta = np.where(is_call, cdf_d1, cdf_d1 - 1)
+        
+        theta_call = -S * pdf_d1 * sigma / (2 * sqrt_t) - r * discounted_k * cdf_d2
+        theta = np.where(is_call, theta_call, theta_call + r * discounted_k) / 365
+        
+        rho_call = T * discounted_k * cdf_d2
+        rho = np.where(is_call, rho_call, rho_call - T * discounted_k) / 100
+        
+        return {
+            'price': price,
+            'delta': delta,
+            'gamma': pdf_d1 / (S * sigma_sqrt_t),
+            'theta': theta,
+            'vega': S * pdf_d1 * sqrt_t / 100,
+            'rho': rho
+        }
+    
+    @staticmethod
+    def calculate_chain_greeks(chain, T, r, sigma=None):
+        """
+        Add ce_/pe_ Greeks columns to an options chain
+        
+        chain is a DataFrame or an OptionsChain (as get_options_chain
+        returns); either way a DataFrame in the chain layout comes back.
+        T (years) and sigma are scalars or per-row arrays. Without sigma
+        the chain's ce_iv/pe_iv columns are used.
+        """
+        # OptionsChain columns are arrays; the Greeks are added to its DataFrame layout
+        frame = chain.to_frame() if hasattr(chain, 'to_frame') else chain
+        if chain.empty:
+            return frame
+        
+        rows = len(chain)
+        spot = np.tile(np.asarray(chain['spot_price'], dtype=np.float64), 2)
+        strike = np.tile(np.asarray(chain['strike'], dtype=np.float64), 2)
+        T = np.tile(np.broadcast_to(np.asarray(T, dtype=np.float64), (rows,)), 2)
+        if sigma is None:
+            sigma = np.concatenate([np.asarray(chain['ce_iv'], dtype=np.float64),
+                                    np.asarray(chain['pe_iv'], dtype=np.float64)])
+        else:
+            sigma = np.tile(np.broadcast_to(np.asarray(sigma, dtype=np.float64), (rows,)), 2)
+        is_call = np.repeat([True, False], rows)
+        
+        greeks = GreeksCalculator.calculate_batch_greeks(spot, strike, T, r, sigma, is_call)
+        
+        frame = frame.copy() if frame is chain else frame
+        for name, values in greeks.items():
+            frame[f'ce_{name}'] = values[:rows]
+            frame[f'pe_{name}'] = values[rows:]
+        
+        return frame
+    
+    @staticmethod
+    def calculate_implied_volatility(price, S, K, T, r, is_call, initial=None,
+                                     tol: float = 1e-6, max_iter: int = 50) -> np.ndarray:
+        """
+        Invert Black-Scholes for many options at once
+        
+        Safeguarded Newton: each row keeps a [lo, hi] bracket and falls
+        back to bisection whenever the Newton step leaves it, so every row
+        converges. Rows stop iterating once priced within tol. `initial`
+        (e.g. the previous tick's IVs) warm-starts rows where it is finite.
+        Prices outside no-arbitrage bounds return NaN.
+        """
+        price, S, K, T, r = np.broadcast_arrays(
+            *(np.asarray(x, dtype=np.float64) for x in (price, S, K, T, r))
+        )
+        is_call = np.asarray(is_call)
+        if is_call.dtype.kind in 'UO':
+            is_call = np.char.upper(is_call.astype(str)) == 'CE'
+        is_call = np.broadcast_to(is_call.astype(bool), price.shape)
+        
+        # Solve everything as calls: puts map over via put-call parity
+        discounted_k = K * np.exp(-r * T)
+        target = np.where(is_call, price, price + S - discounted_k)
+        lower = np.maximum(S - discounted_k, 0)
+        
+        iv = np.full(price.shape, np.nan)
+        valid = (T > 0) & (price > 0) & (target > lower) & (target < S)
+        if not valid.any():
+            return iv
+        
+        S, K, T, r = S[valid], K[valid], T[valid], r[valid]
+        discounted_k, target = discounted_k[valid], target[valid]
+        sqrt_t = np.sqrt(T)
+        log_moneyness = np.log(S / K)
+        
+        # Corrado-Miller starting point, replaced by warm starts when given
+        half_gap = target - (S - discounted_k) / 2
+        root = np.sqrt(np.maximum(half_gap**2 - (S - discounted_k)**2 / np.pi, 0))
+        sigma = np.sqrt(2 * np.pi / T) * (half_gap + root) / (S + discounted_k)
+        if initial is not None:
+            warm = np.broadcast_to(np.asarray(initial, dtype=np.float64), price.shape)[valid]
+            sigma = np.where(np.isfinite(warm) & (warm > 0), warm, sigma)
+        sigma = np.clip(np.nan_to_num(sigma, nan=0.2), 1e-3, 4.0)
+        
+        lo = np.full(sigma.shape, 1e-4)
+        hi = np.full(sigma.shape, 5.0)
+        active = np.arange(sigma.size)
+        
+        for _ in range(max_iter):
+            s = sigma[active]
+            sigma_sqrt_t = s * sqrt_t[active]
+            d1 = (log_moneyness[active] + (r[active] + 0.5 * s**2) * T[active]) / sigma_sqrt_t
+            d2 = d1 - sigma_sqrt_t
+            model = S[active] * ndtr(d1) - discounted_k[active] * ndtr(d2)
+            vega = S[active] * np.exp(-0.5 * d1**2) / SQRT_2PI * sqrt_t[active]
+            diff = model - target[active]
+            
+            converged = np.abs(diff) < tol
+            too_high = diff > 0
+            hi[active] = np.where(too_high, s, hi[active])
+            lo[active] = np.where(too_high, lo[active], s)
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                step = s - diff / vega
+            bisect = 0.5 * (lo[active] + hi[active])
+            outside = ~np.isfinite(step) | (step <= lo[active]) | (step >= hi[active])
+            sigma[active] = np.where(converged, s, np.where(outside, bisect, step))
+            
+            active = active[~converged]
+            if active.size == 0:
+                break
+        
+        iv[valid] = sigma
+        return iv
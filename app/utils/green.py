@@ -0,0 +1,30 @@
+"""
+Cooperative-concurrency helpers
+
+Under ASYNC_MODE=eventlet, run.py monkey-patches the standard library so
+every request is a green thread and broker socket I/O yields to the hub
+instead of blocking the process. Pure-CPU work (NumPy/pandas number
+crunching) never yields, so long computations are pushed onto eventlet's
+native thread pool with offload(). Socket I/O must NOT be offloaded: it
+already cooperates, and patched sockets are not safe to use from tpool.
+"""
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+def patched() -> bool:
+    """True when the process runs on eventlet green threads"""
+    # Only run.py patches, and it imports eventlet first; threading mode never loads it here
+    patcher = sys.modules.get('eventlet.patcher')
+    return patcher is not None and patcher.is_monkey_patched('socket')
+
+
+def offload(fn, *args, **kwargs):
+    """Run CPU-bound fn on a native thread so other green threads keep serving"""
+    if patched():
+        from eventlet import tpool
+
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
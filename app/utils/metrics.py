@@ -0,0 +1,244 @@
+"""
+Latency histograms, call/error counters and per-request profiles
+
+Hot paths are wrapped with metrics.timed(name) (functions) or
+metrics.span(name) (blocks). Each span lands in a fixed-bucket histogram
+keyed by name, so recording is a bisect and a few increments; render()
+writes everything in the Prometheus text format for /api/metrics.
+
+A request can opt into profiling (X-Profile: 1 or ?profile=1, when
+PROFILING_ENABLED): spans then also append (name, depth, start, duration)
+to a per-thread list, which instrument_app() returns as a Server-Timing
+header and a 'profile' key in JSON object responses. Green threads get
+their own list under eventlet, since threading.local is patched.
+"""
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+# Upper bounds in seconds, 10us .. 10s
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+perf_counter = time.perf_counter
+
+
+class _Series:
+    __slots__ = ('counts', 'total', 'errors', 'lock')
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+class _Profile(threading.local):
+    # Class defaults keep the common "not profiling" lookup cheap
+    profile = None
+    depth = 0
+    started = 0.0
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start', 'entry')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.entry = self.metrics._enter(self.name)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._exit(self.name, perf_counter() - self.start, exc_type is not None, self.entry)
+        return False
+
+
+class Metrics:
+    """Process-wide span histograms and gauges"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, _Series] = {}
+        self._gauges: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._local = _Profile()
+
+    def _get(self, name: str) -> _Series:
+        series = self._series.get(name)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(name, _Series(len(self.buckets)))
+        return series
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        """Record one call of `name` that took `seconds`"""
+        series = self._series.get(name) or self._get(name)
+        slot = bisect_left(self.buckets, seconds)
+        with series.lock:
+            series.counts[slot] += 1
+            series.total += seconds
+            if error:
+                series.errors += 1
+
+    def _enter(self, name: str):
+        profile = self._local.profile
+        if profile is None:
+            return None
+        entry = [name, self._local.depth, perf_counter() - self._local.started, 0.0]
+        self._local.depth += 1
+        profile.append(entry)
+        return entry
+
+    def _exit(self, name: str, seconds: float, error: bool, entry):
+        self.observe(name, seconds, error)
+        if entry is not None:
+            entry[3] = seconds
+            self._local.depth -= 1
+
+    def span(self, name: str) -> _Span:
+        """Context manager timing a block"""
+        return _Span(self, name)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator timing every call; exceptions count as errors and propagate"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                entry = self._enter(name)
+                start = perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    self._exit(name, perf_counter() - start, True, entry)
+                    raise
+                self._exit(name, perf_counter() - start, False, entry)
+                return result
+            return wrapper
+        return decorate
+
+    def gauge(self, name: str, fn: Callable[[], float], help: str = '', kind: str = 'gauge', **labels):
+        """
+        Sampled at render time; one series per distinct label set, so
+        registering the same labels again (a second app) replaces it.
+        kind='counter' for values that only grow.
+        """
+        with self._lock:
+            family = self._gauges.setdefault(name, {'help': help, 'kind': kind, 'series': []})
+            family['series'] = [(existing, f) for existing, f in family['series'] if existing != labels]
+            family['series'].append((labels, fn))
+
+    def profile_start(self):
+        """Collect this thread's spans until profile_stop()"""
+        self._local.profile = []
+        self._local.depth = 0
+        self._local.started = perf_counter()
+
+    def profile_stop(self) -> Optional[List[Dict]]:
+        profile = self._local.profile
+        self._local.profile = None
+        if profile is None:
+            return None
+        return [{'stage': name, 'depth': depth, 'start_ms': round(start * 1000, 3), 'ms': round(seconds * 1000, 3)}
+                for name, depth, start, seconds in profile]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Count, error count, total and bucket counts per span"""
+        snapshot = {}
+        for name, series in list(self._series.items()):
+            with series.lock:
+                snapshot[name] = {'count': sum(series.counts), 'errors': series.errors,
+                                  'sum': series.total, 'buckets': list(series.counts)}
+        return snapshot
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = ['# HELP app_span_seconds Latency of instrumented calls and routes',
+                 '# TYPE app_span_seconds histogram']
+        errors = ['# HELP app_span_errors_total Instrumented calls that raised (routes: 5xx responses)',
+                  '# TYPE app_span_errors_total counter']
+        bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+        for name, data in sorted(self.snapshot().items()):
+            label = json.dumps(name)
+            cumulative = 0
+            for bound, count in zip(bounds, data['buckets']):
+                cumulative += count
+                lines.append(f'app_span_seconds_bucket{{span={label},le="{bound}"}} {cumulative}')
+            lines.append(f'app_span_seconds_sum{{span={label}}} {data["sum"]:.9f}')
+            lines.append(f'app_span_seconds_count{{span={label}}} {data["count"]}')
+            errors.append(f'app_span_errors_total{{span={label}}} {data["errors"]}')
+        lines.extend(errors)
+
+        for name, family in sorted(self._gauges.items()):
+            lines.append(f'# HELP {name} {family["help"]}')
+            lines.append(f'# TYPE {name} {family["kind"]}')
+            for labels, fn in family['series']:
+                try:
+                    value = float(fn())
+                except Exception:
+                    continue
+                rendered = ','.join(f'{key}={json.dumps(str(value_))}' for key, value_ in labels.items())
+                lines.append(f'{name}{{{rendered}}} {value}' if rendered else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that times serialization as its own stage"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with metrics.span('json.dumps'):
+            return super().dumps(obj, **kwargs)
+
+
+def instrument_app(app, profiling: bool = False):
+    """Time every route, and serve per-request profiles when enabled"""
+    app.json_provider_class = TimedJSONProvider
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_timer():
+        if profiling and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+            metrics.profile_start()
+            g.profiling = True
+        g.request_started = perf_counter()
+
+    @app.after_request
+    def _record_route(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        seconds = perf_counter() - started
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe(f'{request.method} {rule}', seconds, response.status_code >= 500)
+
+        if g.pop('profiling', False):
+            stages = metrics.profile_stop() or []
+            response.headers['Server-Timing'] = ', '.join(
+                [f'total;dur={seconds * 1000:.3f}'] +
+                [f'{stage["stage"].replace(" ", "_")};dur={stage["ms"]}' for stage in stages if stage['depth'] == 0])
+            if response.is_json and not response.direct_passthrough:
+                body = response.get_json(silent=True)
+                if isinstance(body, dict):
+                    body['profile'] = {'total_ms': round(seconds * 1000, 3), 'stages': stages}
+                    response.set_data(json.dumps(body, default=str))
+        return response
+
+    @app.teardown_request
+    def _clear_profile(error=None):
+        # Unhandled errors skip after_request; don't leak the profile into the next request
+        if g.pop('profiling', False):
+            metrics.profile_stop()
+
+    return app
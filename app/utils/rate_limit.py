@@ -0,0 +1,210 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from app.config import Config
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Thread-safe token bucket for broker request budgets"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # Usage counters for /api/metrics
+        self.acquired = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self) -> float:
+        """Block until a token is available, return seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    self.waited += waited
+                    if waited:
+                        self.throttled += 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def available(self) -> float:
+        """Tokens left in the bucket right now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+# Priority lanes, most urgent first; within a budget a waiting request is
+# admitted only when no more urgent one is queued
+PRIORITY_EXIT = 0         # Stop-loss/target/expiry exits and unwinds
+PRIORITY_ORDER = 1        # New orders and cancels
+PRIORITY_STATUS = 2       # Order status polls
+PRIORITY_PORTFOLIO = 3    # Positions, holdings
+PRIORITY_MARKET_DATA = 4  # Quotes, chains, instrument master
+LANES = ('exit', 'order', 'status', 'portfolio', 'market_data')
+
+# Kite endpoint -> budget (Kite limits quotes, order placement and everything else separately)
+ENDPOINT_BUDGETS = {
+    'quote': 'quote', 'ltp': 'quote', 'ohlc': 'quote',
+    'place_order': 'order', 'modify_order': 'order', 'cancel_order': 'order',
+}
+DEFAULT_BUDGET = 'portfolio'
+ENDPOINT_LANES = {
+    'quote': PRIORITY_MARKET_DATA, 'ltp': PRIORITY_MARKET_DATA, 'ohlc': PRIORITY_MARKET_DATA,
+    'instruments': PRIORITY_MARKET_DATA,
+    'place_order': PRIORITY_ORDER, 'modify_order': PRIORITY_ORDER, 'cancel_order': PRIORITY_ORDER,
+    'order_history': PRIORITY_STATUS, 'orders': PRIORITY_STATUS,
+}
+
+
+def is_throttled(error: Exception) -> bool:
+    """HTTP 429 from Kite (NetworkException) or a raw requests call"""
+    response = getattr(error, 'response', None)
+    return getattr(error, 'code', None) == 429 or getattr(response, 'status_code', None) == 429
+
+
+class PriorityRateLimiter(RateLimiter):
+    """Token bucket whose waiters are served most urgent lane first, FIFO within a lane"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        super().__init__(rate, burst)
+        self._ready = threading.Condition(self._lock)
+        self._waiters = []
+        self._sequence = itertools.count()
+        # Per-lane queue depth and admissions, and 429s seen, for /api/metrics
+        self.queued = [0] * len(LANES)
+        self.lane_acquired = [0] * len(LANES)
+        self.lane_waited = [0.0] * len(LANES)
+        self.retries = 0
+
+    def acquire(self, priority: int = PRIORITY_MARKET_DATA) -> float:
+        """Block until this request's turn and a token, return seconds waited"""
+        started = time.monotonic()
+        with self._lock:
+            if self.rate > 0:
+                entry = (priority, next(self._sequence))
+                heapq.heappush(self._waiters, entry)
+                self.queued[priority] += 1
+                try:
+                    while True:
+                        self._refill(time.monotonic())
+                        head = self._waiters[0] == entry
+                        if head and self._tokens >= 1:
+                            heapq.heappop(self._waiters)
+                            self._tokens -= 1
+                            break
+                        # The head sleeps until its token is due, the rest until the head is served
+                        self._ready.wait((1 - self._tokens) / self.rate if head else None)
+                finally:
+                    self.queued[priority] -= 1
+                self._ready.notify_all()
+
+            waited = time.monotonic() - started
+            self.acquired += 1
+            self.lane_acquired[priority] += 1
+            if waited > 0.001:
+                self.throttled += 1
+                self.waited += waited
+                self.lane_waited[priority] += waited
+            return waited
+
+    def drain(self):
+        """The broker answered 429: spend the tokens so every lane backs off"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+            self.retries += 1
+            self._ready.notify_all()
+
+    def depth(self) -> int:
+        return sum(self.queued)
+
+
+class RateLimitScheduler:
+    """
+    Every broker call's budget and turn
+
+    One PriorityRateLimiter per endpoint class (quote, order, portfolio),
+    so a burst of chain quotes can't use up the order budget, and within
+    each budget exits beat orders, orders beat status polls and portfolio
+    reads, and those beat market data. call() waits for the turn, runs
+    the request, and on a 429 drains the budget and retries after
+    exponential backoff with +-50% jitter, so concurrent callers don't
+    retry in lockstep.
+    """
+
+    def __init__(self, budgets: Dict[str, tuple], retries: int = 3, backoff: float = 0.25,
+                 max_backoff: float = 4.0):
+        self.budgets = {name: PriorityRateLimiter(rate, burst) for name, (rate, burst) in budgets.items()}
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._random = random.Random()
+
+    @classmethod
+    def from_config(cls) -> 'RateLimitScheduler':
+        return cls({'quote': (Config.QUOTE_RATE_LIMIT, Config.QUOTE_RATE_BURST),
+                    'order': (Config.ORDER_RATE_LIMIT, Config.ORDER_RATE_BURST),
+                    'portfolio': (Config.PORTFOLIO_RATE_LIMIT, Config.PORTFOLIO_RATE_BURST)},
+                   retries=Config.RATE_LIMIT_RETRIES, backoff=Config.RATE_LIMIT_BACKOFF,
+                   max_backoff=Config.RATE_LIMIT_MAX_BACKOFF)
+
+    def configure(self, budget: str, rate: float, burst: int = 1):
+        """Resize a budget in place, starting full (rate <= 0 admits everything at once)"""
+        limiter = self.budgets.setdefault(budget, PriorityRateLimiter(rate, burst))
+        with limiter._lock:
+            limiter.rate = float(rate)
+            limiter.capacity = max(1, int(burst))
+            limiter._tokens = float(limiter.capacity)
+            limiter._ready.notify_all()
+
+    def route(self, method: str, priority: Optional[int] = None) -> Tuple[PriorityRateLimiter, str, int]:
+        """Budget and lane of one broker method"""
+        name = ENDPOINT_BUDGETS.get(method, DEFAULT_BUDGET)
+        priority = ENDPOINT_LANES.get(method, PRIORITY_PORTFOLIO) if priority is None else priority
+        return self.budgets.get(name) or self.budgets[DEFAULT_BUDGET], name, priority
+
+    def call(self, method: str, fn: Callable, priority: Optional[int] = None):
+        """fn() in its budget and lane, retrying throttled attempts"""
+        limiter, name, priority = self.route(method, priority)
+        attempt = 0
+        while True:
+            with metrics.span(f'rate_limit.{name}.{LANES[priority]}'):
+                limiter.acquire(priority)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.retries or not is_throttled(e):
+                    raise
+                limiter.drain()
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * self._random.uniform(0.5, 1.5)
+                logger.warning(f"Broker throttled {method}, retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
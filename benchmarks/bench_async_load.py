@@ -0,0 +1,220 @@
+"""
+Concurrent request load test
+
+Starts a stub broker (local HTTP server, --latency-ms injected per call)
+and runs the real Flask app against it in a subprocess, once per mode:
+
+    before  eventlet server without monkey-patching: every broker call
+            blocks the whole process, so requests are served one at a time
+    after   run.py's eventlet.monkey_patch(): broker I/O parks only the
+            green thread that issued it
+
+--clients threads hammer /api/options-chain/<expiry>, /api/quote/<symbol>
+and /api/orders/positions while one prober times /api/health. Prints
+requests/second per endpoint and health latency for each mode.
+
+    python benchmarks/bench_async_load.py --latency-ms 100 --clients 20 --seconds 5
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EXPIRY = (date.today() + timedelta(days=30)).strftime('%d%b%y').upper()
+ENDPOINTS = {
+    'chain': f'/api/options-chain/{EXPIRY}',
+    'quote': f'/api/quote/NIFTY{EXPIRY}22000PE',
+    'positions': '/api/orders/positions',
+}
+
+
+def stub_broker(latency: float) -> ThreadingHTTPServer:
+    """Kite-shaped /quote and /portfolio/positions with a fixed delay"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            if url.path == '/quote':
+                data = {key: {'last_price': 22000.0 if key == 'NSE:NIFTY 50' else 120.0,
+                              'volume': 1000, 'oi': 5000,
+                              'depth': {'buy': [{'price': 119.5}], 'sell': [{'price': 120.5}]}}
+                        for key in parse_qs(url.query).get('i', [])}
+            else:
+                data = {'net': [], 'day': []}
+            body = json.dumps({'status': 'success', 'data': data}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve(mode: str, port: int, broker_url: str):
+    """Subprocess entry point: the app wired to the stub broker"""
+    if mode == 'after':
+        import eventlet
+        eventlet.monkey_patch()
+
+    import requests
+
+    os.environ.update({'TICKER_ENABLED': 'false', 'RECORDER_ENABLED': 'false',
+                       'DATA_DIR': tempfile.mkdtemp()})
+    from app import create_app, socketio
+    from app.services.broker import BrokerService
+    from app.services.cache import BrokerCache
+
+    class FakeKiteConnect:
+        """KiteConnect stand-in that talks HTTP through reqsession"""
+
+        def __init__(self):
+            self.reqsession = requests.Session()
+
+        def set_access_token(self, access_token):
+            pass
+
+        def quote(self, *instruments):
+            keys = [key for item in instruments for key in ([item] if isinstance(item, str) else item)]
+            return self.reqsession.get(f'{broker_url}/quote', params={'i': keys}).json()['data']
+
+        def positions(self):
+            return self.reqsession.get(f'{broker_url}/portfolio/positions').json()['data']
+
+        def instruments(self, exchange=None):
+            return []
+
+    kite = FakeKiteConnect()
+    broker = BrokerService('key', 'secret', kite=kite)
+    kite.reqsession = broker.session
+    broker.base_url = broker_url
+    broker.cache = BrokerCache({})  # Every request reaches the broker
+    for budget in list(broker.scheduler.budgets):
+        broker.scheduler.configure(budget, 0)  # Measure concurrency, not the request budgets
+    socketio.run(create_app(broker=broker), host='127.0.0.1', port=port, log_output=False)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def load(base: str, clients: int, seconds: float):
+    import requests
+
+    counts = {name: 0 for name in ENDPOINTS}
+    errors = [0]
+    health = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(offset):
+        session = requests.Session()
+        names = list(ENDPOINTS)
+        i = offset
+        while time.monotonic() < deadline:
+            name = names[i % len(names)]
+            i += 1
+            ok = session.get(base + ENDPOINTS[name], timeout=60).ok
+            with lock:
+                if ok:
+                    counts[name] += 1
+                else:
+                    errors[0] += 1
+
+    def prober():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            session.get(base + '/api/health', timeout=60)
+            health.append(time.perf_counter() - start)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    threads.append(threading.Thread(target=prober))
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return {name: count / elapsed for name, count in counts.items()}, np.array(health) * 1000, errors[0]
+
+
+def run(mode: str, args, broker_url: str):
+    import requests
+
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode,
+                               '--port', str(port), '--broker', broker_url],
+                              cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(300):
+            try:
+                if requests.get(base + '/api/ready', timeout=1).ok:  # Services built, not just listening
+                    break
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.05)
+        return load(base, args.clients, args.seconds)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='injected broker latency per call')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--serve', choices=('before', 'after'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--broker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.broker)
+        return
+
+    broker = stub_broker(args.latency_ms / 1000)
+    broker_url = f'http://127.0.0.1:{broker.server_address[1]}'
+
+    print(f"{args.clients} clients, {args.seconds:g}s per mode, broker latency {args.latency_ms:g}ms")
+    print(f"{'mode':<8}{'chain/s':>10}{'quote/s':>10}{'pos/s':>10}{'total/s':>10}"
+          f"{'health p50':>13}{'health p99':>13}{'errors':>8}")
+    for mode in ('before', 'after'):
+        rates, health, errors = run(mode, args, broker_url)
+        print(f"{mode:<8}{rates['chain']:>10.1f}{rates['quote']:>10.1f}{rates['positions']:>10.1f}"
+              f"{sum(rates.values()):>10.1f}{np.median(health):>11.1f}ms{np.percentile(health, 99):>11.1f}ms"
+              f"{errors:>8}")
+
+    broker.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Broker session latency benchmark
+
+Serves /portfolio/positions from a local HTTP server and compares the old
+per-request pattern (construct a BrokerService, authenticate, open a new
+connection) with one shared BrokerService reusing pooled keep-alive
+connections. Token loading is simulated with a configurable delay.
+
+    python benchmarks/bench_broker_session.py --requests 200 --auth-ms 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.services.broker as broker_module
+from app.services.broker import BrokerService
+from app.services.cache import BrokerCache
+
+POSITIONS = json.dumps({'status': 'success', 'data': {'net': [], 'day': []}}).encode()
+
+
+class PositionsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(POSITIONS)))
+        self.end_headers()
+        self.wfile.write(POSITIONS)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeKiteConnect:
+    """Minimal KiteConnect stand-in that talks HTTP through reqsession"""
+
+    VARIETY_REGULAR = 'regular'
+    EXCHANGE_NFO = 'NFO'
+    root = None
+
+    def __init__(self, api_key, timeout=None):
+        import requests
+        self.api_key = api_key
+        self.timeout = timeout
+        self.reqsession = requests.Session()
+
+    def set_access_token(self, access_token):
+        self.access_token = access_token
+
+    def positions(self):
+        response = self.reqsession.get(f'{self.root}/portfolio/positions')
+        return response.json()['data']
+
+
+def timed(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--auth-ms', type=float, default=5.0, help='simulated token load / login cost')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PositionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    FakeKiteConnect.root = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def load_token():
+        time.sleep(args.auth_ms / 1000)
+        return 'token'
+
+    broker_module.KiteConnect = FakeKiteConnect
+    broker_module.load_access_token = load_token
+
+    def cold():
+        BrokerService('key', 'secret').get_positions()
+
+    shared = BrokerService('key', 'secret')
+    shared.cache = BrokerCache({})  # Measure connection reuse, not caching
+    for budget in list(shared.scheduler.budgets):
+        shared.scheduler.configure(budget, 0)  # Nor the request budgets
+    shared.get_positions()  # Open the pooled connection
+
+    print(f"{'broker':<8}{'p50':>10}{'p95':>10}{'mean':>10}")
+    for name, fn in (('cold', cold), ('shared', shared.get_positions)):
+        samples = sorted(timed(fn, args.requests))
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        print(f"{name:<8}{statistics.median(samples):>8.2f}ms{p95:>8.2f}ms{statistics.mean(samples):>8.2f}ms")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Options chain representation benchmark
+
+Builds one expiry's chain from Kite-shaped quotes both ways: the old
+list-of-dicts -> DataFrame path serialized with to_dict('records'), and
+OptionsChain (one contiguous NumPy block) serialized as records, columnar
+JSON and the binary frame. Reports memory, build and serialization time,
+a batch of in-place tick updates, and find_selling_candidates on each.
+
+    python benchmarks/bench_chain.py --strikes 180 --ticks 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chain import OptionsChain
+from app.services.options import OptionsChainService
+
+EXPIRY = '28NOV24'
+
+
+def synthetic_quotes(strikes, spot: float, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    quotes = {}
+    for i, strike in enumerate(strikes):
+        for kind, intrinsic in (('CE', max(spot - strike, 0)), ('PE', max(strike - spot, 0))):
+            ltp = round(intrinsic + 40 + rng.uniform(0, 60), 2)
+            quotes[f'NIFTY{EXPIRY}{strike}{kind}'] = {
+                'instrument_token': 10_000 + 2 * i + (kind == 'PE'),
+                'last_price': ltp,
+                'volume': int(rng.integers(1, 10 ** 6)),
+                'oi': int(rng.integers(1, 10 ** 6)),
+                'depth': {'buy': [{'price': ltp - 0.05, 'quantity': 50, 'orders': 1}] * 5,
+                          'sell': [{'price': ltp + 0.05, 'quantity': 50, 'orders': 1}] * 5},
+            }
+    return quotes
+
+
+def legacy_chain(strikes, spot, quotes):
+    """The previous get_options_chain body: a dict per strike, then a DataFrame"""
+    chain_data = []
+    for strike in strikes:
+        ce_symbol, pe_symbol = f'NIFTY{EXPIRY}{strike}CE', f'NIFTY{EXPIRY}{strike}PE'
+        ce_data, pe_data = quotes.get(ce_symbol), quotes.get(pe_symbol)
+        if ce_data and pe_data:
+            chain_data.append({
+                'strike': strike,
+                'ce_symbol': ce_symbol,
+                'pe_symbol': pe_symbol,
+                'ce_ltp': ce_data.get('last_price', 0),
+                'ce_volume': ce_data.get('volume', 0),
+                'ce_oi': ce_data.get('oi', 0),
+                'ce_bid': ce_data.get('depth', {}).get('buy', [{}])[0].get('price', 0),
+                'ce_ask': ce_data.get('depth', {}).get('sell', [{}])[0].get('price', 0),
+                'pe_ltp': pe_data.get('last_price', 0),
+                'pe_volume': pe_data.get('volume', 0),
+                'pe_oi': pe_data.get('oi', 0),
+                'pe_bid': pe_data.get('depth', {}).get('buy', [{}])[0].get('price', 0),
+                'pe_ask': pe_data.get('depth', {}).get('sell', [{}])[0].get('price', 0)
+            })
+    df = pd.DataFrame(chain_data)
+    df['spot_price'] = spot
+    df['expiry'] = EXPIRY
+    df['ce_iv'] = np.nan
+    df['pe_iv'] = np.nan
+    return df
+
+
+def legacy_records(df):
+    df = df.astype(object).where(df.notna(), None)
+    return json.dumps(df.to_dict('records'))
+
+
+def legacy_tick(df, rows, prices):
+    for row, price in zip(rows, prices):
+        df.loc[row, 'pe_ltp'] = price
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strikes', type=int, default=180)
+    parser.add_argument('--ticks', type=int, default=50, help='ticks per streamed batch')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    spot = 22000.0
+    strikes = [int(spot) - 50 * (args.strikes // 2) + 50 * i for i in range(args.strikes)]
+    quotes = synthetic_quotes(strikes, spot)
+    symbols = ([f'NIFTY{EXPIRY}{s}CE' for s in strikes], [f'NIFTY{EXPIRY}{s}PE' for s in strikes])
+    options = OptionsChainService(None)
+    repeat = args.repeat
+
+    old_build, frame = timed(lambda: legacy_chain(strikes, spot, quotes), repeat)
+    new_build, chain = timed(lambda: OptionsChain.from_quotes(EXPIRY, spot, strikes, symbols, quotes), repeat)
+
+    old_json, old_payload = timed(lambda: legacy_records(frame), repeat)
+    records_json, records_payload = timed(lambda: json.dumps(chain.to_records()), repeat)
+    columns_json, columns_payload = timed(lambda: json.dumps(chain.to_columns()), repeat)
+    binary, binary_payload = timed(chain.to_bytes, repeat)
+    decoded, roundtrip = timed(lambda: OptionsChain.from_bytes(binary_payload), repeat)
+    assert json.loads(old_payload) == json.loads(records_payload), 'records differ from the DataFrame path'
+    assert np.array_equal(roundtrip.values, chain.values, equal_nan=True)
+
+    rng = np.random.default_rng(7)
+    rows = rng.choice(len(chain), args.ticks, replace=False)
+    prices = rng.uniform(50, 150, args.ticks)
+    ticks = [{'instrument_token': int(chain.tokens[1, row]), 'last_price': price,
+              'depth': quotes[chain.symbols[1, row]]['depth']} for row, price in zip(rows, prices)]
+    old_ticks, _ = timed(lambda: legacy_tick(frame, rows, prices), max(1, repeat // 10))
+    new_ticks, _ = timed(lambda: chain.apply_ticks(ticks), repeat)
+    assert np.allclose(chain['pe_ltp'], frame['pe_ltp'])
+
+    old_select, old_candidates = timed(lambda: options.find_selling_candidates(frame, 'PE', 100), repeat)
+    new_select, new_candidates = timed(lambda: options.find_selling_candidates(chain, 'PE', 100), repeat)
+    assert old_candidates['strike'].tolist() == new_candidates['strike'].tolist()
+
+    print(f"chain                   {len(chain)} strikes x CE/PE")
+    print(f"{'':<24}{'DataFrame':>12}{'OptionsChain':>14}")
+    print(f"{'memory':<24}{frame.memory_usage(deep=True).sum() / 1024:>10.1f}KB{chain.nbytes / 1024:>12.1f}KB"
+          f"  ({chain.values.nbytes / 1024:.1f}KB numeric block)")
+    print(f"{'build from quotes':<24}{old_build * 1e6:>10.0f}us{new_build * 1e6:>12.0f}us")
+    print(f"{'records JSON':<24}{old_json * 1e6:>10.0f}us{records_json * 1e6:>12.0f}us"
+          f"  ({len(records_payload) / 1024:.1f}KB)")
+    print(f"{'columnar JSON':<24}{'':>12}{columns_json * 1e6:>12.0f}us  ({len(columns_payload) / 1024:.1f}KB)")
+    print(f"{'binary frame':<24}{'':>12}{binary * 1e6:>12.0f}us  ({len(binary_payload) / 1024:.1f}KB, "
+          f"decode {decoded * 1e6:.0f}us)")
+    print(f"{f'{args.ticks}-tick update':<24}{old_ticks * 1e6:>10.0f}us{new_ticks * 1e6:>12.0f}us")
+    print(f"{'find_selling_candidates':<24}{old_select * 1e6:>10.0f}us{new_select * 1e6:>12.0f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Multi-process throughput benchmark
+
+Starts run.py in production mode (WORKERS processes on one port, REDIS_URL
+for SocketIO fan-out and leader election) against the simulated exchange,
+once per worker count, and measures:
+
+    api        --clients load processes cycling through the options chain,
+               positions and position monitor endpoints (requests/second)
+    dashboard  --sockets SocketIO clients spread over the workers by the
+               kernel, subscribed to one channel, while an external emitter
+               publishes through Redis at --emit-rate for --seconds;
+               reports deliveries per second and delivery latency
+    leader     /api/ready sampled across the workers: exactly one should
+               report role 'leader'
+
+Throughput should grow roughly linearly with the worker count up to the
+number of CPU cores (printed first); on fewer cores the workers only
+share them. Needs a Redis server it may write to (keys under the
+bench-cluster prefix, SocketIO channel bench-cluster:socketio).
+
+    python benchmarks/bench_cluster.py --redis-url redis://localhost:6379/15 --workers 1,2,4
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = 'bench-cluster'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get(base: str, path: str):
+    import requests
+
+    try:
+        response = requests.get(base + path, timeout=5)
+        return response.status_code, response.json()
+    except (requests.RequestException, ValueError):
+        return 0, None
+
+
+def start(workers: int, port: int, args) -> subprocess.Popen:
+    data_dir = tempfile.mkdtemp(prefix='cluster-')
+    env = dict(os.environ, WORKERS=str(workers), REDIS_URL=args.redis_url, CLUSTER_PREFIX=PREFIX,
+               BROKER_BACKEND='simulator', TICKER_ENABLED='true', HOST='127.0.0.1', PORT=str(port),
+               DATA_DIR=data_dir, JOURNAL_URL=f"sqlite:///{os.path.join(data_dir, 'journal.db')}",
+               PUBLISH_INTERVAL='1',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    if workers == 1:
+        env['WORKER_ID'] = '0'  # Same server as the cluster workers, without the supervisor
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'run.py')], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(base: str, workers: int, timeout: float) -> bool:
+    """Ready once 4 probes per worker in a row answer 200 (each may land on any worker)"""
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline and streak < 4 * workers:
+        status, _ = get(base, '/api/ready')
+        streak = streak + 1 if status == 200 else 0
+        time.sleep(0.05)
+    return streak >= 4 * workers
+
+
+def roles(base: str, samples: int) -> dict:
+    seen = {}
+    for _ in range(samples):
+        _, body = get(base, '/api/ready')
+        cluster = (body or {}).get('cluster')
+        if cluster:
+            seen[cluster['worker']] = cluster['role']
+    return seen
+
+
+def api_client(base: str, paths: list, seconds: float, results):
+    import requests
+
+    session = requests.Session()
+    ok = errors = 0
+    deadline = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < deadline:
+        try:
+            # A fresh connection per request, so the kernel spreads them over the workers
+            response = session.get(base + paths[i % len(paths)], timeout=30, headers={'Connection': 'close'})
+            ok, errors = (ok + 1, errors) if response.ok else (ok, errors + 1)
+        except requests.RequestException:
+            errors += 1
+        i += 1
+    results.put((ok, errors))
+
+
+def api_load(base: str, args) -> tuple:
+    _, body = get(base, '/api/expiries?min_days=1&max_days=60')
+    expiry = body['expiries'][0]
+    paths = [f'/api/options-chain/{expiry}', '/api/orders/positions', '/api/analytics/positions/monitor']
+    results = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=api_client, args=(base, paths, args.seconds, results))
+               for _ in range(args.clients)]
+    started = time.monotonic()
+    for client in clients:
+        client.start()
+    totals = [results.get() for _ in clients]
+    for client in clients:
+        client.join()
+    elapsed = time.monotonic() - started
+    return sum(ok for ok, _ in totals) / elapsed, sum(errors for _, errors in totals)
+
+
+def dashboard_load(base: str, args) -> tuple:
+    import socketio
+    from flask_socketio import SocketIO
+
+    latencies = []
+    lock = threading.Lock()
+
+    def on_update(message):
+        if message.get('channel') == 'bench':
+            with lock:
+                latencies.append(time.time() - message['sent'])
+
+    sockets = []
+    for _ in range(args.sockets):
+        client = socketio.Client()
+        client.on('update', on_update)
+        client.connect(base, transports=['websocket'])
+        client.emit('subscribe', {'channels': ['pnl']})
+        sockets.append(client)
+    time.sleep(1)
+
+    emitter = SocketIO(message_queue=args.redis_url, channel=f'{PREFIX}:socketio')
+    deadline = time.monotonic() + args.seconds
+    sent = 0
+    started = time.monotonic()
+    while time.monotonic() < deadline:
+        emitter.emit('update', {'channel': 'bench', 'sent': time.time()}, to='pnl')
+        sent += 1
+        time.sleep(1 / args.emit_rate)
+    time.sleep(2)  # Drain
+    elapsed = time.monotonic() - started
+    for client in sockets:
+        client.disconnect()
+
+    delivered = len(latencies)
+    return delivered / elapsed, delivered / max(1, sent * args.sockets), np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15')
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--clients', type=int, default=8, help='API load processes')
+    parser.add_argument('--sockets', type=int, default=40, help='SocketIO clients')
+    parser.add_argument('--emit-rate', type=float, default=50, help='dashboard messages per second')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for readiness')
+    args = parser.parse_args()
+
+    import redis
+
+    try:
+        redis.Redis.from_url(args.redis_url).ping()
+    except redis.RedisError as e:
+        sys.exit(f"Redis not reachable at {args.redis_url}: {e}")
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} API clients, {args.sockets} sockets, "
+          f"{args.emit_rate:g} msg/s, {args.seconds:g}s per phase")
+    print(f"{'workers':<9}{'api req/s':>11}{'errors':>8}{'deliv/s':>10}{'delivered':>11}"
+          f"{'p50':>9}{'p99':>9}{'leaders':>9}")
+    for workers in (int(count) for count in args.workers.split(',')):
+        port = free_port()
+        base = f'http://127.0.0.1:{port}'
+        server = start(workers, port, args)
+        try:
+            if not wait_ready(base, workers, args.timeout):
+                print(f"{workers:<9}never ready (within {args.timeout:g}s)")
+                continue
+            rate, errors = api_load(base, args)
+            delivered, fraction, latency = dashboard_load(base, args)
+            seen = roles(base, 8 * workers)
+            leaders = sum(role == 'leader' for role in seen.values())
+            p50, p99 = (np.percentile(latency, 50), np.percentile(latency, 99)) if len(latency) else (0, 0)
+            print(f"{workers:<9}{rate:>11.1f}{errors:>8}{delivered:>10.1f}{fraction:>10.0%}"
+                  f"{p50:>7.1f}ms{p99:>7.1f}ms{leaders:>4}/{len(seen)}")
+        finally:
+            server.terminate()
+            server.wait()
+            time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()
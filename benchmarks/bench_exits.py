@@ -0,0 +1,169 @@
+"""
+Tick-driven exit engine benchmark
+
+Arms ExitEngine over a book of short option legs, then streams random-walk
+ticks for every leg. A fake broker records when each exit order arrives
+(after --latency-ms) and pushes the fill back through the order feed, the
+way the ticker would. Reports the per-batch tick overhead, the delay from
+the breaching tick to place_order, and that repeated breaches of the same
+leg never produce a second exit. Then breaches one leg on every tick
+against a broker that only half-fills each exit, and one that rejects
+every exit, and counts what was sent.
+
+    python benchmarks/bench_exits.py --legs 200 --batches 2000 --interval-ms 2 --latency-ms 30
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.exits import ExitEngine
+from app.services.risk import PortfolioRisk
+
+
+class FakeBroker:
+    """Accepts every order after a fixed delay and fills it at once"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.orders = []
+        self.listeners = []
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def place_order(self, symbol, transaction_type, quantity, price=None, order_type='LIMIT',
+                    product='NRML', reference_price=None, tag=None, priority=None, reduce_only=False):
+        arrived = time.perf_counter()
+        time.sleep(self.latency)
+        with self._lock:
+            self.orders.append((symbol, arrived))
+            order_id = str(len(self.orders))
+        order = {'order_id': order_id, 'tradingsymbol': symbol, 'instrument_token': self.tokens[symbol],
+                 'transaction_type': transaction_type, 'product': product, 'status': 'COMPLETE',
+                 'filled_quantity': quantity, 'average_price': reference_price}
+        for listener in self.listeners:
+            listener(order)
+        return order_id
+
+
+class ScriptedBroker(FakeBroker):
+    """Answers every exit with one update: half filled and still open, or rejected"""
+
+    def __init__(self, outcome: str):
+        super().__init__(0.0)
+        self.outcome = outcome
+        self.quantities = []
+
+    def place_order(self, symbol, transaction_type, quantity, price=None, order_type='LIMIT',
+                    product='NRML', reference_price=None, tag=None, priority=None, reduce_only=False):
+        with self._lock:
+            self.quantities.append(quantity)
+            order_id = f'{self.outcome}{len(self.quantities)}'
+        filled = quantity // 2 if self.outcome == 'partial' else 0
+        order = {'order_id': order_id, 'tradingsymbol': symbol, 'instrument_token': self.tokens[symbol],
+                 'transaction_type': transaction_type, 'product': product,
+                 'status': 'OPEN' if self.outcome == 'partial' else 'REJECTED',
+                 'filled_quantity': filled, 'average_price': reference_price if filled else 0}
+        # After place_order returns, as the feed would
+        threading.Timer(0.005, lambda: [listener(order) for listener in self.listeners]).start()
+        return order_id
+
+
+def breach_every_tick(outcome: str, seconds: float = 1.0, retry_interval: float = 0.25) -> list:
+    """Exit quantities sent for one 1800 short breaching its stop on every tick"""
+    expiry = date.today() + timedelta(days=30)
+    position = {'tradingsymbol': f"NIFTY{expiry.strftime('%d%b%y').upper()}21000PE", 'instrument_token': 7,
+                'product': 'NRML', 'quantity': -1800, 'average_price': 100.0, 'last_price': 100.0,
+                'sell_value': 180000.0}
+    broker = ScriptedBroker(outcome)
+    broker.tokens = {position['tradingsymbol']: 7}
+    risk = PortfolioRisk()
+    risk.spot['NIFTY'] = 22000
+    engine = ExitEngine(broker, risk, stop_loss_percent=30, profit_target_percent=50,
+                        retry_interval=retry_interval, max_workers=1)
+    broker.listeners = [risk.on_order_update, engine.on_order_update]
+    engine.start([position])
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        engine.on_ticks([{'instrument_token': 7, 'last_price': 150.0}])
+        time.sleep(0.002)
+    engine.pool.shutdown(wait=True)
+    return broker.quantities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legs', type=int, default=200)
+    parser.add_argument('--batches', type=int, default=2000, help='tick batches, one tick per leg each')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='broker order round-trip')
+    parser.add_argument('--interval-ms', type=float, default=2.0, help='gap between tick batches')
+    parser.add_argument('--volatility', type=float, default=0.01, help='per-tick relative move')
+    args = parser.parse_args()
+
+    expiry = date.today() + timedelta(days=30)
+    positions = [{
+        'tradingsymbol': f"NIFTY{expiry.strftime('%d%b%y').upper()}{20000 + 50 * i}PE",
+        'instrument_token': 1000 + i,
+        'product': 'NRML',
+        'quantity': -50,
+        'average_price': 100.0,
+        'last_price': 100.0,
+        'sell_value': 5000.0,
+    } for i in range(args.legs)]
+
+    broker = FakeBroker(args.latency_ms / 1000)
+    broker.tokens = {p['tradingsymbol']: p['instrument_token'] for p in positions}
+    risk = PortfolioRisk()
+    risk.spot['NIFTY'] = 22000
+    engine = ExitEngine(broker, risk, stop_loss_percent=30, profit_target_percent=50, max_workers=8)
+    broker.listeners = [risk.on_order_update, engine.on_order_update]
+    engine.start(positions)
+
+    rng = np.random.default_rng(11)
+    prices = np.full(args.legs, 100.0)
+    tokens = [p['instrument_token'] for p in positions]
+    breached_at = {}
+    tick_times, breaches = [], 0
+    for _ in range(args.batches):
+        prices *= np.exp(rng.normal(0, args.volatility, args.legs))
+        ticks = [{'instrument_token': token, 'last_price': float(price)} for token, price in zip(tokens, prices)]
+        received = time.perf_counter()
+        engine.on_ticks(ticks)
+        tick_times.append(time.perf_counter() - received)
+        for position, price in zip(positions, prices):
+            if price >= 130 or price <= 50:
+                breaches += 1
+                breached_at.setdefault(position['tradingsymbol'], received)
+        time.sleep(args.interval_ms / 1000)
+    engine.pool.shutdown(wait=True)
+
+    exits = {}
+    for symbol, arrived in broker.orders:
+        exits.setdefault(symbol, []).append(arrived)
+    delays = np.array([(arrived[0] - breached_at[symbol]) * 1000 for symbol, arrived in exits.items()])
+    duplicates = sum(len(arrived) - 1 for arrived in exits.values())
+    tick_times = np.array(tick_times) * 1e6
+
+    print(f"book                    {args.legs} short legs, stop +30% / target -50% of premium")
+    print(f"tick batch ({args.legs} ticks)   p50 {np.percentile(tick_times, 50):7.1f}us  "
+          f"p99 {np.percentile(tick_times, 99):7.1f}us")
+    print(f"breaching ticks         {breaches} on {len(breached_at)} legs")
+    print(f"exit orders             {len(broker.orders)} ({duplicates} duplicates), "
+          f"{len(engine.status()['armed'])} legs still armed")
+    if len(delays):
+        print(f"tick -> place_order     p50 {np.percentile(delays, 50):7.3f}ms  p99 {np.percentile(delays, 99):7.3f}ms")
+
+    partial = breach_every_tick('partial')
+    print(f"half-filled exits       {partial} bought against a short of 1800 ({sum(partial)} total)")
+    rejected = breach_every_tick('reject')
+    print(f"rejected exits          {len(rejected)} orders in 1s of breaching ticks (retry every 0.25s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Greeks engine benchmark
+
+Prices a synthetic multi-expiry NIFTY universe with the scalar
+GreeksCalculator methods (price, delta, theta per contract) and with
+calculate_batch_greeks (price plus all five Greeks in one pass).
+
+    python benchmarks/bench_greeks.py --contracts 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.greeks import GreeksCalculator
+
+
+def universe(count: int, spot: float = 22000.0, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    strikes = np.round(spot * rng.uniform(0.8, 1.2, count) / 50) * 50
+    T = rng.integers(1, 90, count) / 365
+    sigma = rng.uniform(0.1, 0.3, count)
+    is_call = rng.random(count) < 0.5
+    return np.full(count, spot), strikes, T, sigma, is_call
+
+
+def scalar(S, K, T, r, sigma, is_call):
+    calc = GreeksCalculator
+    out = []
+    for s, k, t, v, call in zip(S, K, T, sigma, is_call):
+        kind = 'call' if call else 'put'
+        price = calc.black_scholes_call(s, k, t, r, v) if call else calc.black_scholes_put(s, k, t, r, v)
+        out.append((price, calc.calculate_delta(s, k, t, r, v, kind), calc.calculate_theta(s, k, t, r, v, kind)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--contracts', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20, help='batch repetitions to average')
+    args = parser.parse_args()
+
+    r = 0.065
+    S, K, T, sigma, is_call = universe(args.contracts)
+
+    start = time.perf_counter()
+    reference = scalar(S, K, T, r, sigma, is_call)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        greeks = GreeksCalculator.calculate_batch_greeks(S, K, T, r, sigma, is_call)
+    batch_time = (time.perf_counter() - start) / args.repeat
+
+    expected = np.array(reference)
+    error = max(
+        np.max(np.abs(greeks['price'] - expected[:, 0])),
+        np.max(np.abs(greeks['delta'] - expected[:, 1])),
+        np.max(np.abs(greeks['theta'] - expected[:, 2])),
+    )
+
+    print(f"contracts            {args.contracts}")
+    print(f"scalar (3 values)    {scalar_time * 1000:>10.1f}ms")
+    print(f"batch  (6 values)    {batch_time * 1000:>10.2f}ms")
+    print(f"speedup              {scalar_time / batch_time:>10.0f}x")
+    print(f"max abs difference   {error:>10.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Implied volatility solver benchmark
+
+Solves ce_iv/pe_iv for a synthetic NIFTY chain priced off a volatility
+smile and rounded to the 0.05 tick, cold and warm-started from the
+previous solve.
+
+    python benchmarks/bench_implied_volatility.py --strikes 180
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.greeks import GreeksCalculator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strikes', type=int, default=180, help='strikes per side')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    spot, r, T = 22000.0, 0.065, 35 / 365
+    strikes = spot - 50 * (args.strikes // 2) + 50 * np.arange(args.strikes)
+    smile = 0.13 + 0.4 * np.log(strikes / spot) ** 2
+
+    K = np.tile(strikes, 2)
+    sigma = np.tile(smile, 2)
+    is_call = np.repeat([True, False], args.strikes)
+    prices = GreeksCalculator.calculate_batch_greeks(spot, K, T, r, sigma, is_call)['price']
+    prices = np.maximum(np.round(prices / 0.05) * 0.05, 0.05)
+
+    def solve(initial=None):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            iv = GreeksCalculator.calculate_implied_volatility(prices, spot, K, T, r, is_call, initial=initial)
+        return iv, (time.perf_counter() - start) / args.repeat
+
+    cold, cold_time = solve()
+    warm, warm_time = solve(initial=cold)
+
+    solved = np.isfinite(cold)
+    error = np.abs(cold[solved] - sigma[solved])
+
+    print(f"options              {K.size}")
+    print(f"solved               {solved.sum()}")
+    print(f"cold solve           {cold_time * 1000:>8.3f}ms")
+    print(f"warm solve           {warm_time * 1000:>8.3f}ms")
+    print(f"median |iv - true|   {np.median(error):>8.2e}")
+
+
+if __name__ == '__main__':
+    main()
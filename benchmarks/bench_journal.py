@@ -0,0 +1,153 @@
+"""
+Order/trade journal benchmark
+
+Journals a stream of orders (placement, OPEN, partial fill, COMPLETE) for
+strategy runs and exits into a fresh SQLite file. Compares the cost each
+event adds to the caller, enqueue only vs a synchronous insert-and-commit
+per event, then the writer's drain rate. Then seeds a year of fills,
+times pnl() (read from the daily_pnl rollup) over a month and a year,
+and restarts the journal to check that redelivered updates book no new
+fills.
+
+    python benchmarks/bench_journal.py --orders 5000 --history-fills 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+
+from app.services.journal import TradeJournal, fills, order_events
+
+
+def lifecycle(order_id: str, symbol: str, side: str, quantity: int, price: float):
+    """Broker updates for one order that fills in two parts"""
+    half = quantity // 2
+    return [
+        {'order_id': order_id, 'tradingsymbol': symbol, 'transaction_type': side, 'status': 'OPEN',
+         'filled_quantity': 0, 'average_price': 0},
+        {'order_id': order_id, 'tradingsymbol': symbol, 'transaction_type': side, 'status': 'OPEN',
+         'filled_quantity': half, 'average_price': price},
+        {'order_id': order_id, 'tradingsymbol': symbol, 'transaction_type': side, 'status': 'COMPLETE',
+         'filled_quantity': quantity, 'average_price': price + 0.05 * (quantity - half) / quantity},
+    ]
+
+
+def stream(count: int, seed: int = 1):
+    """(run_id, order_id, symbol, side, quantity, price): sells opened by runs, half later bought back"""
+    rng = random.Random(seed)
+    orders = []
+    for i in range(count):
+        symbol = f'NIFTY28NOV24{21000 + 50 * (i // 2 % 40)}PE'
+        if i % 2 == 0:
+            orders.append((f'run{i // 6:08d}', f'o{i}', symbol, 'SELL', 50, round(rng.uniform(80, 150), 2)))
+        else:
+            orders.append(('exit', f'o{i}', symbol, 'BUY', 50, round(rng.uniform(40, 180), 2)))
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--history-fills', type=int, default=200000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='journal-')
+    url = f"sqlite:///{os.path.join(directory, 'journal.db')}"
+    journal = TradeJournal(url).start()
+    orders = stream(args.orders)
+
+    # Caller-side cost: everything the order path does for the journal
+    caller = []
+    runs = set()
+    for run_id, order_id, symbol, side, quantity, price in orders:
+        started = time.perf_counter()
+        if run_id != 'exit' and run_id not in runs:
+            runs.add(run_id)
+            journal.run_started(run_id, 'put_selling', {'capital': 100000})
+        journal.order_placed(order_id, symbol, side, quantity, None, 'MARKET', 'NRML', tag=run_id)
+        for update in lifecycle(order_id, symbol, side, quantity, price):
+            journal.on_order_update(update)
+        caller.append(time.perf_counter() - started)
+    enqueued = time.perf_counter()
+    journal.flush(timeout=120)
+    drained = time.perf_counter() - enqueued
+    written = journal.written
+    events = len(orders) * 4 + len(runs)
+
+    # The same events written synchronously, one transaction each
+    naive = TradeJournal(f"sqlite:///{os.path.join(directory, 'naive.db')}")
+    sample = orders[:200]
+    started = time.perf_counter()
+    for run_id, order_id, symbol, side, quantity, price in sample:
+        for update in [{'order_id': order_id, 'tradingsymbol': symbol, 'transaction_type': side,
+                        'status': 'PLACED', 'filled_quantity': 0}] + lifecycle(order_id, symbol, side, quantity, price):
+            batch = {'runs': {}, 'run_updates': [], 'orders': {}, 'events': [], 'fills': []}
+            naive._apply('order_update', time.time(), update, batch)
+            naive._write(batch)
+    synchronous = (time.perf_counter() - started) / (len(sample) * 4)
+
+    with journal.engine.connect() as connection:
+        booked = connection.execute(select(func.count()).select_from(fills)).scalar()
+        transitions = connection.execute(select(func.count()).select_from(order_events)).scalar()
+    today = date.today()
+    live = journal.pnl(today, today)
+
+    # A year of history for the P&L queries
+    rng = np.random.default_rng(4)
+    days = rng.integers(0, 365, args.history_fills)
+    rows = [{
+        'order_id': f'h{i}', 'run_id': None, 'strategy': ('put_selling', 'manual', 'iron_condor')[i % 3],
+        'symbol': f'NIFTY{21000 + 50 * (i % 40)}PE', 'transaction_type': 'BUY' if i % 2 else 'SELL',
+        'quantity': 50, 'price': 100.0, 'realized_pnl': float(pnl) if i % 2 else 0.0,
+        'timestamp': time.time(), 'trading_day': today - timedelta(days=int(day)),
+    } for i, (day, pnl) in enumerate(zip(days, rng.normal(200, 1500, args.history_fills)))]
+    for chunk in range(0, len(rows), 10000):
+        journal._write({'runs': {}, 'run_updates': [], 'orders': {}, 'events': [], 'fills': rows[chunk:chunk + 10000]})
+
+    def timed(fn, repeat=20):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return (time.perf_counter() - started) / repeat, result
+
+    month, month_result = timed(lambda: journal.pnl(today - timedelta(days=30), today))
+    year, year_result = timed(lambda: journal.pnl(today - timedelta(days=365), today))
+    one, _ = timed(lambda: journal.pnl(today - timedelta(days=365), today, 'iron_condor'))
+    journal.stop()
+
+    # Restart: recent orders are reloaded, so redelivered updates book nothing
+    restarted = TradeJournal(url).start()
+    for run_id, order_id, symbol, side, quantity, price in orders[-100:]:
+        restarted.on_order_update(lifecycle(order_id, symbol, side, quantity, price)[-1])
+    restarted.flush()
+    with restarted.engine.connect() as connection:
+        after = connection.execute(select(func.count()).select_from(fills).where(fills.c.order_id.like('o%'))).scalar()
+    restarted.stop()
+
+    caller = np.array(caller) * 1e6 / 4
+    print(f"stream                  {len(orders)} orders, {len(runs)} strategy runs, {events} events")
+    print(f"per event, caller       p50 {np.percentile(caller, 50):6.2f}us  p99 {np.percentile(caller, 99):6.2f}us "
+          f"(enqueue)  vs {synchronous * 1e6:8.0f}us synchronous commit")
+    print(f"writer drain            {drained * 1000:8.1f}ms after the last event, {written} rows, "
+          f"{journal.dropped} dropped")
+    print(f"journaled               {booked} fills, {transitions} status transitions, "
+          f"today's realized {live['realized_pnl']:,.2f}")
+    print(f"pnl() last 30 days      {month * 1000:8.2f}ms  ({len(month_result['by_day'])} days, "
+          f"{args.history_fills} fills on file)")
+    print(f"pnl() last 365 days     {year * 1000:8.2f}ms  ({len(year_result['by_day'])} days, "
+          f"{len(year_result['by_strategy'])} strategies)")
+    print(f"pnl() one strategy      {one * 1000:8.2f}ms")
+    print(f"restart + redelivery    {after - booked} extra fills booked")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Instrumentation overhead benchmark
+
+Times a trivial function bare, wrapped in metrics.timed() and inside
+metrics.span(), with and without a profile being collected, to give the
+per-span cost. Then serves /api/options-chain/<expiry> from the real app
+(Flask test client, in-process fake Kite client) and prints one profiled
+request's stage breakdown, the request latency with and without
+profiling, and the cost of rendering /api/metrics.
+
+    python benchmarks/bench_metrics.py --calls 200000 --requests 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before app.config is imported: nothing written to disk, profiling on
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='metrics-'))
+os.environ['JOURNAL_ENABLED'] = 'false'
+os.environ['RECORDER_ENABLED'] = 'false'
+os.environ['PROFILING_ENABLED'] = 'true'
+os.environ.setdefault('QUOTE_RATE_LIMIT', '1000')  # Measure the app, not the broker budget
+os.environ.setdefault('ASYNC_MODE', 'threading')
+
+from app import create_app
+from app.services.broker import BrokerService
+from app.utils.metrics import Metrics, metrics
+
+
+class FakeKite:
+    """Kite client stand-in answering quotes instantly"""
+
+    def __init__(self, spot: float = 22000.0):
+        self.spot = spot
+
+    def quote(self, keys):
+        quotes = {}
+        for key in keys:
+            if key == 'NSE:NIFTY 50':
+                quotes[key] = {'last_price': self.spot}
+                continue
+            strike = int(key[-7:-2])
+            intrinsic = max(0.0, self.spot - strike) if key.endswith('CE') else max(0.0, strike - self.spot)
+            ltp = intrinsic + 50.0
+            quotes[key] = {'last_price': ltp, 'volume': 1000, 'oi': 50000,
+                           'depth': {'buy': [{'price': ltp - 0.5}], 'sell': [{'price': ltp + 0.5}]}}
+        return quotes
+
+    def instruments(self, exchange):
+        return []
+
+
+def per_call(fn, calls: int) -> float:
+    """Best of three runs, microseconds per call"""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    # Span overhead on a private registry
+    registry = Metrics()
+
+    def bare():
+        return 1
+
+    timed = registry.timed('bench.timed')(bare)
+
+    def spanned():
+        with registry.span('bench.span'):
+            return 1
+
+    base = per_call(bare, args.calls)
+    costs = {'timed()': per_call(timed, args.calls) - base, 'span()': per_call(spanned, args.calls) - base}
+    registry.profile_start()
+    profiled = {'timed()': per_call(timed, args.calls // 10) - base, 'span()': per_call(spanned, args.calls // 10) - base}
+    registry.profile_stop()
+
+    # The real request path
+    app = create_app(broker=BrokerService(kite=FakeKite()))
+    client = app.test_client()
+    expiry = (date.today() + timedelta(days=30)).strftime('%d%b%y').upper()
+    url = f'/api/options-chain/{expiry}'
+
+    def request(headers=None):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        return time.perf_counter() - started, response
+
+    request()
+    plain = np.array([request()[0] for _ in range(args.requests)]) * 1000
+    with_profile = np.array([request({'X-Profile': '1'})[0] for _ in range(args.requests)]) * 1000
+    _, response = request({'X-Profile': '1'})
+    profile = response.get_json()['profile']
+
+    started = time.perf_counter()
+    for _ in range(100):
+        text = metrics.render()
+    render = (time.perf_counter() - started) / 100 * 1000
+
+    for name in costs:
+        print(f"{name:<8} overhead        {costs[name]:6.2f}us per call  ({profiled[name]:6.2f}us while profiling)")
+    print(f"GET {url:<28} p50 {np.percentile(plain, 50):7.2f}ms  p99 {np.percentile(plain, 99):7.2f}ms")
+    print(f"  with X-Profile: 1{'':14} p50 {np.percentile(with_profile, 50):7.2f}ms  "
+          f"p99 {np.percentile(with_profile, 99):7.2f}ms")
+    print(f"  Server-Timing: {response.headers['Server-Timing']}")
+    print(f"  stages ({profile['total_ms']:.3f}ms total):")
+    for stage in profile['stages']:
+        print(f"    {'  ' * stage['depth']}{stage['stage']:<{40 - 2 * stage['depth']}} {stage['ms']:8.3f}ms")
+    print(f"/api/metrics render      {render:6.2f}ms, {len(metrics.snapshot())} spans, {len(text.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    main()
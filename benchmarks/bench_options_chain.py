@@ -0,0 +1,101 @@
+"""
+Options chain build benchmark
+
+Compares the old one-quote-per-symbol chain fetch with the batched
+BrokerService.get_quotes path against a fake Kite client that sleeps
+for a fixed round-trip latency and counts calls.
+
+    python benchmarks/bench_options_chain.py --latency-ms 80
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.broker import BrokerService
+from app.services.options import OptionsChainService
+
+
+class FakeKite:
+    """Kite client stand-in returning synthetic quotes after a fixed delay"""
+
+    def __init__(self, spot: float = 22000.0, latency: float = 0.08):
+        self.spot = spot
+        self.latency = latency
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def quote(self, keys):
+        with self._lock:
+            self.round_trips += 1
+        time.sleep(self.latency)
+
+        quotes = {}
+        for key in keys:
+            if key == 'NSE:NIFTY 50':
+                quotes[key] = {'last_price': self.spot}
+                continue
+
+            strike = int(key[-7:-2])
+            intrinsic = max(0.0, self.spot - strike) if key.endswith('CE') else max(0.0, strike - self.spot)
+            ltp = intrinsic + 50.0
+            quotes[key] = {
+                'last_price': ltp,
+                'volume': 1000,
+                'oi': 50000,
+                'depth': {
+                    'buy': [{'price': ltp - 0.5, 'quantity': 50, 'orders': 1}],
+                    'sell': [{'price': ltp + 0.5, 'quantity': 50, 'orders': 1}],
+                },
+            }
+        return quotes
+
+
+class SequentialOptionsChainService(OptionsChainService):
+    """Previous behaviour: two get_quote round-trips per strike"""
+
+    def get_options_chain(self, expiry):
+        import pandas as pd
+
+        spot_price = self.broker.get_quote('NIFTY 50', 'NSE')['last_price']
+        rows = []
+        for strike in self._generate_strikes(spot_price):
+            ce = self.broker.get_quote(f"NIFTY{expiry}{strike}CE")
+            pe = self.broker.get_quote(f"NIFTY{expiry}{strike}PE")
+            if ce and pe:
+                rows.append({'strike': strike, 'ce_ltp': ce['last_price'], 'pe_ltp': pe['last_price']})
+        return pd.DataFrame(rows)
+
+
+def run(service_cls, latency: float, rate: float):
+    kite = FakeKite(latency=latency)
+    broker = BrokerService(kite=kite)
+    broker.scheduler.configure('quote', rate, burst=max(1, int(rate)))
+    service = service_cls(broker)
+
+    start = time.perf_counter()
+    chain = service.get_options_chain('28NOV24')
+    elapsed = time.perf_counter() - start
+
+    return len(chain), kite.round_trips, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=80.0, help='simulated broker round-trip')
+    parser.add_argument('--rate', type=float, default=0, help='quote requests per second (0 = unlimited)')
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+
+    print(f"{'path':<12}{'strikes':>10}{'round-trips':>14}{'latency':>12}")
+    for name, cls in (('sequential', SequentialOptionsChainService), ('batched', OptionsChainService)):
+        rows, trips, elapsed = run(cls, latency, args.rate)
+        print(f"{name:<12}{rows:>10}{trips:>14}{elapsed * 1000:>10.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
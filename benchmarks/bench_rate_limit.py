@@ -0,0 +1,137 @@
+"""
+Broker rate-limit scheduler benchmark
+
+Runs the same mixed load against a SimulatedExchange that enforces Kite's
+per-second limits (HTTP 429 past them): --quote-threads hammering bulk
+quotes, --poll-threads polling positions and order status, a burst of
+--orders new orders, and --exits exit orders fired into the middle of the
+burst. First with no client-side budgets (every caller on its own, as
+before), then through the RateLimitScheduler: one budget per endpoint
+class, exits ahead of orders, retries with jittered backoff on 429.
+Reports 429s, failed calls, exit vs new-order latency, per-lane waits
+and the uncontended acquire() cost.
+
+    python benchmarks/bench_rate_limit.py --latency-ms 20 --seconds 3 --orders 40 --exits 5
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.broker import BrokerService
+from app.services.simulator import KITE_RATE_LIMITS, SimulatedExchange
+from app.utils.rate_limit import LANES, PRIORITY_EXIT, PRIORITY_ORDER, PriorityRateLimiter
+
+
+def run(args, scheduled: bool) -> dict:
+    exchange = SimulatedExchange(seed=3, latency=args.latency_ms / 1000, rate_limits=KITE_RATE_LIMITS)
+    broker = BrokerService(kite=exchange)
+    broker.cache.ttls = {}  # Every read reaches the exchange
+    if not scheduled:
+        for budget in list(broker.scheduler.budgets):
+            broker.scheduler.configure(budget, 0)
+        broker.scheduler.retries = 0
+    symbols = list(exchange.symbols[:400])
+    put = exchange.symbols[len(exchange.strikes[0]) + len(exchange.strikes[0]) // 2]
+
+    stop = threading.Event()
+    failures = {'quote': 0, 'poll': 0, 'order': 0, 'exit': 0}
+    latencies = {'order': [], 'exit': []}
+    lock = threading.Lock()
+
+    def fail(kind):
+        with lock:
+            failures[kind] += 1
+
+    def quotes():
+        while not stop.is_set():
+            if len(broker.get_quotes(symbols)) < len(symbols):
+                fail('quote')
+
+    def polls():
+        while not stop.is_set():
+            broker.cache.invalidate('positions', 'net')
+            broker.get_positions()
+            if not broker.get_order_history(last_order[0]) and last_order[0]:
+                fail('poll')
+
+    def order(kind, priority):
+        started = time.perf_counter()
+        order_id = broker.place_order(put, 'SELL' if kind == 'order' else 'BUY', exchange.lot_size,
+                                      order_type='MARKET', priority=priority)
+        with lock:
+            if order_id:
+                latencies[kind].append(time.perf_counter() - started)
+                last_order[0] = order_id
+            else:
+                failures[kind] += 1
+
+    last_order = [None]
+    workers = [threading.Thread(target=quotes) for _ in range(args.quote_threads)]
+    workers += [threading.Thread(target=polls) for _ in range(args.poll_threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(args.seconds / 3)
+
+    # New-order burst with exits fired into the middle of it
+    burst = [threading.Thread(target=order, args=('order', PRIORITY_ORDER)) for _ in range(args.orders)]
+    exits = [threading.Thread(target=order, args=('exit', PRIORITY_EXIT)) for _ in range(args.exits)]
+    for thread in burst[:len(burst) // 2]:
+        thread.start()
+    time.sleep(0.05)
+    for thread in exits + burst[len(burst) // 2:]:
+        thread.start()
+    for thread in burst + exits:
+        thread.join()
+
+    time.sleep(args.seconds / 3)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    return {'faults': exchange.stats()['faults'], 'failures': failures, 'latencies': latencies,
+            'budgets': broker.scheduler.budgets, 'calls': exchange.stats()['calls']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='simulated broker round trip')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--quote-threads', type=int, default=4)
+    parser.add_argument('--poll-threads', type=int, default=2)
+    parser.add_argument('--orders', type=int, default=40)
+    parser.add_argument('--exits', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    def ms(samples, q):
+        return f"{np.percentile(np.asarray(samples) * 1000, q):8.1f}ms" if samples else '       -  '
+
+    for label, scheduled in (('uncoordinated', False), ('scheduled', True)):
+        result = run(args, scheduled)
+        print(f"{label}: 429s {result['faults'].get('rate_limited', 0)}, failed calls {result['failures']}")
+        for kind in ('exit', 'order'):
+            samples = result['latencies'][kind]
+            print(f"  {kind:<6} {len(samples):>3} placed  p50 {ms(samples, 50)}  max {ms(samples, 100)}")
+        if scheduled:
+            for name, limiter in result['budgets'].items():
+                lanes = ', '.join(f"{lane} {limiter.lane_acquired[p]} ({limiter.lane_waited[p]:.2f}s waited)"
+                                  for p, lane in enumerate(LANES) if limiter.lane_acquired[p])
+                print(f"  budget {name:<9} {limiter.rate:g}/s  retries {limiter.retries}  {lanes}")
+
+    limiter = PriorityRateLimiter(1e9, burst=10 ** 9)
+    calls = 200000
+    started = time.perf_counter()
+    for _ in range(calls):
+        limiter.acquire(PRIORITY_ORDER)
+    print(f"uncontended acquire()  {(time.perf_counter() - started) / calls * 1e6:.2f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Chain recorder benchmark
+
+Records a full trading day of 1-second snapshots (09:15-15:30, 22,500
+chains) of a synthetic chain, then reads the day back through the
+memory-mapped reader.
+
+    python benchmarks/bench_recorder.py --strikes 180 --snapshots 22500
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.recorder import ChainReader, ChainRecorder
+
+
+def synthetic_chains(strikes: int, variants: int = 16, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    grid = 22000 - 50 * (strikes // 2) + 50 * np.arange(strikes)
+    chains = []
+    for _ in range(variants):
+        ce = np.maximum(22000 - grid, 0) + rng.uniform(20, 80, strikes)
+        pe = np.maximum(grid - 22000, 0) + rng.uniform(20, 80, strikes)
+        chains.append(pd.DataFrame({
+            'strike': grid,
+            'ce_symbol': [f'NIFTY24NOV{k}CE' for k in grid],
+            'pe_symbol': [f'NIFTY24NOV{k}PE' for k in grid],
+            'ce_ltp': ce, 'ce_bid': ce - 0.5, 'ce_ask': ce + 0.5,
+            'ce_oi': rng.integers(0, 5_000_000, strikes), 'ce_volume': rng.integers(0, 50_000_000, strikes),
+            'pe_ltp': pe, 'pe_bid': pe - 0.5, 'pe_ask': pe + 0.5,
+            'pe_oi': rng.integers(0, 5_000_000, strikes), 'pe_volume': rng.integers(0, 50_000_000, strikes),
+            'spot_price': 22000.0,
+            'expiry': '28NOV24',
+        }))
+    return chains
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strikes', type=int, default=180)
+    parser.add_argument('--snapshots', type=int, default=22500)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='chains-')
+    chains = synthetic_chains(args.strikes)
+    open_time = datetime(2024, 11, 20, 9, 15).timestamp()
+
+    recorder = ChainRecorder(directory, queue_size=args.snapshots + 1).start()
+    latencies = np.empty(args.snapshots)
+    start = time.perf_counter()
+    for i in range(args.snapshots):
+        t0 = time.perf_counter()
+        recorder.record(chains[i % len(chains)], timestamp=open_time + i)
+        latencies[i] = time.perf_counter() - t0
+    enqueued = time.perf_counter() - start
+    recorder.stop()
+    written = time.perf_counter() - start
+
+    size = sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+    rows = args.snapshots * args.strikes
+
+    reader = ChainReader(directory)
+    start = time.perf_counter()
+    arrays = reader.read_arrays('28NOV24', '2024-11-20')
+    mapped = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frame = reader.read_frame('28NOV24', '2024-11-20', decode_symbols=True)
+    framed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    count = sum(1 for _ in reader.snapshots('28NOV24', '2024-11-20'))
+    iterated = time.perf_counter() - start
+
+    print(f"snapshots x strikes     {args.snapshots} x {args.strikes} = {rows:,} rows")
+    print(f"record() p50 / max      {np.median(latencies) * 1e6:.1f}us / {latencies.max() * 1e6:.1f}us")
+    print(f"enqueue all / drained   {enqueued:.2f}s / {written:.2f}s")
+    print(f"disk usage              {size / 1e6:.1f} MB ({size / rows:.1f} bytes/row)")
+    print(f"memmap columns          {mapped * 1000:.2f}ms ({len(arrays['strike']):,} rows)")
+    print(f"full-day DataFrame      {framed:.2f}s ({len(frame):,} rows)")
+    print(f"iterate snapshots       {iterated:.2f}s ({count} snapshots)")
+
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
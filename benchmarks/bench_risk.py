@@ -0,0 +1,138 @@
+"""
+Portfolio risk aggregator benchmark
+
+Loads a book of short NIFTY puts and calls across several expiries, then
+times a full broker sync, tick messages touching --batch legs, index
+ticks (every leg repriced), fills, and analysis() reads from the
+maintained state, against the old per-call loop in monitor_positions.
+
+    python benchmarks/bench_risk.py --legs 500 --batch 20
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.services.risk import PortfolioRisk
+from app.utils.greeks import GreeksCalculator
+
+
+def book(legs: int, spot: float = 22000.0, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    expiries = [today + timedelta(days=7 * w + (3 - today.weekday()) % 7) for w in range(1, 9)]
+    positions = []
+    for i in range(legs):
+        expiry = expiries[i % len(expiries)]
+        kind = 'PE' if i % 3 else 'CE'
+        strike = round(spot * rng.uniform(0.85, 1.15) / 50) * 50
+        T = max((expiry - today).days, 1) / 365
+        price = float(GreeksCalculator.calculate_batch_greeks(spot, strike, T, Config.RISK_FREE_RATE, 0.15,
+                                                              kind == 'CE')['price'])
+        price = max(round(price, 2), 0.5)
+        quantity = -50 * int(rng.integers(1, 6))
+        positions.append({
+            'tradingsymbol': f"NIFTY{expiry.strftime('%d%b%y').upper()}{strike}{kind}",
+            'exchange': 'NFO',
+            'instrument_token': 10_000 + i,
+            'product': 'NRML',
+            'quantity': quantity,
+            'average_price': price,
+            'last_price': price,
+            'buy_value': 0.0,
+            'sell_value': -quantity * price,
+            'multiplier': 1,
+            'pnl': 0.0,
+        })
+    return positions
+
+
+def legacy_monitor(positions):
+    """The previous monitor_positions loop"""
+    analysis = {'total_positions': len(positions), 'total_pnl': 0, 'positions_at_risk': []}
+    for position in positions:
+        pnl = position.get('pnl', 0)
+        analysis['total_pnl'] += pnl
+        if pnl < 0 and position['buy_value']:
+            loss_percent = abs(pnl / position['buy_value']) * 100
+            if loss_percent >= Config.STOP_LOSS_PERCENT:
+                analysis['positions_at_risk'].append(position['tradingsymbol'])
+    return analysis
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legs', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    positions = book(args.legs)
+    rng = np.random.default_rng(1)
+    risk = PortfolioRisk()
+
+    sync = timed(lambda: risk.sync(positions, spot=22000.0), 5)
+    tokens = [p['instrument_token'] for p in positions]
+    prices = {p['instrument_token']: p['average_price'] for p in positions}
+
+    def option_ticks(count=args.batch):
+        chosen = rng.choice(tokens, count, replace=False)
+        risk.on_ticks([{'instrument_token': token, 'last_price': prices[token] * rng.uniform(0.9, 1.4)}
+                       for token in chosen.tolist()])
+    tick = timed(lambda: option_ticks(1), args.repeat)
+    message = timed(option_ticks, args.repeat)
+
+    index_tick = timed(lambda: risk.on_ticks([{'instrument_token': Config.NIFTY_INDEX_TOKEN,
+                                               'last_price': 22000 * rng.uniform(0.99, 1.01)}]), 50)
+
+    fills = iter(range(10 ** 9))
+    def fill():
+        token = tokens[rng.integers(len(tokens))]
+        position = positions[token - 10_000]
+        risk.on_order_update({'order_id': str(next(fills)), 'instrument_token': token, 'product': 'NRML',
+                              'tradingsymbol': position['tradingsymbol'], 'transaction_type': 'SELL',
+                              'filled_quantity': 50, 'average_price': prices[token], 'status': 'COMPLETE'})
+    filled = timed(fill, args.repeat)
+
+    cached = timed(risk.analysis, args.repeat)
+
+    reads = []
+    for _ in range(args.repeat):
+        option_ticks()
+        start = time.perf_counter()
+        risk.analysis()
+        reads.append(time.perf_counter() - start)
+    reads = np.array(reads)
+    legacy = timed(lambda: legacy_monitor(positions), 200)
+
+    result = risk.analysis()
+    print(f"legs                    {args.legs} across {len({p['tradingsymbol'][5:12] for p in positions})} expiries")
+    print(f"full sync               {sync * 1000:.2f}ms")
+    print(f"single-leg tick         {tick * 1e6:.1f}us")
+    print(f"tick message            {message * 1e6:.1f}us ({args.batch} legs repriced together)")
+    print(f"index tick              {index_tick * 1000:.2f}ms (all {args.legs} legs repriced)")
+    print(f"fill                    {filled * 1e6:.1f}us")
+    print(f"analysis() unchanged    {cached * 1e6:.2f}us")
+    print(f"analysis() after ticks  p50 {np.median(reads) * 1e6:.1f}us / p99 {np.percentile(reads, 99) * 1e6:.1f}us "
+          f"({args.batch} rows rebuilt)")
+    print(f"old monitor loop        {legacy * 1e6:.1f}us (P&L only, no Greeks)")
+    print(f"portfolio               delta {result['greeks']['delta']:,.1f}  theta {result['greeks']['theta']:,.0f}  "
+          f"vega {result['greeks']['vega']:,.0f}  margin {result['margin_used']:,.0f}  "
+          f"at stop {len(result['positions_at_risk'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Scenario grid benchmark
+
+Reprices a synthetic book of short NIFTY options over a spot x IV shock
+grid (optionally several days forward) with ScenarioEngine, and checks a
+handful of cells against a per-leg loop over black_scholes_put/call.
+
+    python benchmarks/bench_scenarios.py --legs 200 --spot-steps 100 --iv-steps 100 --days 0,1,3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.services.risk import PortfolioRisk
+from app.services.scenario import DAY, MIN_T, ScenarioEngine
+from app.utils.greeks import GreeksCalculator
+
+from bench_risk import book as positions_book
+
+
+def reference(book, spot_shock, iv_shock, day):
+    """One scenario cell, one leg at a time"""
+    pnl = 0.0
+    for i in range(len(book['strike'])):
+        if not np.isfinite(book['iv'][i]):
+            continue
+        T = max(book['T'][i] - day * DAY, MIN_T)
+        S = book['spot'][i] * (1 + spot_shock)
+        sigma = max(book['iv'][i] + iv_shock, 1e-4)
+        pricer = GreeksCalculator.black_scholes_call if book['is_call'][i] else GreeksCalculator.black_scholes_put
+        pnl += (pricer(S, book['strike'][i], T, Config.RISK_FREE_RATE, sigma) - book['ltp'][i]) * book['units'][i]
+    return pnl
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legs', type=int, default=200)
+    parser.add_argument('--spot-steps', type=int, default=100)
+    parser.add_argument('--iv-steps', type=int, default=100)
+    parser.add_argument('--days', default='0')
+    args = parser.parse_args()
+
+    risk = PortfolioRisk()
+    risk.sync(positions_book(args.legs), spot=22000.0)
+    book = risk.book()
+    # Compare only legs with a solved IV, so the loop and the engine price the same book
+    book = {key: values[np.isfinite(book['iv'])] for key, values in book.items()}
+
+    spot_shocks = np.linspace(-0.05, 0.05, args.spot_steps)
+    iv_shocks = np.linspace(-0.05, 0.15, args.iv_steps)
+    days = [float(day) for day in args.days.split(',')]
+
+    engine = ScenarioEngine()
+    engine.pnl_surface(book, spot_shocks[:2], iv_shocks[:2])
+    start = time.perf_counter()
+    result = engine.pnl_surface(book, spot_shocks, iv_shocks, days)
+    elapsed = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    cells = [(rng.integers(len(days)), rng.integers(args.spot_steps), rng.integers(args.iv_steps)) for _ in range(5)]
+    error = max(abs(result['pnl'][d, s, v] - reference(book, spot_shocks[s], iv_shocks[v], days[d]))
+                for d, s, v in cells)
+
+    evaluations = len(days) * args.spot_steps * args.iv_steps * result['legs']
+    worst = result['worst']
+    print(f"grid                    {len(days)} day(s) x {args.spot_steps} spot x {args.iv_steps} IV "
+          f"x {result['legs']} legs = {evaluations:,} repricings")
+    print(f"surface                 {elapsed * 1000:.1f}ms ({evaluations / elapsed / 1e6:.1f}M repricings/s)")
+    print(f"max abs error vs loop   {error:.2e} over {len(cells)} cells")
+    print(f"no shock, day 0         {engine.pnl_surface(book, [0.0], [0.0])['pnl'][0, 0, 0]:,.4f} (marks reproduced)")
+    print(f"worst cell              {worst['pnl']:,.0f} at spot {worst['spot_shock']:+.1%}, "
+          f"IV {worst['iv_shock'] * 100:+.1f} vols, day {worst['day']:g}")
+
+
+if __name__ == '__main__':
+    main()
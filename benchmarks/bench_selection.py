@@ -0,0 +1,156 @@
+"""
+Strike selection benchmark
+
+Builds a synthetic multi-expiry NIFTY universe (--expiries weekly chains of
+--strikes strikes within 10% of spot, Black-Scholes premiums on a skewed smile, spreads that
+widen and open interest that thins away from the money) and fits a
+volatility surface to it. Times StrikeSelector.score() over the whole
+universe, a tick batch plus re-score (the per-tick refresh), and
+allocate() under a capital budget. Compares the legs picked by the old
+premium sort with the scored picks, and checks the allocator against
+brute-force enumeration on small random books.
+
+    python benchmarks/bench_selection.py --expiries 15 --strikes 180 --legs 3
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.services.chain import ASK, BID, IV, LTP, OI, VOLUME, OptionsChain
+from app.services.options import OptionsChainService
+from app.services.selection import StrikeSelector
+from app.utils.greeks import GreeksCalculator
+
+
+def universe(expiries: int, strikes: int, spot: float = 22000.0, seed: int = 3):
+    """One OptionsChain per weekly expiry, quoted around Black-Scholes prices"""
+    rng = np.random.default_rng(seed)
+    today = datetime.now()
+    # Strikes within 10% of spot, as _generate_strikes lists them
+    grid = np.unique(np.round(np.linspace(spot * 0.9, spot * 1.1, strikes) / 5) * 5)
+    chains = []
+    for week in range(1, expiries + 1):
+        expiry = (today + timedelta(days=7 * week)).strftime('%d%b%y').upper()
+        T = OptionsChainService.time_to_expiry(expiry)
+        k = np.log(grid / spot)
+        smile = 0.13 - 0.25 * k + 0.8 * k ** 2
+        rows = len(grid)
+        values = np.zeros((6, 2, rows))
+        for side, is_call in ((0, True), (1, False)):
+            price = GreeksCalculator.calculate_batch_greeks(spot, grid, T, Config.RISK_FREE_RATE, smile, is_call)['price']
+            price = np.maximum(price, 0.05)
+            half = np.maximum(0.05, price * (0.002 + 0.4 * np.abs(k)) * rng.uniform(0.5, 1.5, rows))
+            values[LTP, side] = price
+            values[BID, side] = np.maximum(price - half, 0.05)
+            values[ASK, side] = price + half
+            values[OI, side] = np.round(2e6 * np.exp(-(k / 0.04) ** 2) * rng.uniform(0.2, 1.0, rows))
+            values[VOLUME, side] = np.round(values[OI, side] * rng.uniform(0.05, 0.3, rows))
+            values[IV, side] = smile
+        symbols = ([f'NIFTY{expiry}{int(s)}CE' for s in grid], [f'NIFTY{expiry}{int(s)}PE' for s in grid])
+        tokens = np.arange(2 * rows).reshape(2, rows) + 100000 * week
+        chains.append(OptionsChain(expiry, spot, grid.astype(np.int64), symbols, tokens, values))
+    return chains
+
+
+def brute_force(top: pd.DataFrame, budget: float, legs: int) -> float:
+    """Best score-weighted premium over every feasible choice of legs and lots"""
+    cost = (top['premium'] * top['lot_size']).to_numpy()
+    value = top['score'].to_numpy() * cost
+    cap = np.floor(budget / legs / cost).astype(int)
+    best = 0.0
+    for count in range(1, legs + 1):
+        for picked in itertools.combinations(range(len(top)), count):
+            for lots in itertools.product(*[range(1, cap[i] + 1) for i in picked]):
+                if sum(cost[i] * lot for i, lot in zip(picked, lots)) <= budget:
+                    best = max(best, sum(value[i] * lot for i, lot in zip(picked, lots)))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--expiries', type=int, default=15)
+    parser.add_argument('--strikes', type=int, default=180)
+    parser.add_argument('--legs', type=int, default=3)
+    parser.add_argument('--capital', type=float, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    chains = universe(args.expiries, args.strikes)
+    options = OptionsChainService(None)
+    for chain in chains:
+        options.chains[chain.expiry] = chain
+        options.surface.update(chain, options.time_to_expiry(chain.expiry))
+
+    def timed(fn, repeat=args.repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            samples.append(time.perf_counter() - started)
+        return np.array(samples) * 1000, result
+
+    score_ms, ranked = timed(lambda: options.find_selling_candidates(chains, 'PE', 100))
+
+    # Per-tick refresh: 50 streamed puts move, then the universe is re-scored
+    rng = np.random.default_rng(5)
+
+    def tick_and_score():
+        chain = chains[rng.integers(len(chains))]
+        rows = rng.choice(len(chain), 50, replace=False)
+        chain.apply_ticks([{'instrument_token': int(chain.tokens[1, row]),
+                            'last_price': float(chain.values[LTP, 1, row] * rng.uniform(0.98, 1.02))} for row in rows])
+        return options.find_selling_candidates(chains, 'PE', 100)
+
+    tick_ms, _ = timed(tick_and_score)
+    allocate_ms, picks = timed(lambda: options.selector.allocate(ranked, args.capital, args.legs,
+                                                                           basis='premium'))
+
+    # What the premium sort would have sold from the nearest eligible expiry
+    window = [chain for chain in chains
+              if Config.EXPIRY_DAYS_MIN <= options.time_to_expiry(chain.expiry) * 365 <= Config.EXPIRY_DAYS_MAX + 1]
+    first = window[0] if window else chains[-1]
+    premium = first['pe_ltp']
+    legacy = np.flatnonzero(premium >= 100)
+    legacy = legacy[np.argsort(-premium[legacy], kind='stable')][:args.legs]
+    everything = StrikeSelector(options.surface, min_pop=0, max_spread_percent=1e9, min_otm_percent=-100).score(
+        [first], [options.time_to_expiry(first.expiry)], [Config.NIFTY_LOT_SIZE], 'PE', 0)
+    legacy_pop = everything.set_index('strike').loc[first.strikes[legacy], 'pop']
+
+    # Allocator vs exhaustive search on small books
+    mismatches = 0
+    for trial in range(30):
+        sample = ranked.sample(6, random_state=trial).sort_values('score', ascending=False)
+        budget = float(rng.uniform(0.5, 3) * (sample['premium'] * sample['lot_size']).max())
+        legs = int(rng.integers(1, 4))
+        got = options.selector.allocate(sample, budget, legs, basis='premium', resolution=2000)
+        achieved = float((got['score'] * got['premium'] * got['lot_size'] * got['lots']).sum())
+        if achieved < brute_force(sample, budget, legs) * 0.99 - 1e-9 or got['cost'].sum() > budget + 1e-6:
+            mismatches += 1
+
+    rows = sum(len(chain) for chain in chains)
+    print(f"universe                {len(chains)} expiries x {args.strikes} strikes = {rows} puts, "
+          f"{len(ranked)} pass the constraints")
+    print(f"score()                 p50 {np.percentile(score_ms, 50):6.2f}ms  p99 {np.percentile(score_ms, 99):6.2f}ms")
+    print(f"50 ticks + re-score     p50 {np.percentile(tick_ms, 50):6.2f}ms  p99 {np.percentile(tick_ms, 99):6.2f}ms")
+    print(f"allocate()              p50 {np.percentile(allocate_ms, 50):6.2f}ms  "
+          f"({args.legs} legs, Rs {args.capital:,.0f} of premium)")
+    print(f"premium sort ({first.expiry})  strikes {first.strikes[legacy].tolist()}, "
+          f"POP {np.round(legacy_pop.to_numpy(), 2).tolist()}")
+    print("scored picks")
+    for row in picks.itertuples(index=False):
+        print(f"  {row.expiry} {row.strike}PE  premium {row.premium:7.2f}  POP {row.pop:.2f}  "
+              f"spread {row.spread * 100:4.1f}%  score {row.score:.3f}  {row.lots} lots")
+    print(f"allocator vs brute force  {30 - mismatches}/30 optimal")
+
+
+if __name__ == '__main__':
+    main()
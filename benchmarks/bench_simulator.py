@@ -0,0 +1,160 @@
+"""
+Simulated exchange benchmark
+
+Boots the real app on SimulatedExchange (no credentials or network) with
+--latency-ms (+ --jitter-ms) per broker call and the simulated ticker
+feeding the QuoteStore. Measures the chain endpoint while the market
+steps, one put-selling strategy run end to end, and --orders market
+orders from place_order to the fill arriving on the order feed. A second
+exchange with Kite's rate limits and --error-rate injected errors shows
+how the quote path degrades. Finally the whole scenario runs twice
+without latency and the prices, fills and P&L are compared: the same
+seed must give the same result.
+
+    python benchmarks/bench_simulator.py --latency-ms 20 --jitter-ms 5 --orders 200 --error-rate 0.05
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before app.config is imported: nothing written outside a temp dir, simulated feed on
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='simulator-'))
+os.environ['JOURNAL_ENABLED'] = 'false'
+os.environ['RECORDER_ENABLED'] = 'false'
+os.environ['TICKER_ENABLED'] = 'true'
+os.environ.setdefault('ASYNC_MODE', 'threading')
+os.environ.setdefault('QUOTE_RATE_LIMIT', '1000')  # Let the client overrun Kite's limits in the fault runs
+
+from app import create_app
+from app.services.broker import BrokerService
+from app.services.simulator import KITE_RATE_LIMITS, SimulatedExchange
+
+
+def percentiles(samples) -> str:
+    samples = np.asarray(samples) * 1000
+    if not len(samples):
+        return 'no samples'
+    return f"p50 {np.percentile(samples, 50):7.2f}ms  p99 {np.percentile(samples, 99):7.2f}ms"
+
+
+def scenario(seed: int, latency: float, jitter: float, requests: int, orders: int) -> dict:
+    """Chain reads, a strategy run and a stream of orders against one exchange"""
+    exchange = SimulatedExchange(seed=seed, latency=latency, jitter=jitter)
+    app = create_app(broker=BrokerService(kite=exchange))
+    client = app.test_client()
+    broker = app.extensions['broker']
+    ticker = app.extensions['ticker']
+
+    filled = {}
+    done = threading.Condition()
+
+    def on_order(order):
+        if order.get('status') == 'COMPLETE':
+            with done:
+                filled[order['order_id']] = (time.perf_counter(), order['average_price'])
+                done.notify_all()
+
+    ticker.add_order_listener(on_order)
+
+    # Chain reads while the market moves; streamed quotes take over after the first fetch
+    expiry = next(expiry for expiry, listed in zip(exchange.expiries, exchange.expiry_dates)
+                  if 30 <= (listed - date.today()).days <= 45)
+    chain_times = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(f'/api/options-chain/{expiry}')
+        chain_times.append(time.perf_counter() - started)
+        exchange.step()
+    rows = len(response.get_json()['data'])
+
+    # Round trips on one near-the-money put, flat again after every second order
+    put = f"NIFTY{expiry}{int(round(exchange.spot / 50) * 50)}PE"
+    acks, fills = [], []
+    reference = exchange.quote(f'NFO:{put}')[f'NFO:{put}']['last_price']
+    for i in range(orders):
+        submitted = time.perf_counter()
+        order_id = broker.place_order(put, 'SELL' if i % 2 == 0 else 'BUY', exchange.lot_size, order_type='MARKET',
+                                      reference_price=reference)
+        acks.append(time.perf_counter() - submitted)
+        with done:
+            done.wait_for(lambda: order_id in filled, timeout=5)
+        if order_id in filled:
+            fills.append(filled[order_id][0] - submitted)
+        if i % 10 == 9:
+            exchange.step()
+
+    started = time.perf_counter()
+    strategy = client.post('/api/orders/strategy/execute', json={'target_strikes': 3}).get_json()
+    strategy_time = time.perf_counter() - started
+
+    positions = exchange.positions()['net']
+    return {
+        'chain': chain_times, 'rows': rows, 'strategy': strategy, 'strategy_time': strategy_time,
+        'acks': acks, 'fills': fills, 'stats': exchange.stats(),
+        'fingerprint': (round(exchange.spot, 6),
+                        tuple((leg['symbol'], leg['filled_quantity'], leg['average_price'])
+                              for leg in strategy.get('orders', [])),
+                        tuple(sorted(price for _, price in filled.values())),
+                        tuple(sorted((p['tradingsymbol'], p['quantity'], round(p['pnl'], 2)) for p in positions)))
+    }
+
+
+def faults(seed: int, calls: int, error_rate: float = 0.0, rate_limits: dict = None) -> dict:
+    """Back-to-back bulk quotes of 400 contracts against injected errors or rate limits"""
+    exchange = SimulatedExchange(seed=seed, error_rate=error_rate, rate_limits=rate_limits)
+    broker = BrokerService(kite=exchange)
+    broker.scheduler.retries = 0  # Raw degradation; bench_rate_limit.py covers retries
+    symbols = list(exchange.symbols[:400])
+    served = 0
+    started = time.perf_counter()
+    for _ in range(calls):
+        served += len(broker.get_quotes(symbols)) == len(symbols)
+    return {'served': served, 'elapsed': time.perf_counter() - started, 'faults': exchange.stats()['faults']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='per broker call')
+    parser.add_argument('--jitter-ms', type=float, default=5.0, help='mean of the exponential extra delay')
+    parser.add_argument('--requests', type=int, default=50, help='chain reads')
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--fault-calls', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    run = scenario(args.seed, args.latency_ms / 1000, args.jitter_ms / 1000, args.requests, args.orders)
+    strategy = run['strategy']
+    print(f"GET /api/options-chain ({run['rows']} strikes)  {percentiles(run['chain'])}  "
+          f"(first {run['chain'][0] * 1000:.1f}ms)")
+    print(f"strategy run              {run['strategy_time'] * 1000:7.1f}ms  status {strategy['status']}, "
+          f"{len(strategy.get('orders', []))} legs {strategy.get('errors') or ''}")
+    for leg in strategy.get('orders', []):
+        print(f"  {leg['symbol']:<22} {leg['status']:<9} {leg['filled_quantity']:>5} @ {leg['average_price']}  "
+              f"{leg['timings']}")
+    print(f"place_order ack           {percentiles(run['acks'])}")
+    print(f"place_order -> fill feed  {percentiles(run['fills'])}  ({len(run['fills'])}/{args.orders} filled)")
+    print(f"exchange                  {run['stats']}")
+
+    logging.getLogger('app.services.broker').setLevel(logging.CRITICAL)
+    for label, fault in ((f"{args.error_rate:.0%} injected errors", faults(args.seed, args.fault_calls, args.error_rate)),
+                         ("Kite rate limits", faults(args.seed, args.fault_calls, rate_limits=KITE_RATE_LIMITS))):
+        print(f"{args.fault_calls} bulk quotes, {label + ':':<22} {fault['served']} served whole "
+              f"in {fault['elapsed'] * 1000:.0f}ms, faults {fault['faults']}")
+
+    first = scenario(args.seed, 0.0, 0.0, 5, 20)['fingerprint']
+    second = scenario(args.seed, 0.0, 0.0, 5, 20)['fingerprint']
+    print(f"same seed, two runs       {'identical' if first == second else 'DIFFERENT'} prices, fills and P&L")
+
+
+if __name__ == '__main__':
+    main()
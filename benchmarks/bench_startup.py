@@ -0,0 +1,94 @@
+"""
+Cold start benchmark
+
+Starts the real server (run.py: eventlet patching, create_app, SocketIO
+server) in a fresh process --runs times and polls it every few
+milliseconds. Reports time from spawn to the first 200 on /api/health
+(liveness: services are not built yet) and to the first 200 on
+/api/ready (broker session, instrument master, options, strategy and
+journal built by the background warm-up). Before lazy construction the
+server only answered once everything was built, so the ready time is
+also what every restart used to cost. Defaults to the simulated exchange
+so readiness is reachable without credentials.
+
+    python benchmarks/bench_startup.py --runs 5 --backend simulator
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVE = "import run; run.socketio.run(run.app, host='127.0.0.1', port={port}, log_output=False{extra})"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def status(port: int, path: str) -> int:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+    try:
+        connection.request('GET', path)
+        return connection.getresponse().status
+    except OSError:
+        return 0
+    finally:
+        connection.close()
+
+
+def cold_start(args) -> dict:
+    port = free_port()
+    data_dir = tempfile.mkdtemp(prefix='startup-')
+    env = dict(os.environ, BROKER_BACKEND=args.backend, ASYNC_MODE=args.async_mode, DATA_DIR=data_dir,
+               JOURNAL_URL=f"sqlite:///{os.path.join(data_dir, 'journal.db')}",
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    serve = SERVE.format(port=port, extra=', allow_unsafe_werkzeug=True' if args.async_mode == 'threading' else '')
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', serve], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    times = {}
+    try:
+        while time.perf_counter() - started < args.timeout and 'ready' not in times:
+            if process.poll() is not None:
+                break
+            if 'health' not in times and status(port, '/api/health') == 200:
+                times['health'] = time.perf_counter() - started
+            if 'health' in times and status(port, '/api/ready') == 200:
+                times['ready'] = time.perf_counter() - started
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--backend', default='simulator', help="'kite' needs credentials to become ready")
+    parser.add_argument('--async-mode', default='eventlet', choices=['eventlet', 'threading'])
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds per run')
+    args = parser.parse_args()
+
+    runs = [cold_start(args) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts of run.py ({args.async_mode}, {args.backend} backend)")
+    for key, label in (('health', 'first /api/health 200'), ('ready', 'first /api/ready 200')):
+        samples = np.asarray([run[key] for run in runs if key in run]) * 1000
+        if not len(samples):
+            print(f"{label:<24} never (within {args.timeout:g}s)")
+            continue
+        print(f"{label:<24} p50 {np.percentile(samples, 50):7.1f}ms  max {samples.max():7.1f}ms  "
+              f"({len(samples)}/{args.runs})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Volatility surface benchmark
+
+A fake Kite client prices every NIFTY contract off a known smile/term
+structure (rounded to the 0.05 tick) with a fixed round-trip latency.
+Times a per-expiry chain loop against the pipelined multi-expiry fetch
+(IVs + surface fit included), then an incremental refresh after ticks on
+a few expiries, and checks the fitted surface against the true vols.
+
+    python benchmarks/bench_surface.py --expiries 15 --latency-ms 80 --ticks 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.services.broker import BrokerService
+from app.services.cache import BrokerCache
+from app.services.options import OptionsChainService
+from app.utils.greeks import GreeksCalculator
+
+
+def true_vol(strike, spot, T):
+    """Skewed smile whose ATM level rises with maturity"""
+    k = np.log(strike / spot) / np.sqrt(T)
+    atm = 0.12 + 0.03 * (1 - np.exp(-4 * T))
+    return np.clip(atm * (1 - 0.35 * k + 0.6 * k * k), 0.05, 1.5)
+
+
+class FakeKite:
+    """Kite client stand-in pricing contracts off true_vol after a fixed delay"""
+
+    def __init__(self, spot: float, latency: float):
+        self.spot = spot
+        self.latency = latency
+        self.round_trips = 0
+        self.tokens = {}
+        self.prices = {}
+        self._lock = threading.Lock()
+
+    def price(self, symbol: str):
+        if symbol in self.prices:
+            return self.prices[symbol]
+        expiry, strike, kind = symbol[5:12], float(symbol[12:-2]), symbol[-2:]
+        T = OptionsChainService.time_to_expiry(expiry)
+        price = GreeksCalculator.calculate_batch_greeks(self.spot, strike, T, Config.RISK_FREE_RATE,
+                                                        true_vol(strike, self.spot, T), kind == 'CE')['price']
+        self.prices[symbol] = max(round(float(price) / 0.05) * 0.05, 0.05)
+        return self.prices[symbol]
+
+    def quote(self, keys):
+        with self._lock:
+            self.round_trips += 1
+        time.sleep(self.latency)
+
+        quotes = {}
+        for key in keys:
+            if key == 'NSE:NIFTY 50':
+                quotes[key] = {'last_price': self.spot}
+                continue
+            ltp = self.price(key[4:])
+            with self._lock:
+                token = self.tokens.setdefault(key[4:], 100_000 + len(self.tokens))
+            quotes[key] = {
+                'instrument_token': token,
+                'last_price': ltp,
+                'volume': 1000,
+                'oi': 50000,
+                'depth': {'buy': [{'price': ltp - 0.05}], 'sell': [{'price': ltp + 0.05}]},
+            }
+        return quotes
+
+
+def listed_expiries(count: int):
+    today = date.today()
+    first = today + timedelta(days=(3 - today.weekday()) % 7 or 7)
+    return [(first + timedelta(weeks=w)).strftime('%d%b%y').upper() for w in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spot', type=float, default=22000.0)
+    parser.add_argument('--expiries', type=int, default=15)
+    parser.add_argument('--latency-ms', type=float, default=80.0)
+    parser.add_argument('--rate', type=float, default=0, help='quote requests per second (0 = unlimited)')
+    parser.add_argument('--ticks', type=int, default=200, help='contracts ticked before the incremental refresh')
+    parser.add_argument('--ticked-expiries', type=int, default=3)
+    args = parser.parse_args()
+
+    kite = FakeKite(args.spot, args.latency_ms / 1000)
+    expiries = listed_expiries(args.expiries)
+    kite.quote([f'NFO:{symbol}' for symbol in (  # Price the universe up front, outside the timings
+        f'NIFTY{expiry}{strike}{kind}' for expiry in expiries for kind in ('CE', 'PE')
+        for strike in OptionsChainService(None)._generate_strikes(args.spot))])
+    kite.round_trips = 0
+    broker = BrokerService(kite=kite)
+    broker.cache = BrokerCache({})
+    broker.scheduler.configure('quote', args.rate, burst=max(1, int(args.rate)))
+
+    sequential = OptionsChainService(broker)
+    start = time.perf_counter()
+    for expiry in expiries:
+        sequential.get_options_chain(expiry)
+    sequential_time = time.perf_counter() - start
+    sequential_trips, kite.round_trips = kite.round_trips, 0
+
+    options = OptionsChainService(broker)
+    start = time.perf_counter()
+    chains = options.get_options_chains(expiries)
+    pipelined_time = time.perf_counter() - start
+    pipelined_trips = kite.round_trips
+    contracts = sum(2 * len(chain) for chain in chains.values())
+
+    start = time.perf_counter()
+    options.refresh_surface()
+    unchanged = time.perf_counter() - start
+
+    # Stream new prices into a few expiries, as the ticker would
+    rng = np.random.default_rng(2)
+    ticked = expiries[:args.ticked_expiries]
+    ticks = []
+    for expiry in ticked:
+        chain = chains[expiry]
+        for flat in rng.choice(chain.tokens.size, args.ticks // len(ticked), replace=False):
+            token = int(chain.tokens.flat[flat])
+            ticks.append({'instrument_token': token,
+                          'last_price': kite.price(chain.symbols.flat[flat]) * rng.uniform(0.98, 1.02)})
+    time.sleep(0.01)
+    start = time.perf_counter()
+    options.on_ticks(ticks)
+    applied = time.perf_counter() - start
+    start = time.perf_counter()
+    options.refresh_surface()
+    incremental = time.perf_counter() - start
+
+    # Fit quality over quoted strikes (OTM side) and a large lookup
+    surface = options.surface
+    errors, raw = [], []
+    for expiry, chain in chains.items():
+        T = options.time_to_expiry(expiry)
+        strikes = chain.strikes.astype(float)
+        truth = true_vol(strikes, args.spot, T)
+        solved = np.where(strikes < args.spot, chain['pe_iv'], chain['ce_iv'])
+        errors.append(np.abs(surface.sigma(strikes, T) - truth))
+        raw.append(np.abs(solved - truth)[np.isfinite(solved)])
+    errors, raw = np.concatenate(errors), np.concatenate(raw)
+
+    strikes = rng.uniform(0.85, 1.15, 10_000) * args.spot
+    T = rng.uniform(1, 120, 10_000) / 365
+    start = time.perf_counter()
+    surface.sigma(strikes, T)
+    lookup = time.perf_counter() - start
+
+    print(f"universe                {len(chains)} expiries, {contracts} contracts, "
+          f"broker latency {args.latency_ms:g}ms, rate {args.rate or 'unlimited'}")
+    print(f"per-expiry loop         {sequential_time * 1000:>8.1f}ms  {sequential_trips} round-trips")
+    print(f"pipelined full refresh  {pipelined_time * 1000:>8.1f}ms  {pipelined_trips} round-trips "
+          f"(fetch + IV + fit)")
+    print(f"refresh, no changes     {unchanged * 1000:>8.3f}ms")
+    print(f"apply {len(ticks)} ticks         {applied * 1000:>8.3f}ms")
+    print(f"incremental refresh     {incremental * 1000:>8.3f}ms  ({len(ticked)} slices re-solved and refitted)")
+    print(f"sigma() 10k contracts   {lookup * 1000:>8.3f}ms")
+    print(f"|surface - true| vol    median {np.median(errors) * 100:.3f} / p95 {np.percentile(errors, 95) * 100:.3f} "
+          f"vol pts (raw IV median {np.median(raw) * 100:.3f})")
+
+
+if __name__ == '__main__':
+    main()
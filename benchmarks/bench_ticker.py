@@ -0,0 +1,195 @@
+"""
+Streaming quote benchmark
+
+Runs a local fake Kite ticker (a bare-bones WebSocket server) that
+replays full-mode ticks for whatever tokens the client subscribes to.
+The first options chain is fetched over a fake REST client, which
+subscribes every instrument; later chains are served from the
+QuoteStore without REST round-trips.
+
+    python benchmarks/bench_ticker.py --latency-ms 80 --seconds 3
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.broker import BrokerService
+from app.services.options import OptionsChainService
+from app.services.ticker import MarketDataTicker, QuoteStore, pack_full_packet, pack_message
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+SPOT = 22000.0
+
+
+def token_for(key: str) -> int:
+    """Deterministic fake NFO token (segment 2) for a tradingsymbol"""
+    if key == 'NSE:NIFTY 50':
+        return 256265
+    return (int(hashlib.md5(key.encode()).hexdigest()[:6], 16) << 8) | 2
+
+
+def price_for(key: str) -> float:
+    if key == 'NSE:NIFTY 50':
+        return SPOT
+    strike = int(key[-7:-2])
+    intrinsic = max(0.0, SPOT - strike) if key.endswith('CE') else max(0.0, strike - SPOT)
+    return intrinsic + 50.0
+
+
+class FakeKite:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.round_trips = 0
+
+    def quote(self, keys):
+        self.round_trips += 1
+        time.sleep(self.latency)
+        return {key: {'instrument_token': token_for(key), 'last_price': price_for(key),
+                      'volume': 0, 'oi': 0, 'depth': {'buy': [{'price': 0}], 'sell': [{'price': 0}]}}
+                for key in keys}
+
+
+class FakeTickerServer:
+    """Single-client RFC 6455 server replaying random-walk ticks"""
+
+    def __init__(self, interval: float, prices: dict):
+        self.interval = interval
+        self.prices = prices
+        self.tokens = set()
+        self.frames_sent = 0
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1)
+        self.url = f'ws://127.0.0.1:{self.sock.getsockname()[1]}'
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += conn.recv(4096)
+        key = [line.split(b':', 1)[1].strip() for line in request.split(b'\r\n')
+               if line.lower().startswith(b'sec-websocket-key')][0]
+        accept = base64.b64encode(hashlib.sha1(key + WS_GUID.encode()).digest())
+        conn.sendall(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                     b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+        threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+        while True:
+            tokens = list(self.tokens)
+            if tokens:
+                packets = []
+                for token in tokens:
+                    price = self.prices.get(token, 100.0)
+                    if token != 256265:
+                        price += random.uniform(-1, 1)
+                    packets.append(pack_full_packet(token, price, volume=1000, oi=50000,
+                                                    bids=[(price - 0.5, 50, 1)],
+                                                    asks=[(price + 0.5, 50, 1)]))
+                self._send(conn, pack_message(packets))
+                self.frames_sent += 1
+            time.sleep(self.interval)
+
+    def _send(self, conn, payload: bytes):
+        header = bytes([0x82])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 65536:
+            header += bytes([126]) + struct.pack('>H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('>Q', len(payload))
+        conn.sendall(header + payload)
+
+    def _recv_exact(self, conn, size):
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _read(self, conn):
+        try:
+            while True:
+                first, second = self._recv_exact(conn, 2)
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack('>H', self._recv_exact(conn, 2))[0]
+                elif length == 127:
+                    length = struct.unpack('>Q', self._recv_exact(conn, 8))[0]
+                mask = self._recv_exact(conn, 4)
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(conn, length)))
+                if first & 0x0F == 0x1:
+                    message = json.loads(payload)
+                    if message['a'] == 'subscribe':
+                        self.tokens.update(message['v'])
+        except (ConnectionError, OSError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=80.0, help='fake REST round-trip')
+    parser.add_argument('--interval-ms', type=float, default=10.0, help='tick frame interval')
+    parser.add_argument('--seconds', type=float, default=3.0, help='replay duration')
+    args = parser.parse_args()
+
+    kite = FakeKite(args.latency_ms / 1000)
+    broker = BrokerService(kite=kite)
+    broker.scheduler.configure('quote', 0)
+    options = OptionsChainService(broker)
+
+    ticks = []
+    prices = {}
+    server = FakeTickerServer(args.interval_ms / 1000, prices)
+    ticker = MarketDataTicker(QuoteStore(), server.url)
+    ticker.add_tick_listener(lambda batch: ticks.append(len(batch)))
+    broker.attach_ticker(ticker)
+    ticker.start()
+    while not ticker.connected:
+        time.sleep(0.01)
+
+    start = time.perf_counter()
+    chain = options.get_options_chain('28NOV24')
+    rest_time = time.perf_counter() - start
+    rest_trips = kite.round_trips
+
+    for key, token in ticker.store._tokens.items():
+        prices[token] = price_for(key)
+
+    time.sleep(args.seconds)
+
+    kite.round_trips = 0
+    start = time.perf_counter()
+    for _ in range(10):
+        chain = options.get_options_chain('28NOV24')
+    streamed_time = (time.perf_counter() - start) / 10
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        broker.get_quote('NIFTY 50', 'NSE')
+    quote_time = (time.perf_counter() - start) / 1000
+
+    ticker.stop()
+
+    print(f"subscribed tokens    {len(server.tokens)}")
+    print(f"ticks ingested       {sum(ticks)} ({sum(ticks) / args.seconds:,.0f}/s)")
+    print(f"chain via REST       {rest_time * 1000:>8.1f}ms  {rest_trips} round-trips")
+    print(f"chain via stream     {streamed_time * 1000:>8.1f}ms  {kite.round_trips} round-trips")
+    print(f"spot quote (store)   {quote_time * 1e6:>8.1f}us  ({len(chain)} strikes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,12 @@
-import React, { useState, useEffect } from 'react'
-import axios from 'axios'
+import React from 'react'
 import { Loader2 } from 'lucide-react'
+import { useWebSocket } from '../hooks/useWebSocket'
 
 const HoldingsView = () => {
-  const [holdings, setHoldings] = useState([])
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState(null)
-
-  useEffect(() => {
-    const fetchHoldings = async () => {
-      try {
-        const response = await axios.get('/api/orders/holdings')
-        if (response.data.success) {
-          setHoldings(response.data.data)
-        }
-      } catch (err) {
-        setError(err.message)
-      } finally {
-        setLoading(false)
-      }
-    }
-
-    fetchHoldings()
-    const interval = setInterval(fetchHoldings, 10000) // Refresh every 10 seconds
-    return () => clearInterval(interval)
-  }, [])
+  // Pushed by the server, keyed by exchange:tradingsymbol
+  const { data } = useWebSocket('holdings')
+  const holdings = data ? Object.values(data) : []
+  const loading = data === null
 
   if (loading) {
     return (
@@ -36,16 +18,6 @@ const HoldingsView = () => {
     )
   }
 
-  if (error) {
-    return (
-      <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl shadow-xl p-6 border border-slate-700">
-        <div className="text-center py-12 text-red-400">
-          <p>Error loading holdings: {error}</p>
-        </div>
-      </div>
-    )
-  }
-
   return (
     <div className="bg-slate-800/50 backdrop-blur-sm rounded-xl shadow-xl p-6 border border-slate-700">
       <h2 className="text-xl font-bold mb-4 text-slate-100">Holdings</h2>
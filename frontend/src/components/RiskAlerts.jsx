@@ -1,27 +1,13 @@
-import React, { useEffect, useState } from 'react'
-import axios from 'axios'
+import React, { useState } from 'react'
 import { AlertTriangle, X } from 'lucide-react'
+import { useWebSocket } from '../hooks/useWebSocket'
 
 const RiskAlerts = () => {
-  const [alerts, setAlerts] = useState([])
+  // Pushed by the server whenever the risk analysis changes
+  const { data: analysis } = useWebSocket('risk')
   const [dismissed, setDismissed] = useState(new Set())
 
-  useEffect(() => {
-    const fetchRiskAnalysis = async () => {
-      try {
-        const response = await axios.get('/api/analytics/positions/monitor')
-        if (response.data.success && response.data.analysis.positions_at_risk) {
-          setAlerts(response.data.analysis.positions_at_risk)
-        }
-      } catch (err) {
-        console.error('Failed to fetch risk analysis:', err)
-      }
-    }
-
-    fetchRiskAnalysis()
-    const interval = setInterval(fetchRiskAnalysis, 10000) // Check every 10 seconds
-    return () => clearInterval(interval)
-  }, [])
+  const alerts = analysis?.positions_at_risk || []
 
   const handleDismiss = (symbol) => {
     setDismissed(prev => new Set([...prev, symbol]))
@@ -3,7 +3,7 @@ import axios from 'axios'
 import { Play, Loader2, CheckCircle, XCircle } from 'lucide-react'
 
 const StrategyView = () => {
-  const [capital, setCapital] = useState(100000)
+  const [capital, setCapital] = useState(500000)
   const [targetStrikes, setTargetStrikes] = useState(3)
   const [loading, setLoading] = useState(false)
   const [result, setResult] = useState(null)
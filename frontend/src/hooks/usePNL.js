@@ -1,44 +1,30 @@
 import { useState, useEffect } from 'react'
-import axios from 'axios'
 import { format } from 'date-fns'
+import { useWebSocket } from './useWebSocket'
 
-export const usePNL = (refreshInterval = 3000) => {
+export const usePNL = () => {
+  const { data: summary } = useWebSocket('pnl')
   const [pnlData, setPnlData] = useState([])
-  const [summary, setSummary] = useState(null)
-  const [loading, setLoading] = useState(true)
 
-  const fetchPNL = async () => {
-    try {
-      const response = await axios.get('/api/analytics/pnl/summary')
-      if (response.data.success) {
-        setSummary(response.data.data)
-        
-        // Add current data point to chart
-        setPnlData(prev => {
-          const newDataPoint = {
-            time: format(new Date(), 'HH:mm:ss'),
-            pnl: response.data.data.total_pnl,
-            realized: response.data.data.realized_pnl,
-            unrealized: response.data.data.unrealized_pnl
-          }
-          
-          // Keep last 100 data points
-          const updated = [...prev, newDataPoint]
-          return updated.slice(-100)
-        })
-      }
-    } catch (err) {
-      console.error('Failed to fetch P&L:', err)
-    } finally {
-      setLoading(false)
+  useEffect(() => {
+    if (!summary) {
+      return
     }
-  }
 
-  useEffect(() => {
-    fetchPNL()
-    const interval = setInterval(fetchPNL, refreshInterval)
-    return () => clearInterval(interval)
-  }, [refreshInterval])
+    // Add current data point to chart
+    setPnlData(prev => {
+      const newDataPoint = {
+        time: format(new Date(), 'HH:mm:ss'),
+        pnl: summary.total_pnl,
+        realized: summary.realized_pnl,
+        unrealized: summary.unrealized_pnl
+      }
+
+      // Keep last 100 data points
+      const updated = [...prev, newDataPoint]
+      return updated.slice(-100)
+    })
+  }, [summary])
 
-  return { pnlData, summary, loading }
-}
\ No newline at end of file
+  return { pnlData, summary, loading: summary === null }
+}
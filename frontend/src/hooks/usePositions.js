@@ -1,31 +1,40 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useMemo } from 'react'
 import axios from 'axios'
+import { useWebSocket } from './useWebSocket'
 
-export const usePositions = (refreshInterval = 5000) => {
-  const [positions, setPositions] = useState([])
-  const [loading, setLoading] = useState(true)
+export const usePositions = () => {
+  const { data } = useWebSocket('positions')
+  const [fetched, setFetched] = useState(null)
   const [error, setError] = useState(null)
 
+  // One-off REST read, e.g. right after placing an order
   const fetchPositions = async () => {
     try {
       const response = await axios.get('/api/orders/positions')
       if (response.data.success) {
-        setPositions(response.data.data)
+        setFetched(response.data.data)
         setError(null)
       }
     } catch (err) {
       setError(err.message)
       console.error('Failed to fetch positions:', err)
-    } finally {
-      setLoading(false)
     }
   }
 
+  // Server pushes take over again as soon as the next update arrives
   useEffect(() => {
-    fetchPositions()
-    const interval = setInterval(fetchPositions, refreshInterval)
-    return () => clearInterval(interval)
-  }, [refreshInterval])
+    setFetched(null)
+  }, [data])
 
-  return { positions, loading, error, refetch: fetchPositions }
-}
\ No newline at end of file
+  const positions = useMemo(
+    () => fetched || (data ? Object.values(data) : []),
+    [data, fetched]
+  )
+
+  return {
+    positions,
+    loading: data === null && fetched === null && !error,
+    error,
+    refetch: fetchPositions
+  }
+}
@@ -1,52 +1,72 @@
-import { useState, useEffect, useRef } from 'react'
+import { useState, useEffect } from 'react'
+import { io } from 'socket.io-client'
 
-export const useWebSocket = (url) => {
+// One SocketIO connection shared by every hook in the tab
+let socket = null
+
+const getSocket = () => {
+  if (!socket) {
+    socket = io({ path: '/socket.io', transports: ['websocket', 'polling'] })
+  }
+  return socket
+}
+
+const ROW_CHANNELS = ['positions', 'holdings']
+
+// Apply a server update: full snapshots replace, partial ones merge changed fields
+const applyUpdate = (prev, update) => {
+  if (update.full || prev === null) {
+    return update.data
+  }
+
+  const next = { ...prev }
+  Object.entries(update.data).forEach(([key, value]) => {
+    next[key] = ROW_CHANNELS.includes(update.channel)
+      ? { ...(prev[key] || {}), ...value }
+      : value
+  })
+  update.removed.forEach(key => delete next[key])
+  return next
+}
+
+export const useWebSocket = (channel) => {
   const [data, setData] = useState(null)
   const [isConnected, setIsConnected] = useState(false)
-  const wsRef = useRef(null)
 
   useEffect(() => {
-    // Create WebSocket connection
-    const ws = new WebSocket(url)
-    wsRef.current = ws
+    const ws = getSocket()
 
-    ws.onopen = () => {
-      console.log('WebSocket connected')
+    const subscribe = () => {
       setIsConnected(true)
+      ws.emit('subscribe', { channels: [channel] })
     }
 
-    ws.onmessage = (event) => {
-      try {
-        const parsedData = JSON.parse(event.data)
-        setData(parsedData)
-      } catch (err) {
-        console.error('Failed to parse WebSocket data:', err)
+    const onUpdate = (update) => {
+      if (update.channel === channel) {
+        setData(prev => applyUpdate(prev, update))
       }
     }
 
-    ws.onerror = (error) => {
-      console.error('WebSocket error:', error)
+    const onDisconnect = () => {
+      console.log('WebSocket disconnected')
       setIsConnected(false)
     }
 
-    ws.onclose = () => {
-      console.log('WebSocket disconnected')
-      setIsConnected(false)
+    ws.on('connect', subscribe)
+    ws.on('update', onUpdate)
+    ws.on('disconnect', onDisconnect)
+    if (ws.connected) {
+      subscribe()
     }
 
     // Cleanup on unmount
     return () => {
-      if (ws.readyState === WebSocket.OPEN) {
-        ws.close()
-      }
+      ws.emit('unsubscribe', { channels: [channel] })
+      ws.off('connect', subscribe)
+      ws.off('update', onUpdate)
+      ws.off('disconnect', onDisconnect)
     }
-  }, [url])
-
-  const sendMessage = (message) => {
-    if (wsRef.current?.readyState === WebSocket.OPEN) {
-      wsRef.current.send(JSON.stringify(message))
-    }
-  }
+  }, [channel])
 
-  return { data, isConnected, sendMessage }
-}
\ No newline at end of file
+  return { data, isConnected }
+}
@@ -11,6 +11,10 @@ export defineConfig({
         target: 'http://localhost:5000',
         changeOrigin: true,
       },
+      '/socket.io': {
+        target: 'http://localhost:5000',
+        ws: true,
+      },
     },
   },
 })
\ No newline at end of file
@@ -1,6 +1,94 @@
+import importlib.util
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+# Before anything below reads WORKERS, REDIS_URL or ASYNC_MODE
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def load_config():
+    """
+    Config from app/config.py alone: importing the app package would
+    import socket before the monkey-patch below
+    """
+    spec = importlib.util.spec_from_file_location(
+        'run_config', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'config.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Config
+
+
+config = load_config()
+
+
+def supervise(workers: int):
+    """Run WORKERS copies of this script on one port and restart any that exit"""
+    if not config.REDIS_URL:
+        logger.error("WORKERS > 1 needs REDIS_URL (SocketIO fan-out and leader election)")
+        sys.exit(1)
+
+    def spawn(worker_id: int):
+        env = dict(os.environ, WORKER_ID=str(worker_id))
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+
+    processes = {worker_id: spawn(worker_id) for worker_id in range(workers)}
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for process in processes.values():
+            process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(f"Started {workers} workers")
+
+    while not stopping:
+        for worker_id, process in processes.items():
+            if process.poll() is not None and not stopping:
+                logger.warning(f"Worker {worker_id} exited ({process.returncode}), restarting")
+                processes[worker_id] = spawn(worker_id)
+        time.sleep(1)
+    for process in processes.values():
+        process.wait()
+
+
+if __name__ == '__main__':
+    workers = config.WORKERS
+    if workers > 1 and 'WORKER_ID' not in os.environ:
+        supervise(workers)
+        sys.exit(0)
+
+# Green threads: a slow broker call parks only its own request instead of
+# the whole server. Patching has to happen before anything imports socket.
+if config.ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
 from app import create_app, socketio
 
 app = create_app()
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if 'WORKER_ID' in os.environ:
+        import eventlet.wsgi
+
+        # Every worker listens on the same port (SO_REUSEPORT); the kernel spreads connections
+        listener = eventlet.listen((app.config['HOST'], app.config['PORT']), reuse_port=True)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            eventlet.wsgi.server(listener, app, log_output=False)
+        finally:
+            # Hand leadership over at once instead of after LEADER_TTL
+            if app.extensions.built('cluster'):
+                app.extensions['cluster'].stop()
+    else:
+        socketio.run(app, debug=True, host=app.config['HOST'], port=app.config['PORT'])